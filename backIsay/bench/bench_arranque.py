@@ -0,0 +1,90 @@
+# Arranque en frío de un worker: importar main, correr el arranque de la app
+# (lifespan) y atender la primera petición, cada repetición en un proceso
+# nuevo. Cuenta por fase las conexiones nuevas a la base, las sentencias SQL
+# y, aparte, las de esquema (PRAGMA, sqlite_master, information_schema, SHOW...).
+#
+#   python -m bench.bench_arranque [--repeticiones 5]
+#
+# La base (DATABASE_URL, por defecto la SQLite de bench/comun.py) ya debe
+# tener el esquema, como en producción; el benchmark la prepara una vez.
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+USUARIO_ID = 1
+ESQUEMA = re.compile(r"^\s*(PRAGMA|SHOW|DESCRIBE)\b|sqlite_master|information_schema", re.I)
+
+
+def _hijo():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from sqlalchemy.pool import Pool
+
+    sentencias, conexiones = [], []
+    event.listen(Engine, "before_cursor_execute", lambda conn, cur, sql, *a: sentencias.append(sql))
+    event.listen(Pool, "connect", lambda *a: conexiones.append(1))
+
+    def fase(inicio, desde):
+        hechas = sentencias[desde[0]:]
+        return {"ms": (time.perf_counter() - inicio) * 1000, "conexiones": len(conexiones) - desde[1],
+                "sql": len(hechas), "esquema": sum(1 for s in hechas if ESQUEMA.search(s))}
+
+    def marca():
+        return len(sentencias), len(conexiones)
+
+    fases = {}
+    n, t0 = marca(), time.perf_counter()
+    import main
+    fases["importar"] = fase(t0, n)
+
+    from fastapi.testclient import TestClient
+    import sesiones
+
+    n, t0 = marca(), time.perf_counter()
+    with TestClient(main.app) as cliente:
+        fases["arranque"] = fase(t0, n)
+        n, t0 = marca(), time.perf_counter()
+        respuesta = cliente.get("/categorias", headers={"Authorization": f"Bearer {sesiones.emitir(USUARIO_ID)}"})
+        fases["primera"] = fase(t0, n)
+        assert respuesta.status_code == 200, respuesta.text
+    print(json.dumps(fases))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--hijo", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.hijo:
+        return _hijo()
+
+    from bench.comun import SessionLocal, reiniciar_base, sembrar_usuario
+
+    reiniciar_base()
+    db = SessionLocal()
+    sembrar_usuario(db, USUARIO_ID, 100)
+    db.close()
+
+    medidas, procesos = [], []
+    for _ in range(args.repeticiones):
+        t0 = time.perf_counter()
+        salida = subprocess.run([sys.executable, "-m", "bench.bench_arranque", "--hijo"],
+                                capture_output=True, text=True, check=True, env=os.environ)
+        procesos.append((time.perf_counter() - t0) * 1000)
+        medidas.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+
+    print(f"{'fase':>10} {'ms (mediana)':>13} {'conexiones':>11} {'SQL':>5} {'esquema':>8}")
+    for nombre in ("importar", "arranque", "primera"):
+        ms = statistics.median(m[nombre]["ms"] for m in medidas)
+        ultima = medidas[-1][nombre]
+        print(f"{nombre:>10} {ms:>13.1f} {ultima['conexiones']:>11} {ultima['sql']:>5} {ultima['esquema']:>8}")
+    print(f"{'proceso':>10} {statistics.median(procesos):>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
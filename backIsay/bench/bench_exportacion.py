@@ -0,0 +1,44 @@
+# Memoria pico y throughput de la exportación (exportacion.generar) según el
+# tamaño del historial: con el cursor del servidor el pico debe mantenerse
+# plano aunque crezca el número de filas.
+#
+#   python -m bench.bench_exportacion [--filas 10000 100000] [--formatos csv xlsx]
+import argparse
+import time
+import tracemalloc
+
+from bench.comun import SessionLocal, reiniciar_base, sembrar_usuario
+import exportacion
+
+USUARIO_ID = 1
+
+
+def medir_exportacion(formato):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    tamano = sum(len(trozo) for trozo in exportacion.generar(USUARIO_ID, formato))
+    segundos = time.perf_counter() - t0
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tamano, segundos, pico
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filas", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--formatos", nargs="+", default=["csv", "xlsx"])
+    args = parser.parse_args()
+
+    print(f"{'filas':>8} {'formato':>8} {'MB salida':>10} {'filas/s':>10} {'pico MB':>8}")
+    for n in args.filas:
+        reiniciar_base()
+        db = SessionLocal()
+        sembrar_usuario(db, USUARIO_ID, n)
+        db.close()
+        for formato in args.formatos:
+            tamano, segundos, pico = medir_exportacion(formato)
+            print(f"{n:>8} {formato:>8} {tamano / 1e6:>10.1f} {n / segundos:>10.0f} {pico / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
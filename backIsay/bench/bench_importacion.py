@@ -0,0 +1,78 @@
+# Throughput (filas/s) de POST /transacciones/bulk frente a un POST
+# /transacciones por fila, usando la app completa vía TestClient.
+#
+#   python -m bench.bench_importacion [--filas 20000] [--filas-individual 1000]
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+
+from bench.comun import SessionLocal, autorizacion, reiniciar_base, sembrar_usuario, TIPOS
+from main import app
+
+USUARIO_ID = 1
+
+
+def generar_filas(n, seed=1):
+    rnd = random.Random(seed)
+    for i in range(n):
+        yield {
+            "monto": round(rnd.uniform(5, 2500), 2),
+            "categoria_id": rnd.randint(1, 8),
+            "tipo": rnd.choice(TIPOS),
+            "descripcion": f"importada {i}",
+            "fecha": (date(2023, 1, 1) + timedelta(days=rnd.randrange(0, 730))).isoformat(),
+        }
+
+
+def cuerpo_ndjson(n, tamano_trozo=64 * 1024):
+    trozo = []
+    tam = 0
+    for fila in generar_filas(n):
+        linea = (json.dumps(fila) + "\n").encode()
+        trozo.append(linea)
+        tam += len(linea)
+        if tam >= tamano_trozo:
+            yield b"".join(trozo)
+            trozo, tam = [], 0
+    if trozo:
+        yield b"".join(trozo)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filas", type=int, default=20000)
+    parser.add_argument("--filas-individual", type=int, default=1000)
+    args = parser.parse_args()
+
+    cliente = TestClient(app, headers=autorizacion(USUARIO_ID))
+
+    reiniciar_base()
+    db = SessionLocal()
+    sembrar_usuario(db, USUARIO_ID, 0)
+    db.close()
+    t0 = time.perf_counter()
+    for fila in generar_filas(args.filas_individual):
+        cliente.post("/transacciones", json=fila).raise_for_status()
+    individual = args.filas_individual / (time.perf_counter() - t0)
+
+    reiniciar_base()
+    db = SessionLocal()
+    sembrar_usuario(db, USUARIO_ID, 0)
+    db.close()
+    t0 = time.perf_counter()
+    r = cliente.post("/transacciones/bulk", content=cuerpo_ndjson(args.filas),
+                     headers={"Content-Type": "application/x-ndjson"})
+    r.raise_for_status()
+    masivo = r.json()["insertadas"] / (time.perf_counter() - t0)
+
+    print(f"POST /transacciones      {individual:>10.0f} filas/s ({args.filas_individual} filas)")
+    print(f"POST /transacciones/bulk {masivo:>10.0f} filas/s ({args.filas} filas, errores: {r.json()['total_errores']})")
+    print(f"aceleración              {masivo / individual:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Listados con y sin LISTAS_RAPIDAS: tiempo por petición y comprobación de
+# que ambos caminos devuelven exactamente los mismos bytes.
+#
+#   python -m bench.bench_listas [--transacciones 20000] [--pagos 5000] [--repeticiones 20]
+import argparse
+from datetime import date, datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from bench.comun import SessionLocal, autorizacion, medir, reiniciar_base, sembrar_usuario
+from main import app
+from models import Notificacion, PagoFijo
+import serializacion
+
+USUARIO_ID = 1
+
+
+def sembrar(n_transacciones, n_pagos):
+    reiniciar_base()
+    db = SessionLocal()
+    sembrar_usuario(db, USUARIO_ID, n_transacciones)
+    db.bulk_insert_mappings(PagoFijo, [
+        {"descripcion": f"Pago {i}", "usuario_id": USUARIO_ID, "categoria_id": 1,
+         "monto": 99.5 + i, "fecha": date(2025, 1, 1) + timedelta(days=i % 365)}
+        for i in range(n_pagos)
+    ])
+    ahora = datetime(2025, 6, 1, 12, 30, 15, 250000)
+    db.bulk_insert_mappings(Notificacion, [
+        {"usuario_id": USUARIO_ID, "tipo": "correo", "asunto": f"Aviso {i}", "mensaje": "Pago próximo ✓",
+         "fecha_programada": ahora + timedelta(minutes=i), "fue_enviada": i % 2 == 0,
+         "estado": "enviada" if i % 2 == 0 else "pendiente", "fecha_envio": ahora if i % 2 == 0 else None}
+        for i in range(2000)
+    ])
+    db.commit()
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transacciones", type=int, default=20000)
+    parser.add_argument("--pagos", type=int, default=5000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    sembrar(args.transacciones, args.pagos)
+    cliente = TestClient(app, headers=autorizacion(USUARIO_ID))
+    rutas = [
+        ("/transacciones", {"limit": 500}),
+        (f"/usuarios/{USUARIO_ID}/pagos-fijos", {"limit": 500}),
+        ("/notificaciones", {"limit": 500}),
+    ]
+
+    print(f"{'ruta':32s} {'bytes':>9s} {'esquemas':>10s} {'rápido':>10s}  iguales  (mediana ms)")
+    for ruta, params in rutas:
+        resultados = {}
+        for rapido in (False, True):
+            serializacion.LISTAS_RAPIDAS = rapido
+            r = cliente.get(ruta, params=params)
+            r.raise_for_status()
+            mediana, _ = medir(lambda: cliente.get(ruta, params=params), args.repeticiones)
+            resultados[rapido] = (r.content, r.headers.get("x-next-cursor"), mediana)
+        (lento, cur_l, t_l), (rapido, cur_r, t_r) = resultados[False], resultados[True]
+        iguales = lento == rapido and cur_l == cur_r
+        print(f"{ruta:32s} {len(lento):9d} {t_l:10.2f} {t_r:10.2f}  {'sí' if iguales else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Prueba de carga: latencia de un endpoint no autenticado (/resumen) mientras
+# una ráfaga de logins satura el hasher.
+#
+#   python -m bench.bench_login [--logins-concurrentes 64] [--segundos 5] [--sin-pool] [--sin-limites]
+#
+# --sin-pool ejecuta bcrypt en el threadpool de Starlette, como hacían los
+# endpoints síncronos antes, para comparar. Los logins salen todos de la misma
+# IP y cuenta, así que los límites de tasa de limites.py cortan casi toda la
+# ráfaga con 429; --sin-limites los quita y deja solo la admisión (503 cuando
+# la cola de bcrypt está llena). Tras un 429/503 cada cliente espera lo que
+# indica Retry-After, como la app.
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("BCRYPT_ROUNDS", "10")
+
+import httpx  # noqa: E402
+from starlette.concurrency import run_in_threadpool  # noqa: E402
+
+from bench.comun import SessionLocal, autorizacion, percentil, reiniciar_base, sembrar_usuario  # noqa: E402
+from main import app  # noqa: E402
+from models import Usuario  # noqa: E402
+import limites  # noqa: E402
+import seguridad  # noqa: E402
+
+USUARIO_ID = 1
+PASSWORD = "secreto123"
+
+
+async def sondear(cliente, fin, latencias):
+    while time.perf_counter() < fin:
+        t0 = time.perf_counter()
+        r = await cliente.get("/resumen", headers=autorizacion(USUARIO_ID))
+        r.raise_for_status()
+        latencias.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(0.005)
+
+
+async def tormenta(cliente, fin, estados, latencias):
+    cuerpo = {"correo": f"bench{USUARIO_ID}@lanaapp.com", "contraseña_hash": PASSWORD}
+    while time.perf_counter() < fin:
+        t0 = time.perf_counter()
+        r = await cliente.post("/login", json=cuerpo)
+        if r.status_code not in (200, 429, 503):
+            r.raise_for_status()
+        estados[r.status_code] = estados.get(r.status_code, 0) + 1
+        if r.status_code == 200:
+            latencias.append((time.perf_counter() - t0) * 1000)
+        else:
+            await asyncio.sleep(min(float(r.headers["retry-after"]), max(0.0, fin - time.perf_counter())))
+
+
+async def fase(cliente, segundos, logins):
+    fin = time.perf_counter() + segundos
+    latencias, estados, de_login = [], {}, []
+    await asyncio.gather(sondear(cliente, fin, latencias),
+                         *(tormenta(cliente, fin, estados, de_login) for _ in range(logins)))
+    return latencias, {estado: n / segundos for estado, n in estados.items()}, de_login
+
+
+async def principal(args):
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        base, _, _ = await fase(cliente, args.segundos, 0)
+        carga, logins_s, de_login = await fase(cliente, args.segundos, args.logins_concurrentes)
+
+    print(f"{'fase':<22} {'p50 ms':>8} {'p99 ms':>8} {'logins/s':>9} {'login p99':>10} {'429/s':>7} {'503/s':>7}")
+    print(f"{'solo /resumen':<22} {percentil(base, .5):>8.2f} {percentil(base, .99):>8.2f} "
+          f"{'-':>9} {'-':>10} {'-':>7} {'-':>7}")
+    print(f"{'/resumen + logins':<22} {percentil(carga, .5):>8.2f} {percentil(carga, .99):>8.2f} "
+          f"{logins_s.get(200, 0):>9.1f} {percentil(de_login, .99):>10.1f} "
+          f"{logins_s.get(429, 0):>7.1f} {logins_s.get(503, 0):>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins-concurrentes", type=int, default=64)
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--sin-pool", action="store_true")
+    parser.add_argument("--sin-limites", action="store_true")
+    args = parser.parse_args()
+
+    if args.sin_limites:
+        limites.REGLAS["login"] = (None, None)
+
+    if args.sin_pool:
+        async def en_threadpool(fn, *a):
+            return await run_in_threadpool(fn, *a)
+        seguridad._ejecutar = en_threadpool
+
+    reiniciar_base()
+    db = SessionLocal()
+    sembrar_usuario(db, USUARIO_ID, 5000)
+    db.get(Usuario, USUARIO_ID).contraseña_hash = seguridad.pwd_context.hash(PASSWORD)
+    db.commit()
+    db.close()
+
+    try:
+        asyncio.run(principal(args))
+    finally:
+        seguridad.cerrar_pool()
+
+
+if __name__ == "__main__":
+    main()
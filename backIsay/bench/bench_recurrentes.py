@@ -0,0 +1,77 @@
+# Generación de transacciones de pagos fijos: tiempo, filas/s y memoria pico
+# de una corrida completa, y de una segunda corrida (que no debe crear nada).
+#
+#   python -m bench.bench_recurrentes [--usuarios 2000] [--pagos-por-usuario 5] [--meses 12] [--bloque 1000]
+import argparse
+import time
+import tracemalloc
+from datetime import date
+
+from sqlalchemy import func
+
+from bench.comun import SessionLocal, reiniciar_base, sembrar_usuario
+from models import Categoria, PagoFijo, Transaccion
+import recurrentes
+
+
+def sembrar_pagos(db, usuarios, pagos_por_usuario, inicio):
+    for u in range(1, usuarios + 1):
+        sembrar_usuario(db, u, 0, n_categorias=2)
+    categorias = dict(db.query(Categoria.usuario_id, func.min(Categoria.id)).group_by(Categoria.usuario_id))
+    filas = [
+        {
+            "descripcion": f"Pago {u}-{i}",
+            "usuario_id": u,
+            "categoria_id": categorias[u],
+            "monto": 100.0 + i,
+            "fecha": date(inicio.year, inicio.month, 1 + (u + i) % 28),
+        }
+        for u in range(1, usuarios + 1)
+        for i in range(pagos_por_usuario)
+    ]
+    db.bulk_insert_mappings(PagoFijo, filas)
+    db.commit()
+
+
+def corrida(hasta, bloque):
+    db = SessionLocal()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    pagos, transacciones = recurrentes.materializar(db, hasta, bloque)
+    segundos = time.perf_counter() - t0
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.close()
+    return pagos, transacciones, segundos, pico / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--usuarios", type=int, default=2000)
+    parser.add_argument("--pagos-por-usuario", type=int, default=5)
+    parser.add_argument("--meses", type=int, default=12, help="meses de atraso a ponerse al día")
+    parser.add_argument("--bloque", type=int, default=recurrentes.TAMANO_BLOQUE)
+    args = parser.parse_args()
+
+    hasta = date(2025, 12, 31)
+    inicio = date(2025 - (args.meses - 1) // 12, 12 - (args.meses - 1) % 12, 1)
+
+    reiniciar_base()
+    db = SessionLocal()
+    sembrar_pagos(db, args.usuarios, args.pagos_por_usuario, inicio)
+    db.close()
+
+    for nombre in ("primera corrida", "repetición"):
+        pagos, trans, seg, pico = corrida(hasta, args.bloque)
+        print(f"{nombre:16s} {pagos:8d} pagos  {trans:9d} transacciones  {seg:7.2f}s  "
+              f"{trans / seg if seg else 0:9.0f} filas/s  pico {pico:6.1f} MiB")
+
+    db = SessionLocal()
+    total = db.query(func.count(Transaccion.id)).scalar()
+    esperado = args.usuarios * args.pagos_por_usuario * args.meses
+    db.close()
+    print(f"transacciones en la base: {total} (esperadas {esperado})")
+
+
+if __name__ == "__main__":
+    main()
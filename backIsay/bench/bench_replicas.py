@@ -0,0 +1,153 @@
+# Lecturas de reporte por segundo según el número de réplicas (replicas.py).
+#
+# El primario y las réplicas son copias SQLite de la misma base sembrada. En
+# una máquina de pocos núcleos varias SQLite no se comportan como servidores
+# distintos, así que cada base se modela como uno: --ranuras sentencias a la
+# vez (un semáforo por engine) y --latencia-ms de servicio por sentencia. El
+# SQL se ejecuta de verdad y el reparto lo hace replicas.py como en la API.
+# Mientras tanto un hilo escribe transacciones en el primario (ocupa sus
+# ranuras) y --pegajosos de los usuarios acaban de escribir, así que sus
+# lecturas van al primario por la ventana de lectura. Con latencias bajas el
+# límite pasa a ser la CPU de la máquina que corre el benchmark.
+#
+#   python -m bench.bench_replicas [--replicas 0,1,2,4] [--lectores 32] [--segundos 3]
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from datetime import date
+
+USUARIOS = 8
+ESCRITOR = USUARIOS + 1
+
+
+def _modelar_servidores(ranuras, latencia):
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    semaforos, lock = {}, threading.Lock()
+
+    def semaforo(conn):
+        url = str(conn.engine.url)
+        with lock:
+            return semaforos.setdefault(url, threading.BoundedSemaphore(ranuras))
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _ocupar(conn, cursor, sql, parametros, contexto, varias):
+        semaforo(conn).acquire()
+        time.sleep(latencia)
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _liberar(conn, cursor, sql, parametros, contexto, varias):
+        semaforo(conn).release()
+
+    @event.listens_for(Engine, "handle_error")
+    def _liberar_error(contexto):
+        semaforo(contexto.connection).release()
+
+
+def _hijo(args):
+    _modelar_servidores(args.ranuras, args.latencia_ms / 1000)
+
+    import database
+    import replicas
+    import reportes
+    from models import Transaccion
+
+    for usuario_id in range(1, args.pegajosos + 1):
+        replicas.marcar_escritura(usuario_id)
+
+    fin = time.perf_counter() + args.segundos
+    lecturas, escrituras = [0] * args.lectores, [0]
+
+    def leer(i):
+        rnd = random.Random(i)
+        while time.perf_counter() < fin:
+            usuario_id = rnd.randint(1, USUARIOS)
+            db = replicas.sesion_lectura(usuario_id)
+            try:
+                reportes.resumen(db, usuario_id)
+            finally:
+                db.close()
+            lecturas[i] += 1
+
+    def escribir():
+        import resumen_mensual
+        while time.perf_counter() < fin:
+            db = database.SessionLocal()
+            try:
+                t = Transaccion(usuario_id=ESCRITOR, monto=10, categoria_id=1, tipo="egreso",
+                                descripcion="bench", fecha=date(2025, 7, 1))
+                db.add(t)
+                resumen_mensual.sumar(db, t)
+                db.commit()
+            finally:
+                db.close()
+            escrituras[0] += 1
+
+    hilos = [threading.Thread(target=leer, args=(i,)) for i in range(args.lectores)]
+    hilos.append(threading.Thread(target=escribir))
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    print(json.dumps({"lecturas": sum(lecturas) / duracion, "escrituras": escrituras[0] / duracion,
+                      "primario": replicas.estadisticas["primario"], "replica": replicas.estadisticas["replica"]}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replicas", default="0,1,2,4")
+    parser.add_argument("--lectores", type=int, default=32)
+    parser.add_argument("--segundos", type=float, default=3)
+    parser.add_argument("--ranuras", type=int, default=4, help="sentencias simultáneas por servidor")
+    parser.add_argument("--latencia-ms", type=float, default=40, help="servicio por sentencia")
+    parser.add_argument("--pegajosos", type=int, default=1, help="usuarios dentro de la ventana de lectura")
+    parser.add_argument("--transacciones", type=int, default=2000, help="por usuario")
+    parser.add_argument("--hijo", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.hijo:
+        return _hijo(args)
+
+    from bench.comun import SessionLocal, reiniciar_base, sembrar_usuario
+    import resumen_mensual
+
+    reiniciar_base()
+    db = SessionLocal()
+    for usuario_id in range(1, ESCRITOR + 1):
+        sembrar_usuario(db, usuario_id, args.transacciones if usuario_id != ESCRITOR else 1)
+    resumen_mensual.reconstruir(db)
+    db.commit()
+    db.close()
+
+    primario = os.environ["DATABASE_URL"].removeprefix("sqlite:///")
+    copias = []
+    for i in range(max(int(n) for n in args.replicas.split(","))):
+        copias.append(f"{primario}.replica{i}")
+        shutil.copyfile(primario, copias[-1])
+
+    print(f"{'réplicas':>9} {'lecturas/s':>11} {'x':>6} {'escrituras/s':>13} {'primario':>9} {'réplica':>8}")
+    base = None
+    for n in (int(n) for n in args.replicas.split(",")):
+        entorno = dict(os.environ, DB_REPLICAS=",".join("sqlite:///" + c for c in copias[:n]),
+                       DB_LECTURA_VENTANA="3600")
+        hijo = [sys.executable, "-m", "bench.bench_replicas", "--hijo"] + sys.argv[1:]
+        salida = subprocess.run(hijo, capture_output=True, text=True, check=True, env=entorno)
+        r = json.loads(salida.stdout.strip().splitlines()[-1])
+        base = base or r["lecturas"]
+        print(f"{n:>9} {r['lecturas']:>11.1f} {r['lecturas'] / base:>6.2f} {r['escrituras']:>13.1f} "
+              f"{r['primario']:>9} {r['replica']:>8}")
+
+    for copia in copias:
+        os.remove(copia)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Compara las consultas de reportes (leídas de resumen_mensual) contra la
+# versión anterior que hidrataba cada Transaccion y sumaba en Python.
+#
+#   python -m bench.bench_resumen [--tamanos 1000 10000 100000]
+import argparse
+from collections import defaultdict
+from decimal import Decimal
+
+from bench.comun import SessionLocal, reiniciar_base, sembrar_usuario, medir
+from models import Transaccion
+import reportes
+
+USUARIO_ID = 1
+
+
+def resumen_hidratando(db):
+    totales = defaultdict(Decimal)
+    for t in db.query(Transaccion).filter(Transaccion.usuario_id == USUARIO_ID).all():
+        totales[t.tipo] += t.monto
+    return totales
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'filas':>8} {'hidratando':>12} {'resumen':>10} {'categorias':>11} {'tendencias':>11}  (mediana ms)")
+    for n in args.tamanos:
+        reiniciar_base()
+        db = SessionLocal()
+        sembrar_usuario(db, USUARIO_ID, n)
+        # Un segundo usuario con el mismo volumen para que el filtro importe
+        sembrar_usuario(db, USUARIO_ID + 1, n)
+
+        antes, _ = medir(lambda: resumen_hidratando(db), args.repeticiones)
+        resumen, _ = medir(lambda: reportes.resumen(db, USUARIO_ID), args.repeticiones)
+        categorias, _ = medir(lambda: reportes.por_categoria(db, USUARIO_ID, "egreso"), args.repeticiones)
+        tendencias, _ = medir(lambda: reportes.tendencias(db, USUARIO_ID, "egreso"), args.repeticiones)
+        print(f"{n:>8} {antes:>12.2f} {resumen:>10.2f} {categorias:>11.2f} {tendencias:>11.2f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# Prueba de carga con flujos de cliente como los de la app móvil.
+#
+#   python -m bench.carga [--sembrar pequena|mediana|grande] [--clientes 20] [--segundos 30]
+#                         [--url http://localhost:8000] [--guardar resultados.json] [--base anterior.json]
+#
+# Cada cliente virtual inicia sesión con un usuario sembrado y recorre las
+# pantallas: Dashboard, Transacciones (primera página y a veces la segunda),
+# alta y edición de una transacción, presupuestos y categorías; cada
+# SESION_PANTALLAS vueltas vuelve a iniciar sesión.
+#
+# Sin --url la app corre en el mismo proceso (httpx.ASGITransport) sobre la
+# base de DATABASE_URL; con --url se prueba un servidor ya levantado que use
+# una base sembrada con `python -m bench.generador`.
+#
+# El reporte trae, por endpoint, peticiones/s, errores y p50/p95/p99 en ms.
+# Con --guardar se escribe en JSON; con --base se compara contra otro JSON.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("BCRYPT_ROUNDS", "10")
+
+import httpx  # noqa: E402
+from sqlalchemy import func  # noqa: E402
+
+from bench.comun import SessionLocal, percentil  # noqa: E402
+from bench import generador  # noqa: E402
+from models import Usuario  # noqa: E402
+
+SESION_PANTALLAS = 10
+
+
+class Registro:
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+
+    async def medir(self, nombre, peticion):
+        t0 = time.perf_counter()
+        try:
+            r = await peticion
+            ok = r.status_code < 400
+        except httpx.HTTPError:
+            r, ok = None, False
+        self.latencias[nombre].append((time.perf_counter() - t0) * 1000)
+        if not ok:
+            self.errores[nombre] += 1
+        return r if ok else None
+
+
+async def cliente_virtual(http, registro, usuarios, fin, pausa, rnd):
+    while time.perf_counter() < fin:
+        uid = rnd.randint(1, usuarios)
+        r = await registro.medir("POST /login", http.post("/login", json={
+            "correo": f"bench{uid}@lanaapp.com", "contraseña_hash": generador.CONTRASENA}))
+        if r is None:
+            continue
+        # Cada petición de la sesión lleva el token de acceso del login
+        auth = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        for _ in range(SESION_PANTALLAS):
+            if time.perf_counter() >= fin:
+                return
+            await registro.medir("GET /dashboard", http.get("/dashboard", headers=auth))
+
+            r = await registro.medir("GET /transacciones", http.get(
+                "/transacciones", params={"limit": 50}, headers=auth))
+            cursor = r.headers.get("x-next-cursor") if r is not None else None
+            if cursor and rnd.random() < 0.3:
+                await registro.medir("GET /transacciones (página 2)", http.get(
+                    "/transacciones", params={"limit": 50, "cursor": cursor}, headers=auth))
+
+            if rnd.random() < 0.3:
+                nueva = {"monto": round(rnd.uniform(10, 900), 2), "categoria_id": rnd.randint(4, 10),
+                         "tipo": "egreso", "descripcion": "carga",
+                         "fecha": (date.today() - timedelta(days=rnd.randint(0, 30))).isoformat()}
+                r = await registro.medir("POST /transacciones", http.post("/transacciones", json=nueva, headers=auth))
+                if r is not None:
+                    nueva["monto"] = round(nueva["monto"] * 1.1, 2)
+                    await registro.medir("PUT /transacciones/{id}", http.put(
+                        f"/transacciones/{r.json()['id']}", json=nueva, headers=auth))
+
+            await registro.medir("GET /presupuestos/estado", http.get(
+                "/presupuestos/estado", headers=auth))
+            await registro.medir("GET /categorias", http.get("/categorias", headers=auth))
+            if pausa:
+                await asyncio.sleep(rnd.expovariate(1 / pausa))
+
+
+def resumir(registro, segundos):
+    endpoints = {}
+    for nombre, lat in sorted(registro.latencias.items()):
+        endpoints[nombre] = {
+            "peticiones": len(lat),
+            "errores": registro.errores[nombre],
+            "rps": len(lat) / segundos,
+            "p50_ms": percentil(lat, .50),
+            "p95_ms": percentil(lat, .95),
+            "p99_ms": percentil(lat, .99),
+            "media_ms": sum(lat) / len(lat),
+        }
+    total = sum(e["peticiones"] for e in endpoints.values())
+    todas = [x for lat in registro.latencias.values() for x in lat]
+    return endpoints, {
+        "peticiones": total,
+        "errores": sum(registro.errores.values()),
+        "rps": total / segundos,
+        "p50_ms": percentil(todas, .50),
+        "p95_ms": percentil(todas, .95),
+        "p99_ms": percentil(todas, .99),
+    }
+
+
+def imprimir(resultado, base=None):
+    print(f"{'endpoint':32s} {'req/s':>8s} {'errores':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s}"
+          + ("   Δp95 vs base" if base else ""))
+    filas = list(resultado["endpoints"].items()) + [("TOTAL", resultado["total"])]
+    for nombre, e in filas:
+        linea = (f"{nombre:32s} {e['rps']:8.1f} {e['errores']:8d} {e['p50_ms']:8.2f} "
+                 f"{e['p95_ms']:8.2f} {e['p99_ms']:8.2f}")
+        anterior = (base["endpoints"].get(nombre) if nombre != "TOTAL" else base["total"]) if base else None
+        if anterior and anterior["p95_ms"]:
+            linea += f"   {(e['p95_ms'] / anterior['p95_ms'] - 1) * 100:+7.1f}%"
+        print(linea)
+
+
+async def correr(args, usuarios):
+    registro = Registro()
+    rnd = random.Random(args.seed)
+    fin = time.perf_counter() + args.segundos
+    limites = httpx.Limits(max_connections=args.clientes)
+    if args.url:
+        http = httpx.AsyncClient(base_url=args.url, limits=limites, timeout=30)
+        contexto = None
+    else:
+        from main import app
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30)
+        contexto = app.router.lifespan_context(app)
+        await contexto.__aenter__()
+    try:
+        async with http:
+            await asyncio.gather(*(
+                cliente_virtual(http, registro, usuarios, fin, args.pausa, random.Random(rnd.random()))
+                for _ in range(args.clientes)
+            ))
+    finally:
+        if contexto is not None:
+            await contexto.__aexit__(None, None, None)
+    return registro
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga con flujos de la app móvil")
+    parser.add_argument("--sembrar", choices=generador.ESCALAS, default=None,
+                        help="reinicia y siembra la base antes de la prueba")
+    parser.add_argument("--clientes", type=int, default=20, help="clientes virtuales concurrentes")
+    parser.add_argument("--segundos", type=float, default=30)
+    parser.add_argument("--pausa", type=float, default=0.0, help="segundos medios entre pantallas")
+    parser.add_argument("--url", default=None, help="servidor a probar (por defecto, la app en proceso)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--guardar", default=None, help="archivo JSON de resultados")
+    parser.add_argument("--base", default=None, help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args()
+
+    if args.sembrar:
+        print("sembrando:", generador.sembrar(generador.ESCALAS[args.sembrar], seed=args.seed))
+    db = SessionLocal()
+    usuarios = db.query(func.count(Usuario.id)).scalar()
+    db.close()
+    if not usuarios:
+        parser.error("la base está vacía; use --sembrar o python -m bench.generador")
+
+    registro = asyncio.run(correr(args, usuarios))
+    endpoints, total = resumir(registro, args.segundos)
+    resultado = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "configuracion": {
+            "clientes": args.clientes, "segundos": args.segundos, "pausa": args.pausa,
+            "url": args.url, "base_de_datos": os.environ.get("DATABASE_URL", "").split("@")[-1],
+            "usuarios": usuarios, "escala": args.sembrar, "seed": args.seed,
+            "python": platform.python_version(), "cpus": os.cpu_count(),
+        },
+        "endpoints": endpoints,
+        "total": total,
+    }
+
+    base = None
+    if args.base:
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+    imprimir(resultado, base)
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"resultados guardados en {args.guardar}")
+
+
+if __name__ == "__main__":
+    main()
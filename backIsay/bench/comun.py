@@ -0,0 +1,75 @@
+# Utilidades compartidas por los benchmarks.
+# Se ejecutan desde backIsay/, p. ej.: python -m bench.bench_resumen
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+# La base se elige antes de importar `database` (que lee DATABASE_URL al importarse)
+os.environ.setdefault(
+    "DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "lanaapp_bench.db")
+)
+os.environ.setdefault("JWT_DESARROLLO", "1")
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from models import Usuario, Categoria, Transaccion  # noqa: E402
+import resumen_mensual  # noqa: E402
+import sesiones  # noqa: E402
+
+TIPOS = ["ingreso", "egreso", "ahorro"]
+
+
+def reiniciar_base():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def sembrar_usuario(db, usuario_id, n_transacciones, n_categorias=8, inicio=date(2020, 1, 1), seed=0):
+    rnd = random.Random(seed + usuario_id)
+    db.add(Usuario(id=usuario_id, nombre_usuario=f"bench{usuario_id}",
+                   correo=f"bench{usuario_id}@lanaapp.com", contraseña_hash="x"))
+    db.flush()
+    categorias = []
+    for i in range(n_categorias):
+        c = Categoria(nombre=f"Cat {usuario_id}-{i}", tipo="ingreso" if i % 4 == 0 else "egreso",
+                      usuario_id=usuario_id)
+        db.add(c)
+        categorias.append(c)
+    db.flush()
+    filas = [
+        {
+            "usuario_id": usuario_id,
+            "monto": round(rnd.uniform(5, 2500), 2),
+            "categoria_id": rnd.choice(categorias).id,
+            "tipo": rnd.choice(TIPOS),
+            "descripcion": "bench",
+            "fecha": inicio + timedelta(days=rnd.randrange(0, 365 * 5)),
+        }
+        for _ in range(n_transacciones)
+    ]
+    if filas:
+        db.bulk_insert_mappings(Transaccion, filas)
+    resumen_mensual.reconstruir(db, usuario_id)
+    db.commit()
+
+
+def autorizacion(usuario_id):
+    """Cabeceras con un token de acceso para `usuario_id`, sin pasar por /login."""
+    return {"Authorization": f"Bearer {sesiones.emitir(usuario_id)}"}
+
+
+def medir(fn, repeticiones=20):
+    """Devuelve (mediana, p95) en milisegundos."""
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2], tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else float("nan")
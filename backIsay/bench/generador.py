@@ -0,0 +1,168 @@
+# Generador de datos sintéticos para pruebas de carga.
+#
+#   python -m bench.generador --escala pequena|mediana|grande [--usuarios N] [--seed 0]
+#   python -m bench.generador --transacciones 250000
+#
+# Llena usuarios, categorias, transacciones, presupuestos, pagos_fijos,
+# notificaciones y resumen_mensual. Las transacciones se reparten entre
+# usuarios con una distribución Zipf (pocos usuarios con muchísimos
+# movimientos, la mayoría con pocos), como en producción. Los usuarios son
+# bench{id}@lanaapp.com con la contraseña CONTRASENA.
+#
+# La base es la de DATABASE_URL (por defecto un SQLite temporal, ver
+# bench/comun.py); para MySQL local: DATABASE_URL=mysql+pymysql://root@localhost/lanaapp_bench
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+from bench.comun import SessionLocal, reiniciar_base
+from models import Categoria, Notificacion, PagoFijo, Presupuesto, Transaccion, Usuario
+import resumen_mensual
+import seguridad
+
+ESCALAS = {"pequena": 1_000, "mediana": 100_000, "grande": 10_000_000}
+CONTRASENA = "bench123"
+TAMANO_LOTE = 20_000
+ZIPF_S = 1.1
+
+PREDETERMINADAS = [
+    ("Salario", "ingreso"), ("Ventas", "ingreso"), ("Inversiones", "ingreso"),
+    ("Comida", "egreso"), ("Transporte", "egreso"), ("Renta", "egreso"), ("Servicios", "egreso"),
+    ("Salud", "egreso"), ("Entretenimiento", "egreso"), ("Educación", "egreso"),
+]
+
+
+def repartir(total, usuarios, rnd):
+    """Transacciones por usuario con sesgo Zipf; suma exactamente `total`."""
+    pesos = [1 / (i + 1) ** ZIPF_S for i in range(usuarios)]
+    rnd.shuffle(pesos)
+    suma = sum(pesos)
+    cuentas = [int(total * p / suma) for p in pesos]
+    for i in rnd.sample(range(usuarios), total - sum(cuentas)):
+        cuentas[i] += 1
+    return cuentas
+
+
+class Lotes:
+    """Acumula filas por tabla y las inserta en bloques de TAMANO_LOTE."""
+
+    def __init__(self, db):
+        self.db = db
+        self.pendientes = {}
+        self.totales = {}
+
+    def agregar(self, modelo, fila):
+        filas = self.pendientes.setdefault(modelo, [])
+        filas.append(fila)
+        if len(filas) >= TAMANO_LOTE:
+            self.volcar(modelo)
+
+    def volcar(self, modelo=None):
+        for m in ([modelo] if modelo else list(self.pendientes)):
+            filas = self.pendientes.pop(m, [])
+            if filas:
+                self.db.execute(insert(m), filas)
+                self.totales[m.__tablename__] = self.totales.get(m.__tablename__, 0) + len(filas)
+        self.db.commit()
+
+
+def sembrar(transacciones, usuarios=None, seed=0, hoy=None):
+    """Reinicia la base y la llena; devuelve el número de filas por tabla."""
+    rnd = random.Random(seed)
+    hoy = hoy or date.today()
+    usuarios = usuarios or max(10, transacciones // 500)
+    cuentas = repartir(transacciones, usuarios, rnd)
+    hash_comun = seguridad.pwd_context.hash(CONTRASENA)
+
+    reiniciar_base()
+    db = SessionLocal()
+    lotes = Lotes(db)
+    try:
+        for uid in range(1, usuarios + 1):
+            lotes.agregar(Usuario, {"id": uid, "nombre_usuario": f"bench{uid}",
+                                    "correo": f"bench{uid}@lanaapp.com", "contraseña_hash": hash_comun,
+                                    "telefono": f"55{uid:08d}" if uid % 3 else None})
+        lotes.volcar()
+
+        # Predeterminadas (ids 1..10) y 0-3 propias por usuario
+        categorias = []
+        for nombre, tipo in PREDETERMINADAS:
+            categorias.append({"id": len(categorias) + 1, "nombre": nombre, "tipo": tipo,
+                               "usuario_id": None, "es_predeterminada": True})
+        propias = {}
+        for uid in range(1, usuarios + 1):
+            for j in range(rnd.randint(0, 3)):
+                cat = {"id": len(categorias) + 1, "nombre": f"Propia {j + 1}",
+                       "tipo": rnd.choice(("ingreso", "egreso")), "usuario_id": uid, "es_predeterminada": False}
+                categorias.append(cat)
+                propias.setdefault(uid, []).append(cat)
+        for cat in categorias:
+            lotes.agregar(Categoria, cat)
+        lotes.volcar()
+        predeterminadas = categorias[:len(PREDETERMINADAS)]
+
+        dias = 730
+        for uid, n in zip(range(1, usuarios + 1), cuentas):
+            disponibles = predeterminadas + propias.get(uid, [])
+            egresos = [c for c in disponibles if c["tipo"] == "egreso"]
+            for _ in range(n):
+                cat = rnd.choice(disponibles)
+                tipo = cat["tipo"] if cat["tipo"] == "ingreso" or rnd.random() > 0.15 else "ahorro"
+                lotes.agregar(Transaccion, {
+                    "usuario_id": uid, "categoria_id": cat["id"], "tipo": tipo,
+                    "monto": round(rnd.lognormvariate(5.5, 1.0), 2),
+                    "descripcion": f"Movimiento {rnd.randrange(10_000)}",
+                    "fecha": hoy - timedelta(days=int(rnd.triangular(0, dias, 0))),
+                })
+
+            # Presupuestos de los últimos tres meses
+            for atras in range(3):
+                ano, mes = divmod(hoy.year * 12 + hoy.month - 1 - atras, 12)
+                for cat in rnd.sample(egresos, min(len(egresos), 4)):
+                    lotes.agregar(Presupuesto, {"usuario_id": uid, "categoria_id": cat["id"],
+                                                "monto": rnd.randrange(500, 5000), "ano": ano, "mes": mes + 1})
+
+            for j in range(rnd.randint(0, 4)):
+                dia = rnd.randint(1, 28)
+                lotes.agregar(PagoFijo, {"usuario_id": uid, "categoria_id": rnd.choice(egresos)["id"],
+                                         "descripcion": f"Suscripción {j + 1}", "monto": rnd.randrange(50, 1500),
+                                         "fecha": date(hoy.year, hoy.month, dia),
+                                         "proximo_cobro": date(hoy.year, hoy.month, dia)})
+
+            for j in range(rnd.randint(0, 5)):
+                enviada = rnd.random() < 0.7
+                programada = datetime.combine(hoy, datetime.min.time()) - timedelta(days=rnd.randint(0, 60))
+                lotes.agregar(Notificacion, {"usuario_id": uid, "tipo": rnd.choice(("correo", "sms")),
+                                             "asunto": "Recordatorio de pago", "mensaje": f"Aviso {j + 1}",
+                                             "fecha_programada": programada, "fue_enviada": enviada,
+                                             "estado": "enviada" if enviada else "pendiente",
+                                             "fecha_envio": programada if enviada else None})
+        lotes.volcar()
+
+        resumen_mensual.reconstruir(db)
+        db.commit()
+    finally:
+        db.close()
+    return dict(lotes.totales, usuarios=usuarios)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Llena la base de benchmarks con datos sintéticos")
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument("--escala", choices=ESCALAS, default="pequena")
+    grupo.add_argument("--transacciones", type=int)
+    parser.add_argument("--usuarios", type=int, default=None, help="por defecto, transacciones / 500")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    totales = sembrar(args.transacciones or ESCALAS[args.escala], args.usuarios, args.seed)
+    print(", ".join(f"{tabla}: {n}" for tabla, n in totales.items()))
+    print(f"listo en {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# Caché de respuestas por usuario para los endpoints del dashboard.
+#
+# Cada entrada depende de uno o más "grupos" de datos del usuario
+# (transacciones, presupuestos, pagos_fijos, pronosticos). La clave incluye:
+#
+#   - la versión de sync del usuario guardada en la base (versiones.py), que
+#     sube con cualquier escritura en transacciones, presupuestos o
+#     pagos_fijos, venga del API o de un cron (recurrentes.py). Como vive en la
+#     base la ven todos los procesos: un worker no sirve datos viejos aunque la
+#     escritura la haya hecho otro proceso con el backend en memoria;
+#   - para "pronosticos", la última fecha_calculo y el número de filas del
+#     usuario en la tabla pronosticos, que reescribe el cron de pronosticos.py;
+#   - la versión del grupo en el backend, que sube `invalidar(usuario_id,
+#     grupo)`. Es solo un atajo dentro del proceso (o entre procesos con
+#     Redis); la corrección la dan las dos anteriores.
+#
+# Leer esas marcas cuesta una consulta por llave primaria por petición, mucho
+# menos que recalcular el reporte. Tras una escritura las entradas viejas
+# dejan de usarse y salen por LRU/TTL.
+#
+# Configuración por entorno:
+#   CACHE_BACKEND  memoria (por defecto) | redis
+#   CACHE_URL      URL de Redis, p. ej. redis://localhost:6379/0
+#   CACHE_TTL      segundos de vida de cada respuesta (por defecto 300)
+#   CACHE_MAX      entradas máximas en el backend en memoria (por defecto 10000)
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, select
+
+import versiones
+from models import Pronostico
+
+CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
+CACHE_MAX = int(os.getenv("CACHE_MAX", "10000"))
+
+estadisticas = {"aciertos": 0, "fallos": 0, "expulsiones": 0, "invalidaciones": 0, "no_modificado": 0}
+
+
+class BackendMemoria:
+    """LRU con TTL en el proceso; cada worker de uvicorn tiene el suyo.
+
+    Las versiones de grupo viven en el mismo LRU (prefijo "v:") para que no
+    crezcan sin límite; si una se expulsa vuelve a 0, lo que no sirve datos
+    viejos porque la clave también lleva las marcas de la base.
+    """
+
+    def __init__(self, maximo=CACHE_MAX):
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                estadisticas["expulsiones"] += 1
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor, ttl):
+        with self._lock:
+            self._poner(clave, valor, ttl)
+
+    def _poner(self, clave, valor, ttl):
+        self._datos[clave] = (valor, time.monotonic() + ttl)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.maximo:
+            self._datos.popitem(last=False)
+            estadisticas["expulsiones"] += 1
+
+    def version(self, clave):
+        return self.get("v:" + clave) or 0
+
+    def incrementar(self, clave):
+        with self._lock:
+            entrada = self._datos.get("v:" + clave)
+            vigente = entrada is not None and entrada[1] >= time.monotonic()
+            self._poner("v:" + clave, entrada[0] + 1 if vigente else 1, CACHE_TTL)
+
+    def tamano(self):
+        return len(self._datos)
+
+
+class BackendRedis:
+    """Compartido entre workers; requiere el paquete `redis`."""
+
+    def __init__(self, url):
+        import redis
+        self._r = redis.Redis.from_url(url)
+
+    def get(self, clave):
+        valor = self._r.get("lana:c:" + clave)
+        return json.loads(valor) if valor is not None else None
+
+    def set(self, clave, valor, ttl):
+        self._r.set("lana:c:" + clave, json.dumps(valor), ex=ttl)
+
+    def version(self, clave):
+        return int(self._r.get("lana:v:" + clave) or 0)
+
+    def incrementar(self, clave):
+        self._r.incr("lana:v:" + clave)
+
+    def tamano(self):
+        return None
+
+
+def _crear_backend():
+    if os.getenv("CACHE_BACKEND", "memoria") == "redis":
+        return BackendRedis(os.getenv("CACHE_URL", "redis://localhost:6379/0"))
+    return BackendMemoria()
+
+
+backend = _crear_backend()
+
+
+def invalidar(usuario_id, grupo):
+    backend.incrementar(f"{usuario_id}:{grupo}")
+    estadisticas["invalidaciones"] += 1
+
+
+def marcas(db, usuario_id, grupos):
+    """Versiones guardadas en la base de los datos de los que depende la entrada."""
+    resultado = [versiones.leer(db, usuario_id)[0]]
+    if "pronosticos" in grupos:
+        ultima, filas = db.execute(select(func.max(Pronostico.fecha_calculo), func.count())
+                                   .where(Pronostico.usuario_id == usuario_id)).one()
+        resultado += [ultima or "", filas]
+    return resultado
+
+
+def _clave(db, endpoint, usuario_id, params, grupos):
+    base = ",".join(str(m) for m in marcas(db, usuario_id, grupos))
+    locales = ",".join(str(backend.version(f"{usuario_id}:{g}")) for g in grupos)
+    params = "&".join(f"{k}={v}" for k, v in sorted(params.items()) if v is not None)
+    return f"{endpoint}:{usuario_id}:{base}:{locales}:{params}"
+
+
+def calcular_etag(cuerpo):
+    return '"' + hashlib.blake2b(cuerpo.encode(), digest_size=12).hexdigest() + '"'
+
+
+def coincide(if_none_match, etag):
+    """If-None-Match (RFC 9110): "*" o alguna etiqueta igual en comparación débil (sin W/)."""
+    etiquetas = [e.strip() for e in (if_none_match or "").split(",")]
+    return "*" in etiquetas or etag.removeprefix("W/") in (e.removeprefix("W/") for e in etiquetas)
+
+
+def con_etag(request: Request, etag, cuerpo):
+    """Respuesta JSON con ETag; 304 sin cuerpo si el cliente ya tiene esa versión."""
+    cabeceras = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if coincide(request.headers.get("if-none-match"), etag):
+        estadisticas["no_modificado"] += 1
+        return Response(status_code=304, headers=cabeceras)
+    return Response(content=cuerpo, media_type="application/json", headers=cabeceras)
+
+
+def respuesta(request: Request, db, endpoint, usuario_id, params, grupos, calcular):
+    """Devuelve la respuesta cacheada (o la calcula) con ETag; 304 si el cliente ya la tiene."""
+    clave = _clave(db, endpoint, usuario_id, params, grupos)
+    entrada = backend.get(clave)
+    if entrada is None:
+        estadisticas["fallos"] += 1
+        cuerpo = json.dumps(jsonable_encoder(calcular()), separators=(",", ":"))
+        entrada = [calcular_etag(cuerpo), cuerpo]
+        backend.set(clave, entrada, CACHE_TTL)
+    else:
+        estadisticas["aciertos"] += 1
+
+    etag, cuerpo = entrada
+    return con_etag(request, etag, cuerpo)
+
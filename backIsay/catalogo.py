@@ -0,0 +1,119 @@
+# Índice en memoria de la tabla categorias.
+#
+# Las categorías casi no cambian y las predeterminadas (es_predeterminada)
+# son las mismas para todos, así que se cargan completas al arrancar y se
+# sirven desde aquí: /categorias, la resolución categoria_id -> nombre de los
+# reportes y la validación de categoria_id en las escrituras (`permitida`; en
+# MySQL transacciones no tiene llave foránea) no vuelven a tocar la base.
+#
+# El índice se recarga cuando:
+#   - una escritura en la misma instancia llama a `invalidar()`, o
+#   - al consultarlo, si pasaron CATEGORIAS_REVISION segundos desde la última
+#     revisión y la huella (COUNT, MAX(id), MAX(fecha_actualizacion)) de la
+#     tabla cambió; así se enteran los demás workers y los cambios hechos por
+#     scripts o con SQL: altas, bajas y renombres (en MySQL la columna se
+#     actualiza sola, ON UPDATE CURRENT_TIMESTAMP(6)).
+# La API no escribe categorías; si llega a hacerlo, debe llamar a
+# `invalidar()` después del commit.
+#
+# Configuración por entorno:
+#   CATEGORIAS_REVISION   segundos entre revisiones de la huella (por defecto 60)
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import func
+
+import cache
+from models import Categoria
+
+CATEGORIAS_REVISION = int(os.getenv("CATEGORIAS_REVISION", "60"))
+
+# Respuestas de /categorias ya serializadas que se guardan por usuario
+MAX_RESPUESTAS = 10000
+
+COLUMNAS = ("id", "nombre", "tipo", "usuario_id", "es_predeterminada")
+HUELLA = (func.count(Categoria.id), func.max(Categoria.id), func.max(Categoria.fecha_actualizacion))
+
+
+class IndiceCategorias:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nombres = {}
+        self._duenos = {}
+        self._por_usuario = {}
+        self._predeterminadas = []
+        self._etags = {}
+        self._huella = None
+        self._revisado = None
+        self.recargas = 0
+
+    def cargar(self, db):
+        # La huella antes que las filas: un cambio entre ambas consultas provoca otra recarga, no se pierde
+        huella = tuple(db.query(*HUELLA).one())
+        filas = db.query(*(getattr(Categoria, c) for c in COLUMNAS)).order_by(Categoria.id).all()
+        nombres, duenos, por_usuario, predeterminadas = {}, {}, {}, []
+        for fila in filas:
+            cat = dict(zip(COLUMNAS, fila))
+            nombres[cat["id"]] = cat["nombre"]
+            if cat["es_predeterminada"] or cat["usuario_id"] is None:
+                predeterminadas.append(cat)
+                duenos[cat["id"]] = None
+            else:
+                por_usuario.setdefault(cat["usuario_id"], []).append(cat)
+                duenos[cat["id"]] = cat["usuario_id"]
+        # Se reemplazan las referencias de una vez; los lectores nunca ven un índice a medias
+        with self._lock:
+            self._nombres, self._duenos = nombres, duenos
+            self._por_usuario, self._predeterminadas = por_usuario, predeterminadas
+            self._etags = {}
+            self._huella = huella
+            self._revisado = time.monotonic()
+            self.recargas += 1
+
+    def invalidar(self):
+        with self._lock:
+            self._revisado = None
+
+    def revisar(self, db):
+        """Carga o recarga el índice si hace falta; barato en el caso común."""
+        revisado = self._revisado
+        if revisado is not None and time.monotonic() - revisado < CATEGORIAS_REVISION:
+            return
+        if revisado is not None and self._huella is not None:
+            if tuple(db.query(*HUELLA).one()) == self._huella:
+                self._revisado = time.monotonic()
+                return
+        self.cargar(db)
+
+    def nombres(self, db):
+        """Diccionario categoria_id -> nombre (no modificarlo)."""
+        self.revisar(db)
+        return self._nombres
+
+    def permitida(self, db, usuario_id, categoria_id):
+        """¿Existe la categoría y es predeterminada o del usuario?"""
+        self.revisar(db)
+        if categoria_id not in self._duenos:
+            # Puede ser más nueva que la última revisión: se compara la huella ya, no en CATEGORIAS_REVISION
+            self.invalidar()
+            self.revisar(db)
+        duenos = self._duenos
+        return categoria_id in duenos and duenos[categoria_id] in (None, usuario_id)
+
+    def de_usuario(self, db, usuario_id):
+        """Cuerpo JSON y ETag de las categorías predeterminadas más las del usuario."""
+        self.revisar(db)
+        etags = self._etags
+        entrada = etags.get(usuario_id)
+        if entrada is None:
+            if len(etags) >= MAX_RESPUESTAS:
+                etags.clear()
+            categorias = self._predeterminadas + self._por_usuario.get(usuario_id, [])
+            cuerpo = json.dumps(categorias, separators=(",", ":"))
+            entrada = etags[usuario_id] = (cache.calcular_etag(cuerpo), cuerpo)
+        return entrada
+
+
+indice = IndiceCategorias()
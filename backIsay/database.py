@@ -1,31 +1,276 @@
+# Conexión a la base de datos.
+#
+# Los engines se crean la primera vez que se usan (`obtener_engine`), no al
+# importar este módulo: un script o una prueba que no toca la base no carga
+# el driver ni abre conexiones. El esquema tampoco se crea aquí: lo llevan
+# las migraciones (migraciones/, `alembic upgrade head` antes de desplegar),
+# y main.py abre las primeras conexiones del pool en el arranque (`calentar`).
+# Las escrituras van siempre al primario; las réplicas de DB_REPLICAS solo
+# atienden las rutas de lectura que usan replicas.get_db_lectura.
+#
+# Configuración por entorno:
+#   DATABASE_URL         URL completa (p. ej. SQLite para benchmarks); si no se
+#                        define se arma con DB_USUARIO, DB_CLAVE, DB_HOST,
+#                        DB_PUERTO y DB_NOMBRE (MySQL, por defecto root@localhost:3306/lanaapp)
+#   ASYNC_DATABASE_URL   URL del engine asíncrono (por defecto derivada de la anterior)
+#   DB_ASYNC             1 para que las rutas usen AsyncSession (por defecto 0)
+#                        (drivers aiomysql para MySQL y aiosqlite para SQLite)
+#   DB_REPLICAS          URLs de réplicas de lectura separadas por coma (por defecto ninguna)
+#   DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING
+#                        (por engine: el primario y cada réplica tienen su pool)
+#   DB_POOL_CALENTAR     conexiones que se abren al arrancar cada worker (por defecto 2)
+import functools
+import itertools
+import os
+import threading
+
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from passlib.context import CryptContext
-
-USER = "root"
-PASSWORD = ""
-HOST = "localhost"
-PORT = "3306"
-DB_NAME = "lanaapp"
-
-SQLALCHEMY_DATABASE_URL = f"mysql+mysqlconnector://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB_NAME}"
-
-# Crear conexión con la base de datos MySQL
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-engine       = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base         = declarative_base()
-pwd_context  = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# Vuelve a crear tablas
-Base.metadata.create_all(bind=engine)
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-def get_db():
-    db = SessionLocal()
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+
+import metricas
+
+USER = os.getenv("DB_USUARIO", "root")
+PASSWORD = os.getenv("DB_CLAVE", "")
+HOST = os.getenv("DB_HOST", "localhost")
+PORT = os.getenv("DB_PUERTO", "3306")
+DB_NAME = os.getenv("DB_NOMBRE", "lanaapp")
+
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL", f"mysql+mysqlconnector://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB_NAME}"
+)
+
+# Modo asíncrono opcional (DB_ASYNC=1): las rutas usan AsyncSession sobre un
+# driver asyncio (aiomysql / aiosqlite) en lugar del threadpool de Starlette
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+
+# Pool de conexiones, configurable por entorno
+POOL_CONFIG = {
+    "pool_size":     int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow":  int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    "pool_timeout":  int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle":  int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+}
+DB_POOL_CALENTAR = int(os.getenv("DB_POOL_CALENTAR", "2"))
+
+
+def _url_async(url):
+    for sync, asincrono in (("mysql+mysqlconnector://", "mysql+aiomysql://"),
+                            ("mysql+pymysql://", "mysql+aiomysql://"),
+                            ("mysql://", "mysql+aiomysql://"),
+                            ("sqlite://", "sqlite+aiosqlite://")):
+        if url.startswith(sync):
+            return asincrono + url[len(sync):]
+    return url
+
+
+_esperando = 0
+_lock_espera = threading.Lock()
+
+
+class _ContarEspera:
+    """Cuenta quién espera una conexión con el pool agotado (la cola de la base)."""
+
+    def _agotado(self):
+        # Con max_overflow = -1 el pool no tiene tope y nadie espera
+        return self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+
+    def _do_get(self):
+        global _esperando
+        if not self._agotado():
+            return super()._do_get()
+        with _lock_espera:
+            _esperando += 1
+        try:
+            return super()._do_get()
+        finally:
+            with _lock_espera:
+                _esperando -= 1
+
+
+class _PoolContado(_ContarEspera, QueuePool):
+    pass
+
+
+class _PoolAsyncContado(_ContarEspera, AsyncAdaptedQueuePool):
+    pass
+
+
+def esperando_conexion():
+    """Peticiones esperando conexión en los pools de este proceso (limites.py, /metrics)."""
+    return _esperando
+
+
+def _opciones_pool(url, asincrono=False):
+    # SQLite no usa un pool de tamaño fijo
+    if url.startswith("sqlite"):
+        return {}
+    return dict(POOL_CONFIG, poolclass=_PoolAsyncContado if asincrono else _PoolContado)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _url_async(SQLALCHEMY_DATABASE_URL))
+REPLICAS = [url.strip() for url in os.getenv("DB_REPLICAS", "").split(",") if url.strip()]
+
+Base        = declarative_base()
+
+_engines = {}
+_lock = threading.Lock()
+_turno = itertools.count()
+
+
+def _perezoso(nombre, crear):
+    motor = _engines.get(nombre)
+    if motor is None:
+        with _lock:
+            motor = _engines.get(nombre)
+            if motor is None:
+                motor = _engines[nombre] = crear()
+    return motor
+
+
+def _crear_engine(url=SQLALCHEMY_DATABASE_URL):
+    motor = create_engine(url, **_opciones_pool(url))
+    metricas.instrumentar_engine(motor)
+    return motor
+
+
+def obtener_engine():
+    """Engine síncrono del proceso; se crea en la primera llamada."""
+    return _perezoso("sync", _crear_engine)
+
+
+def obtener_engine_lectura():
+    """Engine de una réplica, por turnos; el primario si no hay DB_REPLICAS."""
+    if not REPLICAS:
+        return obtener_engine()
+    i = next(_turno) % len(REPLICAS)
+    return _perezoso(f"replica{i}", lambda: _crear_engine(REPLICAS[i]))
+
+
+def __getattr__(nombre):
+    # `from database import engine` sigue funcionando; crea el engine en ese momento
+    if nombre == "engine":
+        return obtener_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
+class _Sesion(Session):
+    """Session que toma el engine al crearse, no al importar el módulo."""
+
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else obtener_engine(), **kwargs)
+
+
+SessionLocal = sessionmaker(class_=_Sesion, autocommit=False, autoflush=False)
+
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    def _crear_async_engine(url=ASYNC_DATABASE_URL):
+        motor = create_async_engine(url, **_opciones_pool(url, asincrono=True))
+        metricas.instrumentar_engine(motor.sync_engine)
+        return motor
+
+    def obtener_async_engine():
+        return _perezoso("async", _crear_async_engine)
+
+    def obtener_async_engine_lectura():
+        if not REPLICAS:
+            return obtener_async_engine()
+        i = next(_turno) % len(REPLICAS)
+        return _perezoso(f"async_replica{i}", lambda: _crear_async_engine(_url_async(REPLICAS[i])))
+
+    AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+    async def get_db():
+        async with AsyncSessionLocal(bind=obtener_async_engine()) as db:
+            yield db
+else:
+    AsyncSession = None
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+def _motores_calentar(primario, lectura):
+    # El primario y, si hay réplicas, una vez cada una (el turno las recorre)
+    return [primario()] + [lectura() for _ in REPLICAS]
+
+
+def calentar(n=DB_POOL_CALENTAR):
+    """Abre `n` conexiones de cada pool síncrono y las devuelve (arranque de cada worker)."""
+    conexiones = []
+    try:
+        for motor in _motores_calentar(obtener_engine, obtener_engine_lectura):
+            for _ in range(n):
+                conexiones.append(motor.connect())
+    finally:
+        for conexion in conexiones:
+            conexion.close()
+
+
+async def calentar_async(n=DB_POOL_CALENTAR):
+    """Lo mismo para los engines asíncronos (DB_ASYNC=1)."""
+    conexiones = []
     try:
-        yield db
+        for motor in _motores_calentar(obtener_async_engine, obtener_async_engine_lectura):
+            for _ in range(n):
+                conexiones.append(await motor.connect().start())
     finally:
-        db.close()
+        for conexion in conexiones:
+            await conexion.close()
+
+
+async def cerrar():
+    """Cierra los pools creados en este proceso (apagado del worker)."""
+    with _lock:
+        motores = list(_engines.items())
+        _engines.clear()
+    for nombre, motor in motores:
+        if nombre.startswith("async"):
+            await motor.dispose()
+        else:
+            motor.dispose()
+
+
+async def ejecutar(db, fn, liberar=False):
+    """Ejecuta fn(session) sin bloquear el event loop.
+
+    Con AsyncSession corre en el loop vía run_sync (la E/S la hace el driver
+    asyncio); con Session síncrona, en el threadpool. `liberar` devuelve la
+    conexión al pool al terminar, útil antes de esperas largas (bcrypt).
+    """
+    if AsyncSession is not None and isinstance(db, AsyncSession):
+        try:
+            return await db.run_sync(fn)
+        finally:
+            if liberar:
+                await db.close()
+
+    def correr():
+        try:
+            return fn(db)
+        finally:
+            if liberar:
+                db.close()
+    return await run_in_threadpool(correr)
+
+
+def con_sesion(ruta):
+    """Convierte una ruta síncrona que recibe `db` en una ruta async.
 
+    El cuerpo de la ruta no cambia; se ejecuta con `ejecutar`, así funciona
+    igual con el engine síncrono y con el asíncrono.
+    """
+    @functools.wraps(ruta)
+    async def envoltura(*args, **kwargs):
+        db = kwargs.pop("db")
+        return await ejecutar(db, lambda sesion: ruta(*args, db=sesion, **kwargs))
+    return envoltura
@@ -0,0 +1,64 @@
+# Importes de dinero en centavos.
+#
+# Todas las columnas de montos (transacciones, archivo, pagos fijos,
+# presupuestos, resumen_mensual, anomalías) son BIGINT con el importe en
+# centavos (`monto_centavos`, `total_centavos`); los modelos las exponen con el
+# nombre de siempre (`monto`, `total`) como Decimal de dos decimales. Así las
+# sumas en SQL son enteras y exactas, y en Python nunca se mezclan flotantes:
+# un valor asignado a esos atributos se redondea al centavo en el momento.
+#
+# Los esquemas de la API siguen recibiendo y devolviendo números JSON; un
+# flotante se convierte a partir de su texto (0.1 -> 0.10), no de su valor
+# binario. Para convertir una base existente, ver migrar_dinero.py.
+from decimal import ROUND_HALF_UP, Decimal
+
+from sqlalchemy import BigInteger, event, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+CENTAVO = Decimal("0.01")
+CERO = Decimal("0.00")
+
+
+def redondear(valor):
+    """`valor` (Decimal, int, float o texto) como Decimal redondeado al centavo."""
+    if valor is None:
+        return None
+    if isinstance(valor, float):
+        valor = repr(valor)
+    return Decimal(valor).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+def a_centavos(valor):
+    return int(redondear(valor).scaleb(2))
+
+
+def de_centavos(centavos):
+    return None if centavos is None else Decimal(int(centavos)).scaleb(-2)
+
+
+class Centavos(TypeDecorator):
+    """BIGINT en la base, Decimal en Python."""
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, valor, dialecto):
+        return None if valor is None else a_centavos(valor)
+
+    def process_result_value(self, valor, dialecto):
+        return de_centavos(valor)
+
+
+def crudo(columna):
+    """La columna como entero en centavos, sin convertir (p. ej. para numpy)."""
+    return type_coerce(columna, BigInteger)
+
+
+def _al_asignar(objeto, valor, anterior, iniciador):
+    return redondear(valor)
+
+
+def normalizar(*atributos):
+    """Redondea al centavo lo que se asigne a estos atributos de modelos."""
+    for atributo in atributos:
+        event.listen(atributo, "set", _al_asignar, retval=True)
@@ -0,0 +1,302 @@
+# Flujo de cambios por usuario para que la app se actualice sin volver a pedir datos.
+#
+# GET /eventos (Server-Sent Events, ver main.py) deja abierta una respuesta
+# por la que llegan los cambios del usuario del token:
+#   event: cambio
+#   data: {"entidad": "transaccion", "accion": "creada", "datos": {...}, "resumen": [...]}
+# entidad: transaccion | presupuesto | pago_fijo | notificacion
+# accion:  creada | actualizada | eliminada, o `masiva` para las inserciones
+#          por lote (importación, pagos fijos generados), que solo traen
+#          `cantidad`: la app recarga esa lista.
+# `resumen` (solo transacciones) son los deltas aplicados a resumen_mensual
+# por (ano, mes, tipo, categoria_id); sumarlos a lo que muestra el dashboard
+# evita volver a pedir /dashboard.
+#
+# Los eventos salen de la sesión de SQLAlchemy: after_flush anota los objetos
+# nuevos, modificados y borrados de esos modelos, y se publican solo cuando la
+# transacción se confirma; lo anotado en un SAVEPOINT deshecho (p. ej. una
+# mutación rechazada en /sync) se descarta. Las inserciones masivas por Core
+# se anotan con `anotar_masiva`.
+#
+# Al conectar llega `event: conectado` y la app recarga una vez: lo ocurrido
+# mientras estuvo desconectada no se guarda. Si una conexión no consume a
+# tiempo se vacía su cola y recibe `event: recargar`. Cada EVENTOS_LATIDO
+# segundos se envía un comentario para que los proxies no corten, y el flujo
+# se cierra al expirar el token para que el cliente reconecte con uno nuevo.
+#
+# Configuración por entorno:
+#   EVENTOS_BACKEND    memoria (por defecto; solo un proceso) | redis (varios workers)
+#   EVENTOS_URL        URL de Redis (por defecto CACHE_URL o redis://localhost:6379/0)
+#   EVENTOS_LATIDO     segundos entre latidos (por defecto 15)
+#   EVENTOS_COLA_MAX   eventos pendientes por conexión (por defecto 100)
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from dinero import CERO, redondear
+from models import Notificacion, PagoFijo, Presupuesto, Transaccion
+
+log = logging.getLogger("lanaapp.eventos")
+
+EVENTOS_LATIDO = float(os.getenv("EVENTOS_LATIDO", "15"))
+EVENTOS_COLA_MAX = int(os.getenv("EVENTOS_COLA_MAX", "100"))
+
+ENTIDADES = {
+    Transaccion: "transaccion",
+    Presupuesto: "presupuesto",
+    PagoFijo: "pago_fijo",
+    Notificacion: "notificacion",
+}
+
+# Marca en la cola de una conexión que se quedó atrás
+RECARGAR = object()
+
+
+class Difusor:
+    """Conexiones abiertas en este proceso: usuario_id -> {(loop, cola)}."""
+
+    def __init__(self):
+        self._conexiones = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def suscribir(self, usuario_id):
+        entrada = (asyncio.get_running_loop(), asyncio.Queue(maxsize=EVENTOS_COLA_MAX))
+        with self._lock:
+            self._conexiones[usuario_id].add(entrada)
+        return entrada
+
+    def cancelar(self, usuario_id, entrada):
+        with self._lock:
+            conexiones = self._conexiones.get(usuario_id)
+            if conexiones is not None:
+                conexiones.discard(entrada)
+                if not conexiones:
+                    del self._conexiones[usuario_id]
+
+    def tiene(self, usuario_id):
+        return usuario_id in self._conexiones
+
+    def entregar(self, usuario_id, mensaje):
+        # Se llama desde hilos del threadpool (o el de Redis): la cola se toca en su loop
+        with self._lock:
+            conexiones = list(self._conexiones.get(usuario_id, ()))
+        for loop, cola in conexiones:
+            try:
+                loop.call_soon_threadsafe(_encolar, cola, mensaje)
+            except RuntimeError:
+                pass  # loop cerrado: la conexión ya terminó
+
+    def total(self):
+        return sum(len(c) for c in self._conexiones.values())
+
+
+def _encolar(cola, mensaje):
+    if cola.full():
+        while not cola.empty():
+            cola.get_nowait()
+        mensaje = RECARGAR
+    cola.put_nowait(mensaje)
+
+
+difusor = Difusor()
+
+
+class BackendMemoria:
+    """Solo llega a las conexiones de este proceso (un worker, o pruebas)."""
+
+    def publicar(self, usuario_id, mensaje):
+        difusor.entregar(usuario_id, mensaje)
+
+    def interesados(self, usuario_id):
+        return difusor.tiene(usuario_id)
+
+    def iniciar(self):
+        pass
+
+
+class BackendRedis:
+    """Publica en Redis; un hilo por proceso reparte lo recibido a sus conexiones.
+
+    Requiere el paquete `redis`. Sirve también para los procesos sin
+    conexiones abiertas (recurrentes.py, notificaciones_worker.py).
+    """
+
+    CANAL = "lana:e:"
+
+    def __init__(self, url):
+        import redis
+        self._r = redis.Redis.from_url(url)
+        self._hilo = None
+
+    def publicar(self, usuario_id, mensaje):
+        self._r.publish(f"{self.CANAL}{usuario_id}", mensaje)
+
+    def interesados(self, usuario_id):
+        # Las conexiones pueden estar en otro worker
+        return True
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._escuchar, name="eventos-redis", daemon=True)
+            self._hilo.start()
+
+    def _escuchar(self):
+        while True:
+            try:
+                pubsub = self._r.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.CANAL + "*")
+                for m in pubsub.listen():
+                    if m["type"] == "pmessage":
+                        usuario_id = int(m["channel"].decode()[len(self.CANAL):])
+                        difusor.entregar(usuario_id, m["data"].decode())
+            except Exception:
+                log.exception("Se perdió la suscripción a Redis; reintentando")
+                time.sleep(1)
+
+
+def _crear_backend():
+    if os.getenv("EVENTOS_BACKEND", "memoria") == "redis":
+        return BackendRedis(os.getenv("EVENTOS_URL", os.getenv("CACHE_URL", "redis://localhost:6379/0")))
+    return BackendMemoria()
+
+
+backend = _crear_backend()
+
+
+def publicar(usuario_id, evento):
+    try:
+        backend.publicar(usuario_id, json.dumps(jsonable_encoder(evento), separators=(",", ":")))
+    except Exception:
+        # El cambio ya está confirmado: un evento perdido no debe romper la petición
+        log.exception("No se pudo publicar el evento de %s", usuario_id)
+
+
+# --- Eventos a partir de la sesión ---
+
+def _resumen(valores, signo, deltas):
+    fecha = valores["fecha"]
+    clave = (fecha.year, fecha.month, valores["tipo"], valores["categoria_id"])
+    total, cantidad = deltas.get(clave, (CERO, 0))
+    deltas[clave] = (total + signo * redondear(valores["monto"]), cantidad + signo)
+
+
+def _lista_resumen(deltas):
+    return [
+        {"ano": ano, "mes": mes, "tipo": tipo, "categoria_id": categoria_id, "total": total, "cantidad": cantidad}
+        for (ano, mes, tipo, categoria_id), (total, cantidad) in deltas.items()
+        if total or cantidad
+    ]
+
+
+def _evento(entidad, accion, obj):
+    estado = inspect(obj)
+    # Solo lo ya cargado: leer un atributo vencido dentro del flush haría otra consulta
+    datos = {a.key: estado.dict[a.key] for a in estado.mapper.column_attrs if a.key in estado.dict}
+    evento = {"entidad": entidad, "accion": accion, "datos": datos if accion != "eliminada" else {"id": obj.id}}
+    if entidad == "transaccion":
+        deltas = {}
+        if accion != "creada":
+            anteriores = dict(datos)
+            for clave in ("fecha", "tipo", "categoria_id", "monto"):
+                historia = estado.attrs[clave].history
+                if historia.deleted:
+                    anteriores[clave] = historia.deleted[0]
+            _resumen(anteriores, -1, deltas)
+        if accion != "eliminada":
+            _resumen(datos, 1, deltas)
+        evento["resumen"] = _lista_resumen(deltas)
+    return evento
+
+
+def _pendientes(sesion):
+    return sesion.info.setdefault("eventos", [])
+
+
+@event.listens_for(Session, "after_flush")
+def _anotar(sesion, contexto):
+    transaccion = sesion.get_nested_transaction()
+    for accion, objetos in (("creada", sesion.new), ("actualizada", sesion.dirty), ("eliminada", sesion.deleted)):
+        for obj in objetos:
+            entidad = ENTIDADES.get(type(obj))
+            if entidad is None or not backend.interesados(obj.usuario_id):
+                continue
+            if accion == "actualizada" and not sesion.is_modified(obj):
+                continue
+            _pendientes(sesion).append((transaccion, obj.usuario_id, _evento(entidad, accion, obj)))
+
+
+def anotar_masiva(db, filas, entidad="transaccion"):
+    """Un evento `masiva` por usuario para filas insertadas por Core (sin objetos ORM)."""
+    por_usuario = defaultdict(lambda: [0, {}])
+    for f in filas:
+        if backend.interesados(f["usuario_id"]):
+            acumulado = por_usuario[f["usuario_id"]]
+            acumulado[0] += 1
+            _resumen(f, 1, acumulado[1])
+    transaccion = db.get_nested_transaction()
+    for usuario_id, (cantidad, deltas) in por_usuario.items():
+        _pendientes(db).append((transaccion, usuario_id, {
+            "entidad": entidad, "accion": "masiva", "cantidad": cantidad, "resumen": _lista_resumen(deltas),
+        }))
+
+
+def _dentro(transaccion, deshecha):
+    while transaccion is not None:
+        if transaccion is deshecha:
+            return True
+        transaccion = transaccion.parent
+    return False
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar(sesion, previa):
+    pendientes = sesion.info.get("eventos")
+    if not pendientes:
+        return
+    if not previa.nested:
+        pendientes.clear()
+        return
+    sesion.info["eventos"] = [p for p in pendientes if not _dentro(p[0], previa)]
+
+
+@event.listens_for(Session, "after_commit")
+def _publicar(sesion):
+    # También se llama al liberar un SAVEPOINT: esos eventos esperan al commit externo
+    if sesion.in_nested_transaction():
+        return
+    for _, usuario_id, evento in sesion.info.pop("eventos", None) or ():
+        publicar(usuario_id, evento)
+
+
+# --- Flujo SSE ---
+
+def _sse(tipo, datos="{}"):
+    return f"event: {tipo}\ndata: {datos}\n\n"
+
+
+async def flujo(usuario_id, expira):
+    """Cuerpo de GET /eventos hasta que el cliente se va o vence su token (`exp`)."""
+    entrada = difusor.suscribir(usuario_id)
+    cola = entrada[1]
+    try:
+        yield "retry: 3000\n" + _sse("conectado")
+        while True:
+            restante = expira - time.time()
+            if restante <= 0:
+                return
+            try:
+                mensaje = await asyncio.wait_for(cola.get(), timeout=min(EVENTOS_LATIDO, restante))
+            except asyncio.TimeoutError:
+                yield ": latido\n\n"
+                continue
+            yield _sse("recargar") if mensaje is RECARGAR else _sse("cambio", mensaje)
+    finally:
+        difusor.cancelar(usuario_id, entrada)
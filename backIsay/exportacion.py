@@ -0,0 +1,292 @@
+# Exportación del historial de transacciones de un usuario (CSV, XLSX o Parquet).
+#
+# GET /usuarios/{id}/export recorre las transacciones archivadas y luego las
+# vivas (particiones.py), unidas al nombre de la categoría, con un cursor del
+# servidor (`yield_per`): cada bloque de filas se convierte a bytes y se envía
+# antes de leer el siguiente, así la memoria no depende del tamaño del
+# historial.
+#   - csv: con encabezado, se puede volver a subir a POST /transacciones/bulk
+#   - xlsx: se escribe el ZIP a mano (sin openpyxl), una hoja en streaming
+#   - parquet: requiere pyarrow; un grupo de filas por bloque
+#
+# Con `asincrono=true` el archivo se escribe en segundo plano en EXPORT_DIR y
+# la ruta responde 202 con un identificador; GET /usuarios/{id}/export/{trabajo}
+# devuelve el estado o el archivo cuando está listo. El estado se lee de los
+# nombres de archivo (*.parcial, *.error), así sirve con varios workers si
+# EXPORT_DIR es compartido. Los archivos se borran tras EXPORT_RETENCION_HORAS.
+#
+# Configuración por entorno:
+#   EXPORT_DIR               carpeta de los trabajos (por defecto <tmp>/lanaapp_exportaciones)
+#   EXPORT_RETENCION_HORAS   horas que se guardan los archivos (por defecto 24)
+#   EXPORT_BLOQUE            filas por lectura del cursor (por defecto 2000)
+import codecs
+import csv
+import io
+import logging
+import os
+import re
+import secrets
+import tempfile
+import time
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from sqlalchemy import select
+
+from models import Categoria, Transaccion, TransaccionArchivo
+import replicas
+
+log = logging.getLogger("lanaapp.exportacion")
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "lanaapp_exportaciones"))
+EXPORT_RETENCION_HORAS = int(os.getenv("EXPORT_RETENCION_HORAS", "24"))
+EXPORT_BLOQUE = int(os.getenv("EXPORT_BLOQUE", "2000"))
+
+COLUMNAS = ["id", "fecha", "tipo", "monto", "categoria_id", "categoria", "descripcion", "es_recurrente"]
+
+TIPOS_MEDIOS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+# --- Lectura ---
+
+def filas(db, usuario_id, desde=None, hasta=None, bloque=EXPORT_BLOQUE):
+    """Genera listas de hasta `bloque` filas, del archivo primero (meses más viejos)."""
+    for modelo in (TransaccionArchivo, Transaccion):
+        sel = (
+            select(modelo.id, modelo.fecha, modelo.tipo, modelo.monto, modelo.categoria_id,
+                   Categoria.nombre, modelo.descripcion, modelo.es_recurrente)
+            .outerjoin(Categoria, Categoria.id == modelo.categoria_id)
+            .where(modelo.usuario_id == usuario_id)
+        )
+        if desde:
+            sel = sel.where(modelo.fecha >= desde)
+        if hasta:
+            sel = sel.where(modelo.fecha <= hasta)
+        resultado = db.execute(sel.order_by(modelo.fecha, modelo.id).execution_options(yield_per=bloque))
+        for trozo in resultado.partitions():
+            yield trozo
+
+
+# --- Formatos ---
+
+class _Tubo:
+    """Destino de solo escritura (sin seek) que se vacía tras cada bloque."""
+
+    closed = False
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+def _csv(trozos):
+    texto = io.StringIO()
+    escritor = csv.writer(texto)
+    escritor.writerow(COLUMNAS)
+    # BOM para que Excel lo abra como UTF-8; la importación lo ignora
+    yield codecs.BOM_UTF8 + texto.getvalue().encode()
+    for trozo in trozos:
+        texto.seek(0)
+        texto.truncate()
+        escritor.writerows(trozo)
+        yield texto.getvalue().encode()
+
+
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_XLSX_FIJOS = {
+    "[Content_Types].xml": _XML + (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": _XML + (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": _XML + (
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Transacciones" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": _XML + (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+# Caracteres de control que XML no admite
+_NO_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _celda(valor):
+    if valor is None:
+        return "<c/>"
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        return f"<c><v>{valor!r}</v></c>"
+    if isinstance(valor, Decimal):
+        return f"<c><v>{valor}</v></c>"
+    texto = escape(_NO_XML.sub("", str(valor)))
+    return f'<c t="inlineStr"><is><t>{texto}</t></is></c>'
+
+
+def _fila_xlsx(valores):
+    return "<row>" + "".join(_celda(v) for v in valores) + "</row>"
+
+
+def _xlsx(trozos):
+    tubo = _Tubo()
+    with zipfile.ZipFile(tubo, "w", zipfile.ZIP_DEFLATED) as archivo:
+        for nombre, contenido in _XLSX_FIJOS.items():
+            archivo.writestr(nombre, contenido)
+        with archivo.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as hoja:
+            hoja.write((_XML + '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                        "<sheetData>" + _fila_xlsx(COLUMNAS)).encode())
+            for trozo in trozos:
+                hoja.write("".join(_fila_xlsx(f) for f in trozo).encode())
+                yield tubo.vaciar()
+            hoja.write(b"</sheetData></worksheet>")
+    yield tubo.vaciar()
+
+
+def _parquet(trozos):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema([
+        ("id", pa.int64()), ("fecha", pa.date32()), ("tipo", pa.string()), ("monto", pa.decimal128(18, 2)),
+        ("categoria_id", pa.int64()), ("categoria", pa.string()), ("descripcion", pa.string()),
+        ("es_recurrente", pa.bool_()),
+    ])
+    tubo = _Tubo()
+    escritor = pq.ParquetWriter(tubo, esquema, compression="zstd")
+    try:
+        for trozo in trozos:
+            escritor.write_table(pa.Table.from_pylist([dict(zip(COLUMNAS, f)) for f in trozo], schema=esquema))
+            yield tubo.vaciar()
+    finally:
+        escritor.close()
+    yield tubo.vaciar()
+
+
+ESCRITORES = {"csv": _csv, "xlsx": _xlsx, "parquet": _parquet}
+
+
+def validar_formato(formato):
+    if formato == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="La exportación a Parquet no está disponible en este servidor")
+
+
+def generar(usuario_id, formato, desde=None, hasta=None):
+    """Bytes del archivo por trozos. Abre su propia sesión (en una réplica si
+    hay): la respuesta se sigue enviando después de que la ruta terminó."""
+    db = replicas.sesion_lectura(usuario_id)
+    try:
+        yield from ESCRITORES[formato](filas(db, usuario_id, desde, hasta))
+    finally:
+        db.close()
+
+
+def _nombre(usuario_id, formato, desde, hasta):
+    rango = "".join(f"_{d.isoformat()}" if d else "_" for d in (desde, hasta)) if desde or hasta else ""
+    return f"transacciones_{usuario_id}{rango}.{formato}"
+
+
+def descargar(usuario_id, formato, desde=None, hasta=None):
+    return StreamingResponse(
+        generar(usuario_id, formato, desde, hasta),
+        media_type=TIPOS_MEDIOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{_nombre(usuario_id, formato, desde, hasta)}"'},
+    )
+
+
+# --- Trabajos en segundo plano ---
+
+def _ruta(usuario_id, trabajo, formato):
+    return os.path.join(EXPORT_DIR, f"{usuario_id}-{trabajo}.{formato}")
+
+
+def purgar(horas=EXPORT_RETENCION_HORAS):
+    limite = time.time() - horas * 3600
+    for nombre in os.listdir(EXPORT_DIR):
+        ruta = os.path.join(EXPORT_DIR, nombre)
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except OSError:
+            pass  # otro worker ya lo borró
+
+
+def crear_trabajo(usuario_id, formato):
+    """Reserva un identificador; el archivo .parcial marca el trabajo en proceso."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    purgar()
+    trabajo = secrets.token_hex(8)
+    open(_ruta(usuario_id, trabajo, formato) + ".parcial", "wb").close()
+    return trabajo
+
+
+def ejecutar_trabajo(usuario_id, trabajo, formato, desde=None, hasta=None):
+    ruta = _ruta(usuario_id, trabajo, formato)
+    try:
+        with open(ruta + ".parcial", "wb") as archivo:
+            for trozo in generar(usuario_id, formato, desde, hasta):
+                archivo.write(trozo)
+        os.replace(ruta + ".parcial", ruta)
+    except Exception as e:
+        log.exception("Falló la exportación %s del usuario %s", trabajo, usuario_id)
+        with open(ruta + ".error", "w") as archivo:
+            archivo.write(str(e)[:500])
+        try:
+            os.remove(ruta + ".parcial")
+        except OSError:
+            pass
+
+
+def respuesta_trabajo(usuario_id, trabajo):
+    """El archivo si está listo; si no, el estado del trabajo."""
+    for formato in ESCRITORES:
+        ruta = _ruta(usuario_id, trabajo, formato)
+        if os.path.exists(ruta):
+            return FileResponse(ruta, media_type=TIPOS_MEDIOS[formato],
+                                filename=_nombre(usuario_id, formato, None, None))
+        if os.path.exists(ruta + ".parcial"):
+            return JSONResponse(status_code=202, content={"trabajo": trabajo, "estado": "en_proceso"})
+        if os.path.exists(ruta + ".error"):
+            return JSONResponse(status_code=200, content={"trabajo": trabajo, "estado": "error"})
+    raise HTTPException(status_code=404, detail="Exportación no encontrada o vencida")
@@ -0,0 +1,241 @@
+# Importación masiva de transacciones (CSV o NDJSON) para POST /transacciones/bulk.
+#
+# El cuerpo se lee por trozos y se procesa registro a registro, así la memoria
+# depende del tamaño del lote y no del archivo. En CSV un solo csv.reader
+# recorre todo el cuerpo, así que los campos entre comillas pueden llevar
+# saltos de línea; cada registro se decodifica (UTF-8) por separado y uno
+# inválido queda como error de su fila sin detener la importación.
+#
+# Cada lote se inserta con un solo INSERT de varias filas y se confirma en su
+# propia transacción; si el lote falla se reintenta fila por fila para
+# reportar solo las filas malas.
+import csv
+import json
+from collections import deque
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError
+
+import cache
+import catalogo
+import eventos
+import presupuestos
+import resumen_mensual
+import versiones
+from database import ejecutar
+from dinero import redondear
+from models import Transaccion
+from schemas import TransaccionCreate
+
+TAMANO_LOTE = 1000
+MAX_ERRORES = 1000
+
+FORMATOS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/json": "ndjson",
+}
+
+
+def detectar_formato(content_type, formato=None):
+    if formato:
+        return formato
+    return FORMATOS.get((content_type or "").split(";")[0].strip().lower())
+
+
+# Un registro CSV con comillas sin cerrar no puede crecer sin límite
+MAX_BYTES_REGISTRO = 1024 * 1024
+
+
+async def _lineas(stream):
+    pendiente = b""
+    async for trozo in stream:
+        pendiente += trozo
+        *completas, pendiente = pendiente.split(b"\n")
+        for linea in completas:
+            yield linea.rstrip(b"\r")
+    if pendiente:
+        yield pendiente.rstrip(b"\r")
+
+
+async def _registros(stream, formato):
+    """Agrupa las líneas (en bytes) por registro: en CSV un campo entre comillas puede abarcar varias."""
+    partes, comillas, largo = [], 0, 0
+    async for linea in _lineas(stream):
+        partes.append(linea)
+        comillas += linea.count(b'"')
+        largo += len(linea)
+        if formato != "csv" or comillas % 2 == 0 or largo > MAX_BYTES_REGISTRO:
+            yield partes, comillas % 2 == 1
+            partes, comillas, largo = [], 0, 0
+    if partes:
+        yield partes, comillas % 2 == 1
+
+
+class _Fuente:
+    """Entrada de un único csv.reader; se le entregan las líneas de un registro completo a la vez."""
+
+    def __init__(self):
+        self.lineas = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.lineas:
+            raise StopIteration
+        return self.lineas.popleft()
+
+
+def _leer_csv(lector, fuente, partes, abierto):
+    if abierto:
+        raise ValueError("comillas sin cerrar")
+    # Se decodifica aquí, dentro del manejo por fila: un byte que no es UTF-8 es error de esa fila
+    fuente.lineas.extend(p.decode("utf-8-sig") + "\n" for p in partes)
+    try:
+        return next(lector)
+    finally:
+        fuente.lineas.clear()
+
+
+async def leer_filas(stream, formato):
+    """Genera (numero_fila, dict | Exception) sin cargar el cuerpo completo."""
+    fuente = _Fuente()
+    lector = csv.reader(fuente)
+    encabezado = None
+    numero = 0
+    async for partes, abierto in _registros(stream, formato):
+        if len(partes) == 1 and not partes[0].strip():
+            continue
+        if formato == "csv" and encabezado is None:
+            try:
+                encabezado = [c.strip() for c in _leer_csv(lector, fuente, partes, abierto)]
+            except (ValueError, csv.Error) as e:
+                # Sin encabezado no se puede leer ninguna fila
+                yield 0, ValueError(f"encabezado: {e}")
+                return
+            continue
+        numero += 1
+        try:
+            if formato == "csv":
+                valores = _leer_csv(lector, fuente, partes, abierto)
+                if len(valores) != len(encabezado):
+                    raise ValueError(f"se esperaban {len(encabezado)} columnas y hay {len(valores)}")
+                # Las celdas vacías equivalen a campos ausentes
+                yield numero, {k: v for k, v in zip(encabezado, valores) if v != ""}
+            else:
+                fila = json.loads(partes[0].decode("utf-8-sig"))
+                if not isinstance(fila, dict):
+                    raise ValueError("cada línea debe ser un objeto JSON")
+                yield numero, fila
+        except (ValueError, csv.Error) as e:
+            # UnicodeDecodeError también es ValueError: la fila queda como error
+            yield numero, e
+
+
+def validar(fila):
+    valores = TransaccionCreate(**fila).dict()
+    valores["monto"] = redondear(valores["monto"])
+    return valores
+
+
+def _con_version(db, filas):
+    # Las inserciones por Core no pasan por before_flush: la versión de /sync va explícita
+    return [dict(f, version=versiones.tomar(db, f["usuario_id"])) for f in filas]
+
+
+def _invalidar_cache(filas):
+    for usuario_id in {f["usuario_id"] for f in filas}:
+        cache.invalidar(usuario_id, "transacciones")
+
+
+def _categorias_validas(db, lote):
+    # transacciones no tiene llave foránea en MySQL: la categoría se valida aquí
+    validas, errores = [], []
+    for numero, valores in lote:
+        if catalogo.indice.permitida(db, valores["usuario_id"], valores["categoria_id"]):
+            validas.append((numero, valores))
+        else:
+            errores.append({"fila": numero, "error": "categoria_id: categoría inexistente o de otro usuario"})
+    return validas, errores
+
+
+def insertar_lote(db, lote):
+    """Inserta [(numero_fila, valores)] y devuelve (insertadas, errores)."""
+    lote, rechazadas = _categorias_validas(db, lote)
+    insertadas, errores = _insertar_validas(db, lote)
+    return insertadas, sorted(rechazadas + errores, key=lambda e: e["fila"])
+
+
+def _insertar_validas(db, lote):
+    if not lote:
+        return 0, []
+    filas = [valores for _, valores in lote]
+    try:
+        db.execute(insert(Transaccion), _con_version(db, filas))
+        resumen_mensual.sumar_filas(db, filas)
+        presupuestos.alertar(db, presupuestos.deltas(filas))
+        eventos.anotar_masiva(db, filas)
+        db.commit()
+        _invalidar_cache(filas)
+        return len(filas), []
+    except DBAPIError:
+        db.rollback()
+
+    # El lote tiene al menos una fila inválida para la base: se aísla fila por fila
+    insertadas, errores = [], []
+    for numero, valores in lote:
+        try:
+            with db.begin_nested():
+                db.execute(insert(Transaccion), _con_version(db, [valores]))
+                resumen_mensual.sumar_filas(db, [valores])
+            insertadas.append(valores)
+        except DBAPIError as e:
+            errores.append({"fila": numero, "error": str(e.orig)})
+    presupuestos.alertar(db, presupuestos.deltas(insertadas))
+    eventos.anotar_masiva(db, insertadas)
+    db.commit()
+    _invalidar_cache(filas)
+    return len(insertadas), errores
+
+
+def error_validacion(numero, e):
+    if isinstance(e, ValidationError):
+        detalle = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+    else:
+        detalle = str(e)
+    return {"fila": numero, "error": detalle}
+
+
+async def importar(stream, formato, db, usuario_id):
+    resultado = {"insertadas": 0, "total_errores": 0, "errores": []}
+
+    def registrar(errores):
+        resultado["total_errores"] += len(errores)
+        espacio = MAX_ERRORES - len(resultado["errores"])
+        resultado["errores"].extend(errores[:max(espacio, 0)])
+
+    async def volcar(lote):
+        insertadas, errores = await ejecutar(db, lambda sesion: insertar_lote(sesion, lote))
+        resultado["insertadas"] += insertadas
+        registrar(errores)
+
+    lote = []
+    async for numero, fila in leer_filas(stream, formato):
+        if isinstance(fila, Exception):
+            registrar([error_validacion(numero, fila)])
+            continue
+        try:
+            # Las filas siempre quedan a nombre del usuario del token
+            lote.append((numero, dict(validar(fila), usuario_id=usuario_id)))
+        except ValidationError as e:
+            registrar([error_validacion(numero, e)])
+            continue
+        if len(lote) >= TAMANO_LOTE:
+            await volcar(lote)
+            lote = []
+    await volcar(lote)
+    return resultado
@@ -1,6 +1,12 @@
 -- phpMyAdmin SQL Dump
 -- Adaptado: 01-07-2025
 -- Base de datos: `lanaapp`
+--
+-- Referencia del esquema en MySQL y datos de ejemplo. Quien crea y actualiza
+-- el esquema son las migraciones (migraciones/): `alembic upgrade head`, que
+-- es la fuente de verdad; este archivo debe coincidir con lo que dejan en
+-- MySQL (p. ej. transacciones particionada por mes, sin llaves foráneas).
+-- Una base creada con este archivo también se actualiza así.
 
 SET SQL_MODE = "NO_AUTO_VALUE_ON_ZERO";
 START TRANSACTION;
@@ -19,9 +25,10 @@ CREATE DATABASE lanaapp;
 CREATE TABLE `categorias` (
   `id`                INT            NOT NULL AUTO_INCREMENT,
   `nombre`            VARCHAR(50)    NOT NULL,
-  `tipo`              ENUM('ingreso','gasto') NOT NULL,
+  `tipo`              ENUM('ingreso','egreso') NOT NULL,
   `usuario_id`        INT            DEFAULT NULL,
   `es_predeterminada` TINYINT(1)     DEFAULT '0',
+  `fecha_actualizacion` TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
   PRIMARY KEY (`id`),
   KEY `idx_categorias_usuario` (`usuario_id`),
   CONSTRAINT `fk_categorias_usuario` FOREIGN KEY (`usuario_id`)
@@ -43,8 +50,14 @@ CREATE TABLE `notificaciones` (
   `fecha_creacion`   TIMESTAMP      NULL DEFAULT CURRENT_TIMESTAMP,
   `fecha_programada` TIMESTAMP      NULL DEFAULT NULL,
   `fecha_envio`      TIMESTAMP      NULL DEFAULT NULL,
+  `intentos`         INT            NOT NULL DEFAULT 0,
+  `estado`           ENUM('pendiente','enviando','enviada','fallida') NOT NULL DEFAULT 'pendiente',
+  `reclamada_por`    VARCHAR(64)    NULL DEFAULT NULL,
+  `reclamada_en`     TIMESTAMP      NULL DEFAULT NULL,
+  `error`            VARCHAR(255)   NULL DEFAULT NULL,
   PRIMARY KEY (`id`),
   KEY `idx_notif_usuario` (`usuario_id`),
+  KEY `idx_notif_pendientes` (`estado`,`fecha_programada`),
   CONSTRAINT `fk_notif_usuario` FOREIGN KEY (`usuario_id`)
     REFERENCES `usuarios` (`id`)
     ON DELETE CASCADE
@@ -57,16 +70,25 @@ CREATE TABLE `notificaciones` (
 CREATE TABLE `pagos_fijos` (
   `id`             INT            NOT NULL AUTO_INCREMENT,
   `descripcion`    VARCHAR(255)   DEFAULT NULL,
-  `monto`          FLOAT          DEFAULT NULL,
+  `monto_centavos` BIGINT         NOT NULL,
   `fecha`          DATE           DEFAULT NULL,
   `usuario_id`     INT            NOT NULL,
+  `categoria_id`   INT            NOT NULL,
+  `proximo_cobro`  DATE           DEFAULT NULL,
   `fecha_creacion` TIMESTAMP      NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `fecha_actualizacion` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  `version`        BIGINT         NOT NULL DEFAULT 0,
   PRIMARY KEY (`id`),
   KEY `idx_pagos_fijos_usuario` (`usuario_id`),
+  KEY `idx_pagos_fijos_usuario_proximo` (`usuario_id`,`proximo_cobro`),
+  KEY `idx_pagos_fijos_usuario_version` (`usuario_id`,`version`,`id`),
+  KEY `idx_pagos_fijos_categoria` (`categoria_id`),
   CONSTRAINT `fk_pagos_fijos_usuario` FOREIGN KEY (`usuario_id`)
     REFERENCES `usuarios` (`id`)
     ON DELETE CASCADE
-    ON UPDATE CASCADE
+    ON UPDATE CASCADE,
+  CONSTRAINT `fk_pagos_fijos_categoria` FOREIGN KEY (`categoria_id`)
+    REFERENCES `categorias` (`id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 -- --------------------------------------------------------
@@ -76,14 +98,16 @@ CREATE TABLE `presupuestos` (
   `id`                 INT             NOT NULL AUTO_INCREMENT,
   `usuario_id`         INT             NOT NULL,
   `categoria_id`       INT             NOT NULL,
-  `monto`              DECIMAL(10,2)   NOT NULL,
+  `monto_centavos`     BIGINT          NOT NULL,
   `ano`                INT             NOT NULL,
   `mes`                INT             NOT NULL,
   `fecha_creacion`     TIMESTAMP       NULL DEFAULT CURRENT_TIMESTAMP,
   `fecha_actualizacion` TIMESTAMP      NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  `version`            BIGINT          NOT NULL DEFAULT 0,
   PRIMARY KEY (`id`),
   UNIQUE KEY `uq_presup_usuario_cat_mes_ano` (`usuario_id`,`categoria_id`,`mes`,`ano`),
   KEY `idx_presup_categoria` (`categoria_id`),
+  KEY `idx_presup_usuario_version` (`usuario_id`,`version`,`id`),
   CONSTRAINT `fk_presup_usuario` FOREIGN KEY (`usuario_id`)
     REFERENCES `usuarios` (`id`)
     ON DELETE CASCADE
@@ -96,31 +120,171 @@ CREATE TABLE `presupuestos` (
 
 -- --------------------------------------------------------
 -- Tabla: transacciones
+-- Particionada por mes de `fecha`; las particiones futuras las crea
+-- `python particiones.py --crear-futuras` (cron mensual) y los meses cerrados
+-- se mueven a transacciones_archivo con `--archivar`. MySQL exige que toda
+-- clave única incluya `fecha` y no admite llaves foráneas en tablas
+-- particionadas: la integridad con usuarios/categorias la cuida la API.
 -- --------------------------------------------------------
 CREATE TABLE `transacciones` (
   `id`             INT             NOT NULL AUTO_INCREMENT,
   `usuario_id`     INT             NOT NULL,
-  `monto`          DECIMAL(10,2)   NOT NULL,
+  `monto_centavos` BIGINT          NOT NULL,
   `categoria_id`   INT             NOT NULL,
-  `tipo`           ENUM('ingreso','gasto') NOT NULL,
+  `tipo`           ENUM('ingreso','egreso','ahorro') NOT NULL,
   `descripcion`    VARCHAR(255)    DEFAULT NULL,
   `fecha`          DATE            NOT NULL,
   `es_recurrente`  TINYINT(1)      DEFAULT '0',
   `id_recurrente`  INT             DEFAULT NULL,
   `fecha_creacion` TIMESTAMP       NULL DEFAULT CURRENT_TIMESTAMP,
-  PRIMARY KEY (`id`),
+  `fecha_actualizacion` TIMESTAMP  NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  `version`        BIGINT          NOT NULL DEFAULT 0,
+  PRIMARY KEY (`id`,`fecha`),
   KEY `idx_trans_usuario` (`usuario_id`),
-  KEY `idx_trans_categoria` (`categoria_id`),
-  CONSTRAINT `fk_trans_usuario` FOREIGN KEY (`usuario_id`)
+  UNIQUE KEY `uq_trans_recurrente_fecha` (`id_recurrente`,`fecha`),
+  KEY `idx_trans_usuario_fecha_id` (`usuario_id`,`fecha`,`id`),
+  KEY `idx_trans_usuario_version` (`usuario_id`,`version`,`id`),
+  KEY `idx_trans_categoria` (`categoria_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+PARTITION BY RANGE COLUMNS(`fecha`) (
+  PARTITION p202501 VALUES LESS THAN ('2025-02-01'),
+  PARTITION p202502 VALUES LESS THAN ('2025-03-01'),
+  PARTITION p202503 VALUES LESS THAN ('2025-04-01'),
+  PARTITION p202504 VALUES LESS THAN ('2025-05-01'),
+  PARTITION p202505 VALUES LESS THAN ('2025-06-01'),
+  PARTITION p202506 VALUES LESS THAN ('2025-07-01'),
+  PARTITION p202507 VALUES LESS THAN ('2025-08-01'),
+  PARTITION p202508 VALUES LESS THAN ('2025-09-01'),
+  PARTITION p202509 VALUES LESS THAN ('2025-10-01'),
+  PARTITION p202510 VALUES LESS THAN ('2025-11-01'),
+  PARTITION p202511 VALUES LESS THAN ('2025-12-01'),
+  PARTITION p202512 VALUES LESS THAN ('2026-01-01'),
+  PARTITION p202601 VALUES LESS THAN ('2026-02-01'),
+  PARTITION p202602 VALUES LESS THAN ('2026-03-01'),
+  PARTITION p202603 VALUES LESS THAN ('2026-04-01'),
+  PARTITION p202604 VALUES LESS THAN ('2026-05-01'),
+  PARTITION p202605 VALUES LESS THAN ('2026-06-01'),
+  PARTITION p202606 VALUES LESS THAN ('2026-07-01'),
+  PARTITION p202607 VALUES LESS THAN ('2026-08-01'),
+  PARTITION p202608 VALUES LESS THAN ('2026-09-01'),
+  PARTITION p202609 VALUES LESS THAN ('2026-10-01'),
+  PARTITION p202610 VALUES LESS THAN ('2026-11-01'),
+  PARTITION p202611 VALUES LESS THAN ('2026-12-01'),
+  PARTITION p202612 VALUES LESS THAN ('2027-01-01'),
+  PARTITION pmax VALUES LESS THAN (MAXVALUE)
+);
+
+-- --------------------------------------------------------
+-- Tabla: transacciones_archivo (meses cerrados, ver particiones.py)
+-- --------------------------------------------------------
+CREATE TABLE `transacciones_archivo` (
+  `id`             INT             NOT NULL,
+  `usuario_id`     INT             NOT NULL,
+  `monto_centavos` BIGINT          NOT NULL,
+  `categoria_id`   INT             NOT NULL,
+  `tipo`           ENUM('ingreso','egreso','ahorro') NOT NULL,
+  `descripcion`    VARCHAR(255)    DEFAULT NULL,
+  `fecha`          DATE            NOT NULL,
+  `es_recurrente`  TINYINT(1)      DEFAULT '0',
+  `id_recurrente`  INT             DEFAULT NULL,
+  `fecha_creacion` TIMESTAMP       NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `idx_archivo_usuario_fecha` (`usuario_id`,`fecha`)
+) ENGINE=InnoDB ROW_FORMAT=COMPRESSED DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+-- Tabla: resumen_mensual (acumulados de transacciones por mes)
+-- Se rellena con: python resumen_mensual.py --reconstruir
+-- --------------------------------------------------------
+CREATE TABLE `resumen_mensual` (
+  `usuario_id`     INT             NOT NULL,
+  `ano`            INT             NOT NULL,
+  `mes`            INT             NOT NULL,
+  `tipo`           ENUM('ingreso','egreso','ahorro') NOT NULL,
+  `categoria_id`   INT             NOT NULL,
+  `total_centavos` BIGINT          NOT NULL DEFAULT 0,
+  `cantidad`       INT             NOT NULL DEFAULT 0,
+  PRIMARY KEY (`usuario_id`,`ano`,`mes`,`tipo`,`categoria_id`),
+  KEY `idx_resumen_categoria` (`categoria_id`),
+  CONSTRAINT `fk_resumen_usuario` FOREIGN KEY (`usuario_id`)
     REFERENCES `usuarios` (`id`)
     ON DELETE CASCADE
     ON UPDATE CASCADE,
-  CONSTRAINT `fk_trans_categoria` FOREIGN KEY (`categoria_id`)
+  CONSTRAINT `fk_resumen_categoria` FOREIGN KEY (`categoria_id`)
     REFERENCES `categorias` (`id`)
     ON DELETE RESTRICT
     ON UPDATE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
+-- --------------------------------------------------------
+-- Tabla: eliminaciones (bajas que /sync entrega a la app, ver sincronizacion.py)
+-- Se purga con: python sincronizacion.py --purgar
+-- --------------------------------------------------------
+CREATE TABLE `eliminaciones` (
+  `id`             INT             NOT NULL AUTO_INCREMENT,
+  `usuario_id`     INT             NOT NULL,
+  `entidad`        ENUM('transaccion','presupuesto','pago_fijo') NOT NULL,
+  `entidad_id`     INT             NOT NULL,
+  `fecha`          TIMESTAMP       NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `version`        BIGINT          NOT NULL DEFAULT 0,
+  PRIMARY KEY (`id`),
+  KEY `idx_eliminaciones_usuario_version` (`usuario_id`,`version`,`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+-- Tabla: sync_versiones (contador de cambios por usuario, ver versiones.py)
+-- --------------------------------------------------------
+CREATE TABLE `sync_versiones` (
+  `usuario_id`     INT             NOT NULL,
+  `version`        BIGINT          NOT NULL DEFAULT 0,
+  `purgado`        BIGINT          NOT NULL DEFAULT 0,
+  PRIMARY KEY (`usuario_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+-- Tabla: sync_operaciones (resultado por clave de idempotencia de /sync)
+-- --------------------------------------------------------
+CREATE TABLE `sync_operaciones` (
+  `usuario_id`     INT             NOT NULL,
+  `clave`          VARCHAR(64)     NOT NULL,
+  `resultado`      VARCHAR(500)    NOT NULL,
+  `fecha`          TIMESTAMP       NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`usuario_id`,`clave`),
+  KEY `ix_sync_operaciones_fecha` (`fecha`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+-- Tablas: pronosticos y anomalias (las recalcula cada noche pronosticos.py)
+-- --------------------------------------------------------
+CREATE TABLE `pronosticos` (
+  `usuario_id`       INT             NOT NULL,
+  `tipo`             ENUM('ingreso','egreso','ahorro') NOT NULL,
+  `categoria_id`     INT             NOT NULL,
+  `ano`              INT             NOT NULL,
+  `mes`              INT             NOT NULL,
+  `base`             DOUBLE          NOT NULL,
+  `pendiente`        DOUBLE          NOT NULL,
+  `desviacion`       DOUBLE          NOT NULL,
+  `meses`            INT             NOT NULL,
+  `monto_medio`      DOUBLE          DEFAULT NULL,
+  `monto_desviacion` DOUBLE          DEFAULT NULL,
+  `muestras`         INT             NOT NULL DEFAULT 0,
+  `fecha_calculo`    TIMESTAMP       NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`usuario_id`,`tipo`,`categoria_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE `anomalias` (
+  `transaccion_id` INT             NOT NULL,
+  `usuario_id`     INT             NOT NULL,
+  `categoria_id`   INT             NOT NULL,
+  `fecha`          DATE            NOT NULL,
+  `monto_centavos` BIGINT          NOT NULL,
+  `esperado`       DOUBLE          NOT NULL,
+  `puntaje`        DOUBLE          NOT NULL,
+  PRIMARY KEY (`transaccion_id`),
+  KEY `idx_anomalias_usuario_fecha` (`usuario_id`,`fecha`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
 -- --------------------------------------------------------
 -- Tabla: usuarios
 -- --------------------------------------------------------
@@ -159,10 +323,10 @@ INSERT INTO `categorias` (`nombre`,       `tipo`,    `usuario_id`, `es_predeterm
 VALUES
   ('Salario',      'ingreso', 1, 1),
   ('Freelance',    'ingreso', 1, 0),
-  ('Alquiler',     'gasto',   1, 1),
-  ('Compras',      'gasto',   1, 0),
+  ('Alquiler',     'egreso',   1, 1),
+  ('Compras',      'egreso',   1, 0),
   ('Beca',         'ingreso', 2, 1),
-  ('Transporte',   'gasto',   2, 1);
+  ('Transporte',   'egreso',   2, 1);
 
 -- Inserts para tabla: notificaciones
 INSERT INTO `notificaciones` (`usuario_id`, `tipo`,    `asunto`,                 `mensaje`,                           `fue_enviada`, `fecha_programada`)
@@ -171,23 +335,23 @@ VALUES
   (2,            'sms',    'Pago fijo próximo',        'No olvides tu pago fijo de suscripción.',   0,            '2025-07-10 18:00:00');
 
 -- Inserts para tabla: pagos_fijos
-INSERT INTO `pagos_fijos` (`descripcion`,            `monto`,   `fecha`,       `usuario_id`)
+INSERT INTO `pagos_fijos` (`descripcion`,            `monto_centavos`, `fecha`,       `usuario_id`, `categoria_id`)
 VALUES
-  ('Netflix',                  159.00,    '2025-07-15', 1),
-  ('Spotify',                   79.99,    '2025-07-20', 1),
-  ('Suscripción gimnasio',    299.50,    '2025-07-05', 2);
+  ('Netflix',                  15900,            '2025-07-15', 1,            4),
+  ('Spotify',                   7999,            '2025-07-20', 1,            4),
+  ('Suscripción gimnasio',     29950,            '2025-07-05', 2,            6);
 
 -- Inserts para tabla: presupuestos
-INSERT INTO `presupuestos` (`usuario_id`, `categoria_id`, `monto`,   `ano`,  `mes`)
+INSERT INTO `presupuestos` (`usuario_id`, `categoria_id`, `monto_centavos`, `ano`,  `mes`)
 VALUES
-  (1,           3,              1200.00,    2025,    7),
-  (1,           4,              500.00,     2025,    7),
-  (2,           6,              300.00,     2025,    7);
+  (1,           3,              120000,           2025,    7),
+  (1,           4,              50000,            2025,    7),
+  (2,           6,              30000,            2025,    7);
 
 -- Inserts para tabla: transacciones
 -- 1) Creamos la categoría en cuestión (para el usuario 1):
 INSERT INTO categorias (nombre, tipo, usuario_id, es_predeterminada)
-VALUES ('Netflix', 'gasto', 1, 0);
+VALUES ('Netflix', 'egreso', 1, 0);
 
 -- Averigua luego su id:
 SELECT id FROM categorias 
@@ -196,9 +360,14 @@ SELECT id FROM categorias
 
 -- Supongamos que el id resultante es 7, entonces:
 INSERT INTO transacciones
-  (usuario_id, monto, categoria_id, tipo, descripcion, fecha, es_recurrente)
+  (usuario_id, monto_centavos, categoria_id, tipo, descripcion, fecha, es_recurrente)
 VALUES
-  (1, 2500.00, 1, 'ingreso', 'Pago de nómina julio', '2025-07-01', 0),
-  (1,   75.50, 4, 'gasto',   'Supermercado',           '2025-07-03', 0),
-  (1,  159.00, 7, 'gasto',   'Netflix',                '2025-07-15', 1),
-  (2,  300.00, 6, 'gasto',   'Taxi mensual',           '2025-07-02', 1);
+  (1, 250000, 1, 'ingreso', 'Pago de nómina julio', '2025-07-01', 0),
+  (1,   7550, 4, 'egreso',   'Supermercado',           '2025-07-03', 0),
+  (1,  15900, 7, 'egreso',   'Netflix',                '2025-07-15', 1),
+  (2,  30000, 6, 'egreso',   'Taxi mensual',           '2025-07-02', 1);
+
+-- Para bases ya creadas: `alembic upgrade head` agrega las tablas, columnas e
+-- índices que falten, cambia 'gasto' por 'egreso' y asigna pagos_fijos.categoria_id.
+-- Particionar una tabla transacciones existente: python particiones.py --convertir
+-- Montos en centavos (monto_centavos/total_centavos) sin detener la API: python migrar_dinero.py --preparar, --copiar y, tras desplegar, --retirar
@@ -0,0 +1,227 @@
+# Límites de tasa por IP y por cuenta, y control de admisión.
+#
+# /login, /register, /password-recovery y /reset-password no piden token y
+# cuestan bcrypt o una escritura. Cada una tiene una cubeta de fichas (token
+# bucket) por IP, como dependencia de la ruta (`por_ip`), y otra por cuenta
+# (el correo del cuerpo, `por_cuenta`); sin fichas responde 429 con
+# Retry-After. En /login la cubeta de la cuenta es por (IP, cuenta): si fuera
+# solo por cuenta, cualquiera podría dejar fuera al dueño fallando a propósito
+# con su correo. Contra intentos repartidos en muchas IPs quedan la cubeta por
+# IP y el costo de bcrypt. En las demás rutas la cubeta es solo por cuenta,
+# para no inundar de correos a un usuario. Con el backend en memoria las
+# cubetas son por worker; con LIMITES_BACKEND=redis las comparten todos.
+#
+# Admisión: antes de encolar trabajo que el proceso no va a poder atender a
+# tiempo se responde 503 con Retry-After:
+#   - `cupo_hash` (rutas con bcrypt): si ya hay HASH_COLA_MAX peticiones
+#     admitidas esperando el pool de seguridad.py, sin llegar a la base;
+#   - `MiddlewareAdmision` (todas las rutas salvo /metrics y /eventos): si hay
+#     ADMISION_DB_COLA o más peticiones esperando conexión en los pools de
+#     database.py.
+# Los rechazos se cuentan en lanaapp_rechazos_total{motivo=...} y las colas se
+# ven en lanaapp_hash_admitidas y lanaapp_db_esperando_conexion (/metrics).
+#
+# Configuración por entorno:
+#   LIMITES_BACKEND        memoria (por defecto) | redis
+#   LIMITES_URL            URL de Redis (por defecto CACHE_URL o redis://localhost:6379/0)
+#   LIMITES_MAX            cubetas en memoria (por defecto 100000; se descartan las más viejas)
+#   LIMITES_IP_CABECERA    cabecera con la IP del cliente que agrega el proxy de
+#                          confianza (p. ej. x-forwarded-for; se toma el último valor).
+#                          Sin ella se usa la IP de la conexión
+#   LIMITE_<RUTA>_IP, LIMITE_<RUTA>_CUENTA
+#                          "peticiones/segundos" (p. ej. LIMITE_LOGIN_IP=20/60), 0 desactiva;
+#                          RUTA: LOGIN, REGISTER, PASSWORD_RECOVERY, RESET_PASSWORD
+#   ADMISION_DB_COLA       por defecto DB_POOL_SIZE + DB_MAX_OVERFLOW
+#   ADMISION_REINTENTO     segundos de Retry-After en los 503 (por defecto 1)
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+import database
+import metricas
+import seguridad
+
+LIMITES_MAX = int(os.getenv("LIMITES_MAX", "100000"))
+IP_CABECERA = os.getenv("LIMITES_IP_CABECERA", "").lower()
+ADMISION_DB_COLA = int(os.getenv(
+    "ADMISION_DB_COLA", str(database.POOL_CONFIG["pool_size"] + database.POOL_CONFIG["max_overflow"])
+))
+ADMISION_REINTENTO = int(os.getenv("ADMISION_REINTENTO", "1"))
+
+OCUPADO = "Servidor ocupado, intenta de nuevo en unos segundos"
+
+# ruta -> (por IP, por cuenta), "peticiones/segundos"
+POR_DEFECTO = {
+    "login": ("20/60", "5/60"),
+    "register": ("5/60", "3/3600"),
+    "password-recovery": ("5/60", "3/3600"),
+    "reset-password": ("10/60", None),
+}
+# Rutas cuya cubeta por cuenta también va por IP (ver arriba)
+CUENTA_POR_IP = {"login"}
+
+
+def _regla(valor):
+    """Convierte "n/s" en (capacidad n, n/s fichas por segundo); None si está desactivada."""
+    if not valor or valor == "0":
+        return None
+    peticiones, segundos = valor.split("/")
+    return int(peticiones), int(peticiones) / float(segundos)
+
+
+def _reglas():
+    reglas = {}
+    for ruta, (ip, cuenta) in POR_DEFECTO.items():
+        prefijo = "LIMITE_" + ruta.upper().replace("-", "_")
+        reglas[ruta] = (_regla(os.getenv(prefijo + "_IP", ip)), _regla(os.getenv(prefijo + "_CUENTA", cuenta)))
+    return reglas
+
+
+REGLAS = _reglas()
+
+
+class BackendMemoria:
+    """Cubetas en el proceso; cada worker de uvicorn tiene las suyas."""
+
+    def __init__(self, maximo=LIMITES_MAX):
+        self.maximo = maximo
+        self._cubetas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, clave, capacidad, tasa):
+        """Toma una ficha; devuelve 0 o los segundos hasta que haya una."""
+        ahora = time.monotonic()
+        with self._lock:
+            fichas, ultimo = self._cubetas.pop(clave, (capacidad, ahora))
+            fichas = min(capacidad, fichas + (ahora - ultimo) * tasa)
+            espera = 0.0
+            if fichas >= 1:
+                fichas -= 1
+            else:
+                espera = (1 - fichas) / tasa
+            self._cubetas[clave] = (fichas, ahora)
+            while len(self._cubetas) > self.maximo:
+                self._cubetas.popitem(last=False)
+        return espera
+
+
+# Misma cuenta que BackendMemoria, atómica en Redis; la cubeta expira al llenarse
+_SCRIPT_CUBETA = """
+local cubeta = redis.call('HMGET', KEYS[1], 'f', 'u')
+local capacidad, tasa, ahora = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local fichas = tonumber(cubeta[1]) or capacidad
+local ultimo = tonumber(cubeta[2]) or ahora
+fichas = math.min(capacidad, fichas + math.max(0, ahora - ultimo) * tasa)
+local espera = 0
+if fichas >= 1 then fichas = fichas - 1 else espera = (1 - fichas) / tasa end
+redis.call('HSET', KEYS[1], 'f', fichas, 'u', ahora)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacidad / tasa) + 1)
+return tostring(espera)
+"""
+
+
+class BackendRedis:
+    """Compartido entre workers; requiere el paquete `redis`."""
+
+    def __init__(self, url):
+        import redis
+        self._r = redis.Redis.from_url(url)
+        self._cubeta = self._r.register_script(_SCRIPT_CUBETA)
+
+    def consumir(self, clave, capacidad, tasa):
+        return float(self._cubeta(keys=["lana:l:" + clave], args=[capacidad, tasa, time.time()]))
+
+
+def _crear_backend():
+    if os.getenv("LIMITES_BACKEND", "memoria") == "redis":
+        return BackendRedis(os.getenv("LIMITES_URL") or os.getenv("CACHE_URL", "redis://localhost:6379/0"))
+    return BackendMemoria()
+
+
+backend = _crear_backend()
+
+
+def ip_cliente(request: Request):
+    if IP_CABECERA:
+        valor = request.headers.get(IP_CABECERA)
+        if valor:
+            return valor.split(",")[-1].strip()
+    return request.client.host if request.client else "desconocida"
+
+
+def _ruta(request):
+    ruta = request.scope.get("route")
+    return ruta.path if ruta else request.url.path
+
+
+def _rechazar(request, motivo, estado, espera, detalle):
+    metricas.registrar_rechazo(request.method, _ruta(request), motivo)
+    raise HTTPException(status_code=estado, detail=detalle,
+                        headers={"Retry-After": str(max(1, math.ceil(espera)))})
+
+
+def _consumir(request, ruta, tipo, valor, regla):
+    if regla is None or valor is None:
+        return
+    espera = backend.consumir(f"{ruta}:{tipo}:{valor}", *regla)
+    if espera:
+        _rechazar(request, f"limite_{tipo}", 429, espera, "Demasiadas solicitudes, intenta más tarde")
+
+
+def por_ip(ruta):
+    """Dependencia de la ruta: 429 si la IP agotó sus fichas para `ruta`."""
+    async def limitar_ip(request: Request):
+        _consumir(request, ruta, "ip", ip_cliente(request), REGLAS[ruta][0])
+    return limitar_ip
+
+
+def por_cuenta(request, ruta, correo):
+    """429 si la cuenta (correo) agotó sus fichas para `ruta`; se llama con el cuerpo ya leído."""
+    cuenta = correo.strip().lower() if correo else None
+    if cuenta and ruta in CUENTA_POR_IP:
+        cuenta = f"{ip_cliente(request)}|{cuenta}"
+    _consumir(request, ruta, "cuenta", cuenta, REGLAS[ruta][1])
+
+
+# --- Admisión ---
+
+admitidas_hash = 0
+
+
+async def cupo_hash(request: Request):
+    """Dependencia de las rutas con bcrypt: 503 si la cola del pool de hashing está llena.
+
+    Se cuenta desde que la petición entra, no desde que pide el hash: así una
+    ráfaga no pasa entera el control mientras espera la consulta a la base.
+    """
+    global admitidas_hash
+    if admitidas_hash >= seguridad.HASH_COLA_MAX:
+        _rechazar(request, "cola_hash", 503, ADMISION_REINTENTO, OCUPADO)
+    admitidas_hash += 1
+    try:
+        yield
+    finally:
+        admitidas_hash -= 1
+
+
+class MiddlewareAdmision:
+    """Middleware ASGI: 503 inmediato cuando la cola de conexiones a la base está llena."""
+
+    EXENTAS = ("/metrics", "/eventos")
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["path"] in self.EXENTAS
+                or database.esperando_conexion() < ADMISION_DB_COLA):
+            return await self.app(scope, receive, send)
+        metricas.registrar_rechazo(scope["method"], "*", "cola_db")
+        respuesta = JSONResponse(status_code=503, content={"detail": OCUPADO},
+                                 headers={"Retry-After": str(ADMISION_REINTENTO)})
+        await respuesta(scope, receive, send)
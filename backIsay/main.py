@@ -1,23 +1,142 @@
-# ——— Imports de terceros —————————————————————————————————————
+# Aplicación FastAPI.
+#
+# `crear_app()` arma la aplicación; el módulo expone `app = crear_app()` para
+# `uvicorn main:app` (también sirve `uvicorn --factory main:crear_app`).
+# Importar este módulo no toca la base. En el arranque de cada worker
+# (lifespan) se abren las primeras conexiones del pool, se carga el índice de
+# categorías, se inicia el backend de eventos y el barrido de tokens de
+# recuperación vencidos (recuperacion.py); al apagarse se cierran el pool de
+# hashing y los de la base. El esquema no se revisa aquí: se actualiza
+# antes de desplegar con `alembic upgrade head` (migraciones/).
+#
+# Varios workers (cada uno es un proceso con sus propios pools y cachés):
+#   uvicorn main:app --workers 4
+#   gunicorn main:app -k uvicorn.workers.UvicornWorker -w 4   (si se instala gunicorn)
+# Para que se comporten como uno solo:
+#   - JWT_SECRETO igual en todos (sesiones.py);
+#   - CACHE_BACKEND=redis, EVENTOS_BACKEND=redis, LIMITES_BACKEND=redis y
+#     SESIONES_BACKEND=redis: invalidaciones, eventos, la ventana de lectura
+#     en el primario de replicas.py, los límites de tasa de limites.py y los
+#     tokens revocados de sesiones.py se comparten;
+#   - EXPORT_DIR en un disco compartido si hay varias máquinas (exportacion.py);
+#   - conexiones: workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) por máquina, en el
+#     primario y en cada réplica, por debajo de max_connections de MySQL;
+#   - HASH_WORKERS (seguridad.py) y THREADPOOL_SIZE son por worker: con N
+#     workers, del orden de núcleos / N;
+#   - `alembic upgrade head` una vez antes de desplegar, no en cada worker;
+#   - /metrics es por proceso (ver metricas.py).
+# Las rutas de lectura pueden repartirse entre réplicas (DB_REPLICAS, ver
+# replicas.py); con más carga de lectura se agregan réplicas y workers.
+#
+# Configuración por entorno:
+#   CORS_ORIGENES     orígenes permitidos, separados por coma (por defecto *)
+#   THREADPOOL_SIZE   hilos para rutas y dependencias síncronas (40 por defecto en Starlette)
+#   La de la base de datos está en database.py y replicas.py.
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import anyio
+from fastapi import Depends, FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+import catalogo
+import cache
+import database
+import eventos
+import limites
+import metricas
+import recuperacion
+import replicas
+import seguridad
+import sesiones
+from paginacion import CABECERA_CURSOR
 from router import router
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware 
-# SQLAlchemy ORM
-from database import SessionLocal, Base
-import uuid
 
+CORS_ORIGENES = os.getenv("CORS_ORIGENES", "*").split(",")
+
+metricas.registrar_medidor("lanaapp_hash_pendientes", "Hashes bcrypt en cola o en curso", lambda: seguridad.pendientes)
+metricas.registrar_medidor("lanaapp_cache_entradas", "Entradas en la caché de respuestas",
+                           lambda: cache.backend.tamano() or 0)
+for _clave, _ayuda in (("aciertos", "Respuestas servidas desde la caché"),
+                       ("fallos", "Respuestas calculadas por no estar en la caché"),
+                       ("expulsiones", "Entradas de la caché descartadas por LRU o TTL"),
+                       ("invalidaciones", "Invalidaciones de grupos de la caché por escrituras"),
+                       ("no_modificado", "Respuestas 304 por If-None-Match")):
+    metricas.registrar_medidor(f"lanaapp_cache_{_clave}_total", _ayuda,
+                               lambda clave=_clave: cache.estadisticas[clave], tipo="counter")
+metricas.registrar_medidor("lanaapp_eventos_conexiones", "Conexiones abiertas a /eventos en este proceso",
+                           eventos.difusor.total)
+metricas.registrar_medidor("lanaapp_lecturas_replica", "Sesiones de lectura servidas por una réplica",
+                           lambda: replicas.estadisticas["replica"])
+metricas.registrar_medidor("lanaapp_lecturas_primario", "Sesiones de lectura servidas por el primario",
+                           lambda: replicas.estadisticas["primario"])
+metricas.registrar_medidor("lanaapp_hash_admitidas", "Peticiones con bcrypt admitidas y sin terminar",
+                           lambda: limites.admitidas_hash)
+metricas.registrar_medidor("lanaapp_db_esperando_conexion", "Peticiones esperando conexión del pool de la base",
+                           database.esperando_conexion)
+
+
+def _cargar_categorias():
+    # Índice de categorías listo antes de la primera petición
+    db = database.SessionLocal()
+    try:
+        catalogo.indice.cargar(db)
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    if os.getenv("THREADPOOL_SIZE"):
+        anyio.to_thread.current_default_thread_limiter().total_tokens = int(os.getenv("THREADPOOL_SIZE"))
+    await run_in_threadpool(database.calentar)
+    if database.DB_ASYNC:
+        await database.calentar_async()
+    await run_in_threadpool(_cargar_categorias)
+    eventos.backend.iniciar()
+    barrido = asyncio.create_task(recuperacion.barrer()) if recuperacion.BARRIDO_SEGUNDOS > 0 else None
+    try:
+        yield
+    finally:
+        if barrido is not None:
+            barrido.cancel()
+        seguridad.cerrar_pool()
+        await database.cerrar()
+
+
+def crear_app():
+    app = FastAPI(title="LanaApp API", version="1.0.0", lifespan=ciclo_de_vida)
+
+    # El último agregado es el más externo: métricas, CORS y luego admisión
+    app.add_middleware(limites.MiddlewareAdmision)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGENES,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=[CABECERA_CURSOR],
+    )
+    app.add_middleware(metricas.MiddlewareMetricas)
+    app.include_router(router)
 
-# Inicialización de la app
-app = FastAPI(title="LanaApp API", version="1.0.0")
+    @app.get("/metrics", include_in_schema=False)
+    def exponer_metricas():
+        return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4")
 
+    # Cambios en vivo por usuario (Server-Sent Events); ver eventos.py
+    @app.get("/eventos", tags=["Eventos"])
+    async def flujo_eventos(claims: dict = Depends(sesiones.sesion_actual)):
+        return StreamingResponse(
+            eventos.flujo(claims["usuario_id"], claims["exp"]),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"], 
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    return app
 
-app.include_router(router)
 
+app = crear_app()
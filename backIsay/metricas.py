@@ -0,0 +1,217 @@
+# Instrumentación de peticiones y consultas, expuesta en /metrics (formato Prometheus).
+#
+# `MiddlewareMetricas` (main.py) abre un contexto por petición; los eventos
+# del engine (`instrumentar_engine`, database.py) y la carga de objetos ORM
+# suman ahí las consultas, el tiempo en base y las filas hidratadas. Al
+# terminar la petición se vuelca todo a histogramas por ruta.
+#
+# Las respuestas de flujo continuo (Server-Sent Events, /eventos) duran lo
+# que dure la conexión del cliente: no entran en el histograma de latencia ni
+# en el registro de lentas, que solo mentirían; sí en respuestas y consultas.
+#
+# Las métricas viven en el proceso: con varios workers, Prometheus debe
+# consultar cada uno (o usar un solo worker por contenedor).
+#
+# Configuración por entorno:
+#   METRICAS_LENTAS_MS   registra en el log las peticiones más lentas que esto,
+#                        con sus sentencias SQL (por defecto desactivado)
+#   METRICAS_N_MAS_1     repeticiones de una misma sentencia en una petición a
+#                        partir de las cuales se avisa de un posible N+1 (por defecto 10)
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Mapper
+
+METRICAS_LENTAS_MS = float(os.getenv("METRICAS_LENTAS_MS", "0"))
+METRICAS_N_MAS_1 = int(os.getenv("METRICAS_N_MAS_1", "10"))
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Tipos de contenido de respuestas que no terminan por sí solas
+TIPOS_FLUJO = (b"text/event-stream",)
+
+log = logging.getLogger("lanaapp.metricas")
+
+_peticion = contextvars.ContextVar("metricas_peticion", default=None)
+_lock = threading.Lock()
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.cubetas = [0] * len(limites)
+        self.suma = 0.0
+        self.cuenta = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.cubetas[i] += 1
+                break
+        self.suma += valor
+        self.cuenta += 1
+
+
+latencia = defaultdict(lambda: Histograma(LIMITES_SEGUNDOS))
+consultas = defaultdict(lambda: Histograma(LIMITES_CONSULTAS))
+tiempo_db = defaultdict(lambda: Histograma(LIMITES_SEGUNDOS))
+filas_hidratadas = Counter()
+respuestas = Counter()
+lentas = Counter()
+n_mas_1 = Counter()
+rechazos = Counter()
+
+# Medidores extra registrados por otros módulos: nombre -> (ayuda, función)
+medidores = {}
+
+
+def registrar_medidor(nombre, ayuda, funcion, tipo="gauge"):
+    """Valor que otro módulo calcula al exponer; `tipo` counter si solo crece."""
+    medidores[nombre] = (ayuda, funcion, tipo)
+
+
+def registrar_rechazo(metodo, ruta, motivo):
+    """Petición rechazada por límite de tasa o por admisión (limites.py)."""
+    with _lock:
+        rechazos[(metodo, ruta, motivo)] += 1
+
+
+# --- Eventos de SQLAlchemy ---
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    context._metricas_inicio = time.perf_counter()
+
+
+def _despues(conn, cursor, statement, parameters, context, executemany):
+    datos = _peticion.get()
+    if datos is None:
+        return
+    duracion = time.perf_counter() - getattr(context, "_metricas_inicio", time.perf_counter())
+    datos["consultas"] += 1
+    datos["tiempo_db"] += duracion
+    datos["sentencias"][statement] += 1
+    if METRICAS_LENTAS_MS:
+        datos["detalle"].append((duracion, statement))
+
+
+def _cargado(objeto, contexto):
+    datos = _peticion.get()
+    if datos is not None:
+        datos["filas"] += 1
+
+
+def instrumentar_engine(engine):
+    event.listen(engine, "before_cursor_execute", _antes)
+    event.listen(engine, "after_cursor_execute", _despues)
+
+
+event.listen(Mapper, "load", _cargado)
+
+
+# --- Middleware ---
+
+class MiddlewareMetricas:
+    """Middleware ASGI: mide cada petición HTTP de principio a fin del cuerpo."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        datos = {"consultas": 0, "tiempo_db": 0.0, "filas": 0, "sentencias": Counter(), "detalle": []}
+        token = _peticion.set(datos)
+        inicio = time.perf_counter()
+        estado = [500]
+        flujo = [False]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+                tipo = dict(mensaje.get("headers", [])).get(b"content-type", b"")
+                flujo[0] = tipo.startswith(TIPOS_FLUJO)
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _peticion.reset(token)
+            ruta = scope.get("route")
+            _registrar(scope["method"], ruta.path if ruta else "sin_ruta", estado[0],
+                       None if flujo[0] else time.perf_counter() - inicio, datos)
+
+
+def _registrar(metodo, ruta, estado, duracion, datos):
+    """`duracion` None: respuesta de flujo continuo, fuera de latencia y lentas."""
+    clave = (metodo, ruta)
+    with _lock:
+        if duracion is not None:
+            latencia[clave].observar(duracion)
+        consultas[clave].observar(datos["consultas"])
+        tiempo_db[clave].observar(datos["tiempo_db"])
+        filas_hidratadas[clave] += datos["filas"]
+        respuestas[clave + (str(estado),)] += 1
+
+    repetidas = [(s, n) for s, n in datos["sentencias"].items() if n >= METRICAS_N_MAS_1]
+    if repetidas:
+        with _lock:
+            n_mas_1[clave] += 1
+        sentencia, veces = max(repetidas, key=lambda x: x[1])
+        log.warning("Posible N+1 en %s %s: %d ejecuciones de %s", metodo, ruta, veces, " ".join(sentencia.split()))
+
+    if METRICAS_LENTAS_MS and duracion is not None and duracion * 1000 >= METRICAS_LENTAS_MS:
+        with _lock:
+            lentas[clave] += 1
+        detalle = "".join(f"\n  {d * 1000:8.2f} ms  {' '.join(s.split())}" for d, s in datos["detalle"])
+        log.warning("Petición lenta %s %s: %.1f ms, %d consultas, %.1f ms en base%s",
+                    metodo, ruta, duracion * 1000, datos["consultas"], datos["tiempo_db"] * 1000, detalle)
+
+
+# --- Exposición ---
+
+def _etiquetas(metodo, ruta, **extra):
+    pares = {"metodo": metodo, "ruta": ruta, **extra}
+    return ",".join(f'{k}="{v}"' for k, v in pares.items())
+
+
+def _histograma(lineas, nombre, ayuda, datos):
+    lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} histogram"]
+    for (metodo, ruta), h in sorted(datos.items()):
+        acumulado = 0
+        for limite, n in zip(h.limites, h.cubetas):
+            acumulado += n
+            lineas.append(f'{nombre}_bucket{{{_etiquetas(metodo, ruta, le=limite)}}} {acumulado}')
+        lineas.append(f'{nombre}_bucket{{{_etiquetas(metodo, ruta, le="+Inf")}}} {h.cuenta}')
+        lineas.append(f"{nombre}_sum{{{_etiquetas(metodo, ruta)}}} {h.suma}")
+        lineas.append(f"{nombre}_count{{{_etiquetas(metodo, ruta)}}} {h.cuenta}")
+
+
+def _contador(lineas, nombre, ayuda, datos, etiqueta="estado"):
+    lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} counter"]
+    for clave, n in sorted(datos.items()):
+        extra = {etiqueta: clave[2]} if len(clave) > 2 else {}
+        lineas.append(f"{nombre}{{{_etiquetas(clave[0], clave[1], **extra)}}} {n}")
+
+
+def exponer():
+    lineas = []
+    with _lock:
+        _histograma(lineas, "lanaapp_peticion_segundos", "Latencia de las peticiones HTTP", latencia)
+        _histograma(lineas, "lanaapp_peticion_consultas", "Consultas SQL por petición", consultas)
+        _histograma(lineas, "lanaapp_peticion_db_segundos", "Tiempo en base por petición", tiempo_db)
+        _contador(lineas, "lanaapp_filas_hidratadas_total", "Objetos ORM cargados", filas_hidratadas)
+        _contador(lineas, "lanaapp_respuestas_total", "Respuestas por estado HTTP", respuestas)
+        _contador(lineas, "lanaapp_n_mas_1_total", "Peticiones con una sentencia repetida muchas veces", n_mas_1)
+        _contador(lineas, "lanaapp_peticiones_lentas_total", "Peticiones sobre METRICAS_LENTAS_MS", lentas)
+        _contador(lineas, "lanaapp_rechazos_total", "Peticiones rechazadas por límite de tasa o admisión",
+                  rechazos, etiqueta="motivo")
+    for nombre, (ayuda, funcion, tipo) in sorted(medidores.items()):
+        lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}", f"{nombre} {funcion()}"]
+    return "\n".join(lineas) + "\n"
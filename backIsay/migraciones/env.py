@@ -0,0 +1,48 @@
+# Entorno de Alembic: la misma URL que la aplicación (database.py) y los
+# modelos de models.py como referencia para `alembic revision --autogenerate`.
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+import database
+import models
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = models.Base.metadata
+
+
+def correr_sin_conexion():
+    # `alembic upgrade head --sql`: escribe el SQL en lugar de ejecutarlo
+    context.configure(url=database.SQLALCHEMY_DATABASE_URL, target_metadata=target_metadata,
+                      literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _comparar_en(dialecto):
+    def incluir(objeto, nombre, tipo, reflejado, comparado):
+        # En MySQL transacciones está particionada y no admite llaves foráneas (0001, particiones.py)
+        return not (dialecto == "mysql" and tipo == "foreign_key_constraint"
+                    and objeto.parent.name == "transacciones")
+    return incluir
+
+
+def correr_con_conexion():
+    motor = create_engine(database.SQLALCHEMY_DATABASE_URL, poolclass=pool.NullPool)
+    with motor.connect() as conexion:
+        # SQLite no tiene ALTER completo: Alembic recrea la tabla (batch)
+        context.configure(connection=conexion, target_metadata=target_metadata,
+                          render_as_batch=conexion.dialect.name == "sqlite",
+                          include_object=_comparar_en(conexion.dialect.name))
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    correr_sin_conexion()
+else:
+    correr_con_conexion()
@@ -0,0 +1,287 @@
+"""esquema inicial
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 15:57:24
+
+Crea las tablas de models.py. En una base creada antes con lanaapp.sql solo
+crea las que falten y, en MySQL, la alinea con los modelos:
+  - `tipo` de categorias/transacciones/transacciones_archivo: 'gasto' pasa a
+    'egreso' y se admite 'ahorro' (quitar el valor del ENUM reescribe la tabla);
+  - pagos_fijos recibe `categoria_id` (la primera categoría de egreso del
+    usuario o predeterminada) y las columnas e índices que se agregaron después.
+En MySQL una base nueva recibe transacciones particionada por mes, como en
+lanaapp.sql; una existente sin particiones la convierte la migración 0004.
+Los montos de esas bases se convierten aparte y sin detener la API con
+migrar_dinero.py; luego conviene `python resumen_mensual.py --reconstruir`.
+"""
+import logging
+from datetime import date
+
+from alembic import context, op
+import sqlalchemy as sa
+
+import particiones
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger("alembic.runtime.migration")
+
+TIPOS = ("ingreso", "egreso", "ahorro")
+AHORA = sa.text("CURRENT_TIMESTAMP")
+
+
+def _actualizacion():
+    return sa.Column("fecha_actualizacion", sa.TIMESTAMP(), server_default=AHORA, nullable=False)
+
+
+# Restricciones únicas con nombre por tabla, para agregarlas a bases existentes
+UNICAS = {}
+
+
+def _unica(tabla, nombre, *columnas):
+    if (nombre, list(columnas)) not in UNICAS.setdefault(tabla, []):
+        UNICAS[tabla].append((nombre, list(columnas)))
+    return sa.UniqueConstraint(*columnas, name=nombre)
+
+
+def _transacciones(particionada=False):
+    """Particionada (MySQL, ver particiones.py): llave (id, fecha) y sin llaves foráneas."""
+    def foranea(tabla):
+        return () if particionada else (sa.ForeignKey(f"{tabla}.id"),)
+
+    return [
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("usuario_id", sa.Integer(), *foranea("usuarios"), nullable=False),
+        sa.Column("monto_centavos", sa.BigInteger(), nullable=False),
+        sa.Column("categoria_id", sa.Integer(), *foranea("categorias"), nullable=False),
+        sa.Column("tipo", sa.Enum(*TIPOS), nullable=False),
+        sa.Column("descripcion", sa.String(255), nullable=True),
+        sa.Column("fecha", sa.Date(), primary_key=particionada, nullable=False),
+        sa.Column("es_recurrente", sa.Boolean(), nullable=True),
+        sa.Column("id_recurrente", sa.Integer(), nullable=True),
+        sa.Column("fecha_creacion", sa.TIMESTAMP(), server_default=AHORA, nullable=False),
+        _actualizacion(),
+        _unica("transacciones", "uq_trans_recurrente_fecha", "id_recurrente", "fecha"),
+    ]
+
+
+# (tabla, columnas y restricciones, índices [(nombre, columnas, único)])
+TABLAS = [
+    ("usuarios", [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("nombre_usuario", sa.String(50), nullable=False, unique=True),
+        sa.Column("correo", sa.String(100), nullable=False, unique=True),
+        sa.Column("contraseña_hash", sa.String(255), nullable=False),
+        sa.Column("telefono", sa.String(20), nullable=True),
+        sa.Column("esta_activo", sa.Boolean(), nullable=True),
+        sa.Column("fecha_creacion", sa.TIMESTAMP(), server_default=AHORA, nullable=False),
+        _actualizacion(),
+    ], [("ix_usuarios_id", ["id"], False)]),
+    ("categorias", [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("nombre", sa.String(50), nullable=False),
+        sa.Column("tipo", sa.Enum("ingreso", "egreso"), nullable=False),
+        sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=True),
+        sa.Column("es_predeterminada", sa.Boolean(), nullable=True),
+    ], [("ix_categorias_id", ["id"], False)]),
+    ("presupuestos", [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=False),
+        sa.Column("categoria_id", sa.Integer(), sa.ForeignKey("categorias.id"), nullable=False),
+        sa.Column("monto_centavos", sa.BigInteger(), nullable=False),
+        sa.Column("ano", sa.Integer(), nullable=False),
+        sa.Column("mes", sa.Integer(), nullable=False),
+        sa.Column("fecha_creacion", sa.TIMESTAMP(), server_default=AHORA, nullable=False),
+        _actualizacion(),
+        _unica("presupuestos", "uq_presup_usuario_cat_mes_ano", "usuario_id", "categoria_id", "mes", "ano"),
+    ], [("ix_presupuestos_id", ["id"], False),
+        ("idx_presup_usuario_actualizacion", ["usuario_id", "fecha_actualizacion", "id"], False)]),
+    ("transacciones", _transacciones(), [("ix_transacciones_id", ["id"], False),
+        ("idx_trans_usuario_fecha_id", ["usuario_id", "fecha", "id"], False),
+        ("idx_trans_usuario_actualizacion", ["usuario_id", "fecha_actualizacion", "id"], False)]),
+    ("transacciones_archivo", [
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("usuario_id", sa.Integer(), nullable=False),
+        sa.Column("monto_centavos", sa.BigInteger(), nullable=False),
+        sa.Column("categoria_id", sa.Integer(), nullable=False),
+        sa.Column("tipo", sa.Enum(*TIPOS), nullable=False),
+        sa.Column("descripcion", sa.String(255), nullable=True),
+        sa.Column("fecha", sa.Date(), nullable=False),
+        sa.Column("es_recurrente", sa.Boolean(), nullable=True),
+        sa.Column("id_recurrente", sa.Integer(), nullable=True),
+        sa.Column("fecha_creacion", sa.TIMESTAMP(), nullable=True),
+    ], [("idx_archivo_usuario_fecha", ["usuario_id", "fecha"], False)]),
+    ("pagos_fijos", [
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("descripcion", sa.String(255), nullable=False),
+        sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=False),
+        sa.Column("categoria_id", sa.Integer(), sa.ForeignKey("categorias.id"), nullable=False),
+        sa.Column("monto_centavos", sa.BigInteger(), nullable=False),
+        sa.Column("fecha", sa.Date(), nullable=False),
+        sa.Column("proximo_cobro", sa.Date(), nullable=True),
+        sa.Column("fecha_creacion", sa.TIMESTAMP(), server_default=AHORA, nullable=False),
+        _actualizacion(),
+    ], [("ix_pagos_fijos_id", ["id"], False),
+        ("idx_pagos_fijos_usuario_proximo", ["usuario_id", "proximo_cobro"], False),
+        ("idx_pagos_fijos_usuario_actualizacion", ["usuario_id", "fecha_actualizacion", "id"], False)]),
+    ("eliminaciones", [
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("usuario_id", sa.Integer(), nullable=False),
+        sa.Column("entidad", sa.Enum("transaccion", "presupuesto", "pago_fijo"), nullable=False),
+        sa.Column("entidad_id", sa.Integer(), nullable=False),
+        sa.Column("fecha", sa.TIMESTAMP(), server_default=AHORA, nullable=False),
+    ], [("idx_eliminaciones_usuario_fecha", ["usuario_id", "fecha", "id"], False)]),
+    ("sync_operaciones", [
+        sa.Column("usuario_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("clave", sa.String(64), primary_key=True),
+        sa.Column("resultado", sa.String(500), nullable=False),
+        sa.Column("fecha", sa.TIMESTAMP(), server_default=AHORA, nullable=False),
+    ], [("ix_sync_operaciones_fecha", ["fecha"], False)]),
+    ("password_resets", [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=False),
+        sa.Column("token", sa.String(100), nullable=False),
+        sa.Column("expires_at", sa.TIMESTAMP(), nullable=False),
+    ], [("ix_password_resets_id", ["id"], False), ("ix_password_resets_token", ["token"], True)]),
+    ("notificaciones", [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=False),
+        sa.Column("tipo", sa.Enum("correo", "sms"), nullable=False),
+        sa.Column("asunto", sa.String(100), nullable=False),
+        sa.Column("mensaje", sa.Text(), nullable=False),
+        sa.Column("fue_enviada", sa.Boolean(), nullable=True),
+        sa.Column("fecha_creacion", sa.TIMESTAMP(), server_default=AHORA, nullable=False),
+        sa.Column("fecha_programada", sa.TIMESTAMP(), nullable=True),
+        sa.Column("fecha_envio", sa.TIMESTAMP(), nullable=True),
+        sa.Column("intentos", sa.Integer(), server_default="0", nullable=False),
+    ], [("ix_notificaciones_id", ["id"], False),
+        ("idx_notif_pendientes", ["fue_enviada", "fecha_programada"], False)]),
+    ("resumen_mensual", [
+        sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id"), primary_key=True),
+        sa.Column("ano", sa.Integer(), primary_key=True),
+        sa.Column("mes", sa.Integer(), primary_key=True),
+        sa.Column("tipo", sa.Enum(*TIPOS), primary_key=True),
+        sa.Column("categoria_id", sa.Integer(), sa.ForeignKey("categorias.id"), primary_key=True),
+        sa.Column("total_centavos", sa.BigInteger(), nullable=False),
+        sa.Column("cantidad", sa.Integer(), nullable=False),
+    ], []),
+    ("pronosticos", [
+        sa.Column("usuario_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("tipo", sa.Enum(*TIPOS), primary_key=True),
+        sa.Column("categoria_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("ano", sa.Integer(), nullable=False),
+        sa.Column("mes", sa.Integer(), nullable=False),
+        sa.Column("base", sa.Float(), nullable=False),
+        sa.Column("pendiente", sa.Float(), nullable=False),
+        sa.Column("desviacion", sa.Float(), nullable=False),
+        sa.Column("meses", sa.Integer(), nullable=False),
+        sa.Column("monto_medio", sa.Float(), nullable=True),
+        sa.Column("monto_desviacion", sa.Float(), nullable=True),
+        sa.Column("muestras", sa.Integer(), nullable=False),
+        sa.Column("fecha_calculo", sa.TIMESTAMP(), server_default=AHORA, nullable=False),
+    ], []),
+    ("anomalias", [
+        sa.Column("transaccion_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("usuario_id", sa.Integer(), nullable=False),
+        sa.Column("categoria_id", sa.Integer(), nullable=False),
+        sa.Column("fecha", sa.Date(), nullable=False),
+        sa.Column("monto_centavos", sa.BigInteger(), nullable=False),
+        sa.Column("esperado", sa.Float(), nullable=False),
+        sa.Column("puntaje", sa.Float(), nullable=False),
+    ], [("idx_anomalias_usuario_fecha", ["usuario_id", "fecha"], False)]),
+]
+
+# Columnas agregadas después de la primera versión de lanaapp.sql
+COLUMNAS_POSTERIORES = {
+    "notificaciones": [lambda: sa.Column("intentos", sa.Integer(), server_default="0", nullable=False)],
+    "pagos_fijos": [lambda: sa.Column("proximo_cobro", sa.Date(), nullable=True), _actualizacion],
+    "presupuestos": [_actualizacion],
+    "transacciones": [_actualizacion],
+}
+
+
+def upgrade():
+    if context.is_offline_mode():
+        # --sql: el DDL completo para una base vacía
+        existentes = set()
+    else:
+        bind = op.get_bind()
+        inspector = sa.inspect(bind)
+        existentes = set(inspector.get_table_names())
+    mysql = op.get_context().dialect.name == "mysql"
+    for nombre, elementos, indices in TABLAS:
+        if nombre not in existentes:
+            if mysql and nombre == "transacciones":
+                elementos = _transacciones(particionada=True)
+            op.create_table(nombre, *elementos)
+            for indice, columnas, unico in indices:
+                op.create_index(indice, nombre, columnas, unique=unico)
+            if mysql and nombre == "transacciones":
+                # Vacía: del mes actual a MESES_FUTUROS más pmax; el cron de --crear-futuras sigue desde ahí
+                hoy = date.today()
+                particionado, _ = particiones.clausula(
+                    (hoy.year, hoy.month), particiones.sumar_meses(hoy.year, hoy.month, particiones.MESES_FUTUROS))
+                op.execute(f"ALTER TABLE transacciones {particionado}")
+    if existentes and bind.dialect.name == "mysql":
+        _alinear_lanaapp_sql(bind, inspector, existentes)
+
+
+def _alinear_lanaapp_sql(bind, inspector, existentes):
+    for nombre, _, indices in TABLAS:
+        if nombre not in existentes:
+            continue
+        columnas = {c["name"]: c for c in inspector.get_columns(nombre)}
+
+        tipo = columnas.get("tipo")
+        if tipo is not None and "gasto" in getattr(tipo["type"], "enums", ()):
+            finales = ("ingreso", "egreso") if nombre == "categorias" else TIPOS
+            op.execute(f"ALTER TABLE `{nombre}` MODIFY `tipo` ENUM('ingreso','gasto','egreso','ahorro') NOT NULL")
+            # Por bloques: transacciones puede ser grande
+            while bind.execute(sa.text(
+                f"UPDATE `{nombre}` SET `tipo` = 'egreso' WHERE `tipo` = 'gasto' LIMIT 10000"
+            )).rowcount:
+                pass
+            op.execute(f"ALTER TABLE `{nombre}` MODIFY `tipo` ENUM({', '.join(repr(t) for t in finales)}) NOT NULL")
+
+        for crear in COLUMNAS_POSTERIORES.get(nombre, ()):
+            columna = crear()
+            if columna.name not in columnas:
+                op.add_column(nombre, columna)
+
+        if nombre == "pagos_fijos" and "categoria_id" not in columnas:
+            _categoria_pagos_fijos(bind)
+
+        actuales = {i["name"] for i in inspector.get_indexes(nombre)}
+        actuales |= {u["name"] for u in inspector.get_unique_constraints(nombre)}
+        for indice, columnas_indice, unico in indices:
+            if indice not in actuales and not indice.startswith("ix_"):
+                op.create_index(indice, nombre, columnas_indice, unique=unico)
+        for unica, columnas_unica in UNICAS.get(nombre, ()):
+            if unica not in actuales:
+                op.create_unique_constraint(unica, nombre, columnas_unica)
+
+
+def _categoria_pagos_fijos(bind):
+    op.add_column("pagos_fijos", sa.Column("categoria_id", sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE pagos_fijos p SET categoria_id = ("
+        "  SELECT MIN(c.id) FROM categorias c"
+        "  WHERE c.tipo = 'egreso' AND (c.usuario_id = p.usuario_id OR c.es_predeterminada = 1))"
+    )
+    sin_categoria = bind.execute(sa.text("SELECT COUNT(*) FROM pagos_fijos WHERE categoria_id IS NULL")).scalar()
+    if sin_categoria:
+        # No se inventa una categoría: quedan nulos hasta asignarlos a mano
+        log.warning("%s pagos fijos sin categoría de egreso; pagos_fijos.categoria_id queda admitiendo NULL",
+                    sin_categoria)
+        return
+    op.alter_column("pagos_fijos", "categoria_id", existing_type=sa.Integer(), nullable=False)
+    op.create_foreign_key("fk_pagos_fijos_categoria", "pagos_fijos", "categorias", ["categoria_id"], ["id"])
+
+
+def downgrade():
+    for nombre, _, _ in reversed(TABLAS):
+        op.drop_table(nombre)
@@ -0,0 +1,23 @@
+"""índice de vencimiento en password_resets
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 18:20:05
+
+El barrido de recuperacion.py borra los tokens vencidos por lotes; sin este
+índice cada lote recorre la tabla entera.
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_password_resets_expires_at", "password_resets", ["expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_password_resets_expires_at", table_name="password_resets")
@@ -0,0 +1,39 @@
+"""fecha_actualizacion en categorias
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 10:12:41
+
+El índice en memoria de catalogo.py compara una huella de la tabla para
+saber si recargarse; con esta columna la huella cambia también cuando se
+renombra una categoría. En MySQL lleva microsegundos y se actualiza sola con
+cualquier UPDATE, también los hechos con SQL fuera de la API.
+"""
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Una base creada con el lanaapp.sql actual ya la tiene
+    if not context.is_offline_mode() and "fecha_actualizacion" in {
+            c["name"] for c in sa.inspect(op.get_bind()).get_columns("categorias")}:
+        return
+    if op.get_context().dialect.name == "mysql":
+        columna = sa.Column("fecha_actualizacion", mysql.TIMESTAMP(fsp=6), nullable=False,
+                            server_default=sa.text("CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)"))
+    else:
+        columna = sa.Column("fecha_actualizacion", sa.TIMESTAMP(), nullable=False,
+                            server_default=sa.text("CURRENT_TIMESTAMP"))
+    with op.batch_alter_table("categorias") as tabla:
+        tabla.add_column(columna)
+
+
+def downgrade():
+    with op.batch_alter_table("categorias") as tabla:
+        tabla.drop_column("fecha_actualizacion")
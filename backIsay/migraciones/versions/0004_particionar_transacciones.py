@@ -0,0 +1,42 @@
+"""transacciones particionada en MySQL
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 11:03:17
+
+particiones.py (--crear-futuras, --archivar) necesita transacciones
+particionada por mes, como en lanaapp.sql. Una base creada por 0001 antes de
+que lo hiciera, o con un lanaapp.sql anterior, la tiene sin particiones: aquí
+se convierte con particiones.convertir (quita las llaves foráneas, llave
+primaria (id, fecha), un mes por partición desde la transacción más vieja).
+Reescribe la tabla con un bloqueo; en una base grande, correr esta migración
+en una ventana de mantenimiento. En otros motores no hace nada.
+"""
+import logging
+
+from alembic import context, op
+
+import particiones
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger("alembic.runtime.migration")
+
+
+def upgrade():
+    # --sql parte de una base vacía, y 0001 ya la crea particionada
+    if context.is_offline_mode() or op.get_context().dialect.name != "mysql":
+        return
+    bind = op.get_bind()
+    if particiones.listar(bind):
+        return
+    meses = particiones.convertir(bind)
+    log.info("transacciones particionada en %d meses más pmax", meses)
+
+
+def downgrade():
+    # Las particiones no estorban a versiones anteriores del esquema
+    pass
@@ -0,0 +1,64 @@
+"""versión de cambios por usuario para /sync
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-20 09:41:17
+
+/sync recorría los cambios por fecha_actualizacion hasta NOW() menos un
+margen de segundos y se saltaba las filas de transacciones que confirmaban
+después de ese margen. Ahora cada escritura lleva la versión del usuario,
+que sigue el orden de los commits (ver versiones.py), y el delta se recorre
+por (version, id). Las filas existentes quedan con versión 0; los cursores
+anteriores ya no valen y esos clientes reciben una sincronización completa.
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# tabla -> (índice por fecha que reemplaza, índice por versión)
+INDICES = {
+    "transacciones": ("idx_trans_usuario_actualizacion", "idx_trans_usuario_version"),
+    "presupuestos": ("idx_presup_usuario_actualizacion", "idx_presup_usuario_version"),
+    "pagos_fijos": ("idx_pagos_fijos_usuario_actualizacion", "idx_pagos_fijos_usuario_version"),
+    "eliminaciones": ("idx_eliminaciones_usuario_fecha", "idx_eliminaciones_usuario_version"),
+}
+COLUMNAS_VIEJAS = {"eliminaciones": ["usuario_id", "fecha", "id"]}
+
+
+def _version():
+    return sa.Column("version", sa.BigInteger(), server_default=sa.text("0"), nullable=False)
+
+
+def upgrade():
+    # Una base creada con el lanaapp.sql actual ya tiene todo
+    inspector = None if context.is_offline_mode() else sa.inspect(op.get_bind())
+    if inspector is None or not inspector.has_table("sync_versiones"):
+        op.create_table(
+            "sync_versiones",
+            sa.Column("usuario_id", sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column("version", sa.BigInteger(), server_default=sa.text("0"), nullable=False),
+            sa.Column("purgado", sa.BigInteger(), server_default=sa.text("0"), nullable=False),
+        )
+    for tabla, (viejo, nuevo) in INDICES.items():
+        columnas = {c["name"] for c in inspector.get_columns(tabla)} if inspector else set()
+        indices = {i["name"] for i in inspector.get_indexes(tabla)} if inspector else {viejo}
+        with op.batch_alter_table(tabla) as t:
+            if "version" not in columnas:
+                t.add_column(_version())
+            if viejo in indices:
+                t.drop_index(viejo)
+            if nuevo not in indices:
+                t.create_index(nuevo, ["usuario_id", "version", "id"])
+
+
+def downgrade():
+    for tabla, (viejo, nuevo) in INDICES.items():
+        with op.batch_alter_table(tabla) as t:
+            t.drop_index(nuevo)
+            t.create_index(viejo, COLUMNAS_VIEJAS.get(tabla, ["usuario_id", "fecha_actualizacion", "id"]))
+            t.drop_column("version")
+    op.drop_table("sync_versiones")
@@ -0,0 +1,46 @@
+"""estado y reclamo de notificaciones
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-21 11:05:32
+
+notificaciones_worker.py mantenía abierta una transacción con
+SELECT ... FOR UPDATE mientras enviaba, reintentaba y esperaba. Ahora reclama
+el lote (estado `enviando`, reclamada_por, reclamada_en), confirma, envía
+sin transacción y al final deja cada fila en `enviada`, `pendiente` o
+`fallida` con el error. Las filas ya enviadas pasan a `enviada`.
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+ESTADOS = ("pendiente", "enviando", "enviada", "fallida")
+
+
+def upgrade():
+    # Una base creada con el lanaapp.sql actual ya las tiene
+    if not context.is_offline_mode() and "estado" in {
+            c["name"] for c in sa.inspect(op.get_bind()).get_columns("notificaciones")}:
+        return
+    with op.batch_alter_table("notificaciones") as tabla:
+        tabla.add_column(sa.Column("estado", sa.Enum(*ESTADOS), nullable=False, server_default="pendiente"))
+        tabla.add_column(sa.Column("reclamada_por", sa.String(64), nullable=True))
+        tabla.add_column(sa.Column("reclamada_en", sa.TIMESTAMP(), nullable=True))
+        tabla.add_column(sa.Column("error", sa.String(255), nullable=True))
+        tabla.drop_index("idx_notif_pendientes")
+        tabla.create_index("idx_notif_pendientes", ["estado", "fecha_programada"])
+    op.execute("UPDATE notificaciones SET estado = 'enviada' WHERE fue_enviada = 1")
+
+
+def downgrade():
+    with op.batch_alter_table("notificaciones") as tabla:
+        tabla.drop_index("idx_notif_pendientes")
+        tabla.create_index("idx_notif_pendientes", ["fue_enviada", "fecha_programada"])
+        tabla.drop_column("error")
+        tabla.drop_column("reclamada_en")
+        tabla.drop_column("reclamada_por")
+        tabla.drop_column("estado")
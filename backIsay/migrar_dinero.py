@@ -0,0 +1,206 @@
+# Convierte los montos de una base existente a centavos enteros (dinero.py).
+#
+#   python migrar_dinero.py --preparar           (solo MySQL)
+#   python migrar_dinero.py --copiar [--bloque 5000] [--pausa 0.1]
+#   python migrar_dinero.py --verificar
+#   python migrar_dinero.py --retirar            (solo MySQL)
+#
+# Las bases creadas antes guardan los montos como FLOAT/DOUBLE/DECIMAL en
+# `monto` (o `total`); el código actual lee y escribe `monto_centavos`
+# (`total_centavos`). La conversión se hace sin detener la API:
+#
+#   1. --preparar  agrega la columna nueva (BIGINT, nula), deja la anterior
+#                  admitiendo NULL (el código nuevo ya no la escribe) y crea
+#                  triggers que, mientras siga corriendo la versión anterior,
+#                  copian a centavos lo que esta inserte o cambie.
+#   2. --copiar    rellena las filas existentes por bloques de llave
+#                  primaria, con un commit por bloque; nunca pisa un valor ya
+#                  puesto por los triggers. Se puede interrumpir y repetir.
+#   3. --verificar cuenta las filas sin convertir y las que no cuadran.
+#   4. Desplegar la versión que usa centavos.
+#   5. --retirar   quita los triggers, marca la columna nueva NOT NULL y
+#                  borra la anterior.
+#
+# La conversión se hace en Python desde el texto del número (0.285 -> 29
+# centavos), no multiplicando el binario en SQL. Después conviene correr
+# `python resumen_mensual.py --reconstruir` para recalcular los acumulados
+# sumando centavos.
+import argparse
+import time
+
+from sqlalchemy import bindparam, column, func, inspect, select, table, text, tuple_, update
+
+from dinero import a_centavos
+
+TAMANO_BLOQUE = 5000
+
+# (tabla, columna anterior, columna nueva, llave primaria)
+COLUMNAS = [
+    ("transacciones", "monto", "monto_centavos", ["id", "fecha"]),
+    ("transacciones_archivo", "monto", "monto_centavos", ["id"]),
+    ("pagos_fijos", "monto", "monto_centavos", ["id"]),
+    ("presupuestos", "monto", "monto_centavos", ["id"]),
+    ("resumen_mensual", "total", "total_centavos", ["usuario_id", "ano", "mes", "tipo", "categoria_id"]),
+    ("anomalias", "monto", "monto_centavos", ["transaccion_id"]),
+]
+
+
+def _es_mysql(db):
+    return db.get_bind().dialect.name == "mysql"
+
+
+def _columnas_actuales(db, tabla):
+    return {
+        nombre: tipo for nombre, tipo in db.execute(text(
+            "SELECT COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla"
+        ), {"tabla": tabla})
+    }
+
+
+def _triggers(tabla, viejo, nuevo):
+    return [
+        (f"trg_{tabla}_centavos_ins",
+         f"CREATE TRIGGER `trg_{tabla}_centavos_ins` BEFORE INSERT ON `{tabla}` FOR EACH ROW "
+         f"SET NEW.`{nuevo}` = IF(NEW.`{nuevo}` IS NULL AND NEW.`{viejo}` IS NOT NULL, "
+         f"ROUND(NEW.`{viejo}` * 100), NEW.`{nuevo}`)"),
+        # Solo si la versión anterior cambió el monto; las escrituras nuevas no tocan `viejo`
+        (f"trg_{tabla}_centavos_upd",
+         f"CREATE TRIGGER `trg_{tabla}_centavos_upd` BEFORE UPDATE ON `{tabla}` FOR EACH ROW "
+         f"SET NEW.`{nuevo}` = IF(NOT (NEW.`{viejo}` <=> OLD.`{viejo}`), "
+         f"ROUND(NEW.`{viejo}` * 100), NEW.`{nuevo}`)"),
+    ]
+
+
+def preparar(db):
+    if not _es_mysql(db):
+        raise SystemExit("--preparar solo aplica a MySQL; en otras bases cree el esquema de nuevo")
+    hechas = []
+    for tabla, viejo, nuevo, _ in COLUMNAS:
+        actuales = _columnas_actuales(db, tabla)
+        if not actuales or viejo not in actuales:
+            continue
+        if nuevo not in actuales:
+            # ADD COLUMN al final es instantáneo en MySQL 8
+            db.execute(text(f"ALTER TABLE `{tabla}` ADD COLUMN `{nuevo}` BIGINT NULL"))
+        db.execute(text(f"ALTER TABLE `{tabla}` MODIFY `{viejo}` {actuales[viejo]} NULL, "
+                        f"ALGORITHM=INPLACE, LOCK=NONE"))
+        for nombre, sentencia in _triggers(tabla, viejo, nuevo):
+            db.execute(text(f"DROP TRIGGER IF EXISTS `{nombre}`"))
+            db.execute(text(sentencia))
+        hechas.append(tabla)
+    return hechas
+
+
+def _pendientes(db):
+    """Las entradas de COLUMNAS que todavía tienen las dos columnas."""
+    inspector = inspect(db.get_bind())
+    for nombre, viejo, nuevo, llave in COLUMNAS:
+        if inspector.has_table(nombre):
+            actuales = {c["name"] for c in inspector.get_columns(nombre)}
+            if {viejo, nuevo} <= actuales:
+                yield nombre, viejo, nuevo, llave
+
+
+def _tabla(nombre, viejo, nuevo, llave):
+    return table(nombre, *(column(c) for c in llave), column(viejo), column(nuevo))
+
+
+def copiar(db, bloque=TAMANO_BLOQUE, pausa=0.0):
+    """Rellena la columna en centavos de cada tabla; devuelve filas convertidas por tabla."""
+    convertidas = {}
+    for nombre, viejo, nuevo, llave in list(_pendientes(db)):
+        t = _tabla(nombre, viejo, nuevo, llave)
+        pk = [t.c[c] for c in llave]
+        poner = (
+            update(t)
+            .where(*(t.c[c] == bindparam(f"_{c}") for c in llave), t.c[nuevo].is_(None))
+            .values({nuevo: bindparam("_centavos")})
+        )
+        ultimo, total = None, 0
+        while True:
+            sel = select(*pk, t.c[viejo]).where(t.c[nuevo].is_(None), t.c[viejo].isnot(None))
+            if ultimo is not None:
+                sel = sel.where(tuple_(*pk) > tuple_(*ultimo))
+            filas = db.execute(sel.order_by(*pk).limit(bloque)).all()
+            if not filas:
+                break
+            db.execute(poner, [
+                {**{f"_{c}": v for c, v in zip(llave, f[:-1])}, "_centavos": a_centavos(f[-1])}
+                for f in filas
+            ])
+            db.commit()
+            ultimo = tuple(filas[-1][:-1])
+            total += len(filas)
+            if pausa:
+                time.sleep(pausa)
+        convertidas[nombre] = total
+    return convertidas
+
+
+def verificar(db):
+    """Por tabla: (filas sin convertir, filas cuyo valor en centavos no cuadra con el anterior)."""
+    resultado = {}
+    for nombre, viejo, nuevo, llave in list(_pendientes(db)):
+        t = _tabla(nombre, viejo, nuevo, llave)
+        pendientes = db.execute(
+            select(func.count()).select_from(t).where(t.c[nuevo].is_(None), t.c[viejo].isnot(None))
+        ).scalar()
+        # Más de un centavo de diferencia: el redondeo de los FLOAT puede mover uno
+        distintas = db.execute(
+            select(func.count()).select_from(t).where(func.abs(t.c[nuevo] - t.c[viejo] * 100) > 1)
+        ).scalar()
+        resultado[nombre] = (pendientes, distintas)
+    return resultado
+
+
+def retirar(db):
+    if not _es_mysql(db):
+        raise SystemExit("--retirar solo aplica a MySQL")
+    for nombre, (pendientes, _) in verificar(db).items():
+        if pendientes:
+            raise SystemExit(f"{nombre} tiene {pendientes} filas sin convertir; corra --copiar")
+    hechas = []
+    for tabla, viejo, nuevo, _ in COLUMNAS:
+        actuales = _columnas_actuales(db, tabla)
+        if viejo not in actuales:
+            continue
+        for nombre, _ in _triggers(tabla, viejo, nuevo):
+            db.execute(text(f"DROP TRIGGER IF EXISTS `{nombre}`"))
+        defecto = " DEFAULT 0" if nuevo == "total_centavos" else ""
+        db.execute(text(f"ALTER TABLE `{tabla}` MODIFY `{nuevo}` BIGINT NOT NULL{defecto}, "
+                        f"ALGORITHM=INPLACE, LOCK=NONE"))
+        db.execute(text(f"ALTER TABLE `{tabla}` DROP COLUMN `{viejo}`"))
+        hechas.append(tabla)
+    return hechas
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Conversión de montos a centavos")
+    accion = parser.add_mutually_exclusive_group(required=True)
+    accion.add_argument("--preparar", action="store_true", help="agrega las columnas en centavos y los triggers")
+    accion.add_argument("--copiar", action="store_true", help="convierte las filas existentes por bloques")
+    accion.add_argument("--verificar", action="store_true", help="cuenta filas pendientes o que no cuadran")
+    accion.add_argument("--retirar", action="store_true", help="quita triggers y columnas anteriores")
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE)
+    parser.add_argument("--pausa", type=float, default=0.0, help="segundos entre bloques (réplicas)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.preparar:
+            print("Preparadas: " + (", ".join(preparar(db)) or "ninguna"))
+            db.commit()
+        elif args.copiar:
+            for tabla, n in copiar(db, args.bloque, args.pausa).items():
+                print(f"{tabla}: {n} filas convertidas")
+        elif args.verificar:
+            for tabla, (pendientes, distintas) in verificar(db).items():
+                print(f"{tabla:22s} pendientes={pendientes} distintas={distintas}")
+        elif args.retirar:
+            print("Retiradas: " + (", ".join(retirar(db)) or "ninguna"))
+            db.commit()
+    finally:
+        db.close()
@@ -1,7 +1,9 @@
 # SQLAlchemy core + func.now()
-from sqlalchemy import Column, Integer, String, Float, Date, Boolean, ForeignKey, DECIMAL, TIMESTAMP, Enum, func
+from sqlalchemy import BigInteger, Column, Integer, String, Text, Float, Date, Boolean, ForeignKey, TIMESTAMP, Enum, Index, UniqueConstraint, func
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import relationship
 from database import Base
+from dinero import Centavos, normalizar
 
 
 # --- Modelos SQLAlchemy ---
@@ -25,6 +27,9 @@ class Categoria(Base):
     tipo              = Column(Enum('ingreso', 'egreso'), nullable=False)
     usuario_id        = Column(Integer, ForeignKey("usuarios.id"), nullable=True)
     es_predeterminada = Column(Boolean, default=False)
+    # Huella del índice en memoria (catalogo.py); en MySQL con microsegundos
+    fecha_actualizacion = Column(TIMESTAMP().with_variant(mysql.TIMESTAMP(fsp=6), "mysql"),
+                                 server_default=func.now(), onupdate=func.now(), nullable=False)
     transacciones     = relationship("Transaccion", back_populates="categoria")
 
 class Presupuesto(Base):
@@ -32,17 +37,25 @@ class Presupuesto(Base):
     id                  = Column(Integer, primary_key=True, index=True)
     usuario_id          = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
     categoria_id        = Column(Integer, ForeignKey("categorias.id"), nullable=False)
-    monto               = Column(DECIMAL(10, 2), nullable=False)
+    monto               = Column("monto_centavos", Centavos, key="monto", nullable=False)
     ano                 = Column(Integer, nullable=False)
     mes                 = Column(Integer, nullable=False)
     fecha_creacion      = Column(TIMESTAMP, server_default=func.now(), nullable=False)
     fecha_actualizacion = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+    version             = Column(BigInteger, server_default="0", nullable=False)  # versiones.py
 
+    __table_args__ = (
+        UniqueConstraint("usuario_id", "categoria_id", "mes", "ano", name="uq_presup_usuario_cat_mes_ano"),
+        Index("idx_presup_usuario_version", "usuario_id", "version", "id"),
+    )
+
+# En MySQL la tabla está particionada por mes: llave (id, fecha) y sin llaves
+# foráneas (migraciones 0001 y 0004). Aquí se declaran para el ORM y SQLite.
 class Transaccion(Base):
     __tablename__ = "transacciones"
     id             = Column(Integer, primary_key=True, index=True, autoincrement=True)
     usuario_id     = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
-    monto          = Column(Float, nullable=False)
+    monto          = Column("monto_centavos", Centavos, key="monto", nullable=False)
     categoria_id   = Column(Integer, ForeignKey("categorias.id"), nullable=False)
     categoria      = relationship("Categoria", back_populates="transacciones")
     tipo           = Column(Enum('ingreso','egreso', 'ahorro'), nullable=False)
@@ -51,6 +64,36 @@ class Transaccion(Base):
     es_recurrente  = Column(Boolean, default=False)
     id_recurrente  = Column(Integer, nullable=True)
     fecha_creacion = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    fecha_actualizacion = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+    version        = Column(BigInteger, server_default="0", nullable=False)  # versiones.py
+
+    __table_args__ = (
+        # Listado paginado por usuario: WHERE usuario_id = ? ORDER BY fecha DESC, id DESC
+        Index("idx_trans_usuario_fecha_id", "usuario_id", "fecha", "id"),
+        # Cambios desde el último /sync: WHERE usuario_id = ? AND (version, id) > cursor
+        Index("idx_trans_usuario_version", "usuario_id", "version", "id"),
+        # Idempotencia de los pagos fijos generados (recurrentes.py)
+        UniqueConstraint("id_recurrente", "fecha", name="uq_trans_recurrente_fecha"),
+    )
+
+class TransaccionArchivo(Base):
+    # Meses cerrados movidos fuera de transacciones (particiones.py --archivar).
+    # Mismas columnas; sin llaves foráneas para que el archivo no frene borrados.
+    __tablename__ = "transacciones_archivo"
+    id             = Column(Integer, primary_key=True, autoincrement=False)
+    usuario_id     = Column(Integer, nullable=False)
+    monto          = Column("monto_centavos", Centavos, key="monto", nullable=False)
+    categoria_id   = Column(Integer, nullable=False)
+    tipo           = Column(Enum('ingreso','egreso', 'ahorro'), nullable=False)
+    descripcion    = Column(String(255), nullable=True)
+    fecha          = Column(Date, nullable=False)
+    es_recurrente  = Column(Boolean, default=False)
+    id_recurrente  = Column(Integer, nullable=True)
+    fecha_creacion = Column(TIMESTAMP, nullable=True)
+
+    __table_args__ = (
+        Index("idx_archivo_usuario_fecha", "usuario_id", "fecha"),
+    )
 
 class PagoFijo(Base):
     __tablename__ = "pagos_fijos"
@@ -58,16 +101,59 @@ class PagoFijo(Base):
     descripcion    = Column(String(255), nullable=False)
     usuario_id     = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
     categoria_id   = Column(Integer, ForeignKey("categorias.id"), nullable=False)
-    monto          = Column(Float, nullable=False)
+    monto          = Column("monto_centavos", Centavos, key="monto", nullable=False)
     fecha          = Column(Date, nullable=False)
+    # Siguiente fecha por generar como transacción; empieza en `fecha`
+    proximo_cobro  = Column(Date, nullable=True,
+                            default=lambda ctx: ctx.get_current_parameters()["fecha"])
     fecha_creacion = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    fecha_actualizacion = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+    version        = Column(BigInteger, server_default="0", nullable=False)  # versiones.py
+
+    __table_args__ = (
+        # Pagos vencidos por bloques de usuarios: WHERE usuario_id > ? AND proximo_cobro <= hoy
+        Index("idx_pagos_fijos_usuario_proximo", "usuario_id", "proximo_cobro"),
+        Index("idx_pagos_fijos_usuario_version", "usuario_id", "version", "id"),
+    )
+
+# --- Sincronización (sincronizacion.py) ---
+
+class Eliminacion(Base):
+    # Registro de bajas para entregarlas en /sync; se purga tras SYNC_RETENCION_DIAS
+    __tablename__ = "eliminaciones"
+    id         = Column(Integer, primary_key=True, autoincrement=True)
+    usuario_id = Column(Integer, nullable=False)
+    entidad    = Column(Enum('transaccion', 'presupuesto', 'pago_fijo'), nullable=False)
+    entidad_id = Column(Integer, nullable=False)
+    fecha      = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    version    = Column(BigInteger, server_default="0", nullable=False)
+
+    __table_args__ = (
+        Index("idx_eliminaciones_usuario_version", "usuario_id", "version", "id"),
+    )
+
+class VersionSync(Base):
+    # Contador de cambios por usuario (versiones.py); `purgado` es la versión
+    # más alta de las bajas ya borradas por la purga
+    __tablename__ = "sync_versiones"
+    usuario_id = Column(Integer, primary_key=True, autoincrement=False)
+    version    = Column(BigInteger, server_default="0", nullable=False)
+    purgado    = Column(BigInteger, server_default="0", nullable=False)
+
+class OperacionSync(Base):
+    # Resultado de cada mutación ya aplicada, por clave de idempotencia del cliente
+    __tablename__ = "sync_operaciones"
+    usuario_id = Column(Integer, primary_key=True, autoincrement=False)
+    clave      = Column(String(64), primary_key=True)
+    resultado  = Column(String(500), nullable=False)
+    fecha      = Column(TIMESTAMP, server_default=func.now(), nullable=False, index=True)
 
 class PasswordReset(Base):
     __tablename__ = "password_resets"
     id         = Column(Integer, primary_key=True, index=True)
     user_id    = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
     token      = Column(String(100), unique=True, index=True, nullable=False)
-    expires_at = Column(TIMESTAMP, nullable=False)
+    expires_at = Column(TIMESTAMP, nullable=False, index=True)
 
 class Notificacion(Base):
     __tablename__ = "notificaciones"
@@ -75,8 +161,69 @@ class Notificacion(Base):
     usuario_id       = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
     tipo             = Column(Enum('correo','sms'), nullable=False)
     asunto           = Column(String(100), nullable=False)
-    mensaje          = Column(String, nullable=False)
+    mensaje          = Column(Text, nullable=False)
     fue_enviada      = Column(Boolean, default=False)
     fecha_creacion   = Column(TIMESTAMP, server_default=func.now(), nullable=False)
     fecha_programada = Column(TIMESTAMP, nullable=True)
-    fecha_envio      = Column(TIMESTAMP, nullable=True)
\ No newline at end of file
+    fecha_envio      = Column(TIMESTAMP, nullable=True)
+    intentos         = Column(Integer, nullable=False, default=0, server_default="0")
+    # Lo mantiene notificaciones_worker.py: pendiente -> enviando -> enviada | pendiente | fallida
+    estado           = Column(Enum('pendiente','enviando','enviada','fallida'), nullable=False,
+                              default='pendiente', server_default='pendiente')
+    reclamada_por    = Column(String(64), nullable=True)
+    reclamada_en     = Column(TIMESTAMP, nullable=True)
+    error            = Column(String(255), nullable=True)
+
+    __table_args__ = (
+        # Cola del despachador: WHERE estado = 'pendiente' AND fecha_programada <= ahora
+        Index("idx_notif_pendientes", "estado", "fecha_programada"),
+    )
+
+class ResumenMensual(Base):
+    # Acumulado por usuario/mes/tipo/categoría; se mantiene en resumen_mensual.py
+    __tablename__ = "resumen_mensual"
+    usuario_id   = Column(Integer, ForeignKey("usuarios.id"), primary_key=True)
+    ano          = Column(Integer, primary_key=True)
+    mes          = Column(Integer, primary_key=True)
+    tipo         = Column(Enum('ingreso','egreso', 'ahorro'), primary_key=True)
+    categoria_id = Column(Integer, ForeignKey("categorias.id"), primary_key=True)
+    total        = Column("total_centavos", Centavos, key="total", nullable=False, default=0)
+    cantidad     = Column(Integer, nullable=False, default=0)
+
+# --- Pronósticos (pronosticos.py) ---
+
+class Pronostico(Base):
+    # Parámetros por serie (usuario, tipo, categoría), recalculados cada noche
+    __tablename__ = "pronosticos"
+    usuario_id       = Column(Integer, primary_key=True, autoincrement=False)
+    tipo             = Column(Enum('ingreso','egreso', 'ahorro'), primary_key=True)
+    categoria_id     = Column(Integer, primary_key=True, autoincrement=False)
+    ano              = Column(Integer, nullable=False)   # último mes de la historia ajustada
+    mes              = Column(Integer, nullable=False)
+    base             = Column(Float, nullable=False)     # valor ajustado de ese mes
+    pendiente        = Column(Float, nullable=False)     # cambio por mes
+    desviacion       = Column(Float, nullable=False)     # de los residuos mensuales
+    meses            = Column(Integer, nullable=False)
+    monto_medio      = Column(Float, nullable=True)      # por transacción, para anomalías
+    monto_desviacion = Column(Float, nullable=True)
+    muestras         = Column(Integer, nullable=False, default=0)
+    fecha_calculo    = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+
+class Anomalia(Base):
+    # Transacciones recientes fuera del rango usual de su categoría
+    __tablename__ = "anomalias"
+    transaccion_id = Column(Integer, primary_key=True, autoincrement=False)
+    usuario_id     = Column(Integer, nullable=False)
+    categoria_id   = Column(Integer, nullable=False)
+    fecha          = Column(Date, nullable=False)
+    monto          = Column("monto_centavos", Centavos, key="monto", nullable=False)
+    esperado       = Column(Float, nullable=False)
+    puntaje        = Column(Float, nullable=False)       # desviaciones sobre la media
+
+    __table_args__ = (
+        Index("idx_anomalias_usuario_fecha", "usuario_id", "fecha"),
+    )
+
+# Montos en centavos (dinero.py): lo asignado en Python queda como Decimal al centavo
+normalizar(Presupuesto.monto, Transaccion.monto, TransaccionArchivo.monto, PagoFijo.monto,
+           ResumenMensual.total, Anomalia.monto)
@@ -0,0 +1,157 @@
+# Altas, cambios y bajas de transacciones, presupuestos y pagos fijos.
+#
+# Las comparten las rutas REST y POST /sync (sincronizacion.py). Cada función
+# deja la sesión lista (acumulados de resumen_mensual, alertas de
+# presupuesto, registro de eliminaciones para la sincronización) pero no
+# confirma: quien llama hace commit e invalida la caché del grupo. La versión
+# de /sync (versiones.py) se toma antes del upsert del resumen, en el mismo
+# orden de bloqueos que las inserciones masivas.
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+import catalogo
+import presupuestos
+import resumen_mensual
+import versiones
+from models import Eliminacion, PagoFijo, Presupuesto, Transaccion, TransaccionArchivo
+
+
+def _propio(db, modelo, id_, usuario_id, detalle):
+    fila = db.query(modelo).filter(modelo.id == id_, modelo.usuario_id == usuario_id).first()
+    if not fila:
+        raise HTTPException(status_code=404, detail=detalle)
+    return fila
+
+
+def archivada(db, transaccion_id, usuario_id):
+    return db.query(TransaccionArchivo).filter(
+        TransaccionArchivo.id == transaccion_id, TransaccionArchivo.usuario_id == usuario_id
+    ).first()
+
+
+def _transaccion_propia(db, transaccion_id, usuario_id):
+    # Los meses cerrados viven en transacciones_archivo (particiones.py) y son de solo lectura
+    t = db.query(Transaccion).filter(Transaccion.id == transaccion_id, Transaccion.usuario_id == usuario_id).first()
+    if t:
+        return t
+    if archivada(db, transaccion_id, usuario_id):
+        raise HTTPException(status_code=410, detail="Transacción archivada: ya no se puede modificar")
+    raise HTTPException(status_code=404, detail="Transacción no encontrada")
+
+
+def validar_categoria(db, usuario_id, categoria_id):
+    # Sin llave foránea en transacciones (MySQL particionada) y la de las demás
+    # tablas no mira al dueño: solo predeterminadas o del usuario
+    if not catalogo.indice.permitida(db, usuario_id, categoria_id):
+        raise HTTPException(status_code=400, detail="Categoría inexistente o de otro usuario")
+
+
+def _guardar(db):
+    # Choque con una llave única (p. ej. un presupuesto repetido para el mismo mes): 409, no 500
+    try:
+        db.flush()
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Conflicto con datos existentes")
+
+
+def _eliminar(db, fila, entidad):
+    # Las bajas quedan registradas para que /sync las entregue a los clientes
+    db.add(Eliminacion(usuario_id=fila.usuario_id, entidad=entidad, entidad_id=fila.id))
+    db.delete(fila)
+
+
+# --- Transacciones ---
+
+def crear_transaccion(db, usuario_id, datos):
+    validar_categoria(db, usuario_id, datos.categoria_id)
+    versiones.tomar(db, usuario_id)
+    t = Transaccion(**datos.dict(exclude={"usuario_id"}), usuario_id=usuario_id)
+    db.add(t)
+    resumen_mensual.sumar(db, t)
+    presupuestos.alertar(db, presupuestos.deltas([t]))
+    _guardar(db)
+    return t
+
+
+def actualizar_transaccion(db, usuario_id, transaccion_id, datos):
+    t = _transaccion_propia(db, transaccion_id, usuario_id)
+    validar_categoria(db, usuario_id, datos.categoria_id)
+    versiones.tomar(db, usuario_id)
+    # Se descuenta el valor anterior y se suma el nuevo (puede cambiar de mes, tipo o categoría)
+    resumen_mensual.restar(db, t)
+    cambios = presupuestos.deltas([t], -1)
+    for key, value in datos.dict(exclude={"usuario_id"}).items():
+        setattr(t, key, value)
+    resumen_mensual.sumar(db, t)
+    presupuestos.alertar(db, presupuestos.deltas([t], 1, cambios))
+    _guardar(db)
+    return t
+
+
+def eliminar_transaccion(db, usuario_id, transaccion_id):
+    t = _transaccion_propia(db, transaccion_id, usuario_id)
+    versiones.tomar(db, usuario_id)
+    resumen_mensual.restar(db, t)
+    _eliminar(db, t, "transaccion")
+    return t
+
+
+# --- Presupuestos ---
+
+def crear_presupuesto(db, usuario_id, datos):
+    validar_categoria(db, usuario_id, datos.categoria_id)
+    p = Presupuesto(**datos.dict(exclude={"usuario_id"}), usuario_id=usuario_id)
+    db.add(p)
+    _guardar(db)
+    return p
+
+
+def actualizar_presupuesto(db, usuario_id, presupuesto_id, datos):
+    p = _propio(db, Presupuesto, presupuesto_id, usuario_id, "Presupuesto no encontrado")
+    validar_categoria(db, usuario_id, datos.categoria_id)
+    for key, value in datos.dict(exclude={"usuario_id"}).items():
+        setattr(p, key, value)
+    _guardar(db)
+    return p
+
+
+def eliminar_presupuesto(db, usuario_id, presupuesto_id):
+    p = _propio(db, Presupuesto, presupuesto_id, usuario_id, "Presupuesto no encontrado")
+    _eliminar(db, p, "presupuesto")
+    return p
+
+
+# --- Pagos fijos ---
+
+def crear_pago_fijo(db, usuario_id, datos):
+    validar_categoria(db, usuario_id, datos.categoria_id)
+    existe_pago = db.query(PagoFijo.id).filter(
+        PagoFijo.descripcion == datos.descripcion,
+        PagoFijo.usuario_id == usuario_id,
+        PagoFijo.monto == datos.monto
+    ).first()
+    if existe_pago:
+        raise HTTPException(status_code=400, detail="Ya existe un pago fijo similar para este usuario")
+
+    pago = PagoFijo(**datos.dict(exclude={"usuario_id"}), usuario_id=usuario_id)
+    db.add(pago)
+    _guardar(db)
+    return pago
+
+
+def actualizar_pago_fijo(db, usuario_id, pago_id, datos):
+    pago = _propio(db, PagoFijo, pago_id, usuario_id, "Pago fijo no encontrado")
+    validar_categoria(db, usuario_id, datos.categoria_id)
+    for key, value in datos.dict(exclude={"usuario_id"}).items():
+        setattr(pago, key, value)
+    # Si la fecha se mueve hacia adelante, la generación empieza desde ahí
+    if pago.proximo_cobro is None or pago.fecha > pago.proximo_cobro:
+        pago.proximo_cobro = pago.fecha
+    _guardar(db)
+    return pago
+
+
+def eliminar_pago_fijo(db, usuario_id, pago_id):
+    pago = _propio(db, PagoFijo, pago_id, usuario_id, "Pago fijo no encontrado")
+    _eliminar(db, pago, "pago_fijo")
+    return pago
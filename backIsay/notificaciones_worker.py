@@ -0,0 +1,327 @@
+# Despachador de notificaciones programadas (correo / SMS).
+#
+#   python notificaciones_worker.py [--lote 200] [--concurrencia 20] [--falso]
+#
+# Cada vuelta reclama un lote de notificaciones vencidas: con
+# SELECT ... FOR UPDATE SKIP LOCKED las pasa a estado `enviando` a nombre de
+# la instancia (reclamada_por, reclamada_en) y confirma enseguida. Los envíos,
+# reintentos y esperas corren fuera de cualquier transacción y sin conexión
+# abierta; al terminar, otra transacción corta deja cada fila en `enviada`,
+# `pendiente` (con backoff) o `fallida` (con el error en `error`).
+#
+# Varias instancias pueden correr a la vez: cada una salta las filas
+# bloqueadas por las demás y solo cierra las que siguen a su nombre. Si el
+# proceso muere a mitad de un lote, sus filas se quedan en `enviando` y otra
+# instancia las vuelve a reclamar pasados NOTIF_RECLAMO_VENCE segundos
+# (entrega "al menos una vez").
+#
+# Configuración por entorno:
+#   SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_REMITENTE
+#   SMS_URL, SMS_TOKEN          webhook HTTP del proveedor de SMS
+#   CORREOS_POR_SEGUNDO, SMS_POR_SEGUNDO   límite de envío por instancia
+#   NOTIF_MAX_INTENTOS          intentos antes de abandonar una notificación
+#   NOTIF_RECLAMO_VENCE         segundos tras los que un lote `enviando` se da
+#                               por perdido (por defecto 600)
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import smtplib
+import socket
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from sqlalchemy import and_, or_, update
+
+from database import SessionLocal
+from models import Notificacion, Usuario
+
+MAX_INTENTOS = int(os.getenv("NOTIF_MAX_INTENTOS", "5"))
+RECLAMO_VENCE = timedelta(seconds=int(os.getenv("NOTIF_RECLAMO_VENCE", "600")))
+REINTENTOS_INMEDIATOS = 3
+
+log = logging.getLogger("lanaapp.notificaciones")
+
+metricas = {
+    "enviadas": 0,
+    "fallidas": 0,
+    "reintentos": 0,
+    "lotes": 0,
+    "lag_ultimo_s": 0.0,
+    "inicio": time.monotonic(),
+}
+
+
+class ErrorTransitorio(Exception):
+    """Fallo que vale la pena reintentar (red, 4xx de límite, 5xx)."""
+
+
+# --- Límite de tasa ---
+
+class LimiteTasa:
+    """Token bucket: `tasa` envíos por segundo con ráfagas de hasta `rafaga`."""
+
+    def __init__(self, tasa, rafaga=None):
+        self.tasa = tasa
+        self.capacidad = rafaga or max(1, int(tasa))
+        self.tokens = self.capacidad
+        self.ultimo = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def esperar(self):
+        async with self._lock:
+            while True:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+                self.ultimo = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.tasa)
+
+
+# --- Transportes ---
+
+class TransporteSMTP:
+    def __init__(self):
+        self.host = os.getenv("SMTP_HOST", "localhost")
+        self.puerto = int(os.getenv("SMTP_PORT", "25"))
+        self.usuario = os.getenv("SMTP_USER")
+        self.password = os.getenv("SMTP_PASSWORD")
+        self.remitente = os.getenv("SMTP_REMITENTE", "no-reply@lanaapp.com")
+
+    def _enviar(self, destino, asunto, mensaje):
+        msg = EmailMessage()
+        msg["From"] = self.remitente
+        msg["To"] = destino
+        msg["Subject"] = asunto
+        msg.set_content(mensaje)
+        try:
+            with smtplib.SMTP(self.host, self.puerto, timeout=10) as smtp:
+                if self.usuario:
+                    smtp.starttls()
+                    smtp.login(self.usuario, self.password)
+                smtp.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError) as e:
+            raise ErrorTransitorio(str(e))
+
+    async def enviar(self, destino, asunto, mensaje):
+        await asyncio.to_thread(self._enviar, destino, asunto, mensaje)
+
+
+class TransporteSMSHttp:
+    def __init__(self):
+        self.url = os.getenv("SMS_URL", "http://localhost:8025/sms")
+        self.token = os.getenv("SMS_TOKEN", "")
+
+    def _enviar(self, destino, asunto, mensaje):
+        cuerpo = json.dumps({"to": destino, "text": f"{asunto}: {mensaje}"}).encode()
+        req = urllib.request.Request(self.url, data=cuerpo, method="POST", headers={
+            "Content-Type": "application/json", "Authorization": f"Bearer {self.token}",
+        })
+        try:
+            with urllib.request.urlopen(req, timeout=10) as r:
+                r.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                raise ErrorTransitorio(f"HTTP {e.code}")
+            raise
+        except (urllib.error.URLError, OSError) as e:
+            raise ErrorTransitorio(str(e))
+
+    async def enviar(self, destino, asunto, mensaje):
+        await asyncio.to_thread(self._enviar, destino, asunto, mensaje)
+
+
+class TransporteFalso:
+    """Sustituto local de SMTP/SMS: guarda los envíos en memoria."""
+
+    def __init__(self, latencia=0.0, tasa_fallos=0.0):
+        self.latencia = latencia
+        self.tasa_fallos = tasa_fallos
+        self.enviados = []
+
+    async def enviar(self, destino, asunto, mensaje):
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        if random.random() < self.tasa_fallos:
+            raise ErrorTransitorio("fallo simulado")
+        self.enviados.append((destino, asunto, mensaje))
+
+
+# --- Despachador ---
+
+class Despachador:
+    def __init__(self, transportes, limites=None, lote=200, concurrencia=20, sesiones=SessionLocal):
+        self.transportes = transportes
+        self.limites = limites or {}
+        self.lote = lote
+        self.concurrencia = asyncio.Semaphore(concurrencia)
+        self.sesiones = sesiones
+        self.nombre = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[:64]
+
+    def _en_sesion(self, funcion, *args):
+        db = self.sesiones()
+        try:
+            return funcion(db, *args)
+        finally:
+            db.close()
+
+    def _reclamar(self, db):
+        """Pasa un lote a `enviando` a nombre de esta instancia; devuelve sus datos ya confirmados."""
+        ahora = datetime.utcnow()
+        ids = [i for i, in db.query(Notificacion.id).filter(
+            Notificacion.intentos < MAX_INTENTOS,
+            or_(
+                and_(Notificacion.estado == "pendiente",
+                     or_(Notificacion.fecha_programada == None, Notificacion.fecha_programada <= ahora)),  # noqa: E711
+                # Lotes de una instancia que murió antes de cerrarlos
+                and_(Notificacion.estado == "enviando", Notificacion.reclamada_en < ahora - RECLAMO_VENCE),
+            ),
+        ).order_by(
+            Notificacion.fecha_programada
+        ).limit(self.lote).with_for_update(skip_locked=True).all()]
+        if not ids:
+            db.rollback()
+            return []
+
+        db.execute(
+            update(Notificacion).where(Notificacion.id.in_(ids))
+            .values(estado="enviando", reclamada_por=self.nombre, reclamada_en=ahora)
+        )
+        filas = db.query(
+            Notificacion.id, Notificacion.tipo, Notificacion.asunto, Notificacion.mensaje,
+            Notificacion.intentos, Notificacion.fecha_programada, Notificacion.fecha_creacion,
+            Usuario.correo, Usuario.telefono,
+        ).join(
+            Usuario, Notificacion.usuario_id == Usuario.id
+        ).filter(Notificacion.id.in_(ids)).all()
+        db.commit()
+        return filas
+
+    async def _enviar_una(self, fila):
+        """("enviada", None), ("reintentar", error) o ("fallida", error) si no tiene remedio."""
+        destino = fila.correo if fila.tipo == "correo" else fila.telefono
+        if not destino:
+            return "fallida", f"sin {'correo' if fila.tipo == 'correo' else 'teléfono'}"
+        transporte = self.transportes[fila.tipo]
+        limite = self.limites.get(fila.tipo)
+        error = None
+        async with self.concurrencia:
+            for intento in range(REINTENTOS_INMEDIATOS):
+                if limite:
+                    await limite.esperar()
+                try:
+                    await transporte.enviar(destino, fila.asunto, fila.mensaje)
+                    return "enviada", None
+                except ErrorTransitorio as e:
+                    error = str(e)
+                    metricas["reintentos"] += 1
+                    await asyncio.sleep(min(5.0, 0.2 * 2 ** intento) * random.uniform(0.5, 1.5))
+                except Exception as e:
+                    log.warning("Notificación %s rechazada: %r", fila.id, e)
+                    return "fallida", repr(e)
+        return "reintentar", error
+
+    def _marcar(self, db, filas, resultados):
+        ahora = datetime.utcnow()
+        # Si el lote venció y otra instancia lo reclamó, el cierre le toca a ella
+        propias = (Notificacion.reclamada_por == self.nombre, Notificacion.estado == "enviando")
+        enviadas = [f.id for f, (resultado, _) in zip(filas, resultados) if resultado == "enviada"]
+        if enviadas:
+            db.execute(
+                update(Notificacion).where(Notificacion.id.in_(enviadas), *propias)
+                .values(estado="enviada", fue_enviada=True, fecha_envio=ahora, reclamada_por=None, error=None)
+            )
+        for fila, (resultado, error) in zip(filas, resultados):
+            if resultado == "enviada":
+                continue
+            intentos = fila.intentos + 1
+            if resultado == "fallida" or intentos >= MAX_INTENTOS:
+                valores = {"estado": "fallida"}
+            else:
+                # Backoff exponencial entre vueltas del despachador
+                valores = {"estado": "pendiente", "fecha_programada": ahora + timedelta(seconds=30 * 2 ** intentos)}
+            db.execute(
+                update(Notificacion).where(Notificacion.id == fila.id, *propias)
+                .values(intentos=intentos, error=(error or "")[:255] or None, reclamada_por=None, **valores)
+            )
+        db.commit()
+
+    async def procesar_lote(self):
+        """Procesa un lote; devuelve cuántas notificaciones reclamó."""
+        filas = await asyncio.to_thread(self._en_sesion, self._reclamar)
+        if not filas:
+            return 0
+        resultados = await asyncio.gather(*(self._enviar_una(f) for f in filas))
+
+        # Retraso de la cola: cuánto esperó la notificación más vieja del lote
+        ahora = datetime.utcnow()
+        metricas["lag_ultimo_s"] = max(
+            (ahora - (f.fecha_programada or f.fecha_creacion or ahora)).total_seconds() for f in filas
+        )
+
+        await asyncio.to_thread(self._en_sesion, self._marcar, filas, resultados)
+
+        enviadas = sum(resultado == "enviada" for resultado, _ in resultados)
+        metricas["enviadas"] += enviadas
+        metricas["fallidas"] += len(filas) - enviadas
+        metricas["lotes"] += 1
+        return len(filas)
+
+    async def correr(self, intervalo=2.0, una_vez=False):
+        while True:
+            reclamadas = await self.procesar_lote()
+            if una_vez and not reclamadas:
+                return
+            if not reclamadas:
+                await asyncio.sleep(intervalo)
+
+
+def resumen_metricas():
+    transcurrido = max(time.monotonic() - metricas["inicio"], 1e-9)
+    return dict(metricas, por_segundo=metricas["enviadas"] / transcurrido)
+
+
+async def _reportar(cada):
+    while True:
+        await asyncio.sleep(cada)
+        m = resumen_metricas()
+        log.info("enviadas=%d fallidas=%d %.1f/s lag=%.1fs",
+                 m["enviadas"], m["fallidas"], m["por_segundo"], m["lag_ultimo_s"])
+
+
+async def _principal(args):
+    if args.falso:
+        transportes = {"correo": TransporteFalso(0.01), "sms": TransporteFalso(0.01)}
+    else:
+        transportes = {"correo": TransporteSMTP(), "sms": TransporteSMSHttp()}
+    limites = {
+        "correo": LimiteTasa(float(os.getenv("CORREOS_POR_SEGUNDO", "20"))),
+        "sms": LimiteTasa(float(os.getenv("SMS_POR_SEGUNDO", "5"))),
+    }
+    despachador = Despachador(transportes, limites, lote=args.lote, concurrencia=args.concurrencia)
+    reporte = asyncio.create_task(_reportar(args.reporte))
+    try:
+        await despachador.correr(args.intervalo, una_vez=args.una_vez)
+    finally:
+        reporte.cancel()
+        m = resumen_metricas()
+        log.info("total enviadas=%d fallidas=%d %.1f/s", m["enviadas"], m["fallidas"], m["por_segundo"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Despachador de notificaciones")
+    parser.add_argument("--lote", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=20)
+    parser.add_argument("--intervalo", type=float, default=2.0, help="segundos de espera con la cola vacía")
+    parser.add_argument("--reporte", type=float, default=30.0, help="segundos entre líneas de métricas")
+    parser.add_argument("--una-vez", action="store_true", help="termina al vaciar la cola")
+    parser.add_argument("--falso", action="store_true", help="usa transportes en memoria en lugar de SMTP/SMS")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(name)s] %(levelname)s %(message)s")
+    asyncio.run(_principal(parser.parse_args()))
@@ -0,0 +1,71 @@
+# Paginación por cursor (keyset) para los listados.
+#
+# El cuerpo de la respuesta sigue siendo una lista; el cursor de la página
+# siguiente viaja en la cabecera X-Next-Cursor (ausente en la última página).
+import base64
+import json
+from datetime import date, datetime
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, not_, or_
+
+LIMITE_DEFECTO = 50
+LIMITE_MAXIMO = 500
+CABECERA_CURSOR = "X-Next-Cursor"
+
+
+def codificar_cursor(valores):
+    crudo = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in valores])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor, columnas):
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if len(valores) != len(columnas):
+            raise ValueError
+        convertidos = []
+        for col, valor in zip(columnas, valores):
+            tipo = col.type.python_type
+            if tipo is datetime:
+                valor = datetime.fromisoformat(valor)
+            elif tipo is date:
+                valor = date.fromisoformat(valor)
+            convertidos.append(valor)
+        return convertidos
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _despues_de(columnas, valores, descendente):
+    # (a, b) > (x, y)  ==>  a > x OR (a = x AND b > y), legible para el índice compuesto
+    condiciones = []
+    for i, col in enumerate(columnas):
+        iguales = [columnas[j] == valores[j] for j in range(i)]
+        siguiente = col < valores[i] if descendente else col > valores[i]
+        condiciones.append(and_(*iguales, siguiente))
+    return or_(*condiciones)
+
+
+def hasta(columnas, valores, descendente=False):
+    """Filas que no van después de `valores`, es decir, hasta esa clave incluida."""
+    return not_(_despues_de(columnas, valores, descendente))
+
+
+def ordenar(query, columnas, cursor, descendente=False):
+    """La consulta desde `cursor` (excluido), ordenada por `columnas`."""
+    if cursor:
+        query = query.filter(_despues_de(columnas, decodificar_cursor(cursor, columnas), descendente))
+    orden = [c.desc() for c in columnas] if descendente else list(columnas)
+    return query.order_by(*orden)
+
+
+def paginar(query, columnas, limit, cursor, response: Response, descendente=False):
+    filas = ordenar(query, columnas, cursor, descendente).limit(limit + 1).all()
+
+    if len(filas) > limit:
+        filas = filas[:limit]
+        ultimo = filas[-1]
+        response.headers[CABECERA_CURSOR] = codificar_cursor([getattr(ultimo, c.key) for c in columnas])
+    return filas
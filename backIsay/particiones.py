@@ -0,0 +1,332 @@
+# Particiones mensuales de transacciones y archivo de meses cerrados.
+#
+#   python particiones.py --listar
+#   python particiones.py --crear-futuras [--meses 3]
+#   python particiones.py --convertir
+#   python particiones.py --archivar [--meses-vivos 24] [--parquet DIR] [--bloque 5000]
+#
+# En MySQL, transacciones está particionada por RANGE COLUMNS(fecha), una
+# partición por mes (pAAAAMM) más `pmax` para lo que quede fuera. Así la crean
+# las migraciones (0001 en una base nueva; 0004 convierte con `convertir` una
+# tabla que no lo esté) y así aparece en lanaapp.sql. Las consultas con filtro
+# de fecha (p. ej. /transacciones con desde/hasta) solo leen las particiones
+# del rango.
+#
+#   --crear-futuras  parte `pmax` para que existan los próximos N meses;
+#                    pensado para un cron mensual.
+#   --convertir      particiona una tabla creada con el esquema anterior
+#                    (lo mismo que hace la migración 0004): quita sus llaves
+#                    foráneas y cambia la llave primaria a (id, fecha), que es
+#                    lo que MySQL exige. Bloquea la tabla mientras la
+#                    reescribe; correrlo en una ventana de mantenimiento.
+#   --archivar       mueve los meses anteriores a los últimos N a
+#                    transacciones_archivo, mes por mes. Con la partición
+#                    del mes la cambia (EXCHANGE PARTITION, atómico) por una
+#                    tabla vacía transacciones_canje_pAAAAMM, copia esa tabla
+#                    al archivo y la borra; la partición, ya vacía, se suelta
+#                    solo si sigue vacía bajo LOCK TABLES. Sin partición
+#                    mueve bloques de ids bloqueados con FOR UPDATE: copia y
+#                    borra los mismos ids en una transacción. En ningún caso
+#                    se pierde una fila escrita a mitad del proceso: lo que
+#                    llegue después queda vivo para la siguiente corrida.
+#                    Con --parquet también deja cada mes en
+#                    DIR/transacciones_AAAA_MM.parquet (requiere `pyarrow`)
+#                    para guardarlo fuera de la base.
+#
+# Los reportes leen resumen_mensual, que conserva los meses archivados; y
+# `resumen_mensual.py --reconstruir` suma transacciones y archivo. Una
+# transacción archivada se sigue leyendo en GET /transacciones/{id}, pero es
+# de solo lectura: PUT y DELETE responden 410 (ver mutaciones.py). Los
+# listados solo recorren transacciones; el historial completo sale por
+# /exportar.
+import argparse
+import os
+import re
+from datetime import date
+
+from sqlalchemy import column, delete, func, insert, select, table, text
+
+from models import Transaccion, TransaccionArchivo
+
+TABLA = "transacciones"
+CANJE = "transacciones_canje_"
+MESES_FUTUROS = 3
+MESES_VIVOS = 24
+TAMANO_BLOQUE = 5000
+
+COLUMNAS = [c.key for c in TransaccionArchivo.__table__.columns]
+
+
+def nombre_particion(ano, mes):
+    return f"p{ano}{mes:02d}"
+
+
+def sumar_meses(ano, mes, n):
+    ano, mes = divmod(ano * 12 + mes - 1 + n, 12)
+    return ano, mes + 1
+
+
+def _es_mysql(db):
+    return db.get_bind().dialect.name == "mysql"
+
+
+def _definicion(ano, mes):
+    fin = date(*sumar_meses(ano, mes, 1), 1)
+    return f"PARTITION {nombre_particion(ano, mes)} VALUES LESS THAN ('{fin.isoformat()}')"
+
+
+def clausula(desde, hasta):
+    """`PARTITION BY ...` con un mes por partición de `desde` a `hasta` (año, mes) más pmax, y cuántos meses."""
+    ano, mes = desde
+    definiciones = []
+    while (ano, mes) <= hasta:
+        definiciones.append(_definicion(ano, mes))
+        ano, mes = sumar_meses(ano, mes, 1)
+    return (f"PARTITION BY RANGE COLUMNS(fecha) ({', '.join(definiciones)}, "
+            f"PARTITION pmax VALUES LESS THAN (MAXVALUE))"), len(definiciones)
+
+
+def listar(db):
+    """[(nombre, límite superior o None para pmax, filas aproximadas)] en orden."""
+    filas = db.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"tabla": TABLA}).all()
+    resultado = []
+    for nombre, descripcion, n in filas:
+        encontrada = re.search(r"\d{4}-\d{2}-\d{2}", descripcion or "")
+        limite = date.fromisoformat(encontrada.group()) if encontrada else None
+        resultado.append((nombre, limite, n))
+    return resultado
+
+
+def crear_futuras(db, meses=MESES_FUTUROS, hoy=None):
+    """Agrega las particiones mensuales que falten hasta `meses` después de hoy."""
+    hoy = hoy or date.today()
+    particiones = listar(db)
+    if not particiones:
+        raise SystemExit(f"{TABLA} no está particionada; use --convertir")
+    if particiones[-1][1] is not None:
+        raise SystemExit(f"{TABLA} no tiene la partición pmax")
+    limites = [limite for _, limite, _ in particiones if limite is not None]
+    ano, mes = (limites[-1].year, limites[-1].month) if limites else (hoy.year, hoy.month)
+    ultimo = sumar_meses(hoy.year, hoy.month, meses)
+
+    nuevas = []
+    while (ano, mes) <= ultimo:
+        nuevas.append(_definicion(ano, mes))
+        ano, mes = sumar_meses(ano, mes, 1)
+    if nuevas:
+        db.execute(text(
+            f"ALTER TABLE {TABLA} REORGANIZE PARTITION pmax INTO "
+            f"({', '.join(nuevas)}, PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+        ))
+    return len(nuevas)
+
+
+def convertir(db, meses=MESES_FUTUROS, hoy=None):
+    """Particiona una tabla transacciones sin particiones, desde su primer mes."""
+    hoy = hoy or date.today()
+    if listar(db):
+        raise SystemExit(f"{TABLA} ya está particionada")
+    foraneas = db.execute(text(
+        "SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla AND CONSTRAINT_TYPE = 'FOREIGN KEY'"
+    ), {"tabla": TABLA}).scalars().all()
+    for nombre in foraneas:
+        db.execute(text(f"ALTER TABLE {TABLA} DROP FOREIGN KEY `{nombre}`"))
+
+    primera = db.execute(select(func.min(Transaccion.fecha))).scalar() or hoy
+    particionado, n = clausula((primera.year, primera.month), sumar_meses(hoy.year, hoy.month, meses))
+    db.execute(text(f"ALTER TABLE {TABLA} DROP PRIMARY KEY, ADD PRIMARY KEY (id, fecha), {particionado}"))
+    return n
+
+
+# --- Archivo ---
+
+def _sentencia_copiar(dialecto, origen):
+    tabla = TransaccionArchivo.__table__
+    if dialecto == "mysql":
+        return insert(tabla).prefix_with("IGNORE").from_select(COLUMNAS, origen)
+    if dialecto == "sqlite":
+        return insert(tabla).prefix_with("OR IGNORE").from_select(COLUMNAS, origen)
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(tabla).from_select(COLUMNAS, origen).on_conflict_do_nothing()
+    return insert(tabla).from_select(COLUMNAS, origen)
+
+
+def _exportar_parquet(db, inicio, fin, directorio, bloque):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("--parquet requiere el paquete pyarrow")
+
+    ruta = os.path.join(directorio, f"transacciones_{inicio.year}_{inicio.month:02d}.parquet")
+    columnas = [getattr(TransaccionArchivo, c) for c in COLUMNAS]
+    filas = db.execute(
+        select(*columnas).where(TransaccionArchivo.fecha >= inicio, TransaccionArchivo.fecha < fin)
+        .order_by(TransaccionArchivo.usuario_id, TransaccionArchivo.fecha)
+        .execution_options(yield_per=bloque)
+    )
+    escritor = None
+    try:
+        for trozo in filas.partitions():
+            tabla = pa.Table.from_pylist([dict(zip(COLUMNAS, f)) for f in trozo])
+            if escritor is None:
+                # El Decimal de `monto` se infiere con la precisión del primer bloque: se fija aquí
+                esquema = tabla.schema.set(tabla.schema.get_field_index("monto"),
+                                           pa.field("monto", pa.decimal128(18, 2)))
+                escritor = pq.ParquetWriter(ruta, esquema, compression="zstd")
+            escritor.write_table(tabla.cast(escritor.schema))
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return ruta if escritor is not None else None
+
+
+def _copiar_canje(db, nombre):
+    """Pasa al archivo las filas de una tabla de canje y la borra; devuelve cuántas había."""
+    dialecto = db.get_bind().dialect.name
+    canje = table(nombre, *(column(c.name) for c in Transaccion.__table__.columns if c.key in COLUMNAS))
+    columnas = {c.key: c for c in Transaccion.__table__.columns}
+    origen = select(*(canje.c[columnas[c].name] for c in COLUMNAS))
+    n = db.execute(select(func.count()).select_from(canje)).scalar()
+    db.execute(_sentencia_copiar(dialecto, origen))
+    db.commit()
+    db.execute(text(f"DROP TABLE {nombre}"))
+    return n
+
+
+def _canjes_pendientes(db):
+    """Tablas de canje que dejó una corrida interrumpida después del EXCHANGE."""
+    return db.execute(text(
+        "SELECT TABLE_NAME FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME LIKE :prefijo"
+    ), {"prefijo": CANJE + "%"}).scalars().all()
+
+
+def _particion_del_mes(db, inicio, fin):
+    """Nombre de la partición que contiene exactamente el mes, o None."""
+    nombre = nombre_particion(inicio.year, inicio.month)
+    particiones = listar(db)
+    nombres = [n for n, _, _ in particiones]
+    if nombre not in nombres:
+        return None
+    i = nombres.index(nombre)
+    # La partición es exactamente el mes si la anterior termina donde él empieza;
+    # si es la primera, lo anterior ya se archivó (se avanza del mes más viejo).
+    if particiones[i][1] == fin and (i == 0 or particiones[i - 1][1] == inicio):
+        return nombre
+    return None
+
+
+def _canjear_particion(db, particion):
+    """Saca la partición entera con EXCHANGE y la pasa al archivo; devuelve cuántas filas movió."""
+    canje = CANJE + particion
+    db.execute(text(f"CREATE TABLE {canje} LIKE {TABLA}"))
+    db.execute(text(f"ALTER TABLE {canje} REMOVE PARTITIONING"))
+    db.execute(text(f"ALTER TABLE {TABLA} EXCHANGE PARTITION {particion} WITH TABLE {canje}"))
+    n = _copiar_canje(db, canje)
+
+    # Lo escrito en el mes después del EXCHANGE quedó en la partición: solo se
+    # suelta si nadie escribió, con la tabla bloqueada entre la cuenta y el DROP
+    db.execute(text(f"LOCK TABLES {TABLA} WRITE"))
+    try:
+        restantes = db.execute(text(f"SELECT COUNT(*) FROM {TABLA} PARTITION ({particion})")).scalar()
+        if not restantes:
+            db.execute(text(f"ALTER TABLE {TABLA} DROP PARTITION {particion}"))
+    finally:
+        db.execute(text("UNLOCK TABLES"))
+    return n
+
+
+def _mover_bloques(db, inicio, fin, bloque):
+    """Copia y borra el mes por bloques de ids bloqueados; devuelve cuántas filas movió."""
+    dialecto = db.get_bind().dialect.name
+    n = 0
+    while True:
+        ids = db.execute(
+            select(Transaccion.id).where(Transaccion.fecha >= inicio, Transaccion.fecha < fin)
+            .order_by(Transaccion.id).limit(bloque).with_for_update()
+        ).scalars().all()
+        if not ids:
+            db.commit()
+            return n
+        origen = select(*(getattr(Transaccion, c) for c in COLUMNAS)).where(Transaccion.id.in_(ids))
+        db.execute(_sentencia_copiar(dialecto, origen))
+        db.execute(delete(Transaccion).where(Transaccion.id.in_(ids)))
+        db.commit()
+        n += len(ids)
+
+
+def archivar(db, meses_vivos=MESES_VIVOS, parquet=None, bloque=TAMANO_BLOQUE, hoy=None):
+    """Mueve al archivo los meses anteriores a los últimos `meses_vivos`; devuelve {mes: filas}."""
+    hoy = hoy or date.today()
+    corte = date(*sumar_meses(hoy.year, hoy.month, -meses_vivos + 1), 1)
+    movidos = {}
+
+    if _es_mysql(db):
+        for canje in _canjes_pendientes(db):
+            _copiar_canje(db, canje)
+
+    primera = db.execute(select(func.min(Transaccion.fecha)).where(Transaccion.fecha < corte)).scalar()
+    while primera is not None:
+        inicio = date(primera.year, primera.month, 1)
+        fin = date(*sumar_meses(inicio.year, inicio.month, 1), 1)
+
+        particion = _particion_del_mes(db, inicio, fin) if _es_mysql(db) else None
+        if particion:
+            n = _canjear_particion(db, particion)
+        else:
+            n = _mover_bloques(db, inicio, fin, bloque)
+        if parquet:
+            _exportar_parquet(db, inicio, fin, parquet, bloque)
+        movidos[f"{inicio.year}-{inicio.month:02d}"] = n
+
+        primera = db.execute(
+            select(func.min(Transaccion.fecha)).where(Transaccion.fecha >= fin, Transaccion.fecha < corte)
+        ).scalar()
+    return movidos
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Particiones y archivo de transacciones")
+    accion = parser.add_mutually_exclusive_group(required=True)
+    accion.add_argument("--listar", action="store_true", help="muestra las particiones de transacciones")
+    accion.add_argument("--crear-futuras", action="store_true", help="crea las particiones de los próximos meses")
+    accion.add_argument("--convertir", action="store_true", help="particiona una tabla existente")
+    accion.add_argument("--archivar", action="store_true", help="mueve los meses cerrados al archivo")
+    parser.add_argument("--meses", type=int, default=MESES_FUTUROS, help="meses a futuro con partición")
+    parser.add_argument("--meses-vivos", type=int, default=MESES_VIVOS,
+                        help="meses (incluido el actual) que se quedan en transacciones")
+    parser.add_argument("--parquet", default=None, help="directorio donde exportar cada mes archivado")
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.archivar:
+            if args.parquet:
+                os.makedirs(args.parquet, exist_ok=True)
+            movidos = archivar(db, args.meses_vivos, args.parquet, args.bloque)
+            for mes, n in movidos.items():
+                print(f"{mes}: {n} transacciones archivadas")
+            print(f"{len(movidos)} meses archivados")
+        elif not _es_mysql(db):
+            print("Las particiones solo aplican a MySQL; en esta base solo está disponible --archivar")
+        elif args.listar:
+            for nombre, limite, n in listar(db):
+                print(f"{nombre:10s} < {limite or 'MAXVALUE'}  ~{n} filas")
+        elif args.crear_futuras:
+            print(f"{crear_futuras(db, args.meses)} particiones nuevas")
+            db.commit()
+        elif args.convertir:
+            print(f"{TABLA} particionada en {convertir(db, args.meses)} meses más pmax")
+            db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,125 @@
+# Presupuesto contra gasto real.
+#
+# El gasto de cada presupuesto sale de resumen_mensual (egresos por usuario,
+# mes y categoría), así que el estado de un mes es un solo JOIN sin importar
+# cuántas transacciones tenga el usuario. Los nombres de categoría salen de
+# catalogo.py.
+#
+# Las escrituras de transacciones llaman a `alertar` después de actualizar el
+# resumen y antes del commit: si el gasto de una categoría cruza uno de los
+# UMBRALES de su presupuesto, se encola una Notificacion en la misma
+# transacción (la envía notificaciones_worker.py).
+#
+# Configuración por entorno:
+#   PRESUPUESTO_UMBRALES   porcentajes separados por coma (por defecto 80,100)
+import os
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, func, tuple_
+
+from catalogo import indice as categorias
+from dinero import redondear
+from models import Notificacion, Presupuesto, ResumenMensual
+from reportes import MESES_ES
+
+UMBRALES = sorted(int(u) for u in os.getenv("PRESUPUESTO_UMBRALES", "80,100").split(","))
+
+
+def _consulta(db):
+    gastado = func.coalesce(ResumenMensual.total, 0)
+    return db.query(
+        Presupuesto.id, Presupuesto.usuario_id, Presupuesto.categoria_id,
+        Presupuesto.ano, Presupuesto.mes, Presupuesto.monto, gastado
+    ).outerjoin(
+        ResumenMensual, and_(
+            ResumenMensual.usuario_id == Presupuesto.usuario_id,
+            ResumenMensual.categoria_id == Presupuesto.categoria_id,
+            ResumenMensual.ano == Presupuesto.ano,
+            ResumenMensual.mes == Presupuesto.mes,
+            ResumenMensual.tipo == "egreso",
+        )
+    )
+
+
+def estado(db, usuario_id, ano, mes):
+    filas = _consulta(db).filter(
+        Presupuesto.usuario_id == usuario_id,
+        Presupuesto.ano == ano,
+        Presupuesto.mes == mes,
+    ).all()
+
+    nombres = categorias.nombres(db)
+    resultado = []
+    for pid, _, categoria_id, ano, mes, monto, gastado in filas:
+        # Todo en Decimal (dinero.py): pasan a número JSON solo al responder, como los demás montos
+        resultado.append({
+            "presupuesto_id": pid,
+            "categoria_id": categoria_id,
+            "categoria": nombres.get(categoria_id, ""),
+            "ano": ano,
+            "mes": mes,
+            "monto": monto,
+            "gastado": gastado,
+            "restante": monto - gastado,
+            "porcentaje": redondear(gastado * 100 / monto) if monto else None,
+        })
+    resultado.sort(key=lambda p: p["categoria"])
+    return resultado
+
+
+def _valor(fila, campo):
+    return fila[campo] if isinstance(fila, dict) else getattr(fila, campo)
+
+
+def deltas(filas, signo=1, acumulado=None):
+    """Suma los egresos de `filas` (dicts o Transaccion) por (usuario, categoría, año, mes)."""
+    acumulado = defaultdict(Decimal) if acumulado is None else acumulado
+    for f in filas:
+        if _valor(f, "tipo") != "egreso":
+            continue
+        fecha = _valor(f, "fecha")
+        clave = (_valor(f, "usuario_id"), _valor(f, "categoria_id"), fecha.year, fecha.month)
+        acumulado[clave] += signo * redondear(_valor(f, "monto"))
+    return acumulado
+
+
+def alertar(db, cambios):
+    """Encola una notificación por cada presupuesto cuyo gasto cruzó un umbral.
+
+    `cambios` viene de `deltas` y el resumen ya debe incluirlos: el gasto
+    anterior se obtiene restando el delta al total actual.
+    """
+    cambios = {clave: delta for clave, delta in cambios.items() if delta > 0}
+    if not cambios or not UMBRALES:
+        return 0
+    filas = _consulta(db).filter(
+        tuple_(Presupuesto.usuario_id, Presupuesto.categoria_id, Presupuesto.ano, Presupuesto.mes)
+        .in_(list(cambios))
+    ).all()
+
+    encoladas = 0
+    ahora = datetime.utcnow()
+    nombres = categorias.nombres(db)
+    for _, usuario_id, categoria_id, ano, mes, monto, gastado in filas:
+        # Monto y gasto son Decimal: la comparación con los umbrales es exacta
+        categoria = nombres.get(categoria_id, "")
+        if monto <= 0:
+            continue
+        antes = gastado - cambios[(usuario_id, categoria_id, ano, mes)]
+        # Solo el umbral más alto cruzado, para no mandar dos avisos a la vez
+        cruzados = [u for u in UMBRALES if antes < monto * u / 100 <= gastado]
+        if not cruzados:
+            continue
+        umbral = cruzados[-1]
+        asunto = (f"Presupuesto de {categoria} excedido" if umbral >= 100
+                  else f"Presupuesto de {categoria} al {umbral}%")
+        db.add(Notificacion(
+            usuario_id=usuario_id, tipo="correo", asunto=asunto[:100],
+            mensaje=(f"Llevas ${gastado:,.2f} de ${monto:,.2f} ({gastado * 100 / monto:.0f}%) "
+                     f"en {categoria} para {MESES_ES[mes]} {ano}."),
+            fecha_programada=ahora,
+        ))
+        encoladas += 1
+    return encoladas
@@ -0,0 +1,299 @@
+# Pronóstico de ingresos y gastos por categoría y detección de gastos atípicos.
+#
+# Los parámetros se calculan de noche para todos los usuarios (cron diario):
+#
+#   python pronosticos.py [--bloque 2000] [--hoy 2025-07-01]
+#
+# Por bloques de usuarios se lee resumen_mensual (en centavos, como int64) y,
+# con NumPy, se ajusta de una vez una recta por mínimos cuadrados a cada serie (usuario, tipo, categoría)
+# sobre los últimos PRONOSTICO_HISTORIA meses completos, desde el primer mes
+# con datos (los meses sin movimientos cuentan como 0). Con menos de
+# MESES_TENDENCIA meses no se usa pendiente, solo el promedio. Se guardan el
+# valor ajustado del último mes (`base`), la pendiente y la desviación de los
+# residuos en la tabla pronosticos.
+#
+# Para los gastos atípicos se agregan en SQL la media y la desviación del
+# monto por transacción de cada categoría; los egresos de los últimos
+# PRONOSTICO_VENTANA_DIAS días que superan la media en más de PRONOSTICO_Z
+# desviaciones quedan en la tabla anomalias.
+#
+# GET /graficas/pronostico solo lee esas tablas: proyecta base + pendiente·k
+# para los próximos meses, con un intervalo de ±1.28 desviaciones (~80 %).
+# Los pagos fijos programados de la categoría hacen de piso del egreso; no se
+# suman encima porque ya forman parte del historial.
+#
+# Configuración por entorno:
+#   PRONOSTICO_HISTORIA        meses de historia ajustados (por defecto 12)
+#   PRONOSTICO_VENTANA_DIAS    días revisados en busca de anomalías (por defecto 60)
+#   PRONOSTICO_Z               puntaje z mínimo de una anomalía (por defecto 3)
+import argparse
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Float, cast, delete, func, insert, select
+
+import cache
+from catalogo import indice as categorias
+from dinero import crudo, de_centavos
+from models import Anomalia, PagoFijo, Pronostico, ResumenMensual, Transaccion, Usuario
+from particiones import sumar_meses
+from reportes import MESES_ES, TIPOS
+
+PRONOSTICO_HISTORIA = int(os.getenv("PRONOSTICO_HISTORIA", "12"))
+PRONOSTICO_VENTANA_DIAS = int(os.getenv("PRONOSTICO_VENTANA_DIAS", "60"))
+PRONOSTICO_Z = float(os.getenv("PRONOSTICO_Z", "3"))
+
+TAMANO_BLOQUE = 2000
+MESES_TENDENCIA = 6
+# Transacciones mínimas de una categoría para juzgar si un gasto es atípico
+MUESTRAS_MINIMAS = 8
+Z_INTERVALO = 1.28
+MAX_ANOMALIAS = 20
+
+
+# --- Cálculo nocturno ---
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise SystemExit("pronosticos.py requiere el paquete numpy (pip install -r requirements.txt)")
+    return numpy
+
+
+def ajustar(np, y, observado):
+    """Recta por mínimos cuadrados en cada fila de `y` (series × meses), solo donde `observado`.
+
+    Devuelve (base, pendiente, desviacion, meses) por fila; `base` es el valor
+    ajustado del último mes.
+    """
+    x = np.arange(y.shape[1], dtype=float)
+    w = observado.astype(float)
+    n = w.sum(axis=1)
+    sx, sxx = w @ x, w @ (x * x)
+    sy, sxy = (w * y).sum(axis=1), (w * y) @ x
+    den = n * sxx - sx * sx
+    con_tendencia = (n >= MESES_TENDENCIA) & (den > 0)
+    pendiente = np.where(con_tendencia, (n * sxy - sx * sy) / np.where(den > 0, den, 1), 0.0)
+    ordenada = (sy - pendiente * sx) / np.maximum(n, 1)
+    residuos = (y - ordenada[:, None] - pendiente[:, None] * x) * w
+    desviacion = np.sqrt((residuos ** 2).sum(axis=1) / np.maximum(n - 2, 1))
+    return ordenada + pendiente * x[-1], pendiente, desviacion, n
+
+
+def _series(np, db, desde, hasta, inicio, fin):
+    """Parámetros de las series de los usuarios desde..hasta; fin = último mes (ano, mes)."""
+    historia = PRONOSTICO_HISTORIA
+    periodo = ResumenMensual.ano * 12 + ResumenMensual.mes - 1
+    primero = inicio[0] * 12 + inicio[1] - 1
+    filas = db.execute(
+        select(ResumenMensual.usuario_id, ResumenMensual.tipo, ResumenMensual.categoria_id, periodo,
+               crudo(ResumenMensual.total))
+        .where(ResumenMensual.usuario_id.between(desde, hasta),
+               periodo.between(primero, primero + historia - 1))
+    ).all()
+
+    # Momentos del monto por transacción (mismos meses), agregados en la base en
+    # centavos; la suma de cuadrados en flotante para no desbordar BIGINT
+    centavos = crudo(Transaccion.monto)
+    muestras = db.execute(
+        select(Transaccion.usuario_id, Transaccion.tipo, Transaccion.categoria_id, func.count(),
+               func.sum(centavos), func.sum(cast(centavos, Float) * centavos))
+        .where(Transaccion.usuario_id.between(desde, hasta),
+               Transaccion.fecha >= date(*inicio, 1),
+               Transaccion.fecha < date(*sumar_meses(*fin, 1), 1))
+        .group_by(Transaccion.usuario_id, Transaccion.tipo, Transaccion.categoria_id)
+    ).all()
+    if not filas:
+        return []
+
+    claves = {}
+    for u, t, c, *_ in filas:
+        claves.setdefault((u, t, c), len(claves))
+    indice = np.fromiter((claves[(u, t, c)] for u, t, c, _, _ in filas), dtype=np.int64, count=len(filas))
+    meses = np.fromiter((p - primero for *_, p, _ in filas), dtype=np.int64, count=len(filas))
+
+    # Totales en centavos (int64, exactos); el ajuste trabaja en pesos
+    centavos = np.zeros((len(claves), historia), dtype=np.int64)
+    centavos[indice, meses] = np.fromiter((total for *_, total in filas), dtype=np.int64, count=len(filas))
+    y = centavos / 100
+    inicio_serie = np.full(len(claves), historia)
+    np.minimum.at(inicio_serie, indice, meses)
+    observado = np.arange(historia)[None, :] >= inicio_serie[:, None]
+    base, pendiente, desviacion, n = ajustar(np, y, observado)
+
+    cantidad = np.zeros(len(claves))
+    suma = np.zeros(len(claves))
+    cuadrados = np.zeros(len(claves))
+    for u, t, c, k, s, s2 in muestras:
+        i = claves.get((u, t, c))
+        if i is not None:
+            cantidad[i], suma[i], cuadrados[i] = k, int(s or 0) / 100, float(s2 or 0) / 10000
+    medio = suma / np.maximum(cantidad, 1)
+    varianza = np.maximum(cuadrados / np.maximum(cantidad, 1) - medio ** 2, 0) * cantidad / np.maximum(cantidad - 1, 1)
+    monto_desviacion = np.sqrt(varianza)
+
+    return [
+        {
+            "usuario_id": u, "tipo": t, "categoria_id": c, "ano": fin[0], "mes": fin[1],
+            "base": float(base[i]), "pendiente": float(pendiente[i]), "desviacion": float(desviacion[i]),
+            "meses": int(n[i]), "monto_medio": float(medio[i]) if cantidad[i] else None,
+            "monto_desviacion": float(monto_desviacion[i]) if cantidad[i] else None,
+            "muestras": int(cantidad[i]),
+        }
+        for (u, t, c), i in claves.items()
+    ]
+
+
+def _anomalias(np, db, desde, hasta, series, hoy):
+    referencia = {
+        (s["usuario_id"], s["categoria_id"]): (s["monto_medio"], s["monto_desviacion"])
+        for s in series
+        if s["tipo"] == "egreso" and s["muestras"] >= MUESTRAS_MINIMAS and s["monto_desviacion"]
+    }
+    if not referencia:
+        return []
+    filas = db.execute(
+        select(Transaccion.id, Transaccion.usuario_id, Transaccion.categoria_id, Transaccion.fecha,
+               crudo(Transaccion.monto).label("centavos"))
+        .where(Transaccion.usuario_id.between(desde, hasta), Transaccion.tipo == "egreso",
+               Transaccion.fecha >= hoy - timedelta(days=PRONOSTICO_VENTANA_DIAS), Transaccion.fecha <= hoy)
+    ).all()
+    filas = [f for f in filas if (f.usuario_id, f.categoria_id) in referencia]
+    if not filas:
+        return []
+
+    centavos = np.fromiter((f.centavos for f in filas), dtype=np.int64, count=len(filas))
+    monto = centavos / 100
+    medio, desviacion = np.array([referencia[(f.usuario_id, f.categoria_id)] for f in filas]).T
+    puntaje = (monto - medio) / desviacion
+    anomalias = []
+    for i in np.flatnonzero(puntaje > PRONOSTICO_Z):
+        f = filas[i]
+        anomalias.append({"transaccion_id": f.id, "usuario_id": f.usuario_id, "categoria_id": f.categoria_id,
+                          "fecha": f.fecha, "monto": de_centavos(centavos[i]), "esperado": float(medio[i]),
+                          "puntaje": float(puntaje[i])})
+    return anomalias
+
+
+def calcular(db, hoy=None, bloque=TAMANO_BLOQUE):
+    """Recalcula pronósticos y anomalías de todos los usuarios; devuelve (series, anomalías)."""
+    np = _numpy()
+    hoy = hoy or date.today()
+    # Historia: los últimos meses completos, sin el mes en curso
+    fin = sumar_meses(hoy.year, hoy.month, -1)
+    inicio = sumar_meses(*fin, -PRONOSTICO_HISTORIA + 1)
+    total_series = total_anomalias = 0
+
+    ultimo = 0
+    while True:
+        usuarios = db.execute(
+            select(Usuario.id).where(Usuario.id > ultimo).order_by(Usuario.id).limit(bloque)
+        ).scalars().all()
+        if not usuarios:
+            break
+        desde, hasta = usuarios[0], usuarios[-1]
+        series = _series(np, db, desde, hasta, inicio, fin)
+        anomalias = _anomalias(np, db, desde, hasta, series, hoy)
+
+        db.execute(delete(Pronostico).where(Pronostico.usuario_id.between(desde, hasta)))
+        db.execute(delete(Anomalia).where(Anomalia.usuario_id.between(desde, hasta)))
+        if series:
+            db.execute(insert(Pronostico), series)
+        if anomalias:
+            db.execute(insert(Anomalia), anomalias)
+        db.commit()
+        # El API compara fecha_calculo en la clave del caché (cache.marcas); esto
+        # solo adelanta la invalidación con CACHE_BACKEND=redis
+        for usuario_id in {s["usuario_id"] for s in series}:
+            cache.invalidar(usuario_id, "pronosticos")
+
+        total_series += len(series)
+        total_anomalias += len(anomalias)
+        ultimo = hasta
+    return total_series, total_anomalias
+
+
+# --- Lectura (GET /graficas/pronostico) ---
+
+def _fijos_por_mes(db, usuario_id, periodos):
+    """Egresos programados por (categoria_id, periodo) según los pagos fijos (mensuales)."""
+    pagos = db.query(PagoFijo.categoria_id, PagoFijo.monto, PagoFijo.fecha).filter(
+        PagoFijo.usuario_id == usuario_id
+    ).all()
+    fijos = defaultdict(float)
+    for categoria_id, monto, fecha in pagos:
+        for ano, mes in periodos:
+            if (fecha.year, fecha.month) <= (ano, mes):
+                fijos[(categoria_id, (ano, mes))] += float(monto)
+    return fijos
+
+
+def pronostico(db, usuario_id, meses=3, hoy=None):
+    hoy = hoy or date.today()
+    periodos = [sumar_meses(hoy.year, hoy.month, k) for k in range(meses)]
+    parametros = {(p.tipo, p.categoria_id): p for p in db.query(Pronostico).filter(Pronostico.usuario_id == usuario_id)}
+    fijos = _fijos_por_mes(db, usuario_id, periodos)
+    for categoria_id, _ in fijos:
+        parametros.setdefault(("egreso", categoria_id), None)
+    nombres = categorias.nombres(db)
+
+    resultado = []
+    for ano, mes in periodos:
+        totales = dict.fromkeys(TIPOS, 0.0)
+        lineas = []
+        for (tipo, categoria_id), p in parametros.items():
+            fijo = fijos.get((categoria_id, (ano, mes)), 0.0) if tipo == "egreso" else 0.0
+            if p is None:
+                total = desviacion = 0.0
+            else:
+                distancia = (ano * 12 + mes) - (p.ano * 12 + p.mes)
+                total = max(p.base + p.pendiente * distancia, 0.0)
+                desviacion = p.desviacion
+            total = max(total, fijo)
+            if total <= 0:
+                continue
+            totales[tipo] += total
+            lineas.append({
+                "categoria_id": categoria_id,
+                "categoria": nombres.get(categoria_id, ""),
+                "tipo": tipo,
+                "total": total,
+                "minimo": max(total - Z_INTERVALO * desviacion, fijo),
+                "maximo": total + Z_INTERVALO * desviacion,
+                "fijos": fijo,
+            })
+        lineas.sort(key=lambda l: -l["total"])
+        resultado.append({"ano": ano, "mes": mes, "nombre": MESES_ES[mes], "totales": totales, "categorias": lineas})
+
+    anomalias = db.query(Anomalia).filter(Anomalia.usuario_id == usuario_id) \
+        .order_by(Anomalia.fecha.desc(), Anomalia.transaccion_id.desc()).limit(MAX_ANOMALIAS).all()
+    calculado = max((p.fecha_calculo for p in parametros.values() if p is not None), default=None)
+    return {
+        "calculado": calculado,
+        "meses": resultado,
+        "anomalias": [
+            {"transaccion_id": a.transaccion_id, "fecha": a.fecha, "categoria_id": a.categoria_id,
+             "categoria": nombres.get(a.categoria_id, ""), "monto": a.monto, "esperado": a.esperado,
+             "puntaje": a.puntaje}
+            for a in anomalias
+        ],
+    }
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Cálculo nocturno de pronósticos y anomalías")
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE, help="usuarios por bloque")
+    parser.add_argument("--hoy", type=date.fromisoformat, default=None, help="fecha de referencia (pruebas)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        inicio = datetime.now()
+        series, anomalias = calcular(db, args.hoy, args.bloque)
+        print(f"{series} series y {anomalias} anomalías en {(datetime.now() - inicio).total_seconds():.1f} s")
+    finally:
+        db.close()
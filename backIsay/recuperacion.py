@@ -0,0 +1,101 @@
+# Tokens de recuperación de contraseña (tabla password_resets).
+#
+# /password-recovery deja a lo más un token vigente por usuario: crear uno
+# borra los anteriores. Los vencidos los borra `purgar` por lotes de
+# RESETS_LOTE filas (sobre ix_password_resets_expires_at), cada
+# RESETS_BARRIDO_SEGUNDOS en cada worker (tarea del lifespan de main.py) o a
+# mano:
+#
+#   python recuperacion.py --purgar
+#
+# Configuración por entorno:
+#   RESETS_VIGENCIA_MINUTOS   vida de un token (por defecto 60)
+#   RESETS_BARRIDO_SEGUNDOS   intervalo del barrido en la API (por defecto 600; 0 lo desactiva)
+#   RESETS_LOTE               filas por DELETE (por defecto 1000)
+import argparse
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+from starlette.concurrency import run_in_threadpool
+
+from models import PasswordReset
+
+log = logging.getLogger("lanaapp.recuperacion")
+
+VIGENCIA = timedelta(minutes=int(os.getenv("RESETS_VIGENCIA_MINUTOS", "60")))
+BARRIDO_SEGUNDOS = int(os.getenv("RESETS_BARRIDO_SEGUNDOS", "600"))
+LOTE = int(os.getenv("RESETS_LOTE", "1000"))
+
+estadisticas = {"purgados": 0}
+
+
+def crear(db, usuario_id):
+    """Token nuevo para el usuario (reemplaza los anteriores); el commit lo hace quien llama."""
+    db.execute(delete(PasswordReset).where(PasswordReset.user_id == usuario_id))
+    token = str(uuid.uuid4())
+    db.add(PasswordReset(user_id=usuario_id, token=token, expires_at=datetime.utcnow() + VIGENCIA))
+    # Sin autoflush, otro `crear` en la misma transacción no vería este token al borrar
+    db.flush()
+    return token
+
+
+def purgar(db, lote=LOTE):
+    """Borra los tokens vencidos, un lote por transacción; devuelve cuántos."""
+    total = 0
+    while True:
+        ids = db.scalars(
+            select(PasswordReset.id).where(PasswordReset.expires_at < datetime.utcnow()).limit(lote)
+        ).all()
+        if ids:
+            db.execute(delete(PasswordReset).where(PasswordReset.id.in_(ids)))
+        db.commit()
+        total += len(ids)
+        if len(ids) < lote:
+            break
+    estadisticas["purgados"] += total
+    return total
+
+
+def _purgar_con_sesion():
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return purgar(db)
+    finally:
+        db.close()
+
+
+async def barrer(intervalo=BARRIDO_SEGUNDOS):
+    """Tarea de fondo de la API; el intervalo varía un poco para que los workers no coincidan."""
+    while True:
+        await asyncio.sleep(intervalo * random.uniform(0.8, 1.2))
+        try:
+            purgados = await run_in_threadpool(_purgar_con_sesion)
+            if purgados:
+                log.info("%d tokens de recuperación vencidos borrados", purgados)
+        except Exception:
+            log.exception("Falló el barrido de password_resets")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de password_resets")
+    parser.add_argument("--purgar", action="store_true", help="borra los tokens vencidos")
+    parser.add_argument("--lote", type=int, default=LOTE)
+    args = parser.parse_args()
+
+    if args.purgar:
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            print(f"{purgar(db, args.lote)} tokens vencidos borrados")
+        finally:
+            db.close()
+    else:
+        parser.print_help()
@@ -0,0 +1,150 @@
+# Generación de las transacciones de los pagos fijos.
+#
+#   python recurrentes.py [--hasta 2025-12-31] [--bloque 1000]
+#
+# Pensado para correr desde cron (p. ej. cada hora). Cada pago fijo se repite
+# mensualmente el mismo día que su `fecha` (o el último día del mes si ese día
+# no existe). `proximo_cobro` guarda la siguiente fecha por generar; en cada
+# corrida se crean todas las fechas vencidas hasta hoy, así que tras días sin
+# correr se pone al día sola.
+#
+# Los pagos se procesan en bloques ordenados por (usuario_id, id), cada bloque
+# en su propia transacción, con memoria acotada al tamaño del bloque. Las filas
+# se bloquean con FOR UPDATE SKIP LOCKED, por lo que varias corridas a la vez
+# se reparten el trabajo; el índice único (id_recurrente, fecha) de
+# transacciones impide duplicados aunque una corrida se repita.
+import argparse
+import calendar
+import time
+from datetime import date
+
+from sqlalchemy import and_, or_, select
+
+import cache
+import eventos
+import presupuestos
+import resumen_mensual
+import versiones
+from models import PagoFijo, Transaccion
+from paginacion import _despues_de
+
+TAMANO_BLOQUE = 1000
+
+
+def siguiente_mes(fecha, dia):
+    """Misma `dia` del mes siguiente a `fecha`, recortado al largo del mes."""
+    ano, mes = (fecha.year + 1, 1) if fecha.month == 12 else (fecha.year, fecha.month + 1)
+    return date(ano, mes, min(dia, calendar.monthrange(ano, mes)[1]))
+
+
+def fechas_vencidas(pago, hasta):
+    """Fechas pendientes de `pago` hasta `hasta` inclusive y el nuevo proximo_cobro."""
+    fechas = []
+    actual = pago.proximo_cobro or pago.fecha
+    while actual <= hasta:
+        fechas.append(actual)
+        actual = siguiente_mes(actual, pago.fecha.day)
+    return fechas, actual
+
+
+def _sentencia_insertar(dialecto):
+    tabla = Transaccion.__table__
+    if dialecto == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(tabla)
+        return stmt.on_duplicate_key_update(id_recurrente=stmt.inserted.id_recurrente)
+    if dialecto in ("sqlite", "postgresql"):
+        if dialecto == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert(tabla).on_conflict_do_nothing(index_elements=["id_recurrente", "fecha"])
+    return tabla.insert()
+
+
+def _vencidos(db, hasta, despues_de, tamano):
+    query = select(PagoFijo).where(
+        or_(PagoFijo.proximo_cobro <= hasta,
+            and_(PagoFijo.proximo_cobro == None, PagoFijo.fecha <= hasta))  # noqa: E711
+    )
+    if despues_de is not None:
+        query = query.where(_despues_de([PagoFijo.usuario_id, PagoFijo.id], despues_de, False))
+    query = query.order_by(PagoFijo.usuario_id, PagoFijo.id).limit(tamano)
+    return db.scalars(query.with_for_update(skip_locked=True)).all()
+
+
+def procesar_bloque(db, pagos, hasta):
+    """Genera y confirma las transacciones de un bloque; devuelve cuántas insertó."""
+    filas = []
+    for pago in pagos:
+        fechas, proximo = fechas_vencidas(pago, hasta)
+        pago.proximo_cobro = proximo
+        filas.extend({
+            "usuario_id": pago.usuario_id,
+            "monto": pago.monto,
+            "categoria_id": pago.categoria_id,
+            "tipo": "egreso",
+            "descripcion": pago.descripcion,
+            "fecha": f,
+            "es_recurrente": True,
+            "id_recurrente": pago.id,
+        } for f in fechas)
+
+    if filas:
+        # Las ya existentes (p. ej. de una corrida anterior interrumpida tras
+        # insertar) se descartan aquí para no sumarlas dos veces al resumen
+        existentes = set(db.execute(
+            select(Transaccion.id_recurrente, Transaccion.fecha).where(
+                Transaccion.id_recurrente.in_([p.id for p in pagos]),
+                Transaccion.fecha >= min(f["fecha"] for f in filas),
+            )
+        ).all())
+        filas = [f for f in filas if (f["id_recurrente"], f["fecha"]) not in existentes]
+
+    if filas:
+        # Core no pasa por before_flush: la versión de /sync va explícita (ver versiones.py)
+        db.execute(_sentencia_insertar(db.get_bind().dialect.name),
+                   [dict(f, version=versiones.tomar(db, f["usuario_id"])) for f in filas])
+        resumen_mensual.sumar_filas(db, filas)
+        presupuestos.alertar(db, presupuestos.deltas(filas))
+        eventos.anotar_masiva(db, filas)
+    db.commit()
+
+    # Las inserciones ya subieron la versión de sync en la base, que va en la
+    # clave del caché de todos los workers; esto solo sirve con CACHE_BACKEND=redis
+    for usuario_id in {f["usuario_id"] for f in filas}:
+        cache.invalidar(usuario_id, "transacciones")
+    return len(filas)
+
+
+def materializar(db, hasta=None, tamano=TAMANO_BLOQUE):
+    """Recorre todos los pagos vencidos por bloques; devuelve (pagos, transacciones)."""
+    hasta = hasta or date.today()
+    despues_de = None
+    total_pagos = total_trans = 0
+    while True:
+        pagos = _vencidos(db, hasta, despues_de, tamano)
+        if not pagos:
+            return total_pagos, total_trans
+        despues_de = [pagos[-1].usuario_id, pagos[-1].id]
+        total_trans += procesar_bloque(db, pagos, hasta)
+        total_pagos += len(pagos)
+        db.expunge_all()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Genera las transacciones de los pagos fijos vencidos")
+    parser.add_argument("--hasta", type=date.fromisoformat, default=None, help="fecha límite (por defecto hoy)")
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE, help="pagos fijos por transacción")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        pagos, transacciones = materializar(db, args.hasta, args.bloque)
+        print(f"{pagos} pagos fijos procesados, {transacciones} transacciones creadas "
+              f"en {time.perf_counter() - t0:.1f}s")
+    finally:
+        db.close()
@@ -0,0 +1,100 @@
+# Lecturas en réplicas con lectura de lo propio escrito.
+#
+# Las rutas de solo lectura (listados, /resumen, /dashboard, /graficas/*)
+# piden la sesión con `Depends(get_db_lectura)` en lugar de `get_db`: se
+# conecta a una réplica de DB_REPLICAS (por turnos) y las escrituras siguen en
+# el primario. Sin DB_REPLICAS todo va al primario y esto no cambia nada.
+#
+# Una réplica va algo atrasada, así que quien acaba de escribir no debe leer de
+# ella: cuando una sesión confirma una escritura (ORM o Core) hecha en una
+# petición autenticada, el usuario de esa petición queda marcado
+# LECTURA_VENTANA segundos y sus lecturas van al primario mientras tanto. La
+# marca vive en el backend de cache.py; con varios workers debe ser redis para
+# que la vean todos. La ventana debe cubrir el retraso normal de las réplicas
+# (Seconds_Behind_Source); si una réplica se atrasa más, conviene sacarla de
+# DB_REPLICAS. Los scripts (recurrentes.py, notificaciones_worker.py...) no
+# marcan a nadie: sus cambios aparecen cuando la réplica los alcanza.
+#
+# Configuración por entorno:
+#   DB_REPLICAS          ver database.py
+#   DB_LECTURA_VENTANA   segundos que las lecturas de un usuario van al primario
+#                        después de que escribe (por defecto 5)
+import os
+
+from fastapi import Depends
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import cache
+import database
+from sesiones import usuario_actual, usuario_peticion
+
+LECTURA_VENTANA = int(os.getenv("DB_LECTURA_VENTANA", "5"))
+
+estadisticas = {"primario": 0, "replica": 0, "marcas": 0}
+
+
+def _clave(usuario_id):
+    return f"escritura:{usuario_id}"
+
+
+def marcar_escritura(usuario_id):
+    """Manda al primario las lecturas del usuario durante LECTURA_VENTANA segundos."""
+    if database.REPLICAS:
+        cache.backend.set(_clave(usuario_id), 1, LECTURA_VENTANA)
+        estadisticas["marcas"] += 1
+
+
+def leer_del_primario(usuario_id):
+    return not database.REPLICAS or cache.backend.get(_clave(usuario_id)) is not None
+
+
+def _elegir(usuario_id):
+    primario = leer_del_primario(usuario_id)
+    estadisticas["primario" if primario else "replica"] += 1
+    return primario
+
+
+@event.listens_for(Session, "after_flush")
+def _anotar_flush(sesion, contexto):
+    sesion.info["escribio"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _anotar_dml(estado):
+    # insert/update/delete por Core dentro de la sesión (importación, resumen_mensual...)
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        estado.session.info["escribio"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _marcar(sesion):
+    # También se llama al liberar un SAVEPOINT: se marca con el commit externo
+    if sesion.in_nested_transaction() or not sesion.info.pop("escribio", False):
+        return
+    usuario_id = usuario_peticion.get()
+    if usuario_id is not None:
+        marcar_escritura(usuario_id)
+
+
+def sesion_lectura(usuario_id):
+    """Session síncrona para leer datos de `usuario_id` (réplica o primario)."""
+    motor = database.obtener_engine() if _elegir(usuario_id) else database.obtener_engine_lectura()
+    return database.SessionLocal(bind=motor)
+
+
+if database.DB_ASYNC:
+    async def get_db_lectura(usuario_id: int = Depends(usuario_actual)):
+        if _elegir(usuario_id):
+            motor = database.obtener_async_engine()
+        else:
+            motor = database.obtener_async_engine_lectura()
+        async with database.AsyncSessionLocal(bind=motor) as db:
+            yield db
+else:
+    def get_db_lectura(usuario_id: int = Depends(usuario_actual)):
+        db = sesion_lectura(usuario_id)
+        try:
+            yield db
+        finally:
+            db.close()
@@ -0,0 +1,125 @@
+# Consultas de los reportes del dashboard. Leen resumen_mensual, así que su
+# costo depende del número de meses del usuario y no de sus transacciones.
+# Los nombres de categoría salen del índice en memoria (catalogo.py), sin JOIN.
+# Los totales se suman en centavos en la base y como Decimal aquí (dinero.py).
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import func
+
+from catalogo import indice as categorias
+from dinero import CERO
+from models import ResumenMensual
+
+MESES_ES = {
+    1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
+    7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
+}
+
+TIPOS = ("ingreso", "egreso", "ahorro")
+
+
+def por_categoria(db, usuario_id, tipo):
+    filas = db.query(
+        ResumenMensual.categoria_id, func.sum(ResumenMensual.total)
+    ).filter(
+        ResumenMensual.usuario_id == usuario_id,
+        ResumenMensual.tipo == tipo
+    ).group_by(ResumenMensual.categoria_id).all()
+
+    nombres = categorias.nombres(db)
+    totales = defaultdict(Decimal)
+    for categoria_id, total in filas:
+        categoria_nombre = nombres.get(categoria_id)
+        if categoria_nombre:
+            totales[categoria_nombre] += total or CERO
+
+    return [{"categoria": cat, "total": total} for cat, total in totales.items()]
+
+
+def tendencias(db, usuario_id, tipo):
+    filas = db.query(
+        ResumenMensual.ano, ResumenMensual.mes, func.sum(ResumenMensual.total)
+    ).filter(
+        ResumenMensual.usuario_id == usuario_id,
+        ResumenMensual.tipo == tipo
+    ).group_by(
+        ResumenMensual.ano, ResumenMensual.mes
+    ).order_by(ResumenMensual.ano, ResumenMensual.mes).all()
+
+    return [
+        {"ano": ano, "mes": MESES_ES[mes], "total": total or CERO}
+        for ano, mes, total in filas
+    ]
+
+
+def resumen(db, usuario_id):
+    filas = db.query(
+        ResumenMensual.tipo, func.sum(ResumenMensual.total)
+    ).filter(
+        ResumenMensual.usuario_id == usuario_id
+    ).group_by(ResumenMensual.tipo).all()
+    totales = {tipo: total or CERO for tipo, total in filas}
+
+    total_ingresos = totales.get("ingreso", CERO)
+    total_egresos = totales.get("egreso", CERO)
+    total_ahorros = totales.get("ahorro", CERO)
+    balance = total_ingresos - total_egresos
+
+    return {
+        "total_ingresos": total_ingresos,
+        "total_egresos": total_egresos,
+        "total_ahorros": total_ahorros,
+        "balance": balance
+    }
+
+
+def dashboard(db, usuario_id, desde=None, hasta=None):
+    """Resumen, tendencias y categorías de todos los tipos en una sola consulta.
+
+    El rango se aplica por mes (resumen_mensual no guarda días): se incluyen
+    los meses de `desde` a `hasta`, ambos completos.
+    """
+    query = db.query(
+        ResumenMensual.tipo, ResumenMensual.ano, ResumenMensual.mes,
+        ResumenMensual.categoria_id, func.sum(ResumenMensual.total)
+    ).filter(ResumenMensual.usuario_id == usuario_id)
+    periodo = ResumenMensual.ano * 100 + ResumenMensual.mes
+    if desde:
+        query = query.filter(periodo >= desde.year * 100 + desde.month)
+    if hasta:
+        query = query.filter(periodo <= hasta.year * 100 + hasta.month)
+    filas = query.group_by(
+        ResumenMensual.tipo, ResumenMensual.ano, ResumenMensual.mes, ResumenMensual.categoria_id
+    ).all()
+    nombres = categorias.nombres(db)
+
+    por_tipo = defaultdict(Decimal)
+    por_mes = {tipo: defaultdict(Decimal) for tipo in TIPOS}
+    por_cat = {tipo: defaultdict(Decimal) for tipo in TIPOS}
+    for tipo, ano, mes, categoria_id, total in filas:
+        total = total or CERO
+        categoria_nombre = nombres.get(categoria_id)
+        por_tipo[tipo] += total
+        por_mes.setdefault(tipo, defaultdict(Decimal))[(ano, mes)] += total
+        if categoria_nombre:
+            por_cat.setdefault(tipo, defaultdict(Decimal))[categoria_nombre] += total
+
+    total_ingresos = por_tipo["ingreso"]
+    total_egresos = por_tipo["egreso"]
+    return {
+        "resumen": {
+            "total_ingresos": total_ingresos,
+            "total_egresos": total_egresos,
+            "total_ahorros": por_tipo["ahorro"],
+            "balance": total_ingresos - total_egresos,
+        },
+        "tendencias": {
+            tipo: [{"ano": ano, "mes": MESES_ES[mes], "total": t} for (ano, mes), t in sorted(meses.items())]
+            for tipo, meses in por_mes.items()
+        },
+        "categorias": {
+            tipo: [{"categoria": c, "total": t} for c, t in cats.items()]
+            for tipo, cats in por_cat.items()
+        },
+    }
@@ -0,0 +1,151 @@
+# Mantenimiento de la tabla resumen_mensual (acumulados por usuario y mes).
+#
+# Los endpoints de escritura de transacciones llaman a `sumar`/`restar` dentro
+# de la misma sesión antes del commit, así el acumulado y la transacción se
+# confirman juntos. Para rellenar la tabla con datos existentes:
+#
+#   python resumen_mensual.py --reconstruir [--usuario 1]
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import Integer, cast, delete, extract, func, insert, select, union_all
+
+from dinero import CERO, redondear
+from models import ResumenMensual, Transaccion, TransaccionArchivo
+
+CLAVE = ["usuario_id", "ano", "mes", "tipo", "categoria_id"]
+
+
+def _sentencia_upsert(dialecto):
+    tabla = ResumenMensual.__table__
+    if dialecto == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(tabla)
+        return stmt.on_duplicate_key_update(
+            total=tabla.c.total + stmt.inserted.total,
+            cantidad=tabla.c.cantidad + stmt.inserted.cantidad,
+        )
+    if dialecto in ("sqlite", "postgresql"):
+        if dialecto == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(tabla)
+        return stmt.on_conflict_do_update(
+            index_elements=CLAVE,
+            set_={
+                "total": tabla.c.total + stmt.excluded.total,
+                "cantidad": tabla.c.cantidad + stmt.excluded.cantidad,
+            },
+        )
+    return None
+
+
+def _upsert(db, filas):
+    """Suma cada fila {CLAVE..., total, cantidad} a su acumulado en una sola ejecución."""
+    stmt = _sentencia_upsert(db.get_bind().dialect.name)
+    if stmt is not None:
+        db.execute(stmt, filas)
+        return
+    for valores in filas:
+        fila = db.get(ResumenMensual, tuple(valores[k] for k in CLAVE))
+        if fila is None:
+            db.add(ResumenMensual(**valores))
+        else:
+            fila.total += valores["total"]
+            fila.cantidad += valores["cantidad"]
+    db.flush()
+
+
+def aplicar(db, usuario_id, fecha, tipo, categoria_id, monto, cantidad):
+    valores = {
+        "usuario_id": usuario_id,
+        "ano": fecha.year,
+        "mes": fecha.month,
+        "tipo": tipo,
+        "categoria_id": categoria_id,
+        "total": monto,
+        "cantidad": cantidad,
+    }
+    _upsert(db, [valores])
+    if cantidad < 0:
+        # Un mes/categoría sin transacciones no debe quedar como fila en cero
+        db.execute(
+            delete(ResumenMensual).where(
+                *(getattr(ResumenMensual, k) == valores[k] for k in CLAVE),
+                ResumenMensual.cantidad <= 0,
+            )
+        )
+
+
+def sumar(db, t):
+    aplicar(db, t.usuario_id, t.fecha, t.tipo, t.categoria_id, t.monto, 1)
+
+
+def restar(db, t):
+    aplicar(db, t.usuario_id, t.fecha, t.tipo, t.categoria_id, -t.monto, -1)
+
+
+def sumar_filas(db, filas):
+    # Para inserciones masivas: un upsert por clave en lugar de uno por fila
+    deltas = defaultdict(lambda: [CERO, 0])
+    for f in filas:
+        clave = (f["usuario_id"], f["fecha"].year, f["fecha"].month, f["tipo"], f["categoria_id"])
+        deltas[clave][0] += redondear(f["monto"])
+        deltas[clave][1] += 1
+    if deltas:
+        _upsert(db, [
+            dict(zip(CLAVE, clave), total=total, cantidad=cantidad)
+            for clave, (total, cantidad) in deltas.items()
+        ])
+
+
+def _movimientos(usuario_id=None):
+    """Transacciones vivas y archivadas (particiones.py) como una sola fuente."""
+    partes = []
+    for modelo in (Transaccion, TransaccionArchivo):
+        sel = select(modelo.usuario_id, modelo.fecha, modelo.tipo, modelo.categoria_id, modelo.monto)
+        if usuario_id is not None:
+            sel = sel.where(modelo.usuario_id == usuario_id)
+        partes.append(sel)
+    return union_all(*partes).subquery("movimientos")
+
+
+def reconstruir(db, usuario_id=None):
+    borrar = delete(ResumenMensual)
+    m = _movimientos(usuario_id)
+    origen = select(
+        m.c.usuario_id,
+        cast(extract("year", m.c.fecha), Integer).label("ano"),
+        cast(extract("month", m.c.fecha), Integer).label("mes"),
+        m.c.tipo,
+        m.c.categoria_id,
+        func.sum(m.c.monto).label("total"),
+        func.count().label("cantidad"),
+    )
+    if usuario_id is not None:
+        borrar = borrar.where(ResumenMensual.usuario_id == usuario_id)
+    origen = origen.group_by(m.c.usuario_id, "ano", "mes", m.c.tipo, m.c.categoria_id)
+
+    db.execute(borrar)
+    db.execute(insert(ResumenMensual).from_select(CLAVE + ["total", "cantidad"], origen))
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Mantenimiento de resumen_mensual")
+    parser.add_argument("--reconstruir", action="store_true", help="recalcula el resumen desde transacciones (vivas y archivadas)")
+    parser.add_argument("--usuario", type=int, default=None, help="limita la reconstrucción a un usuario")
+    args = parser.parse_args()
+
+    if args.reconstruir:
+        db = SessionLocal()
+        try:
+            reconstruir(db, args.usuario)
+            db.commit()
+            print("resumen_mensual reconstruido")
+        finally:
+            db.close()
+    else:
+        parser.print_help()
@@ -1,59 +1,86 @@
-import uuid
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from datetime import datetime, date, timedelta
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Path, Query, Request, Response
+from fastapi.responses import JSONResponse
+from datetime import datetime, date
 from typing import List, Optional
-from collections import defaultdict
-from database import get_db
+from database import get_db, ejecutar, con_sesion
+from replicas import get_db_lectura
 from models import Notificacion, PasswordReset, Usuario, Presupuesto, Transaccion, PagoFijo, Categoria
+import reportes
+import cache
+import catalogo
+import exportacion
+import importacion
+import limites
+import mutaciones
+import presupuestos
+import pronosticos
+import recuperacion
+import sincronizacion
+from paginacion import paginar, LIMITE_DEFECTO, LIMITE_MAXIMO
 from schemas import (
     NotificacionRead, PasswordResetRequest, PasswordRecoveryRequest, UsuarioBase, UsuarioCreate, UsuarioRead as SchemaUsuario, UsuarioLogin, 
-    PresupuestoBase, PresupuestoCreate, PresupuestoRead as SchemaPresupuesto, 
+    PresupuestoBase, PresupuestoCreate, PresupuestoRead as SchemaPresupuesto, EstadoPresupuesto,
     TransaccionBase, TransaccionCreate, TransaccionRead as SchemaTransaccion, 
-    PagoFijoBase, PagoFijoCreate, PagoFijoRead as SchemaPagoFijo, PagoFijoOut,
-    CategoriaTotal, TendenciaMensual, ResumenFinanciero, UsuarioRead,
-    NotificacionCreate, NotificacionRead
+    PagoFijoBase, PagoFijoCreate, PagoFijoRead as SchemaPagoFijo,
+    CategoriaTotal, TendenciaMensual, ResumenFinanciero, Dashboard, Pronostico, UsuarioRead, ResultadoImportacion,
+    NotificacionCreate, NotificacionRead, RefrescoToken, CierreSesion, PeticionSync, RespuestaSync
     
 )
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
+import seguridad
+import serializacion
+import sesiones
+from sesiones import usuario_actual
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 router = APIRouter()
 
-MESES_ES = {
-    1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
-    7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
-}
+# El usuario de cada petición sale del token de acceso (sesiones.py); los
+# recursos de otro usuario se responden como inexistentes. Las rutas de solo
+# lectura piden `get_db_lectura`: réplica si hay (replicas.py), primario si no
+def _solo_propio(usuario_id: int, actual: int):
+    if usuario_id != actual:
+        raise HTTPException(status_code=403, detail="No autorizado para este usuario")
 
 # Endpoints de Usuarios
-@router.post("/register", response_model=SchemaUsuario, tags=["Usuarios"])
-def register(user: UsuarioCreate, db: Session = Depends(get_db)):
-    user_in_db_email = db.query(Usuario).filter(Usuario.correo == user.correo).first()
+# register/login/reset son async: bcrypt corre en el pool de seguridad.py y
+# liberan la conexión de la base antes de esperar el hash. Las rutas sin token
+# tienen límite de tasa por IP y por cuenta, y las de bcrypt control de
+# admisión (limites.py)
+@router.post("/register", response_model=SchemaUsuario, tags=["Usuarios"],
+             dependencies=[Depends(limites.por_ip("register")), Depends(limites.cupo_hash)])
+async def register(request: Request, user: UsuarioCreate, db: Session = Depends(get_db)):
+    limites.por_cuenta(request, "register", user.correo)
+
+    def buscar_existentes(db):
+        por_correo = db.query(Usuario.id).filter(Usuario.correo == user.correo).first()
+        por_nombre = db.query(Usuario.id).filter(Usuario.nombre_usuario == user.nombre_usuario).first()
+        return por_correo, por_nombre
+
+    user_in_db_email, user_in_db_username = await ejecutar(db, buscar_existentes, liberar=True)
     if user_in_db_email:
         raise HTTPException(status_code=400, detail="El correo ya está registrado")
-
-    user_in_db_username = db.query(Usuario).filter(Usuario.nombre_usuario == user.nombre_usuario).first()
     if user_in_db_username:
         raise HTTPException(status_code=400, detail="El nombre de usuario ya está en uso")
 
-    hashed_password = pwd_context.hash(user.contraseña)
+    hashed_password = await seguridad.hash_password(user.contraseña_hash)
     nuevo_usuario = Usuario(
         nombre_usuario=user.nombre_usuario,
         correo=user.correo,
-        contraseña=hashed_password,
+        contraseña_hash=hashed_password,
         telefono=user.telefono,
         esta_activo=True,
         fecha_creacion=datetime.now(),
         fecha_actualizacion=datetime.now()
     )
     
-    db.add(nuevo_usuario)
-    db.commit()
-    db.refresh(nuevo_usuario)
+    def guardar(db):
+        db.add(nuevo_usuario)
+        db.commit()
+        db.refresh(nuevo_usuario)
+    await ejecutar(db, guardar, liberar=True)
     return nuevo_usuario
 
-@router.put("/usuarios/{usuario_id}", response_model=UsuarioRead, tags=["Usuarios"])
-def actualizar_usuario(usuario_id: int, datos: UsuarioBase, db: Session = Depends(get_db)):
+def _actualizar_usuario(db, usuario_id, datos):
     u = db.query(Usuario).get(usuario_id)
     if not u:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -66,338 +93,481 @@ def actualizar_usuario(usuario_id: int, datos: UsuarioBase, db: Session = Depend
     db.refresh(u)
     return u
 
-@router.post("/login", tags=["Usuarios"])
-def login(user: UsuarioLogin, db: Session = Depends(get_db)):
-    usuario = db.query(Usuario).filter(Usuario.correo == user.correo).first()
-    if not usuario or not pwd_context.verify(user.contraseña_hash, usuario.contraseña_hash):
+@router.put("/usuarios/me", response_model=UsuarioRead, tags=["Usuarios"])
+@con_sesion
+def actualizar_usuario_actual(datos: UsuarioBase, actual: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    return _actualizar_usuario(db, actual, datos)
+
+@router.put("/usuarios/{usuario_id}", response_model=UsuarioRead, tags=["Usuarios"])
+@con_sesion
+def actualizar_usuario(usuario_id: int, datos: UsuarioBase, actual: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    _solo_propio(usuario_id, actual)
+    return _actualizar_usuario(db, usuario_id, datos)
+
+@router.post("/login", tags=["Usuarios"],
+             dependencies=[Depends(limites.por_ip("login")), Depends(limites.cupo_hash)])
+async def login(request: Request, user: UsuarioLogin, db: Session = Depends(get_db)):
+    limites.por_cuenta(request, "login", user.correo)
+    usuario = await ejecutar(
+        db, lambda db: db.query(Usuario).filter(Usuario.correo == user.correo).first(), liberar=True
+    )
+    if not usuario:
+        raise HTTPException(status_code=401, detail="Credenciales incorrectas")
+    valido, nuevo_hash = await seguridad.verificar_password(user.contraseña_hash, usuario.contraseña_hash)
+    if not valido:
         raise HTTPException(status_code=401, detail="Credenciales incorrectas")
+    if nuevo_hash:
+        # BCRYPT_ROUNDS cambió: se guarda el hash con el costo nuevo
+        def rehash(db):
+            db.query(Usuario).filter(Usuario.id == usuario.id).update(
+                {Usuario.contraseña_hash: nuevo_hash}, synchronize_session=False
+            )
+            db.commit()
+        await ejecutar(db, rehash, liberar=True)
     
     return {
         "mensaje": "Inicio de sesión exitoso",
         "usuario": usuario.nombre_usuario,
-        "usuario_id": usuario.id
+        "usuario_id": usuario.id,
+        **sesiones.emitir_par(usuario.id, nuevo_hash or usuario.contraseña_hash)
     }
 
+# Rota el par de tokens: el refresco usado queda revocado
+@router.post("/token/refresh", tags=["Usuarios"])
+async def refrescar_token(req: RefrescoToken, db: Session = Depends(get_db)):
+    claims = sesiones.verificar(req.refresh_token, sesiones.REFRESCO)
+    usuario = await ejecutar(db, lambda db: db.get(Usuario, claims["usuario_id"]), liberar=True)
+    # La huella cambia con la contraseña: un reset invalida los refrescos en todos los workers
+    if (not usuario or not usuario.esta_activo
+            or claims.get("pwd") != sesiones.huella_contrasena(usuario.contraseña_hash)):
+        raise HTTPException(status_code=401, detail="Token revocado", headers={"WWW-Authenticate": "Bearer"})
+    sesiones.revocar(claims)
+    return sesiones.emitir_par(usuario.id, usuario.contraseña_hash)
+
+@router.post("/logout", status_code=204, tags=["Usuarios"])
+async def logout(req: Optional[CierreSesion] = None, claims: dict = Depends(sesiones.sesion_actual)):
+    sesiones.revocar(claims)
+    if req and req.refresh_token:
+        try:
+            refresco = sesiones.verificar(req.refresh_token, sesiones.REFRESCO)
+        except HTTPException:
+            return
+        if refresco["usuario_id"] == claims["usuario_id"]:
+            sesiones.revocar(refresco)
+
+@router.get("/usuarios/me", response_model=UsuarioRead, tags=["Usuarios"])
+@con_sesion
+def obtener_usuario_actual(actual: int = Depends(usuario_actual), db: Session = Depends(get_db_lectura)):
+    u = db.query(Usuario).get(actual)
+    if not u:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return u
+
 @router.get("/usuarios/{usuario_id}", response_model=UsuarioRead, tags=["Usuarios"])
-def obtener_usuario(usuario_id: int, db: Session = Depends(get_db)):
+@con_sesion
+def obtener_usuario(usuario_id: int, actual: int = Depends(usuario_actual), db: Session = Depends(get_db_lectura)):
+    _solo_propio(usuario_id, actual)
     u = db.query(Usuario).get(usuario_id)
     if not u:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     return u
 
 
+# No hay rol de administrador: cada usuario solo se ve a sí mismo (la forma de lista se conserva)
 @router.get("/usuarios", response_model=List[UsuarioRead], tags=["Usuarios"])
-def listar_usuarios(db: Session = Depends(get_db)):
-    return db.query(Usuario).all()
+@con_sesion
+def listar_usuarios(
+    response: Response,
+    limit: int = Query(LIMITE_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    usuario_id: int = Depends(usuario_actual),
+    db: Session = Depends(get_db_lectura)
+):
+    query = db.query(Usuario).filter(Usuario.id == usuario_id)
+    return paginar(query, [Usuario.id], limit, cursor, response)
 
 # --- Recuperación de contraseña ---
-# Función simulada de envío de correo electrónico
-def send_recovery_email(email: str, token: str):
-    print(f"[EMAIL] Para {email}: usa este token → {token}")
-
-@router.post("/password-recovery", tags=["Usuarios"])
+# El correo se encola como notificación; lo envía notificaciones_worker.py
+# Un token vigente por usuario; los vencidos los borra recuperacion.py
+@router.post("/password-recovery", tags=["Usuarios"], dependencies=[Depends(limites.por_ip("password-recovery"))])
+@con_sesion
 def password_recovery(
+    request: Request,
     req: PasswordRecoveryRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
+    limites.por_cuenta(request, "password-recovery", req.correo)
     u = db.query(Usuario).filter(Usuario.correo == req.correo).first()
     mensaje = {"mensaje": "Si el correo existe, recibirás instrucciones por email."}
     if not u:
         return mensaje
-    token = str(uuid.uuid4())
-    expires = datetime.utcnow() + timedelta(hours=1)
-    pr = PasswordReset(user_id=u.id, token=token, expires_at=expires)
-    db.add(pr); db.commit()
-    background_tasks.add_task(send_recovery_email, u.correo, token)
-    return mensaje
-
-@router.post("/reset-password/{token}", tags=["Usuarios"])
-def reset_password(token: str, req: PasswordResetRequest, db: Session = Depends(get_db)):
-    pr = db.query(PasswordReset).filter(PasswordReset.token == token).first()
-    if not pr or pr.expires_at < datetime.utcnow():
-        raise HTTPException(status_code=400, detail="Token inválido o expirado")
-    u = db.get(Usuario, pr.user_id)
-    u.contraseña = req.nueva_contraseña
-    db.delete(pr)
+    token = recuperacion.crear(db, u.id)
+    db.add(Notificacion(
+        usuario_id=u.id, tipo="correo", asunto="Recuperación de contraseña",
+        mensaje=f"Usa este token para restablecer tu contraseña: {token}",
+        fecha_programada=datetime.utcnow()
+    ))
     db.commit()
-    return {"mensaje": "Contraseña reestablecida correctamente"}
+    return mensaje
 
-@router.post("/reset-password/{token}", tags=["Usuarios"])
-def reset_password(token: str, req: PasswordResetRequest, db: Session = Depends(get_db)):
-    pr = db.query(PasswordReset).filter(PasswordReset.token == token).first()
+@router.post("/reset-password/{token}", tags=["Usuarios"],
+             dependencies=[Depends(limites.por_ip("reset-password")), Depends(limites.cupo_hash)])
+async def reset_password(token: str, req: PasswordResetRequest, db: Session = Depends(get_db)):
+    pr = await ejecutar(
+        db, lambda db: db.query(PasswordReset).filter(PasswordReset.token == token).first(), liberar=True
+    )
     if not pr or pr.expires_at < datetime.utcnow():
         raise HTTPException(status_code=400, detail="Token inválido o expirado")
-    u = db.get(Usuario, pr.user_id)
-    u.contraseña_hash = pwd_context.hash(req.nueva_contraseña)
-    db.delete(pr)
-    db.commit()
+    nuevo_hash = await seguridad.hash_password(req.nueva_contraseña)
+
+    def guardar(db):
+        u = db.get(Usuario, pr.user_id)
+        u.contraseña_hash = nuevo_hash
+        db.query(PasswordReset).filter(PasswordReset.id == pr.id).delete(synchronize_session=False)
+        db.commit()
+    await ejecutar(db, guardar, liberar=True)
+    # Cierra las sesiones abiertas con la contraseña anterior
+    sesiones.revocar_usuario(pr.user_id)
     return {"mensaje": "Contraseña reestablecida correctamente"}
 
 
 # Endpoints de Presupuestos
 @router.get("/presupuestos", response_model=List[SchemaPresupuesto], tags=["Presupuestos"])
-def listar_presupuestos(db: Session = Depends(get_db)):
-    return db.query(Presupuesto).all()
+@con_sesion
+def listar_presupuestos(
+    response: Response,
+    limit: int = Query(LIMITE_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    usuario_id: int = Depends(usuario_actual),
+    db: Session = Depends(get_db_lectura)
+):
+    query = db.query(Presupuesto).filter(Presupuesto.usuario_id == usuario_id)
+    return paginar(query, [Presupuesto.id], limit, cursor, response)
+
+# Gasto contra presupuesto de un mes (por defecto el actual)
+@router.get("/presupuestos/estado", response_model=List[EstadoPresupuesto], tags=["Presupuestos"])
+@con_sesion
+def estado_presupuestos(
+    request: Request,
+    ano: Optional[int] = None,
+    mes: Optional[int] = Query(None, ge=1, le=12),
+    usuario_id: int = Depends(usuario_actual),
+    db: Session = Depends(get_db_lectura)
+):
+    hoy = date.today()
+    ano, mes = ano or hoy.year, mes or hoy.month
+    return cache.respuesta(request, db, "presupuestos_estado", usuario_id, {"ano": ano, "mes": mes},
+                           ["presupuestos", "transacciones"],
+                           lambda: presupuestos.estado(db, usuario_id, ano, mes))
 
 @router.get("/presupuestos/{presupuesto_id}", response_model=SchemaPresupuesto, tags=["Presupuestos"])
-def obtener_presupuesto(presupuesto_id: int, db: Session = Depends(get_db)):
-    presupuesto = db.query(Presupuesto).filter(Presupuesto.id == presupuesto_id).first()
+@con_sesion
+def obtener_presupuesto(presupuesto_id: int, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db_lectura)):
+    presupuesto = db.query(Presupuesto).filter(
+        Presupuesto.id == presupuesto_id, Presupuesto.usuario_id == usuario_id
+    ).first()
     if not presupuesto:
         raise HTTPException(status_code=404, detail="Presupuesto no encontrado")
     return presupuesto
 
 @router.post("/presupuestos", response_model=SchemaPresupuesto, tags=["Presupuestos"])
-def crear_presupuesto(presupuesto: PresupuestoCreate, db: Session = Depends(get_db)):
-    db_presupuesto = Presupuesto(**presupuesto.dict())
-    db.add(db_presupuesto)
+@con_sesion
+def crear_presupuesto(presupuesto: PresupuestoCreate, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    db_presupuesto = mutaciones.crear_presupuesto(db, usuario_id, presupuesto)
     db.commit()
+    cache.invalidar(usuario_id, "presupuestos")
     db.refresh(db_presupuesto)
     return db_presupuesto
 
 @router.put("/presupuestos/{presupuesto_id}", response_model=SchemaPresupuesto, tags=["Presupuestos"])
-def actualizar_presupuesto(presupuesto_id: int, presupuesto: PresupuestoCreate, db: Session = Depends(get_db)):
-    db_presupuesto = db.query(Presupuesto).filter(Presupuesto.id == presupuesto_id).first()
-    if not db_presupuesto:
-        raise HTTPException(status_code=404, detail="Presupuesto no encontrado")
-    
-    for key, value in presupuesto.dict().items():
-        setattr(db_presupuesto, key, value)
-    
+@con_sesion
+def actualizar_presupuesto(presupuesto_id: int, presupuesto: PresupuestoCreate, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    db_presupuesto = mutaciones.actualizar_presupuesto(db, usuario_id, presupuesto_id, presupuesto)
     db.commit()
+    cache.invalidar(usuario_id, "presupuestos")
     db.refresh(db_presupuesto)
     return db_presupuesto
 
 @router.delete("/presupuestos/{presupuesto_id}", tags=["Presupuestos"])
-def eliminar_presupuesto(presupuesto_id: int, db: Session = Depends(get_db)):
-    db_presupuesto = db.query(Presupuesto).filter(Presupuesto.id == presupuesto_id).first()
-    if not db_presupuesto:
-        raise HTTPException(status_code=404, detail="Presupuesto no encontrado")
-    
-    db.delete(db_presupuesto)
+@con_sesion
+def eliminar_presupuesto(presupuesto_id: int, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    mutaciones.eliminar_presupuesto(db, usuario_id, presupuesto_id)
     db.commit()
+    cache.invalidar(usuario_id, "presupuestos")
     return {"mensaje": "Presupuesto eliminado correctamente"}
 
 # Endpoints de Transacciones
+# Más recientes primero; el cursor recorre (fecha, id) sobre idx_trans_usuario_fecha_id.
+# Solo lista transacciones vivas: los meses archivados (particiones.py) salen por /exportar
 @router.get("/transacciones", response_model=List[SchemaTransaccion], tags=["Transacciones"])
-def listar_transacciones(db: Session = Depends(get_db)):
-    return db.query(Transaccion).all()
+@con_sesion
+def listar_transacciones(
+    response: Response,
+    tipo: Optional[str] = None,
+    categoria_id: Optional[int] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    q: Optional[str] = Query(None, max_length=100),
+    limit: int = Query(LIMITE_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    usuario_id: int = Depends(usuario_actual),
+    db: Session = Depends(get_db_lectura)
+):
+    query = db.query(Transaccion).filter(Transaccion.usuario_id == usuario_id)
+    if tipo:
+        query = query.filter(Transaccion.tipo == tipo)
+    if categoria_id is not None:
+        query = query.filter(Transaccion.categoria_id == categoria_id)
+    if desde:
+        query = query.filter(Transaccion.fecha >= desde)
+    if hasta:
+        query = query.filter(Transaccion.fecha <= hasta)
+    if q:
+        query = query.filter(Transaccion.descripcion.contains(q, autoescape=True))
+    query = serializacion.seleccionar(query, SchemaTransaccion)
+    return serializacion.pagina(query, [Transaccion.fecha, Transaccion.id], limit, cursor, response, usuario_id,
+                                descendente=True)
 
 @router.get("/transacciones/{transaccion_id}", response_model=SchemaTransaccion, tags=["Transacciones"])
-def obtener_transaccion(transaccion_id: int, db: Session = Depends(get_db)):
-    transaccion = db.query(Transaccion).filter(Transaccion.id == transaccion_id).first()
+@con_sesion
+def obtener_transaccion(transaccion_id: int, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db_lectura)):
+    transaccion = db.query(Transaccion).filter(
+        Transaccion.id == transaccion_id, Transaccion.usuario_id == usuario_id
+    ).first() or mutaciones.archivada(db, transaccion_id, usuario_id)
     if not transaccion:
         raise HTTPException(status_code=404, detail="Transacción no encontrada")
     return transaccion
 
 @router.post("/transacciones", response_model=SchemaTransaccion, tags=["Transacciones"])
-def agregar_transaccion(transaccion: TransaccionCreate, db: Session = Depends(get_db)):
-    db_transaccion = Transaccion(**transaccion.dict())
-    db.add(db_transaccion)
+@con_sesion
+def agregar_transaccion(transaccion: TransaccionCreate, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    db_transaccion = mutaciones.crear_transaccion(db, usuario_id, transaccion)
     db.commit()
+    cache.invalidar(usuario_id, "transacciones")
     db.refresh(db_transaccion)
     return db_transaccion
 
+# Importación masiva: cuerpo CSV (con encabezado) o NDJSON, leído en streaming
+@router.post("/transacciones/bulk", response_model=ResultadoImportacion, tags=["Transacciones"])
+async def importar_transacciones(
+    request: Request,
+    formato: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    usuario_id: int = Depends(usuario_actual),
+    db: Session = Depends(get_db)
+):
+    formato = importacion.detectar_formato(request.headers.get("content-type"), formato)
+    if not formato:
+        raise HTTPException(status_code=415, detail="Formato no soportado, use CSV o NDJSON")
+    return await importacion.importar(request.stream(), formato, db, usuario_id)
+
 @router.put("/transacciones/{transaccion_id}", response_model=SchemaTransaccion, tags=["Transacciones"])
-def actualizar_transaccion(transaccion_id: int, transaccion: TransaccionCreate, db: Session = Depends(get_db)):
-    db_transaccion = db.query(Transaccion).filter(Transaccion.id == transaccion_id).first()
-    if not db_transaccion:
-        raise HTTPException(status_code=404, detail="Transacción no encontrada")
-    
-    for key, value in transaccion.dict().items():
-        setattr(db_transaccion, key, value)
-    
+@con_sesion
+def actualizar_transaccion(transaccion_id: int, transaccion: TransaccionCreate, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    db_transaccion = mutaciones.actualizar_transaccion(db, usuario_id, transaccion_id, transaccion)
     db.commit()
+    cache.invalidar(usuario_id, "transacciones")
     db.refresh(db_transaccion)
     return db_transaccion
 
 @router.delete("/transacciones/{transaccion_id}", tags=["Transacciones"])
-def eliminar_transaccion(transaccion_id: int, db: Session = Depends(get_db)):
-    db_transaccion = db.query(Transaccion).filter(Transaccion.id == transaccion_id).first()
-    if not db_transaccion:
-        raise HTTPException(status_code=404, detail="Transacción no encontrada")
-    
-    db.delete(db_transaccion)
+@con_sesion
+def eliminar_transaccion(transaccion_id: int, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    mutaciones.eliminar_transaccion(db, usuario_id, transaccion_id)
     db.commit()
+    cache.invalidar(usuario_id, "transacciones")
     return {"mensaje": "Transacción eliminada correctamente"}
 
 # Endpoints de Pagos Fijos
+# Predeterminadas más las del usuario, servidas desde el índice en memoria (catalogo.py)
 @router.get("/categorias")
-def get_categories(db: Session = Depends(get_db)):
-    return db.query(Categoria).all()
-
-@router.get("/pagos-fijos", response_model=List[PagoFijoOut], tags=["Pagos Fijos"])
-def listar_pagos_fijos(usuario_id: Optional[int] = None, db: Session = Depends(get_db)):
-    query = db.query(PagoFijo)
-    if usuario_id:
-        query = query.filter(PagoFijo.usuario_id == usuario_id)
-    return query.all()
+@con_sesion
+def get_categories(request: Request, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    etag, cuerpo = catalogo.indice.de_usuario(db, usuario_id)
+    return cache.con_etag(request, etag, cuerpo)
+
+@router.get("/pagos-fijos", response_model=List[SchemaPagoFijo], tags=["Pagos Fijos"])
+@con_sesion
+def listar_pagos_fijos(
+    response: Response,
+    limit: int = Query(LIMITE_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    usuario_id: int = Depends(usuario_actual),
+    db: Session = Depends(get_db_lectura)
+):
+    query = db.query(PagoFijo).filter(PagoFijo.usuario_id == usuario_id)
+    query = serializacion.seleccionar(query, SchemaPagoFijo)
+    return serializacion.pagina(query, [PagoFijo.id], limit, cursor, response, usuario_id)
 
 @router.get("/pagos-fijos/{pago_id}", response_model=SchemaPagoFijo, tags=["Pagos Fijos"])
-def obtener_pago_fijo(pago_id: int, db: Session = Depends(get_db)):
-    pago = db.query(PagoFijo).filter(PagoFijo.id == pago_id).first()
+@con_sesion
+def obtener_pago_fijo(pago_id: int, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db_lectura)):
+    pago = db.query(PagoFijo).filter(PagoFijo.id == pago_id, PagoFijo.usuario_id == usuario_id).first()
     if not pago:
         raise HTTPException(status_code=404, detail="Pago fijo no encontrado")
     return pago
 
 @router.post("/pagos-fijos", response_model=SchemaPagoFijo, tags=["Pagos Fijos"])
-def crear_pago_fijo(pago: PagoFijoCreate, db: Session = Depends(get_db)):
-    usuario = db.query(Usuario).filter(Usuario.id == pago.usuario_id).first()
-    if not usuario:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    
-    existe_pago = db.query(PagoFijo).filter(
-        PagoFijo.descripcion == pago.descripcion,
-        PagoFijo.usuario_id == pago.usuario_id,
-        PagoFijo.monto == pago.monto
-    ).first()
-    
-    if existe_pago:
-        raise HTTPException(status_code=400, detail="Ya existe un pago fijo similar para este usuario")
-    
-    db_pago = PagoFijo(**pago.dict())
-    db.add(db_pago)
+@con_sesion
+def crear_pago_fijo(pago: PagoFijoCreate, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    db_pago = mutaciones.crear_pago_fijo(db, usuario_id, pago)
     db.commit()
+    cache.invalidar(usuario_id, "pagos_fijos")
     db.refresh(db_pago)
     return db_pago
 
 @router.put("/pagos-fijos/{pago_id}", response_model=SchemaPagoFijo, tags=["Pagos Fijos"])
-def actualizar_pago_fijo(pago_id: int, pago: PagoFijoCreate, db: Session = Depends(get_db)):
-    db_pago = db.query(PagoFijo).filter(PagoFijo.id == pago_id).first()
-    if not db_pago:
-        raise HTTPException(status_code=404, detail="Pago fijo no encontrado")
-    
-    usuario = db.query(Usuario).filter(Usuario.id == pago.usuario_id).first()
-    if not usuario:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    
-    for key, value in pago.dict().items():
-        setattr(db_pago, key, value)
-    
+@con_sesion
+def actualizar_pago_fijo(pago_id: int, pago: PagoFijoCreate, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    db_pago = mutaciones.actualizar_pago_fijo(db, usuario_id, pago_id, pago)
     db.commit()
+    cache.invalidar(usuario_id, "pagos_fijos")
     db.refresh(db_pago)
     return db_pago
 
 @router.delete("/pagos-fijos/{pago_id}", tags=["Pagos Fijos"])
-def eliminar_pago_fijo(pago_id: int, db: Session = Depends(get_db)):
-    db_pago = db.query(PagoFijo).filter(PagoFijo.id == pago_id).first()
-    if not db_pago:
-        raise HTTPException(status_code=404, detail="Pago fijo no encontrado")
-    
-    db.delete(db_pago)
+@con_sesion
+def eliminar_pago_fijo(pago_id: int, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    mutaciones.eliminar_pago_fijo(db, usuario_id, pago_id)
     db.commit()
+    cache.invalidar(usuario_id, "pagos_fijos")
     return {"mensaje": "Pago fijo eliminado correctamente"}
 
 @router.get("/usuarios/{usuario_id}/pagos-fijos", response_model=List[SchemaPagoFijo], tags=["Pagos Fijos"])
-def listar_pagos_fijos_por_usuario(usuario_id: int, db: Session = Depends(get_db)):
-    usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
-    if not usuario:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    
-    return db.query(PagoFijo).filter(PagoFijo.usuario_id == usuario_id).all()
+@con_sesion
+def listar_pagos_fijos_por_usuario(
+    usuario_id: int,
+    response: Response,
+    limit: int = Query(LIMITE_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    actual: int = Depends(usuario_actual),
+    db: Session = Depends(get_db_lectura)
+):
+    _solo_propio(usuario_id, actual)
+    query = db.query(PagoFijo).filter(PagoFijo.usuario_id == usuario_id)
+    query = serializacion.seleccionar(query, SchemaPagoFijo)
+    return serializacion.pagina(query, [PagoFijo.id], limit, cursor, response, usuario_id)
+
+# Exportación del historial completo (vivo y archivado), en streaming o como trabajo (ver exportacion.py)
+@router.get("/usuarios/{usuario_id}/export", tags=["Transacciones"])
+async def exportar_transacciones(
+    usuario_id: int,
+    tareas: BackgroundTasks,
+    formato: str = Query("csv", pattern="^(csv|xlsx|parquet)$"),
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    asincrono: bool = False,
+    actual: int = Depends(usuario_actual)
+):
+    _solo_propio(usuario_id, actual)
+    exportacion.validar_formato(formato)
+    if not asincrono:
+        return exportacion.descargar(usuario_id, formato, desde, hasta)
+    trabajo = exportacion.crear_trabajo(usuario_id, formato)
+    tareas.add_task(exportacion.ejecutar_trabajo, usuario_id, trabajo, formato, desde, hasta)
+    return JSONResponse(status_code=202, content={
+        "trabajo": trabajo, "estado": "en_proceso", "url": f"/usuarios/{usuario_id}/export/{trabajo}"
+    })
+
+@router.get("/usuarios/{usuario_id}/export/{trabajo}", tags=["Transacciones"])
+async def descargar_exportacion(
+    usuario_id: int,
+    trabajo: str = Path(..., pattern="^[0-9a-f]{16}$"),
+    actual: int = Depends(usuario_actual)
+):
+    _solo_propio(usuario_id, actual)
+    return exportacion.respuesta_trabajo(usuario_id, trabajo)
+
+# Sincronización de la app sin conexión: mutaciones por lote + cambios desde el cursor (ver sincronizacion.py)
+@router.post("/sync", response_model=RespuestaSync, tags=["Sincronización"])
+@con_sesion
+def sincronizar(peticion: PeticionSync, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    return sincronizacion.sincronizar(db, usuario_id, peticion)
 
 # Endpoints de Gráficas y Reportes
+# Cacheados por usuario; la clave lleva la versión de sync guardada en la base (ver cache.py)
 @router.get("/graficas/categorias", response_model=List[CategoriaTotal], tags=["Gráficas"])
-def graficas_por_categoria(tipo: str, usuario_id: int = 1, db: Session = Depends(get_db)):
-    totales = defaultdict(float)
-    transacciones_con_categorias = db.query(Transaccion, Categoria.nombre).join(
-        Categoria, Transaccion.categoria_id == Categoria.id
-    ).filter(
-        Transaccion.usuario_id == usuario_id,
-        Transaccion.tipo == tipo
-    ).all()
-
-    for t, categoria_nombre in transacciones_con_categorias:
-        if categoria_nombre:
-            totales[categoria_nombre] += t.monto
-
-    return [{"categoria": cat, "total": total} for cat, total in totales.items()]
+@con_sesion
+def graficas_por_categoria(request: Request, tipo: str, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db_lectura)):
+    return cache.respuesta(request, db, "categorias", usuario_id, {"tipo": tipo}, ["transacciones"],
+                           lambda: reportes.por_categoria(db, usuario_id, tipo))
 
 @router.get("/graficas/tendencias", response_model=List[TendenciaMensual], tags=["Gráficas"])
-def tendencias_mensuales(tipo: str, usuario_id: int = 1, db: Session = Depends(get_db)):
-    totales_por_mes = defaultdict(float)
-
-    transacciones = db.query(Transaccion).filter(
-        Transaccion.usuario_id == usuario_id,
-        Transaccion.tipo == tipo
-    ).all()
-
-    for t in transacciones:
-        if t.fecha:
-            mes = t.fecha.month
-            totales_por_mes[mes] += t.monto
-
-    return [
-        {"mes": MESES_ES[mes], "total": totales_por_mes[mes]}
-        for mes in sorted(totales_por_mes.keys())
-    ] 
+@con_sesion
+def tendencias_mensuales(request: Request, tipo: str, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db_lectura)):
+    return cache.respuesta(request, db, "tendencias", usuario_id, {"tipo": tipo}, ["transacciones"],
+                           lambda: reportes.tendencias(db, usuario_id, tipo))
+
+# Proyección de los próximos meses y gastos atípicos; los parámetros los calcula pronosticos.py de noche
+@router.get("/graficas/pronostico", response_model=Pronostico, tags=["Gráficas"])
+@con_sesion
+def pronostico(request: Request, meses: int = Query(3, ge=1, le=12), usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db_lectura)):
+    return cache.respuesta(request, db, "pronostico", usuario_id, {"meses": meses}, ["pagos_fijos", "pronosticos"],
+                           lambda: pronosticos.pronostico(db, usuario_id, meses))
 
 @router.get("/resumen", response_model=ResumenFinanciero, tags=["Resumen Financiero"])
-def resumen_financiero(usuario_id: int = 1, db: Session = Depends(get_db)):
-    ingresos = db.query(Transaccion).filter(
-        Transaccion.usuario_id == usuario_id,
-        Transaccion.tipo == "ingreso"
-    ).all()
-    
-    egresos = db.query(Transaccion).filter(
-        Transaccion.usuario_id == usuario_id,
-        Transaccion.tipo == "egreso"
-    ).all()
-
-    ahorros = db.query(Transaccion).filter(
-        Transaccion.usuario_id == usuario_id,
-        Transaccion.tipo == "ahorro"
-    ).all()
-    
-    total_ingresos = sum(t.monto for t in ingresos)
-    total_egresos = sum(t.monto for t in egresos)
-    total_ahorros = sum(t.monto for t in ahorros)
-    balance = total_ingresos - total_egresos
+@con_sesion
+def resumen_financiero(request: Request, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db_lectura)):
+    return cache.respuesta(request, db, "resumen", usuario_id, {}, ["transacciones"],
+                           lambda: reportes.resumen(db, usuario_id))
+
+# Todo el dashboard en una respuesta para evitar varias idas y vueltas desde el móvil
+@router.get("/dashboard", response_model=Dashboard, tags=["Resumen Financiero"])
+@con_sesion
+def dashboard(
+    request: Request,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    usuario_id: int = Depends(usuario_actual),
+    db: Session = Depends(get_db_lectura)
+):
+    return cache.respuesta(request, db, "dashboard", usuario_id, {"desde": desde, "hasta": hasta}, ["transacciones"],
+                           lambda: reportes.dashboard(db, usuario_id, desde, hasta))
 
-    return {
-        "total_ingresos": total_ingresos,
-        "total_egresos": total_egresos,
-        "total_ahorros": total_ahorros,
-        "balance": balance
-    }
-    
     # --- Rutas Notificaciones ---
 @router.get("/notificaciones", response_model=List[NotificacionRead], tags=["Notificaciones"])
-def listar_notificaciones(usuario_id: Optional[int] = None, db: Session = Depends(get_db)):
-    q = db.query(Notificacion)
-    if usuario_id is not None:
-        q = q.filter(Notificacion.usuario_id == usuario_id)
-    return q.all()
+@con_sesion
+def listar_notificaciones(
+    response: Response,
+    limit: int = Query(LIMITE_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    usuario_id: int = Depends(usuario_actual),
+    db: Session = Depends(get_db_lectura)
+):
+    q = db.query(Notificacion).filter(Notificacion.usuario_id == usuario_id)
+    q = serializacion.seleccionar(q, NotificacionRead)
+    return serializacion.pagina(q, [Notificacion.id], limit, cursor, response, usuario_id)
 
 @router.get("/notificaciones/{notif_id}", response_model=NotificacionRead, tags=["Notificaciones"])
-def obtener_notificacion(notif_id: int, db: Session = Depends(get_db)):
+@con_sesion
+def obtener_notificacion(notif_id: int, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db_lectura)):
     n = db.query(Notificacion).get(notif_id)
-    if not n:
+    if not n or n.usuario_id != usuario_id:
         raise HTTPException(status_code=404, detail="Notificación no encontrada")
     return n
 
 @router.post("/notificaciones", response_model=NotificacionRead, status_code=201, tags=["Notificaciones"])
-def crear_notificacion(payload: NotificacionCreate, db: Session = Depends(get_db)):
-    if not db.query(Usuario).get(payload.usuario_id):
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    n = Notificacion(**payload.dict())
+@con_sesion
+def crear_notificacion(payload: NotificacionCreate, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
+    n = Notificacion(**payload.dict(exclude={"usuario_id"}), usuario_id=usuario_id)
     db.add(n); db.commit(); db.refresh(n)
     return n
 
 @router.put("/notificaciones/{notif_id}", response_model=NotificacionRead, tags=["Notificaciones"])
-def actualizar_notificacion(notif_id: int, datos: NotificacionCreate, db: Session = Depends(get_db)):
+@con_sesion
+def actualizar_notificacion(notif_id: int, datos: NotificacionCreate, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
     n = db.query(Notificacion).get(notif_id)
-    if not n:
+    if not n or n.usuario_id != usuario_id:
         raise HTTPException(status_code=404, detail="Notificación no encontrada")
-    for k, v in datos.dict().items():
+    for k, v in datos.dict(exclude={"usuario_id"}).items():
         setattr(n, k, v)
     db.commit(); db.refresh(n)
     return n
 
 @router.delete("/notificaciones/{notif_id}", status_code=204, tags=["Notificaciones"])
-def eliminar_notificacion(notif_id: int, db: Session = Depends(get_db)):
+@con_sesion
+def eliminar_notificacion(notif_id: int, usuario_id: int = Depends(usuario_actual), db: Session = Depends(get_db)):
     n = db.query(Notificacion).get(notif_id)
-    if not n:
+    if not n or n.usuario_id != usuario_id:
         raise HTTPException(status_code=404, detail="Notificación no encontrada")
     db.delete(n); db.commit()
 
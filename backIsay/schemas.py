@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional, Literal
+from typing import Dict, List, Optional, Literal
 from pydantic import BaseModel, Field
 from datetime import datetime, date
 
@@ -36,9 +36,15 @@ class PasswordRecoveryRequest(BaseModel):
 class PasswordResetRequest(BaseModel):
     nueva_contraseña: str = Field(..., min_length=6)
 
+class RefrescoToken(BaseModel):
+    refresh_token: str
+
+class CierreSesion(BaseModel):
+    refresh_token: Optional[str] = None
+
 # --- Presupuestos ---
 class PresupuestoBase(BaseModel):
-    usuario_id: int
+    usuario_id: Optional[int] = None  # en escrituras lo fija el token
     categoria_id: int
     monto: float
     ano: int
@@ -47,31 +53,54 @@ class PresupuestoBase(BaseModel):
 class PresupuestoCreate(PresupuestoBase): pass
 
 class PresupuestoRead(PresupuestoBase):
+    usuario_id: int
     id: int
     fecha_creacion: datetime
     fecha_actualizacion: datetime
     class Config:
         orm_mode = True
 
+class EstadoPresupuesto(BaseModel):
+    presupuesto_id: int
+    categoria_id: int
+    categoria: str
+    ano: int
+    mes: int
+    monto: float
+    gastado: float
+    restante: float
+    porcentaje: Optional[float] = None
+
 # --- Transacciones ---
 class TransaccionBase(BaseModel):
-    usuario_id: int
+    usuario_id: Optional[int] = None  # en escrituras lo fija el token
     monto: float
     categoria_id: int
-    tipo: str
+    tipo: Literal['ingreso', 'egreso', 'ahorro']
     fecha: date
     descripcion: Optional[str] = None
-    es_recurrente: Optional[bool] = False
-    id_recurrente: Optional[int] = None
 
 class TransaccionCreate(TransaccionBase): pass
 
 class TransaccionRead(TransaccionBase):
+    usuario_id: int
     id: int
+    # Solo lectura: los fija recurrentes.py al generar los pagos fijos
+    es_recurrente: Optional[bool] = False
+    id_recurrente: Optional[int] = None
     fecha_creacion: datetime
     class Config:
         orm_mode = True
         
+class ErrorImportacion(BaseModel):
+    fila: int
+    error: str
+
+class ResultadoImportacion(BaseModel):
+    insertadas: int
+    total_errores: int
+    errores: List[ErrorImportacion]
+
 class TransaccionOut(BaseModel):
     id: int
     monto: float
@@ -86,7 +115,7 @@ class TransaccionOut(BaseModel):
 # --- Pagos Fijos ---
 class PagoFijoBase(BaseModel):
     descripcion: str
-    usuario_id: int
+    usuario_id: Optional[int] = None  # en escrituras lo fija el token
     categoria_id: int
     monto: float
     fecha: date
@@ -94,7 +123,9 @@ class PagoFijoBase(BaseModel):
 class PagoFijoCreate(PagoFijoBase): pass
 
 class PagoFijoRead(PagoFijoBase):
+    usuario_id: int
     id: int
+    proximo_cobro: Optional[date] = None
     fecha_creacion: datetime
     class Config:
         orm_mode = True
@@ -117,6 +148,7 @@ class Categoria(BaseModel):
         orm_mode = True
 
 class TendenciaMensual(BaseModel):
+    ano: int
     mes: str
     total: float
     
@@ -126,9 +158,44 @@ class ResumenFinanciero(BaseModel):
     total_ahorros: float
     balance: float
 
+class Dashboard(BaseModel):
+    resumen: ResumenFinanciero
+    tendencias: Dict[str, List[TendenciaMensual]]
+    categorias: Dict[str, List[CategoriaTotal]]
+
+class PronosticoCategoria(BaseModel):
+    categoria_id: int
+    categoria: str
+    tipo: str
+    total: float
+    minimo: float       # intervalo de ~80 %
+    maximo: float
+    fijos: float        # pagos fijos programados en el mes
+
+class PronosticoMes(BaseModel):
+    ano: int
+    mes: int
+    nombre: str
+    totales: Dict[str, float]
+    categorias: List[PronosticoCategoria]
+
+class AnomaliaRead(BaseModel):
+    transaccion_id: int
+    fecha: date
+    categoria_id: int
+    categoria: str
+    monto: float
+    esperado: float     # monto medio de la categoría
+    puntaje: float      # desviaciones sobre la media
+
+class Pronostico(BaseModel):
+    calculado: Optional[datetime] = None
+    meses: List[PronosticoMes]
+    anomalias: List[AnomaliaRead]
+
 # --- Notificaciones ---
 class NotificacionBase(BaseModel):
-    usuario_id: int
+    usuario_id: Optional[int] = None  # en escrituras lo fija el token
     tipo: Literal['correo','sms']
     asunto: str
     mensaje: str
@@ -138,10 +205,41 @@ class NotificacionCreate(NotificacionBase):
     pass
 
 class NotificacionRead(NotificacionBase):
+    usuario_id: int
     id: int
     fue_enviada: bool
     fecha_creacion: datetime
     fecha_envio: Optional[datetime]
     class Config:
         orm_mode = True
-       
+
+# --- Sincronización (POST /sync) ---
+class MutacionSync(BaseModel):
+    clave: str = Field(..., min_length=1, max_length=64)   # idempotencia, la genera el cliente
+    entidad: Literal['transaccion', 'presupuesto', 'pago_fijo']
+    operacion: Literal['crear', 'actualizar', 'eliminar']
+    id: Optional[int] = None                                # para actualizar/eliminar
+    datos: Optional[Dict] = None                            # para crear/actualizar
+
+class PeticionSync(BaseModel):
+    cursor: Optional[str] = None
+    mutaciones: List[MutacionSync] = Field(default_factory=list, max_length=500)
+
+class ResultadoMutacion(BaseModel):
+    clave: str
+    estado: Literal['ok', 'error']
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class CambiosSync(BaseModel):
+    transacciones: List[TransaccionRead]
+    presupuestos: List[PresupuestoRead]
+    pagos_fijos: List[PagoFijoRead]
+    eliminados: Dict[str, List[int]]
+
+class RespuestaSync(BaseModel):
+    resultados: List[ResultadoMutacion]
+    cambios: CambiosSync
+    cursor: str
+    hay_mas: bool       # quedan cambios: volver a llamar con el cursor nuevo
+    completo: bool      # los cambios son la colección completa: reemplazar lo local
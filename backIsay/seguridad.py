@@ -0,0 +1,81 @@
+# Hash y verificación de contraseñas (bcrypt) fuera del event loop.
+#
+# bcrypt consume decenas de ms de CPU por llamada; se ejecuta en un pool de
+# procesos de tamaño fijo para no ocupar los hilos que atienden al resto de
+# endpoints. Configuración por variables de entorno:
+#   BCRYPT_ROUNDS  costo de bcrypt (por defecto 12)
+#   HASH_WORKERS   procesos del pool (por defecto, núcleos disponibles)
+#   HASH_COLA_MAX  operaciones de hash admitidas a la vez, en curso + en cola
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_COLA_MAX = int(os.getenv("HASH_COLA_MAX", str(HASH_WORKERS * 8)))
+
+# Con `rounds` fijo, needs_update() marca los hashes creados con otro costo
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_pool = None
+_cupos = None
+pendientes = 0
+
+
+# --- Funciones que corren dentro de los procesos del pool ---
+
+def _hash(password):
+    return pwd_context.hash(password)
+
+
+def _verificar(password, hash_guardado):
+    """Devuelve (coincide, nuevo_hash) — nuevo_hash solo si el costo cambió."""
+    coincide = pwd_context.verify(password, hash_guardado)
+    if coincide and pwd_context.needs_update(hash_guardado):
+        return True, pwd_context.hash(password)
+    return coincide, None
+
+
+# --- API asíncrona para los endpoints ---
+
+def _obtener_pool():
+    global _pool, _cupos
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        _cupos = asyncio.Semaphore(HASH_COLA_MAX)
+    return _pool
+
+
+async def _ejecutar(fn, *args):
+    global pendientes
+    pool = _obtener_pool()
+    pendientes += 1
+    try:
+        async with _cupos:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    finally:
+        pendientes -= 1
+
+
+async def hash_password(password):
+    return await _ejecutar(_hash, password)
+
+
+async def verificar_password(password, hash_guardado):
+    if not hash_guardado:
+        return False, None
+    try:
+        return await _ejecutar(_verificar, password, hash_guardado)
+    except ValueError:
+        # Hash con formato desconocido (p. ej. datos de ejemplo sin bcrypt)
+        return False, None
+
+
+def cerrar_pool():
+    global _pool, _cupos
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _cupos = None
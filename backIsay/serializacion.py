@@ -0,0 +1,108 @@
+# Serialización rápida de listados (opcional, LISTAS_RAPIDAS=1).
+#
+# Por defecto los listados devuelven objetos ORM y FastAPI los valida y
+# convierte uno por uno con los esquemas de schemas.py. Con LISTAS_RAPIDAS=1
+# las rutas que usan `seleccionar`/`responder`:
+#   - piden a la base solo las columnas del esquema, como tuplas,
+#   - las codifican directamente con orjson (o json si no está instalado),
+#   - y envían el arreglo en trozos con StreamingResponse, leyendo
+#     TAMANO_TROZO filas a la vez de un cursor del servidor (`yield_per`),
+#     así la respuesta nunca está entera en memoria.
+# La sesión de la ruta se cierra antes de que salga el cuerpo, así que la
+# lectura usa una sesión propia (replicas.sesion_lectura, como exportacion.py).
+# En los listados con cursor la ruta solo lee las columnas de la llave de la
+# página (limit + 1) para poner X-Next-Cursor; el cuerpo se lee después hasta
+# esa llave, no por `limit`, para que una fila insertada entre ambas lecturas
+# no desplace la página y quede fuera de las dos.
+#
+# La salida es la misma, byte a byte: mismos campos, mismo orden, mismo
+# formato de fechas y números. Lo que se pierde es la validación de salida
+# del esquema, que aquí no aporta porque los datos vienen de la propia base.
+#
+# Configuración por entorno:
+#   LISTAS_RAPIDAS   1 para activar el camino rápido (por defecto 0)
+import json
+import os
+from decimal import Decimal
+
+from fastapi.responses import StreamingResponse
+
+import replicas
+from paginacion import CABECERA_CURSOR, codificar_cursor, hasta, ordenar, paginar
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+LISTAS_RAPIDAS = os.getenv("LISTAS_RAPIDAS", "0") == "1"
+
+# Filas por trozo enviado al cliente
+TAMANO_TROZO = 500
+
+
+def _por_defecto(valor):
+    # Los montos (Decimal, ver dinero.py) salen como número, igual que con los esquemas
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if hasattr(valor, "isoformat"):
+        return valor.isoformat()
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+
+def _codificar(objetos):
+    if orjson is not None:
+        return orjson.dumps(objetos, default=_por_defecto)
+    return json.dumps(objetos, ensure_ascii=False, separators=(",", ":"), default=_por_defecto).encode()
+
+
+def trozos_json(trozos, campos):
+    """Genera el arreglo JSON de `trozos` (listas de tuplas) como bytes."""
+    yield b"["
+    primero = True
+    for trozo in trozos:
+        if not trozo:
+            continue
+        codificado = _codificar([dict(zip(campos, fila)) for fila in trozo])
+        # Se quitan los corchetes de cada trozo y se unen con comas
+        yield (b"" if primero else b",") + codificado[1:-1]
+        primero = False
+    yield b"]"
+
+
+def seleccionar(query, schema):
+    """Con LISTAS_RAPIDAS, cambia la consulta a solo las columnas de `schema`, en su orden."""
+    if not LISTAS_RAPIDAS:
+        return query
+    modelo = query.column_descriptions[0]["entity"]
+    return query.with_entities(*(getattr(modelo, campo) for campo in schema.model_fields))
+
+
+def transmitir(sentencia, usuario_id, response=None):
+    """Envía el resultado de `sentencia` como arreglo JSON, leído por trozos en una sesión propia."""
+    def generar():
+        db = replicas.sesion_lectura(usuario_id)
+        try:
+            resultado = db.execute(sentencia.execution_options(yield_per=TAMANO_TROZO))
+            yield from trozos_json(resultado.partitions(), list(resultado.keys()))
+        finally:
+            db.close()
+
+    cabeceras = {}
+    # Una Response devuelta directamente no hereda las cabeceras del parámetro `response`
+    if response is not None and CABECERA_CURSOR in response.headers:
+        cabeceras[CABECERA_CURSOR] = response.headers[CABECERA_CURSOR]
+    return StreamingResponse(generar(), media_type="application/json", headers=cabeceras)
+
+
+def pagina(query, columnas, limit, cursor, response, usuario_id, descendente=False):
+    """Página de un listado con cursor: objetos ORM o, con LISTAS_RAPIDAS, tuplas en streaming."""
+    if not LISTAS_RAPIDAS:
+        return paginar(query, columnas, limit, cursor, response, descendente)
+    query = ordenar(query, columnas, cursor, descendente)
+    claves = query.with_entities(*columnas).limit(limit + 1).all()
+    if len(claves) > limit:
+        ultima = list(claves[limit - 1])
+        response.headers[CABECERA_CURSOR] = codificar_cursor(ultima)
+        query = query.filter(hasta(columnas, ultima, descendente))
+    return transmitir(query.statement, usuario_id, response)
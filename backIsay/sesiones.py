@@ -0,0 +1,244 @@
+# Tokens de sesión firmados (JWT HS256) y dependencia del usuario actual.
+#
+# /login entrega un token de acceso de vida corta y uno de refresco de vida
+# larga. Las rutas obtienen el usuario con `Depends(usuario_actual)`:
+# verificar el token es un HMAC y dos búsquedas en diccionarios, sin base de
+# datos ni bcrypt.
+#
+# Revocación:
+#   - /logout y /token/refresh (que rota el refresco) agregan el `jti` del
+#     token a una lista de denegados; cada entrada se descarta cuando su
+#     token expira.
+#   - Al cambiar la contraseña se revocan todos los tokens de acceso emitidos
+#     antes al usuario (`iat` lleva milisegundos, así que un login justo
+#     después del cambio no cae en la revocación); los de refresco llevan una huella del hash de la
+#     contraseña que /token/refresh compara con la base, así que dejan de
+#     servir en todos los workers.
+# Con SESIONES_BACKEND=redis las dos listas (denegados y revocaciones por
+# usuario) viven en Redis con TTL hasta que vence lo que revocan, y valen en
+# todos los workers. En memoria son por proceso y están acotadas a
+# DENEGADOS_MAX entradas: con varios workers, un token de acceso revocado
+# puede seguir valiendo en otro worker hasta que expire (JWT_ACCESO_MINUTOS).
+#
+# Configuración por entorno:
+#   JWT_SECRETO          clave HMAC; debe ser la misma en todos los workers.
+#                        Obligatoria: sin ella el proceso no arranca, salvo
+#                        con JWT_DESARROLLO=1
+#   JWT_DESARROLLO       1 para desarrollo local: sin JWT_SECRETO se genera
+#                        una clave al arrancar (los tokens no sobreviven a un
+#                        reinicio ni valen en otro worker)
+#   JWT_ACCESO_MINUTOS   vida del token de acceso (por defecto 15)
+#   JWT_REFRESCO_DIAS    vida del token de refresco (por defecto 30)
+#   JWT_DENEGADOS_MAX    entradas máximas de cada lista en memoria (por defecto 10000)
+#   SESIONES_BACKEND     memoria (por defecto) | redis
+#   SESIONES_URL         URL de Redis (por defecto la de CACHE_URL)
+import base64
+import contextvars
+import hashlib
+import hmac
+import json
+import logging
+import math
+import os
+import secrets
+import threading
+import time
+from typing import Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+log = logging.getLogger("lanaapp.sesiones")
+
+ACCESO = "acceso"
+REFRESCO = "refresco"
+
+ACCESO_SEGUNDOS = int(os.getenv("JWT_ACCESO_MINUTOS", "15")) * 60
+REFRESCO_SEGUNDOS = int(os.getenv("JWT_REFRESCO_DIAS", "30")) * 86400
+DENEGADOS_MAX = int(os.getenv("JWT_DENEGADOS_MAX", "10000"))
+
+def _leer_secreto():
+    secreto = os.getenv("JWT_SECRETO")
+    if secreto:
+        return secreto
+    if os.getenv("JWT_DESARROLLO", "0") != "1":
+        raise RuntimeError("JWT_SECRETO no está definido (para desarrollo local: JWT_DESARROLLO=1)")
+    log.warning("JWT_SECRETO no está definido: se usa una clave temporal de este proceso")
+    return secrets.token_urlsafe(32)
+
+
+SECRETO = _leer_secreto().encode()
+
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b"=")
+
+
+def _de_b64(texto):
+    return base64.urlsafe_b64decode(texto + b"=" * (-len(texto) % 4))
+
+
+def _firmar(mensaje):
+    return _b64(hmac.new(SECRETO, mensaje, hashlib.sha256).digest())
+
+
+_ENCABEZADO = _b64(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+
+
+class ListaDenegados:
+    """clave -> expiración, con tamaño máximo; las entradas vencidas sobran."""
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def agregar(self, clave, expira):
+        with self._lock:
+            self._datos[clave] = expira
+            if len(self._datos) > self.maximo:
+                ahora = time.time()
+                self._datos = {k: e for k, e in self._datos.items() if e > ahora}
+                # Si sigue llena, se sacrifica la que expira antes
+                while len(self._datos) > self.maximo:
+                    del self._datos[min(self._datos, key=self._datos.get)]
+
+    def get(self, clave):
+        return self._datos.get(clave)
+
+    def __contains__(self, clave):
+        expira = self._datos.get(clave)
+        return expira is not None and expira > time.time()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class ListaRedis:
+    """Misma interfaz que ListaDenegados, compartida entre workers; requiere `redis`."""
+
+    def __init__(self, url, prefijo):
+        import redis
+        self._r = redis.Redis.from_url(url)
+        self.prefijo = prefijo
+
+    def agregar(self, clave, expira):
+        # La entrada dura lo mismo que lo que revoca
+        self._r.set(self.prefijo + clave, repr(expira), ex=max(1, math.ceil(expira - time.time())))
+
+    def get(self, clave):
+        valor = self._r.get(self.prefijo + clave)
+        return float(valor) if valor is not None else None
+
+    def __contains__(self, clave):
+        expira = self.get(clave)
+        return expira is not None and expira > time.time()
+
+
+def _crear_lista(prefijo):
+    if os.getenv("SESIONES_BACKEND", "memoria") == "redis":
+        return ListaRedis(os.getenv("SESIONES_URL") or os.getenv("CACHE_URL", "redis://localhost:6379/0"), prefijo)
+    return ListaDenegados(DENEGADOS_MAX)
+
+
+denegados = _crear_lista("lana:jti:")
+# usuario_id -> fin de la revocación: los tokens de acceso emitidos antes de
+# ACCESO_SEGUNDOS previos a ese momento (es decir, antes de revocar) no valen
+revocados = _crear_lista("lana:rev:")
+
+
+def _ahora():
+    # Milisegundos exactos: NumericDate admite fracciones (RFC 7519)
+    return math.floor(time.time() * 1000) / 1000
+
+
+def _ms(instante):
+    return round(instante * 1000)
+
+
+def huella_contrasena(contrasena_hash):
+    """Huella corta del hash guardado; cambia cuando cambia la contraseña."""
+    return _b64(hmac.new(SECRETO, (contrasena_hash or "").encode(), hashlib.sha256).digest()[:9]).decode()
+
+
+def emitir(usuario_id, tipo=ACCESO, huella=None):
+    ahora = _ahora()
+    claims = {
+        "sub": str(usuario_id),
+        "typ": tipo,
+        "iat": ahora,
+        "exp": int(ahora) + (ACCESO_SEGUNDOS if tipo == ACCESO else REFRESCO_SEGUNDOS),
+        "jti": secrets.token_urlsafe(12),
+    }
+    if huella is not None:
+        claims["pwd"] = huella
+    cuerpo = _ENCABEZADO + b"." + _b64(json.dumps(claims, separators=(",", ":")).encode())
+    return (cuerpo + b"." + _firmar(cuerpo)).decode()
+
+
+def emitir_par(usuario_id, contrasena_hash):
+    """Respuesta de /login y /token/refresh."""
+    return {
+        "access_token": emitir(usuario_id, ACCESO),
+        "refresh_token": emitir(usuario_id, REFRESCO, huella_contrasena(contrasena_hash)),
+        "token_type": "bearer",
+        "expires_in": ACCESO_SEGUNDOS,
+    }
+
+
+def _no_autorizado(detalle):
+    return HTTPException(status_code=401, detail=detalle, headers={"WWW-Authenticate": "Bearer"})
+
+
+def verificar(token, tipo=ACCESO):
+    """Devuelve los claims de un token válido del `tipo` pedido; si no, 401."""
+    try:
+        cuerpo, firma = token.encode().rsplit(b".", 1)
+        encabezado, datos = cuerpo.split(b".")
+        if encabezado != _ENCABEZADO or not hmac.compare_digest(firma, _firmar(cuerpo)):
+            raise ValueError
+        claims = json.loads(_de_b64(datos))
+        if not isinstance(claims, dict) or "jti" not in claims or "sub" not in claims:
+            raise ValueError
+    except (ValueError, UnicodeError):
+        raise _no_autorizado("Token inválido")
+    if claims.get("typ") != tipo or claims.get("exp", 0) <= time.time():
+        raise _no_autorizado("Token expirado o inválido")
+    if claims["jti"] in denegados:
+        raise _no_autorizado("Token revocado")
+    if tipo == ACCESO:
+        hasta = revocados.get(claims["sub"])
+        if hasta is not None and _ms(claims.get("iat", 0)) < _ms(hasta - ACCESO_SEGUNDOS):
+            raise _no_autorizado("Token revocado")
+    claims["usuario_id"] = int(claims["sub"])
+    return claims
+
+
+def revocar(claims):
+    denegados.agregar(claims["jti"], claims["exp"])
+
+
+def revocar_usuario(usuario_id):
+    """Invalida los tokens de acceso ya emitidos al usuario (en este proceso, o en todos con Redis)."""
+    # La entrada solo hace falta hasta que expiren los tokens que revoca
+    revocados.agregar(str(usuario_id), _ahora() + ACCESO_SEGUNDOS)
+
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+async def sesion_actual(credenciales: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)):
+    """Claims del token de acceso de la petición (async: no pasa por el threadpool)."""
+    if credenciales is None:
+        raise _no_autorizado("No autenticado")
+    return verificar(credenciales.credentials, ACCESO)
+
+
+# Usuario autenticado de la petición en curso, para quien lo necesite fuera de
+# la ruta (replicas.py lo usa al confirmar una escritura)
+usuario_peticion = contextvars.ContextVar("usuario_peticion", default=None)
+
+
+async def usuario_actual(claims: dict = Depends(sesion_actual)) -> int:
+    usuario_peticion.set(claims["usuario_id"])
+    return claims["usuario_id"]
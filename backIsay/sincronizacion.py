@@ -0,0 +1,216 @@
+# Sincronización por lotes para la app móvil (POST /sync).
+#
+# El cliente guarda sus cambios hechos sin conexión como mutaciones, cada una
+# con una clave de idempotencia que genera él mismo, y las envía juntas:
+#   - se aplican en una sola transacción, cada una dentro de un SAVEPOINT: una
+#     mutación inválida (404, 400, datos mal formados) queda como error en
+#     `resultados` sin deshacer las demás;
+#   - el resultado de cada clave se guarda en sync_operaciones; si el lote se
+#     reenvía (p. ej. se perdió la respuesta), las claves ya vistas devuelven
+#     el resultado guardado sin aplicarse otra vez.
+#
+# La respuesta trae además lo que cambió en el servidor desde el cursor del
+# cliente: filas y bajas (tabla eliminaciones) con una versión posterior,
+# recorridas por (version, id) con los índices *_version. Las versiones son
+# por usuario y siguen el orden de los commits (ver versiones.py): se entrega
+# hasta la última confirmada, así que una transacción lenta en confirmar no
+# se salta; aparece en la sincronización siguiente. Sin cursor, con uno
+# anterior a bajas ya purgadas o que no corresponde a esta base, se entrega
+# todo y `completo` es verdadero. Con `hay_mas` el cliente vuelve a llamar
+# con el cursor nuevo (y sin mutaciones) hasta ponerse al día.
+#
+# Purga de bajas y claves viejas (cron diario):
+#   python sincronizacion.py --purgar
+#
+# Configuración por entorno:
+#   SYNC_LIMITE            filas máximas por entidad en cada respuesta (por defecto 1000)
+#   SYNC_RETENCION_DIAS    días que se guardan bajas y claves (por defecto 30)
+import argparse
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func
+from sqlalchemy.exc import IntegrityError
+
+import cache
+import mutaciones
+import versiones
+from models import Eliminacion, OperacionSync, PagoFijo, Presupuesto, Transaccion
+from paginacion import _despues_de, codificar_cursor, decodificar_cursor
+from schemas import PagoFijoCreate, PresupuestoCreate, TransaccionCreate
+
+SYNC_LIMITE = int(os.getenv("SYNC_LIMITE", "1000"))
+SYNC_RETENCION_DIAS = int(os.getenv("SYNC_RETENCION_DIAS", "30"))
+
+# entidad -> (esquema, crear, actualizar, eliminar, grupo de caché)
+ENTIDADES = {
+    "transaccion": (TransaccionCreate, mutaciones.crear_transaccion, mutaciones.actualizar_transaccion,
+                    mutaciones.eliminar_transaccion, "transacciones"),
+    "presupuesto": (PresupuestoCreate, mutaciones.crear_presupuesto, mutaciones.actualizar_presupuesto,
+                    mutaciones.eliminar_presupuesto, "presupuestos"),
+    "pago_fijo": (PagoFijoCreate, mutaciones.crear_pago_fijo, mutaciones.actualizar_pago_fijo,
+                  mutaciones.eliminar_pago_fijo, "pagos_fijos"),
+}
+
+# Colecciones del delta, en el orden en que van en el cursor; las bajas al final
+COLECCIONES = [("transacciones", Transaccion), ("presupuestos", Presupuesto), ("pagos_fijos", PagoFijo)]
+COLUMNAS = [[m.version, m.id] for _, m in COLECCIONES] + [[Eliminacion.version, Eliminacion.id]]
+
+# Posición "después de todo lo de esta versión": (version, ID_MAXIMO)
+ID_MAXIMO = 2 ** 31 - 1
+
+
+# --- Mutaciones ---
+
+def _aplicar(db, usuario_id, mutacion):
+    schema, crear, actualizar, eliminar, _ = ENTIDADES[mutacion.entidad]
+    if mutacion.operacion != "crear" and mutacion.id is None:
+        raise ValueError("falta el id")
+    if mutacion.operacion == "eliminar":
+        return eliminar(db, usuario_id, mutacion.id).id
+    datos = schema(**(mutacion.datos or {}))
+    if mutacion.operacion == "crear":
+        return crear(db, usuario_id, datos).id
+    return actualizar(db, usuario_id, mutacion.id, datos).id
+
+
+def _error(e):
+    if isinstance(e, HTTPException):
+        return str(e.detail)
+    if isinstance(e, IntegrityError):
+        return "Conflicto con datos existentes"
+    return str(e)[:200]
+
+
+def aplicar_mutaciones(db, usuario_id, lista):
+    """Aplica las mutaciones nuevas y devuelve (resultados en orden, grupos tocados)."""
+    claves = {m.clave for m in lista}
+    vistas = {
+        clave: json.loads(resultado)
+        for clave, resultado in db.query(OperacionSync.clave, OperacionSync.resultado).filter(
+            OperacionSync.usuario_id == usuario_id, OperacionSync.clave.in_(claves)
+        )
+    } if claves else {}
+
+    resultados, grupos = [], set()
+    for m in lista:
+        if m.clave not in vistas:
+            try:
+                with db.begin_nested():
+                    resultado = {"clave": m.clave, "estado": "ok", "id": _aplicar(db, usuario_id, m)}
+                grupos.add(ENTIDADES[m.entidad][4])
+            except (HTTPException, ValueError, IntegrityError) as e:
+                # Los errores de datos también se guardan: reenviar la clave da la misma respuesta
+                resultado = {"clave": m.clave, "estado": "error", "error": _error(e)}
+            db.add(OperacionSync(usuario_id=usuario_id, clave=m.clave,
+                                 resultado=json.dumps(resultado, ensure_ascii=False)))
+            vistas[m.clave] = resultado
+        resultados.append(vistas[m.clave])
+    return resultados, grupos
+
+
+# --- Cambios desde el cursor ---
+
+def _posiciones(cursor, corte, purgado):
+    """Posición por colección y si el cliente debe empezar de cero."""
+    inicial = [(0, 0)] * len(COLECCIONES) + [(corte, ID_MAXIMO)]
+    if not cursor:
+        return inicial, True
+    planas = [c for par in COLUMNAS for c in par]
+    valores = decodificar_cursor(cursor, planas)
+    posiciones = [tuple(valores[i:i + 2]) for i in range(0, len(valores), 2)]
+    # Cursor por fechas (antes de las versiones) o de otra base: no se puede continuar
+    if not all(type(v) is int for v in valores) or any(p[0] > corte for p in posiciones):
+        return inicial, True
+    # Bajas ya purgadas: el cliente podría conservar filas que ya no existen
+    if posiciones[-1] < (purgado, ID_MAXIMO):
+        return inicial, True
+    return posiciones, False
+
+
+def _pagina(query, columnas, posicion, corte, limite):
+    filas = query.filter(columnas[0] <= corte, _despues_de(columnas, posicion, False)) \
+        .order_by(*columnas).limit(limite + 1).all()
+    if len(filas) > limite:
+        filas = filas[:limite]
+        return filas, tuple(getattr(filas[-1], c.key) for c in columnas), True
+    return filas, (corte, ID_MAXIMO), False
+
+
+def cambios(db, usuario_id, cursor, limite=SYNC_LIMITE):
+    corte, purgado = versiones.leer(db, usuario_id)
+    posiciones, completo = _posiciones(cursor, corte, purgado)
+
+    resultado, nuevas, hay_mas = {}, [], False
+    for (nombre, modelo), columnas, posicion in zip(COLECCIONES, COLUMNAS, posiciones):
+        filas, posicion, mas = _pagina(db.query(modelo).filter(modelo.usuario_id == usuario_id),
+                                       columnas, posicion, corte, limite)
+        resultado[nombre] = filas
+        nuevas.append(posicion)
+        hay_mas = hay_mas or mas
+
+    eliminados = defaultdict(list)
+    if not completo:
+        bajas, posicion, mas = _pagina(db.query(Eliminacion).filter(Eliminacion.usuario_id == usuario_id),
+                                       COLUMNAS[-1], posiciones[-1], corte, limite)
+        for b in bajas:
+            eliminados[b.entidad].append(b.entidad_id)
+        hay_mas = hay_mas or mas
+    else:
+        posicion = posiciones[-1]
+    nuevas.append(posicion)
+    resultado["eliminados"] = dict(eliminados)
+
+    return {
+        "cambios": resultado,
+        "cursor": codificar_cursor([v for par in nuevas for v in par]),
+        "hay_mas": hay_mas,
+        "completo": completo,
+    }
+
+
+def sincronizar(db, usuario_id, peticion):
+    resultados, grupos = aplicar_mutaciones(db, usuario_id, peticion.mutaciones)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otra sincronización del mismo usuario guardó alguna de estas claves a la vez
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Sincronización simultánea, reintente")
+    for grupo in grupos:
+        cache.invalidar(usuario_id, grupo)
+    return {"resultados": resultados, **cambios(db, usuario_id, peticion.cursor)}
+
+
+def purgar(db, dias=SYNC_RETENCION_DIAS):
+    limite = datetime.utcnow() - timedelta(days=dias)
+    # Un cursor anterior a la última baja purgada del usuario pide todo otra vez
+    for usuario_id, version in db.query(Eliminacion.usuario_id, func.max(Eliminacion.version)).filter(
+            Eliminacion.fecha < limite).group_by(Eliminacion.usuario_id).all():
+        versiones.marcar_purgado(db, usuario_id, version)
+    bajas = db.execute(delete(Eliminacion).where(Eliminacion.fecha < limite)).rowcount
+    claves = db.execute(delete(OperacionSync).where(OperacionSync.fecha < limite)).rowcount
+    db.commit()
+    return bajas, claves
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Mantenimiento de la sincronización")
+    parser.add_argument("--purgar", action="store_true", help="borra bajas y claves más viejas que --dias")
+    parser.add_argument("--dias", type=int, default=SYNC_RETENCION_DIAS)
+    args = parser.parse_args()
+
+    if args.purgar:
+        db = SessionLocal()
+        try:
+            bajas, claves = purgar(db, args.dias)
+            print(f"{bajas} bajas y {claves} claves de idempotencia purgadas")
+        finally:
+            db.close()
+    else:
+        parser.print_help()
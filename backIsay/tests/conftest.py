@@ -0,0 +1,82 @@
+# Fixtures de las pruebas.
+#
+# Una base SQLite temporal creada con las migraciones (alembic upgrade head),
+# vaciada antes de cada prueba, y la aplicación de main.py con TestClient.
+# Las cachés y los límites en memoria también se reinician en cada prueba.
+import os
+import tempfile
+
+# Antes de importar la aplicación: database.py lee DATABASE_URL al importarse
+_DIRECTORIO = tempfile.mkdtemp(prefix="lanaapp_pruebas_")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_DIRECTORIO, "lanaapp.db")
+os.environ.setdefault("JWT_SECRETO", "pruebas")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ["RESETS_BARRIDO_SEGUNDOS"] = "0"
+for variable in ("DB_REPLICAS", "DB_ASYNC", "CACHE_BACKEND", "EVENTOS_BACKEND", "LIMITES_BACKEND", "SESIONES_BACKEND",
+                 "JWT_DESARROLLO"):
+    os.environ.pop(variable, None)
+
+import pytest  # noqa: E402
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import cache  # noqa: E402
+import catalogo  # noqa: E402
+import database  # noqa: E402
+import limites  # noqa: E402
+import seguridad  # noqa: E402
+import sesiones  # noqa: E402
+from models import Base, Categoria, Usuario  # noqa: E402
+
+CONTRASENA = "secreta123"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def esquema():
+    command.upgrade(Config(os.path.join(os.path.dirname(__file__), "..", "alembic.ini")), "head")
+
+
+@pytest.fixture(autouse=True)
+def base_limpia(esquema):
+    with database.obtener_engine().begin() as conexion:
+        for tabla in reversed(Base.metadata.sorted_tables):
+            conexion.execute(tabla.delete())
+    cache.backend = cache.BackendMemoria()
+    limites.backend = limites.BackendMemoria()
+    sesiones.denegados = sesiones.ListaDenegados(sesiones.DENEGADOS_MAX)
+    sesiones.revocados = sesiones.ListaDenegados(sesiones.DENEGADOS_MAX)
+    catalogo.indice.invalidar()
+
+
+@pytest.fixture
+def db():
+    sesion = database.SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+
+
+@pytest.fixture
+def cliente():
+    import main
+
+    with TestClient(main.app) as c:
+        yield c
+
+
+def crear_usuario(db, usuario_id=1, contrasena=CONTRASENA):
+    """Usuario con contraseña real (bcrypt) y dos categorías propias."""
+    db.add(Usuario(id=usuario_id, nombre_usuario=f"usuario{usuario_id}", correo=f"usuario{usuario_id}@lanaapp.com",
+                   contraseña_hash=seguridad.pwd_context.hash(contrasena)))
+    db.flush()
+    categorias = [Categoria(nombre=f"Comida {usuario_id}", tipo="egreso", usuario_id=usuario_id),
+                  Categoria(nombre=f"Sueldo {usuario_id}", tipo="ingreso", usuario_id=usuario_id)]
+    db.add_all(categorias)
+    db.commit()
+    return [c.id for c in categorias]
+
+
+def cabeceras(usuario_id=1):
+    return {"Authorization": f"Bearer {sesiones.emitir(usuario_id)}"}
@@ -0,0 +1,78 @@
+# Caché de respuestas con ETag (cache.py).
+from datetime import date
+
+import pytest
+
+import cache
+import pronosticos
+import resumen_mensual
+from conftest import cabeceras, crear_usuario
+from models import Transaccion
+
+
+@pytest.mark.parametrize("cabecera", [
+    '"a"', '"x", "a"', '"x","a"', ' "x" ,  "a" ', 'W/"a"', '"x", W/"a"', "*",
+])
+def test_coincide(cabecera):
+    assert cache.coincide(cabecera, '"a"')
+
+
+@pytest.mark.parametrize("cabecera", [None, "", '"b"', '"b", W/"c"', '"aa"'])
+def test_no_coincide(cabecera):
+    assert not cache.coincide(cabecera, '"a"')
+
+
+def test_revalidacion_y_contadores_en_metrics(cliente, db):
+    crear_usuario(db)
+    primera = cliente.get("/resumen", headers=cabeceras())
+    etag = primera.headers["etag"]
+
+    r = cliente.get("/resumen", headers={**cabeceras(), "If-None-Match": f'"otro",{etag}'})
+    assert r.status_code == 304
+    r = cliente.get("/resumen", headers={**cabeceras(), "If-None-Match": "W/" + etag})
+    assert r.status_code == 304
+
+    metricas = cliente.get("/metrics").text
+    assert "# TYPE lanaapp_cache_aciertos_total counter" in metricas
+    assert f"lanaapp_cache_no_modificado_total {cache.estadisticas['no_modificado']}" in metricas
+    assert cliente.get("/cache/estadisticas").status_code == 404
+
+
+def test_escritura_de_otro_proceso(monkeypatch, cliente, db):
+    # Un cron con el backend en memoria no llega al caché de los workers del API
+    comida, _ = crear_usuario(db)
+    antes = cliente.get("/resumen", headers=cabeceras()).json()
+
+    monkeypatch.setattr(cache, "invalidar", lambda usuario_id, grupo: None)
+    db.add(Transaccion(usuario_id=1, monto=50, categoria_id=comida, tipo="egreso", fecha=date.today()))
+    db.flush()
+    resumen_mensual.reconstruir(db, 1)
+    db.commit()
+
+    despues = cliente.get("/resumen", headers=cabeceras()).json()
+    assert despues != antes
+    assert despues["total_egresos"] - antes["total_egresos"] == 50
+
+
+def test_pronostico_recalculado_por_el_cron(monkeypatch, cliente, db):
+    comida, _ = crear_usuario(db)
+    for k in range(6):
+        db.add(Transaccion(usuario_id=1, monto=100, categoria_id=comida, tipo="egreso",
+                           fecha=date(2025, k + 1, 10)))
+    db.commit()
+    resumen_mensual.reconstruir(db, 1)
+    db.commit()
+    assert cliente.get("/graficas/pronostico", headers=cabeceras()).json()["meses"][0]["categorias"] == []
+
+    monkeypatch.setattr(cache, "invalidar", lambda usuario_id, grupo: None)
+    pronosticos.calcular(db, hoy=date(2025, 7, 15))
+    assert cliente.get("/graficas/pronostico", headers=cabeceras()).json()["meses"][0]["categorias"]
+
+
+def test_versiones_acotadas():
+    backend = cache.BackendMemoria(maximo=10)
+    for usuario_id in range(100):
+        backend.incrementar(f"{usuario_id}:transacciones")
+    assert backend.tamano() == 10
+    assert backend.version("99:transacciones") == 1
+    assert backend.version("0:transacciones") == 0
@@ -0,0 +1,51 @@
+# Índice de categorías en memoria (catalogo.py): se recarga cuando cambia la
+# huella de la tabla, también por cambios hechos fuera de la API.
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import catalogo
+from conftest import cabeceras, crear_usuario
+from models import Categoria
+
+
+@pytest.fixture
+def revisar_siempre(monkeypatch):
+    monkeypatch.setattr(catalogo, "CATEGORIAS_REVISION", 0)
+
+
+def _nombres(cliente):
+    return sorted(c["nombre"] for c in cliente.get("/categorias", headers=cabeceras()).json())
+
+
+def test_renombre_recarga_el_indice(cliente, db, revisar_siempre):
+    comida, _ = crear_usuario(db)
+    assert _nombres(cliente) == ["Comida 1", "Sueldo 1"]
+
+    # Como lo haría MySQL con ON UPDATE CURRENT_TIMESTAMP(6)
+    db.execute(update(Categoria).where(Categoria.id == comida).values(
+        nombre="Super", fecha_actualizacion=datetime.utcnow() + timedelta(seconds=1)))
+    db.commit()
+
+    assert _nombres(cliente) == ["Sueldo 1", "Super"]
+
+
+def test_baja_y_alta_recargan_el_indice(cliente, db, revisar_siempre):
+    comida, _ = crear_usuario(db)
+    _nombres(cliente)
+
+    db.query(Categoria).filter(Categoria.id == comida).delete()
+    db.add(Categoria(nombre="Renta", tipo="egreso", usuario_id=1))
+    db.commit()
+
+    assert _nombres(cliente) == ["Renta", "Sueldo 1"]
+
+
+def test_sin_cambios_no_recarga(cliente, db, revisar_siempre):
+    crear_usuario(db)
+    _nombres(cliente)
+    recargas = catalogo.indice.recargas
+
+    _nombres(cliente)
+    assert catalogo.indice.recargas == recargas
@@ -0,0 +1,63 @@
+# POST /transacciones/bulk: errores por fila sin detener la importación.
+import pytest
+
+import importacion
+from conftest import cabeceras, crear_usuario
+from models import Transaccion
+
+
+@pytest.fixture
+def comida(db):
+    return crear_usuario(db)[0]
+
+
+def _importar(cliente, cuerpo, tipo="text/csv"):
+    r = cliente.post("/transacciones/bulk", headers={**cabeceras(), "Content-Type": tipo}, content=cuerpo)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _descripciones(db):
+    return [t.descripcion for t in db.query(Transaccion).order_by(Transaccion.id)]
+
+
+def test_fila_no_utf8_es_error_de_esa_fila(monkeypatch, cliente, db, comida):
+    monkeypatch.setattr(importacion, "TAMANO_LOTE", 2)
+    lineas = [f"{i},{comida},egreso,2025-01-0{i},fila {i}".encode() for i in range(1, 6)]
+    lineas[3] = f"4,{comida},egreso,2025-01-04,Caf".encode() + "é".encode("latin-1")
+    cuerpo = b"monto,categoria_id,tipo,fecha,descripcion\n" + b"\n".join(lineas)
+
+    resultado = _importar(cliente, cuerpo)
+    assert resultado["insertadas"] == 4
+    assert [e["fila"] for e in resultado["errores"]] == [4]
+    assert _descripciones(db) == ["fila 1", "fila 2", "fila 3", "fila 5"]
+
+
+def test_campo_con_salto_de_linea(cliente, db, comida):
+    cuerpo = ("\ufeffmonto,categoria_id,tipo,fecha,descripcion\r\n"
+              f'1,{comida},egreso,2025-01-01,"Súper\r\nde la semana, con ""oferta"""\r\n'
+              f"2,{comida},egreso,2025-01-02,Taxi\r\n").encode()
+
+    resultado = _importar(cliente, cuerpo)
+    assert resultado == {"insertadas": 2, "total_errores": 0, "errores": []}
+    assert _descripciones(db) == ['Súper\nde la semana, con "oferta"', "Taxi"]
+
+
+def test_comillas_sin_cerrar_al_final(cliente, db, comida):
+    cuerpo = (f"monto,categoria_id,tipo,fecha,descripcion\n"
+              f"1,{comida},egreso,2025-01-01,ok\n"
+              f'2,{comida},egreso,2025-01-02,"sin cerrar\n').encode()
+
+    resultado = _importar(cliente, cuerpo)
+    assert resultado["insertadas"] == 1
+    assert resultado["errores"] == [{"fila": 2, "error": "comillas sin cerrar"}]
+
+
+def test_ndjson_no_utf8(cliente, db, comida):
+    cuerpo = (f'{{"monto": 1, "categoria_id": {comida}, "tipo": "egreso", "fecha": "2025-01-01"}}\n'.encode()
+              + b'{"monto": 2, "descripcion": "\xe9"}\n'
+              + f'{{"monto": 3, "categoria_id": {comida}, "tipo": "egreso", "fecha": "2025-01-03"}}\n'.encode())
+
+    resultado = _importar(cliente, cuerpo, "application/x-ndjson")
+    assert resultado["insertadas"] == 2
+    assert [e["fila"] for e in resultado["errores"]] == [2]
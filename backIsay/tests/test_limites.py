@@ -0,0 +1,85 @@
+# Límites de tasa (429) y control de admisión (503) de limites.py.
+import pytest
+
+import database
+import limites
+import metricas
+import seguridad
+from conftest import CONTRASENA, crear_usuario
+
+
+def _login(cliente, correo="usuario1@lanaapp.com", contrasena="incorrecta"):
+    return cliente.post("/login", json={"correo": correo, "contraseña_hash": contrasena})
+
+
+@pytest.fixture
+def usuario(db):
+    crear_usuario(db)
+
+
+def _rechazos(motivo):
+    return sum(n for (_, _, m), n in metricas.rechazos.items() if m == motivo)
+
+
+def test_login_por_cuenta(cliente, usuario):
+    capacidad = limites.REGLAS["login"][1][0]
+    antes = _rechazos("limite_cuenta")
+    assert [_login(cliente).status_code for _ in range(capacidad)] == [401] * capacidad
+
+    r = _login(cliente, contrasena=CONTRASENA)
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+    assert _rechazos("limite_cuenta") == antes + 1
+    # Mayúsculas y espacios cuentan como la misma cuenta; otra cuenta sigue entrando
+    assert _login(cliente, correo=" USUARIO1@lanaapp.com").status_code == 429
+    assert _login(cliente, correo="otro@lanaapp.com").status_code == 401
+
+
+def test_login_de_otra_ip_no_queda_bloqueado(monkeypatch, cliente, usuario):
+    # Fallar a propósito con el correo de alguien no lo deja fuera desde su propia IP
+    monkeypatch.setattr(limites, "IP_CABECERA", "x-forwarded-for")
+    capacidad = limites.REGLAS["login"][1][0]
+    atacante = {"X-Forwarded-For": "203.0.113.7"}
+    for _ in range(capacidad + 1):
+        r = cliente.post("/login", headers=atacante, json={"correo": "usuario1@lanaapp.com", "contraseña_hash": "x"})
+    assert r.status_code == 429
+
+    r = cliente.post("/login", headers={"X-Forwarded-For": "198.51.100.2"},
+                     json={"correo": "usuario1@lanaapp.com", "contraseña_hash": CONTRASENA})
+    assert r.status_code == 200
+
+
+def test_login_por_ip(cliente, usuario):
+    capacidad = limites.REGLAS["login"][0][0]
+    codigos = [_login(cliente, correo=f"nadie{i}@lanaapp.com").status_code for i in range(capacidad + 1)]
+    assert codigos == [401] * capacidad + [429]
+    # El límite por IP se aplica antes de leer la cuenta
+    assert _login(cliente, contrasena=CONTRASENA).status_code == 429
+
+
+def test_regla_desactivada(monkeypatch, cliente, usuario):
+    monkeypatch.setitem(limites.REGLAS, "login", (None, None))
+    assert all(_login(cliente).status_code == 401 for _ in range(30))
+
+
+def test_admision_cola_db(monkeypatch, cliente, usuario):
+    monkeypatch.setattr(database, "esperando_conexion", lambda: limites.ADMISION_DB_COLA)
+    antes = _rechazos("cola_db")
+
+    r = _login(cliente, contrasena=CONTRASENA)
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == str(limites.ADMISION_REINTENTO)
+    assert _rechazos("cola_db") == antes + 1
+    assert cliente.get("/metrics").status_code == 200
+
+    monkeypatch.setattr(database, "esperando_conexion", lambda: limites.ADMISION_DB_COLA - 1)
+    assert _login(cliente, contrasena=CONTRASENA).status_code == 200
+
+
+def test_admision_cola_hash(monkeypatch, cliente, usuario):
+    monkeypatch.setattr(limites, "admitidas_hash", seguridad.HASH_COLA_MAX)
+    r = _login(cliente, contrasena=CONTRASENA)
+    assert r.status_code == 503
+    assert "Retry-After" in r.headers
+    # El rechazo no consume el cupo de otra petición
+    assert limites.admitidas_hash == seguridad.HASH_COLA_MAX
@@ -0,0 +1,59 @@
+# Instrumentación (metricas.py) y cola de espera del pool (database.py).
+import asyncio
+import sqlite3
+import threading
+import time
+
+import database
+import metricas
+
+
+def _app(tipo):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", tipo)]})
+        await send({"type": "http.response.body", "body": b"data: 1\n\n"})
+    return app
+
+
+def _peticion(tipo):
+    async def enviar(mensaje):
+        pass
+    scope = {"type": "http", "method": "GET", "route": type("Ruta", (), {"path": "/prueba_metricas"})}
+    asyncio.run(metricas.MiddlewareMetricas(_app(tipo))(scope, None, enviar))
+
+
+def test_flujo_fuera_del_histograma_de_latencia():
+    clave = ("GET", "/prueba_metricas")
+    _peticion(b"text/event-stream; charset=utf-8")
+    assert metricas.latencia[clave].cuenta == 0
+    assert metricas.respuestas[clave + ("200",)] == 1
+
+    _peticion(b"application/json")
+    assert metricas.latencia[clave].cuenta == 1
+    assert metricas.respuestas[clave + ("200",)] == 2
+
+
+def test_espera_solo_con_el_pool_agotado():
+    vistas = []
+
+    def crear():
+        vistas.append(database.esperando_conexion())
+        return sqlite3.connect(":memory:", check_same_thread=False)
+
+    pool = database._PoolContado(crear, pool_size=1, max_overflow=0, timeout=5)
+    primera = pool.connect()
+    assert vistas == [0]
+
+    obtenida = []
+    hilo = threading.Thread(target=lambda: obtenida.append(pool.connect()))
+    hilo.start()
+    limite = time.monotonic() + 5
+    while database.esperando_conexion() == 0 and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert database.esperando_conexion() == 1
+
+    primera.close()
+    hilo.join(5)
+    assert obtenida and database.esperando_conexion() == 0
+    obtenida[0].close()
+    pool.dispose()
@@ -0,0 +1,24 @@
+# Las migraciones crean el esquema de producción: deben compilar para MySQL
+# aunque las pruebas corran sobre SQLite (modo sin conexión, `--sql`; en
+# SQLite las corre conftest.py contra la base de pruebas).
+import io
+import os
+
+from alembic import command
+from alembic.config import Config
+
+import database
+
+INI = os.path.join(os.path.dirname(__file__), "..", "alembic.ini")
+
+
+def test_upgrade_mysql_sin_conexion(monkeypatch):
+    monkeypatch.setattr(database, "SQLALCHEMY_DATABASE_URL", "mysql+pymysql://lanaapp@localhost/lanaapp")
+    salida = io.StringIO()
+    command.upgrade(Config(INI, output_buffer=salida), "head", sql=True)
+
+    sql = salida.getvalue()
+    assert "CREATE TABLE notificaciones" in sql
+    assert "mensaje TEXT NOT NULL" in sql
+    assert "PARTITION BY RANGE COLUMNS(fecha)" in sql
+    assert "version_num='0006'" in sql
@@ -0,0 +1,100 @@
+# Escrituras compartidas por REST, /sync e importación (mutaciones.py): validación
+# de categoria_id y tipo (en MySQL no hay llave foránea), campos que solo fija el
+# servidor y conflictos con llaves únicas.
+from datetime import date
+
+import pytest
+
+from conftest import cabeceras, crear_usuario
+from models import Categoria, Transaccion
+
+
+@pytest.fixture
+def categorias(db):
+    propias = crear_usuario(db)
+    ajenas = crear_usuario(db, usuario_id=2)
+    predeterminada = Categoria(nombre="Otros", tipo="egreso", usuario_id=None, es_predeterminada=True)
+    db.add(predeterminada)
+    db.commit()
+    return propias[0], ajenas[0], predeterminada.id
+
+
+def _datos(categoria_id, tipo="egreso"):
+    return {"monto": 10, "categoria_id": categoria_id, "tipo": tipo, "fecha": "2025-01-15"}
+
+
+def test_alta_rest(cliente, db, categorias):
+    propia, ajena, predeterminada = categorias
+    for categoria_id, estado in [(propia, 200), (predeterminada, 200), (ajena, 400), (99999, 400)]:
+        r = cliente.post("/transacciones", headers=cabeceras(), json=_datos(categoria_id))
+        assert r.status_code == estado, (categoria_id, r.text)
+    assert cliente.post("/transacciones", headers=cabeceras(), json=_datos(propia, "gasto")).status_code == 422
+    assert db.query(Transaccion).count() == 2
+
+
+def test_cambio_rest(cliente, db, categorias):
+    propia, ajena, _ = categorias
+    id_ = cliente.post("/transacciones", headers=cabeceras(), json=_datos(propia)).json()["id"]
+    r = cliente.put(f"/transacciones/{id_}", headers=cabeceras(), json=_datos(ajena))
+    assert r.status_code == 400
+    db.expire_all()
+    assert db.get(Transaccion, id_).categoria_id == propia
+
+
+def test_categoria_nueva_sin_esperar_la_revision(cliente, db, categorias):
+    propia, _, _ = categorias
+    assert cliente.post("/transacciones", headers=cabeceras(), json=_datos(propia)).status_code == 200
+    nueva = Categoria(nombre="Viajes", tipo="egreso", usuario_id=1)
+    db.add(nueva)
+    db.commit()
+    assert cliente.post("/transacciones", headers=cabeceras(), json=_datos(nueva.id)).status_code == 200
+
+
+def test_sync(cliente, categorias):
+    _, ajena, _ = categorias
+    r = cliente.post("/sync", headers=cabeceras(), json={"mutaciones": [
+        {"clave": "a", "entidad": "transaccion", "operacion": "crear", "datos": _datos(ajena)},
+        {"clave": "b", "entidad": "pago_fijo", "operacion": "crear",
+         "datos": {"descripcion": "Renta", "categoria_id": ajena, "monto": 5, "fecha": "2025-01-01"}},
+    ]})
+    assert [m["estado"] for m in r.json()["resultados"]] == ["error", "error"]
+
+
+def test_importacion(cliente, db, categorias):
+    propia, ajena, _ = categorias
+    cuerpo = ("monto,categoria_id,tipo,fecha\n"
+              f"1,{propia},egreso,2025-01-01\n"
+              f"2,{ajena},egreso,2025-01-02\n"
+              f"3,{propia},gasto,2025-01-03\n"
+              f"4,99999,egreso,2025-01-04\n")
+    r = cliente.post("/transacciones/bulk", headers={**cabeceras(), "Content-Type": "text/csv"}, content=cuerpo)
+    resultado = r.json()
+    assert resultado["insertadas"] == 1
+    assert sorted(e["fila"] for e in resultado["errores"]) == [2, 3, 4]
+    assert db.query(Transaccion).one().categoria_id == propia
+
+
+def test_id_recurrente_solo_lo_fija_el_servidor(cliente, db, categorias):
+    propia, _, _ = categorias
+    datos = dict(_datos(propia), es_recurrente=True, id_recurrente=7)
+    primera = cliente.post("/transacciones", headers=cabeceras(), json=datos)
+    # Antes la segunda chocaba con uq_trans_recurrente_fecha (500)
+    segunda = cliente.post("/transacciones", headers=cabeceras(), json=datos)
+    assert (primera.status_code, segunda.status_code) == (200, 200)
+    assert {(t.es_recurrente, t.id_recurrente) for t in db.query(Transaccion)} == {(False, None)}
+
+    # Editar una transacción generada no la desliga de su pago fijo
+    generada = Transaccion(usuario_id=1, monto=5, categoria_id=propia, tipo="egreso",
+                           fecha=date(2025, 2, 1), es_recurrente=True, id_recurrente=7)
+    db.add(generada)
+    db.commit()
+    r = cliente.put(f"/transacciones/{generada.id}", headers=cabeceras(), json=_datos(propia))
+    assert r.status_code == 200 and r.json()["id_recurrente"] == 7
+
+
+def test_presupuesto_repetido_es_409(cliente, categorias):
+    propia, _, _ = categorias
+    datos = {"categoria_id": propia, "monto": 100, "ano": 2025, "mes": 1}
+    assert cliente.post("/presupuestos", headers=cabeceras(), json=datos).status_code == 200
+    r = cliente.post("/presupuestos", headers=cabeceras(), json=datos)
+    assert r.status_code == 409
@@ -0,0 +1,80 @@
+# Despachador de notificaciones (notificaciones_worker.py): reclama y confirma
+# antes de enviar, y deja cada fila en enviada, pendiente o fallida.
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import notificaciones_worker as worker
+from conftest import crear_usuario
+from models import Notificacion
+
+
+class Transporte:
+    def __init__(self, error=None):
+        self.error = error
+        self.estados = []
+
+    async def enviar(self, destino, asunto, mensaje):
+        # Otra conexión ya ve el reclamo: no hay transacción abierta durante el envío
+        with database.SessionLocal() as otra:
+            self.estados.append(otra.query(Notificacion.estado).filter_by(asunto=asunto).scalar())
+        if self.error:
+            raise self.error
+
+
+@pytest.fixture
+def notificacion(db):
+    crear_usuario(db)
+    notif = Notificacion(usuario_id=1, tipo="correo", asunto="Aviso", mensaje="Pago próximo")
+    db.add(notif)
+    db.commit()
+    return notif.id
+
+
+def _procesar(transporte):
+    despachador = worker.Despachador({"correo": transporte, "sms": transporte})
+    return asyncio.run(despachador.procesar_lote())
+
+
+def _fila(db, id_):
+    db.expire_all()
+    return db.get(Notificacion, id_)
+
+
+def test_enviada(db, notificacion):
+    transporte = Transporte()
+    assert _procesar(transporte) == 1
+    assert transporte.estados == ["enviando"]
+    fila = _fila(db, notificacion)
+    assert (fila.estado, fila.fue_enviada, fila.reclamada_por) == ("enviada", True, None)
+    assert _procesar(transporte) == 0
+
+
+def test_rechazo_permanente(db, notificacion):
+    _procesar(Transporte(ValueError("destinatario inválido")))
+    fila = _fila(db, notificacion)
+    assert (fila.estado, fila.fue_enviada, fila.intentos) == ("fallida", False, 1)
+    assert "destinatario inválido" in fila.error
+
+
+def test_transitorio_vuelve_a_la_cola(monkeypatch, db, notificacion):
+    monkeypatch.setattr(worker, "REINTENTOS_INMEDIATOS", 1)
+    _procesar(Transporte(worker.ErrorTransitorio("HTTP 503")))
+    fila = _fila(db, notificacion)
+    assert (fila.estado, fila.intentos, fila.error) == ("pendiente", 1, "HTTP 503")
+    assert fila.fecha_programada > datetime.utcnow()
+
+
+def test_reclamo_vencido(db, notificacion):
+    fila = _fila(db, notificacion)
+    fila.estado, fila.reclamada_por = "enviando", "otra"
+    fila.reclamada_en = datetime.utcnow() - timedelta(minutes=1)
+    db.commit()
+    assert _procesar(Transporte()) == 0
+
+    fila.reclamada_en = datetime.utcnow() - worker.RECLAMO_VENCE - timedelta(minutes=1)
+    db.commit()
+    assert _procesar(Transporte()) == 1
+    assert _fila(db, notificacion).estado == "enviada"
@@ -0,0 +1,86 @@
+# Listados paginados por cursor (paginacion.py), con y sin LISTAS_RAPIDAS.
+import pytest
+
+import serializacion
+from conftest import cabeceras, crear_usuario
+from paginacion import CABECERA_CURSOR
+
+CAMPOS_PAGO = {"descripcion", "usuario_id", "categoria_id", "monto", "fecha", "id", "proximo_cobro", "fecha_creacion"}
+
+
+@pytest.fixture(params=[False, True], ids=["esquemas", "rapidas"])
+def listas_rapidas(request, monkeypatch):
+    monkeypatch.setattr(serializacion, "LISTAS_RAPIDAS", request.param)
+
+
+def test_pagos_fijos_devuelve_los_campos(cliente, db, listas_rapidas):
+    comida, _ = crear_usuario(db)
+    for i in range(3):
+        r = cliente.post("/pagos-fijos", headers=cabeceras(), json={
+            "descripcion": f"Renta {i}", "categoria_id": comida, "monto": 1500.5 + i, "fecha": "2025-01-05"})
+        assert r.status_code == 200
+
+    r = cliente.get("/pagos-fijos", params={"limit": 2}, headers=cabeceras())
+    assert r.status_code == 200
+    pagina = r.json()
+    assert [p["descripcion"] for p in pagina] == ["Renta 0", "Renta 1"]
+    assert set(pagina[0]) == CAMPOS_PAGO
+    assert pagina[0]["monto"] == 1500.5
+    assert pagina[0]["fecha"] == "2025-01-05"
+    assert pagina[0]["usuario_id"] == 1
+
+    r = cliente.get("/pagos-fijos", params={"limit": 2, "cursor": r.headers[CABECERA_CURSOR]}, headers=cabeceras())
+    assert [p["descripcion"] for p in r.json()] == ["Renta 2"]
+    assert CABECERA_CURSOR not in r.headers
+
+
+def test_pagos_fijos_solo_del_usuario(cliente, db):
+    comida, _ = crear_usuario(db, 1)
+    crear_usuario(db, 2)
+    cliente.post("/pagos-fijos", headers=cabeceras(1), json={
+        "descripcion": "Renta", "categoria_id": comida, "monto": 10, "fecha": "2025-01-05"})
+
+    assert cliente.get("/pagos-fijos", headers=cabeceras(2)).json() == []
+
+
+def test_rapidas_por_trozos_igual_que_esquemas(monkeypatch, cliente, db):
+    comida, _ = crear_usuario(db)
+    for i in range(7):
+        cliente.post("/transacciones", headers=cabeceras(), json={
+            "monto": 10 + i, "categoria_id": comida, "tipo": "egreso", "fecha": f"2025-01-0{i % 3 + 1}"})
+    monkeypatch.setattr(serializacion, "TAMANO_TROZO", 2)
+
+    respuestas = {}
+    for rapidas in (False, True):
+        monkeypatch.setattr(serializacion, "LISTAS_RAPIDAS", rapidas)
+        paginas, cursor = [], None
+        while True:
+            r = cliente.get("/transacciones", params={"limit": 5, "cursor": cursor}, headers=cabeceras())
+            paginas.append(r.content)
+            cursor = r.headers.get(CABECERA_CURSOR)
+            if not cursor:
+                break
+        paginas.append(cliente.get("/usuarios/1/pagos-fijos", headers=cabeceras()).content)
+        respuestas[rapidas] = paginas
+    assert respuestas[True] == respuestas[False]
+    assert len(respuestas[True]) == 3
+
+
+def test_pagos_fijos_por_usuario_paginados(cliente, db, listas_rapidas):
+    comida, _ = crear_usuario(db)
+    for i in range(3):
+        cliente.post("/pagos-fijos", headers=cabeceras(), json={
+            "descripcion": f"Renta {i}", "categoria_id": comida, "monto": 10, "fecha": "2025-01-05"})
+
+    r = cliente.get("/usuarios/1/pagos-fijos", params={"limit": 2}, headers=cabeceras())
+    assert [p["descripcion"] for p in r.json()] == ["Renta 0", "Renta 1"]
+    r = cliente.get("/usuarios/1/pagos-fijos", params={"limit": 2, "cursor": r.headers[CABECERA_CURSOR]},
+                    headers=cabeceras())
+    assert [p["descripcion"] for p in r.json()] == ["Renta 2"]
+    assert CABECERA_CURSOR not in r.headers
+
+
+def test_usuarios_solo_el_propio(cliente, db):
+    crear_usuario(db, 1)
+    crear_usuario(db, 2)
+    assert [u["id"] for u in cliente.get("/usuarios", headers=cabeceras(2)).json()] == [2]
@@ -0,0 +1,38 @@
+# Archivo de meses cerrados (particiones.py --archivar). En SQLite no hay
+# particiones: se prueba el movimiento por bloques y las rutas por id.
+from datetime import date
+
+import pytest
+
+import particiones
+from conftest import cabeceras, crear_usuario
+from models import Transaccion, TransaccionArchivo
+
+
+@pytest.fixture
+def archivadas(db):
+    comida, _ = crear_usuario(db)
+    db.add_all(Transaccion(usuario_id=1, monto=10 + i, categoria_id=comida, tipo="egreso",
+                           fecha=date(2024, 1 + i % 2, 5 + i)) for i in range(5))
+    db.add(Transaccion(usuario_id=1, monto=99, categoria_id=comida, tipo="egreso", fecha=date(2025, 6, 1)))
+    db.commit()
+    movidos = particiones.archivar(db, meses_vivos=2, bloque=2, hoy=date(2025, 6, 15))
+    assert movidos == {"2024-01": 3, "2024-02": 2}
+    return [t.id for t in db.query(TransaccionArchivo).order_by(TransaccionArchivo.id)]
+
+
+def test_mueve_por_bloques(db, archivadas):
+    assert len(archivadas) == 5
+    assert [t.fecha for t in db.query(Transaccion)] == [date(2025, 6, 1)]
+
+
+def test_rutas_por_id(cliente, db, archivadas):
+    id_ = archivadas[0]
+    r = cliente.get(f"/transacciones/{id_}", headers=cabeceras())
+    assert r.status_code == 200 and r.json()["monto"] == 10
+
+    datos = {"monto": 1, "categoria_id": r.json()["categoria_id"], "tipo": "egreso", "fecha": "2024-01-05"}
+    assert cliente.put(f"/transacciones/{id_}", headers=cabeceras(), json=datos).status_code == 410
+    assert cliente.delete(f"/transacciones/{id_}", headers=cabeceras()).status_code == 410
+    assert cliente.get(f"/transacciones/{id_}", headers=cabeceras(2)).status_code == 404
+    assert cliente.delete("/transacciones/99999", headers=cabeceras()).status_code == 404
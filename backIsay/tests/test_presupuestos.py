@@ -0,0 +1,21 @@
+# Estado de presupuestos (presupuestos.py): montos exactos en Decimal hasta la respuesta.
+from decimal import Decimal
+
+import presupuestos
+from conftest import cabeceras, crear_usuario
+
+
+def test_estado_sin_flotantes(cliente, db):
+    comida, _ = crear_usuario(db)
+    cliente.post("/presupuestos", headers=cabeceras(), json={"categoria_id": comida, "monto": 1.10, "ano": 2025, "mes": 3})
+    cliente.post("/transacciones", headers=cabeceras(), json={
+        "monto": 0.20, "categoria_id": comida, "tipo": "egreso", "fecha": "2025-03-02"})
+
+    fila, = presupuestos.estado(db, 1, 2025, 3)
+    assert (fila["monto"], fila["gastado"], fila["restante"]) == (Decimal("1.10"), Decimal("0.20"), Decimal("0.90"))
+    assert fila["porcentaje"] == Decimal("18.18")
+
+    r = cliente.get("/presupuestos/estado", params={"ano": 2025, "mes": 3}, headers=cabeceras())
+    # 1.1 - 0.2 en flotante sería 0.9000000000000001
+    assert b'"restante":0.9,' in r.content
+    assert r.json()[0]["porcentaje"] == 18.18
@@ -0,0 +1,26 @@
+# Cálculo nocturno de pronosticos.py (requiere numpy, ver requirements.txt).
+from datetime import date
+
+import pronosticos
+import resumen_mensual
+from conftest import crear_usuario
+from models import Transaccion
+
+
+def test_tendencia_lineal(db):
+    comida, _ = crear_usuario(db)
+    # Gasto que sube 10 por mes durante un año
+    for k in range(12):
+        db.add(Transaccion(usuario_id=1, monto=100 + 10 * k, categoria_id=comida, tipo="egreso",
+                           fecha=date(2024 + (k + 6) // 12, (k + 6) % 12 + 1, 10)))
+    db.commit()
+    resumen_mensual.reconstruir(db, 1)
+    db.commit()
+
+    series, _ = pronosticos.calcular(db, hoy=date(2025, 6, 15))
+    assert series == 1
+
+    mes = pronosticos.pronostico(db, 1, meses=1, hoy=date(2025, 6, 15))["meses"][0]
+    categoria = mes["categorias"][0]
+    assert categoria["categoria_id"] == comida
+    assert abs(categoria["total"] - 210) < 1
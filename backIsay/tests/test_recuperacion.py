@@ -0,0 +1,56 @@
+# Tokens de recuperación (recuperacion.py): uno vigente por usuario y purga por lotes.
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import database
+import recuperacion
+from conftest import crear_usuario
+from models import PasswordReset
+
+
+@pytest.fixture
+def usuario(db):
+    crear_usuario(db)
+
+
+def _tokens(db, n, vencidos):
+    expira = datetime.utcnow() + (-timedelta(minutes=5) if vencidos else recuperacion.VIGENCIA)
+    db.add_all(PasswordReset(user_id=1, token=f"{'v' if vencidos else 'n'}{i}", expires_at=expira)
+               for i in range(n))
+    db.commit()
+
+
+@pytest.fixture
+def borrados():
+    """Cuenta los DELETE sobre password_resets."""
+    lotes = []
+
+    def anotar(conn, cursor, sentencia, parametros, contexto, varios):
+        if sentencia.lstrip().upper().startswith("DELETE FROM PASSWORD_RESETS"):
+            lotes.append(sentencia)
+
+    motor = database.obtener_engine()
+    event.listen(motor, "before_cursor_execute", anotar)
+    yield lotes
+    event.remove(motor, "before_cursor_execute", anotar)
+
+
+def test_crear_deja_un_token(db, usuario):
+    recuperacion.crear(db, 1)
+    token = recuperacion.crear(db, 1)
+    db.commit()
+    assert [r.token for r in db.query(PasswordReset)] == [token]
+
+
+@pytest.mark.parametrize("vencidos, lotes", [(25, 3), (20, 2), (0, 0)])
+def test_purgar_por_lotes(db, usuario, borrados, vencidos, lotes):
+    _tokens(db, vencidos, True)
+    _tokens(db, 3, False)
+    antes = recuperacion.estadisticas["purgados"]
+
+    assert recuperacion.purgar(db, lote=10) == vencidos
+    assert len(borrados) == lotes
+    assert sorted(r.token for r in db.query(PasswordReset)) == ["n0", "n1", "n2"]
+    assert recuperacion.estadisticas["purgados"] == antes + vencidos
@@ -0,0 +1,84 @@
+# resumen_mensual se mantiene con deltas en cada escritura de transacciones;
+# tras cada cambio debe coincidir con reconstruirlo desde cero.
+from decimal import Decimal
+
+import pytest
+
+import resumen_mensual
+from conftest import cabeceras, crear_usuario
+from models import ResumenMensual
+
+
+def _filas(db):
+    db.expire_all()
+    return {
+        (r.ano, r.mes, r.tipo, r.categoria_id): (r.total, r.cantidad)
+        for r in db.query(ResumenMensual).filter(ResumenMensual.usuario_id == 1)
+    }
+
+
+def _reconstruido(db):
+    resumen_mensual.reconstruir(db, 1)
+    filas = _filas(db)
+    db.rollback()
+    return filas
+
+
+@pytest.fixture
+def categorias(db):
+    return crear_usuario(db)
+
+
+def _crear(cliente, categoria_id, monto=100, tipo="egreso", fecha="2025-01-15"):
+    r = cliente.post("/transacciones", headers=cabeceras(), json={
+        "monto": monto, "categoria_id": categoria_id, "tipo": tipo, "fecha": fecha})
+    assert r.status_code == 200
+    return r.json()["id"]
+
+
+def test_alta_suma_al_mes(cliente, db, categorias):
+    comida, _ = categorias
+    _crear(cliente, comida, 100)
+    _crear(cliente, comida, 50.25)
+
+    assert _filas(db) == {(2025, 1, "egreso", comida): (Decimal("150.25"), 2)}
+    assert _filas(db) == _reconstruido(db)
+
+
+@pytest.mark.parametrize("cambio", [
+    {"fecha": "2025-02-01"},
+    {"tipo": "ahorro"},
+    {"categoria": 1},
+    {"monto": 30, "fecha": "2024-12-31", "tipo": "ingreso", "categoria": 1},
+])
+def test_cambio_mueve_el_acumulado(cliente, db, categorias, cambio):
+    comida, sueldo = categorias
+    transaccion_id = _crear(cliente, comida, 100)
+    _crear(cliente, comida, 40)
+
+    datos = {"monto": 100, "categoria_id": comida, "tipo": "egreso", "fecha": "2025-01-15"}
+    datos.update({k: v for k, v in cambio.items() if k != "categoria"})
+    if "categoria" in cambio:
+        datos["categoria_id"] = sueldo
+    r = cliente.put(f"/transacciones/{transaccion_id}", headers=cabeceras(), json=datos)
+    assert r.status_code == 200
+
+    filas = _filas(db)
+    assert filas[(2025, 1, "egreso", comida)] == (Decimal("40"), 1)
+    ano, mes = int(datos["fecha"][:4]), int(datos["fecha"][5:7])
+    assert filas[(ano, mes, datos["tipo"], datos["categoria_id"])] == (Decimal(str(datos["monto"])), 1)
+    assert len(filas) == 2
+    assert filas == _reconstruido(db)
+
+
+def test_baja_resta_y_no_deja_filas_en_cero(cliente, db, categorias):
+    comida, _ = categorias
+    primera = _crear(cliente, comida, 100)
+    segunda = _crear(cliente, comida, 20, fecha="2025-03-02")
+
+    assert cliente.delete(f"/transacciones/{primera}", headers=cabeceras()).status_code == 200
+    assert _filas(db) == {(2025, 3, "egreso", comida): (Decimal("20"), 1)}
+
+    assert cliente.delete(f"/transacciones/{segunda}", headers=cabeceras()).status_code == 200
+    assert _filas(db) == {}
+    assert _reconstruido(db) == {}
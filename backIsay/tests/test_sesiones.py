@@ -0,0 +1,135 @@
+# Tokens de acceso y refresco (sesiones.py): rotación, lista de denegados y
+# revocación al cambiar la contraseña.
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import recuperacion
+import sesiones
+from conftest import CONTRASENA, crear_usuario
+
+RAIZ = os.path.join(os.path.dirname(__file__), "..")
+
+
+def _login(cliente, contrasena=CONTRASENA):
+    r = cliente.post("/login", json={"correo": "usuario1@lanaapp.com", "contraseña_hash": contrasena})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def usuario(db):
+    crear_usuario(db)
+
+
+def test_reset_revoca_lo_anterior_y_no_el_login_siguiente(cliente, db, usuario):
+    viejo = _login(cliente)
+    token = recuperacion.crear(db, 1)
+    db.commit()
+
+    r = cliente.post(f"/reset-password/{token}", json={"nueva_contraseña": "otra123456"})
+    assert r.status_code == 200
+    # En el mismo segundo que la revocación
+    nuevo = _login(cliente, "otra123456")
+
+    assert cliente.get("/usuarios/me", headers=_bearer(viejo["access_token"])).status_code == 401
+    assert cliente.post("/token/refresh", json={"refresh_token": viejo["refresh_token"]}).status_code == 401
+    assert cliente.get("/usuarios/me", headers=_bearer(nuevo["access_token"])).status_code == 200
+    assert cliente.post("/token/refresh", json={"refresh_token": nuevo["refresh_token"]}).status_code == 200
+
+
+def test_revocacion_por_milisegundos():
+    antes = sesiones.emitir(1)
+    time.sleep(0.002)
+    sesiones.revocar_usuario(1)
+    despues = sesiones.emitir(1)
+
+    with pytest.raises(HTTPException) as error:
+        sesiones.verificar(antes)
+    assert error.value.status_code == 401
+    assert sesiones.verificar(despues)["usuario_id"] == 1
+
+
+def test_refresco_rota_y_no_se_reutiliza(cliente, usuario):
+    par = _login(cliente)
+
+    r = cliente.post("/token/refresh", json={"refresh_token": par["refresh_token"]})
+    assert r.status_code == 200
+    rotado = r.json()
+    assert rotado["refresh_token"] != par["refresh_token"]
+
+    assert cliente.post("/token/refresh", json={"refresh_token": par["refresh_token"]}).status_code == 401
+    assert cliente.post("/token/refresh", json={"refresh_token": rotado["refresh_token"]}).status_code == 200
+
+
+def test_refresco_no_sirve_como_acceso(cliente, usuario):
+    par = _login(cliente)
+    assert cliente.get("/usuarios/me", headers=_bearer(par["refresh_token"])).status_code == 401
+
+
+def test_logout_deniega_ambos_tokens(cliente, usuario):
+    par = _login(cliente)
+
+    r = cliente.post("/logout", json={"refresh_token": par["refresh_token"]}, headers=_bearer(par["access_token"]))
+    assert r.status_code == 204
+    assert cliente.get("/usuarios/me", headers=_bearer(par["access_token"])).status_code == 401
+    assert cliente.post("/token/refresh", json={"refresh_token": par["refresh_token"]}).status_code == 401
+
+
+def test_token_alterado(cliente, usuario):
+    token = sesiones.emitir(1)
+    cuerpo, firma = token.rsplit(".", 1)
+    alterado = cuerpo + "." + ("A" if firma[0] != "A" else "B") + firma[1:]
+    assert cliente.get("/usuarios/me", headers=_bearer(alterado)).status_code == 401
+
+
+def test_sin_secreto_no_arranca():
+    entorno = {k: v for k, v in os.environ.items() if k not in ("JWT_SECRETO", "JWT_DESARROLLO")}
+    codigo = "import sesiones"
+    r = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=entorno, capture_output=True, text=True)
+    assert r.returncode != 0 and "JWT_SECRETO" in r.stderr
+
+    r = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=dict(entorno, JWT_DESARROLLO="1"))
+    assert r.returncode == 0
+
+
+class _RedisFalso:
+    def __init__(self):
+        self.datos = {}
+
+    def set(self, clave, valor, ex):
+        self.datos[clave] = (valor.encode(), ex)
+
+    def get(self, clave):
+        return self.datos.get(clave, (None,))[0]
+
+
+def test_listas_compartidas_en_redis(monkeypatch):
+    r = _RedisFalso()
+    for nombre, prefijo in (("denegados", "lana:jti:"), ("revocados", "lana:rev:")):
+        lista = object.__new__(sesiones.ListaRedis)
+        lista._r, lista.prefijo = r, prefijo
+        monkeypatch.setattr(sesiones, nombre, lista)
+
+    acceso = sesiones.emitir(1)
+    claims = sesiones.verificar(acceso)
+    sesiones.revocar(claims)
+    valor, ttl = r.datos["lana:jti:" + claims["jti"]]
+    assert float(valor) == claims["exp"] and 0 < ttl <= sesiones.ACCESO_SEGUNDOS
+    with pytest.raises(HTTPException):
+        sesiones.verificar(acceso)
+
+    otro = sesiones.emitir(2)
+    time.sleep(0.002)
+    sesiones.revocar_usuario(2)
+    assert "lana:rev:2" in r.datos
+    with pytest.raises(HTTPException):
+        sesiones.verificar(otro)
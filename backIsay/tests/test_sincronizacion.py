@@ -0,0 +1,128 @@
+# POST /sync: idempotencia por clave, bajas y avance del cursor por versión.
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import importacion
+import sincronizacion
+from conftest import cabeceras, crear_usuario
+from models import Eliminacion, Transaccion
+from paginacion import codificar_cursor
+
+
+@pytest.fixture
+def categorias(db):
+    return crear_usuario(db)
+
+
+def _sync(cliente, cursor=None, mutaciones=()):
+    r = cliente.post("/sync", headers=cabeceras(), json={"cursor": cursor, "mutaciones": list(mutaciones)})
+    assert r.status_code == 200
+    return r.json()
+
+
+def _alta(clave, categoria_id, monto=100):
+    return {"clave": clave, "entidad": "transaccion", "operacion": "crear",
+            "datos": {"monto": monto, "categoria_id": categoria_id, "tipo": "egreso", "fecha": "2025-01-15"}}
+
+
+def _ids(respuesta):
+    return [t["id"] for t in respuesta["cambios"]["transacciones"]]
+
+
+def test_clave_repetida_no_se_aplica_dos_veces(cliente, db, categorias):
+    comida, _ = categorias
+    primera = _sync(cliente, mutaciones=[_alta("a", comida)])
+    segunda = _sync(cliente, mutaciones=[_alta("a", comida, monto=999)])
+
+    assert primera["resultados"] == segunda["resultados"]
+    assert primera["resultados"][0]["estado"] == "ok"
+    assert db.query(Transaccion).count() == 1
+    assert db.query(Transaccion).one().monto == 100
+
+
+def test_error_guardado_y_resto_del_lote_aplicado(cliente, db, categorias):
+    comida, _ = categorias
+    lote = [{"clave": "x", "entidad": "transaccion", "operacion": "actualizar", "id": 12345,
+             "datos": {"monto": 1, "categoria_id": comida, "tipo": "egreso", "fecha": "2025-01-15"}},
+            _alta("b", comida)]
+    r = _sync(cliente, mutaciones=lote)
+
+    assert [m["estado"] for m in r["resultados"]] == ["error", "ok"]
+    assert _sync(cliente, mutaciones=lote[:1])["resultados"] == r["resultados"][:1]
+    # La mutación aplicada tras el SAVEPOINT deshecho también llega por el delta
+    assert _ids(r) == [r["resultados"][1]["id"]]
+
+
+def test_cursor_entrega_altas_cambios_y_bajas(cliente, categorias):
+    comida, _ = categorias
+    inicial = _sync(cliente, mutaciones=[_alta("a", comida), _alta("b", comida)])
+    assert inicial["completo"] and len(_ids(inicial)) == 2
+    a, b = (m["id"] for m in inicial["resultados"])
+
+    vacia = _sync(cliente, inicial["cursor"])
+    assert not vacia["completo"] and _ids(vacia) == [] and vacia["cambios"]["eliminados"] == {}
+
+    cliente.put(f"/transacciones/{a}", headers=cabeceras(), json={
+        "monto": 50, "categoria_id": comida, "tipo": "egreso", "fecha": "2025-02-01"})
+    cliente.delete(f"/transacciones/{b}", headers=cabeceras())
+    cambios = _sync(cliente, vacia["cursor"])
+    assert _ids(cambios) == [a]
+    assert cambios["cambios"]["eliminados"] == {"transaccion": [b]}
+
+    assert _ids(_sync(cliente, cambios["cursor"])) == []
+
+
+def test_escritura_con_fecha_vieja_no_se_salta(cliente, db, categorias):
+    # Una transacción larga deja fecha_actualizacion = NOW() de su inicio; si
+    # confirma después de que el cliente sincronizó, el delta igual la trae
+    comida, _ = categorias
+    cursor = _sync(cliente)["cursor"]
+    ids = [m["id"] for m in _sync(cliente, mutaciones=[_alta("a", comida)])["resultados"]]
+    db.query(Transaccion).update({"fecha_actualizacion": datetime.utcnow() - timedelta(hours=1)})
+    db.commit()
+
+    assert _ids(_sync(cliente, cursor)) == ids
+
+
+def test_paginas_con_hay_mas(db, categorias):
+    comida, _ = categorias
+    importacion.insertar_lote(db, [
+        (i, {"usuario_id": 1, "monto": 10 + i, "categoria_id": comida, "tipo": "egreso",
+             "fecha": date(2025, 1, 1 + i), "descripcion": None, "es_recurrente": False, "id_recurrente": None})
+        for i in range(5)
+    ])
+
+    vistos, cursor, hay_mas = [], None, True
+    while hay_mas:
+        r = sincronizacion.cambios(db, 1, cursor, limite=2)
+        vistos += [t.id for t in r["cambios"]["transacciones"]]
+        cursor, hay_mas = r["cursor"], r["hay_mas"]
+    assert sorted(vistos) == sorted(t.id for t in db.query(Transaccion))
+    assert len(vistos) == 5
+
+
+def test_cursor_anterior_o_de_otra_base_pide_todo(cliente, categorias):
+    comida, _ = categorias
+    _sync(cliente, mutaciones=[_alta("a", comida)])
+    por_fecha = codificar_cursor([datetime(2025, 1, 1), 0] * 4)
+    adelantado = codificar_cursor([10 ** 6, 0] * 4)
+
+    for cursor in (por_fecha, adelantado):
+        r = _sync(cliente, cursor)
+        assert r["completo"] and len(_ids(r)) == 1
+
+
+def test_bajas_purgadas_piden_todo(cliente, db, categorias):
+    comida, _ = categorias
+    inicial = _sync(cliente, mutaciones=[_alta("a", comida)])
+    cliente.delete(f"/transacciones/{inicial['resultados'][0]['id']}", headers=cabeceras())
+    al_dia = _sync(cliente, inicial["cursor"])
+    assert al_dia["cambios"]["eliminados"] == {"transaccion": [inicial["resultados"][0]["id"]]}
+
+    db.query(Eliminacion).update({"fecha": datetime.utcnow() - timedelta(days=60)})
+    db.commit()
+    assert sincronizacion.purgar(db, 30)[0] == 1
+
+    assert _sync(cliente, inicial["cursor"])["completo"]
+    assert not _sync(cliente, al_dia["cursor"])["completo"]
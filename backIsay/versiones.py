@@ -0,0 +1,101 @@
+# Versión de cambios por usuario para los deltas de /sync (sincronizacion.py).
+#
+# Toda escritura en transacciones, presupuestos, pagos_fijos o eliminaciones
+# incrementa el contador del usuario en sync_versiones y deja ese número en
+# la columna `version` de las filas que toca. El incremento bloquea la fila
+# del contador hasta el commit, así que las transacciones de un mismo usuario
+# se confirman en orden de versión: si el contador confirmado vale N, todas
+# las filas con version <= N ya son visibles y ninguna transacción abierta
+# puede escribir una versión <= N. /sync entrega hasta N sin depender del
+# reloj ni de cuánto tarde en confirmar una transacción.
+#
+# Las escrituras por ORM se marcan solas (before_flush). Las inserciones por
+# Core (importacion.py, recurrentes.py) ponen `version` con `tomar`; un
+# UPDATE o INSERT escrito a mano sobre esas tablas debe hacer lo mismo o /sync
+# no lo entregará.
+#
+# La versión se pide una vez por transacción y usuario y se guarda en
+# session.info; si se deshace el SAVEPOINT en que se pidió, se descarta y la
+# siguiente escritura pide otra.
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from models import Eliminacion, PagoFijo, Presupuesto, Transaccion, VersionSync
+
+VERSIONADOS = (Transaccion, Presupuesto, PagoFijo, Eliminacion)
+
+TABLA = VersionSync.__table__
+
+
+def _sentencia_incrementar(dialecto):
+    if dialecto == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        return mysql_insert(TABLA).on_duplicate_key_update(version=TABLA.c.version + 1)
+    if dialecto in ("sqlite", "postgresql"):
+        if dialecto == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert(TABLA).on_conflict_do_update(
+            index_elements=["usuario_id"], set_={"version": TABLA.c.version + 1})
+    return None
+
+
+def _incrementar(db, usuario_id):
+    stmt = _sentencia_incrementar(db.get_bind().dialect.name)
+    if stmt is not None:
+        db.execute(stmt, {"usuario_id": usuario_id, "version": 1})
+    elif not db.execute(update(TABLA).where(TABLA.c.usuario_id == usuario_id)
+                        .values(version=TABLA.c.version + 1)).rowcount:
+        db.execute(TABLA.insert(), {"usuario_id": usuario_id, "version": 1})
+    return db.execute(select(TABLA.c.version).where(TABLA.c.usuario_id == usuario_id)).scalar_one()
+
+
+def tomar(db, usuario_id):
+    """Versión de la transacción en curso para las escrituras de `usuario_id`."""
+    tomadas = db.info.setdefault("versiones_sync", [])
+    for _, uid, version in tomadas:
+        if uid == usuario_id:
+            return version
+    version = _incrementar(db, usuario_id)
+    tomadas.append((db.get_nested_transaction(), usuario_id, version))
+    return version
+
+
+def leer(db, usuario_id):
+    """(última versión confirmada, versión de la última baja purgada) del usuario."""
+    fila = db.execute(select(TABLA.c.version, TABLA.c.purgado).where(TABLA.c.usuario_id == usuario_id)).first()
+    return tuple(fila) if fila else (0, 0)
+
+
+def marcar_purgado(db, usuario_id, version):
+    db.execute(update(TABLA).where(TABLA.c.usuario_id == usuario_id, TABLA.c.purgado < version)
+               .values(purgado=version))
+
+
+@event.listens_for(Session, "before_flush")
+def _marcar(sesion, contexto, instancias):
+    for obj in list(sesion.new) + list(sesion.dirty):
+        if isinstance(obj, VERSIONADOS) and (obj in sesion.new or sesion.is_modified(obj)):
+            obj.version = tomar(sesion, obj.usuario_id)
+
+
+def _dentro(transaccion, deshecha):
+    while transaccion is not None:
+        if transaccion is deshecha:
+            return True
+        transaccion = transaccion.parent
+    return False
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar(sesion, previa):
+    tomadas = sesion.info.get("versiones_sync")
+    if tomadas and previa.nested:
+        sesion.info["versiones_sync"] = [t for t in tomadas if not _dentro(t[0], previa)]
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _terminar(sesion, transaccion):
+    if transaccion.parent is None:
+        sesion.info.pop("versiones_sync", None)
@@ -9,9 +9,7 @@ import {
   StyleSheet,
   Alert
 } from 'react-native';
-import AsyncStorage from '@react-native-async-storage/async-storage';
-
-const API_URL = "http://192.168.1.140:8000";  // This is correct, keep it as is
+import { getPerfil, logout } from '../utils/api';
 
 export default function Configuracion({ navigation }) {
   const [usuario, setUsuario] = useState({
@@ -30,9 +28,7 @@ export default function Configuracion({ navigation }) {
 
   const fetchPerfil = async () => {
     try {
-      // supongamos que tienes GET /usuarios/1
-      const res = await fetch(`${API_URL}/usuarios/1`);
-      const data = await res.json();
+      const data = await getPerfil();
       setUsuario({
         nombre: data.nombre,
         email: data.email,
@@ -46,8 +42,12 @@ export default function Configuracion({ navigation }) {
   };
 
   const handleLogout = async () => {
-    // limpia token/id y vuelve a login
-    await AsyncStorage.removeItem('userId');
+    // revoca los tokens, limpia la sesión guardada y vuelve a login
+    try {
+      await logout();
+    } catch (error) {
+      console.log('Error al cerrar sesión', error);
+    }
     navigation.replace('Login');
   };
 
@@ -1,37 +1,50 @@
-import React, { useCallback, useState } from "react";
+import React, { useCallback, useEffect, useRef, useState } from "react";
 import { useFocusEffect } from "@react-navigation/native";
 import { View, Text, StyleSheet, ScrollView, Dimensions } from "react-native";
 import { BarChart, PieChart } from "react-native-chart-kit";
 import { Picker } from "@react-native-picker/picker";
-import { getResumen, getTendencias, getCategorias } from "../utils/api";
+import { escucharEventos, getDashboard } from "../utils/api";
 
 export default function Dashboard() {
   const [resumen, setResumen] = useState({ total_ingresos: 0, total_egresos: 0, total_ahorros: 0, balance: 0 });
-  const [tendencias, setTendencias] = useState([]);
-  const [categorias, setCategorias] = useState([]);
+  const [tendenciasPorTipo, setTendenciasPorTipo] = useState({});
+  const [categoriasPorTipo, setCategoriasPorTipo] = useState({});
   const [tipo, setTipo] = useState("egreso"); // Gastos
 
+  // Solo se vuelve a pedir el dashboard si llegó un cambio por /eventos
+  const desactualizado = useRef(true);
+  const enFoco = useRef(false);
+
+  // Una sola petición trae los datos de todos los tipos; cambiar de tipo no vuelve a pedir nada
+  const cargarDatos = useCallback(async () => {
+    desactualizado.current = false;
+    const data = await getDashboard();
+    setResumen(data.resumen);
+    setTendenciasPorTipo(data.tendencias);
+    setCategoriasPorTipo(data.categorias);
+  }, []);
+
+  useEffect(() => escucharEventos((nombre, evento) => {
+    if (nombre === "cambio" && evento.entidad !== "transaccion") return;
+    desactualizado.current = true;
+    if (enFoco.current) cargarDatos();
+  }), [cargarDatos]);
+
 useFocusEffect(
   useCallback(() => {
-    const cargarDatos = async () => {
-      const resumenData = await getResumen();
-      setResumen(resumenData);
-
-      const tendenciasData = await getTendencias(tipo);
-      setTendencias(tendenciasData);
-
-      const categoriasData = await getCategorias(tipo);
-      setCategorias(categoriasData);
-    };
-
-    cargarDatos();
-  }, [tipo]) // Se vuelve a ejecutar si cambia el tipo
+    enFoco.current = true;
+    if (desactualizado.current) cargarDatos();
+    return () => { enFoco.current = false; };
+  }, [cargarDatos])
 );
 
+  const tendencias = tendenciasPorTipo[tipo] || [];
+  const categorias = categoriasPorTipo[tipo] || [];
+
 
-  // Datos para la gráfica de barras
+  // Datos para la gráfica de barras; con el año, dos "Enero" de años distintos no se confunden
   const barData = {
-    labels: tendencias.map((item) => item.mes),
+    labels: tendencias.map((item) => `${item.mes.slice(0, 3)} ${String(item.ano).slice(-2)}`),
     datasets: [{ data: tendencias.map((item) => item.total) }],
   };
 
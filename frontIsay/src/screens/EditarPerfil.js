@@ -8,8 +8,7 @@ import {
   StyleSheet,
   Alert
 } from 'react-native';
-
-const API_URL = "http://192.168.1.140:8000";
+import { getPerfil, actualizarPerfil } from '../utils/api';
 
 export default function EditarPerfil({ navigation }) {
   const [usuario, setUsuario] = useState({
@@ -24,8 +23,7 @@ export default function EditarPerfil({ navigation }) {
 
   const fetchPerfil = async () => {
     try {
-      const res = await fetch(`${API_URL}/usuarios/1`);
-      const data = await res.json();
+      const data = await getPerfil();
       setUsuario({
         nombre_usuario: data.nombre_usuario,
         correo: data.correo,
@@ -39,12 +37,7 @@ export default function EditarPerfil({ navigation }) {
 
   const guardarCambios = async () => {
     try {
-      const res = await fetch(`${API_URL}/usuarios/1`, {
-        method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(usuario)
-      });
-      if (!res.ok) throw new Error('Error al actualizar');
+      await actualizarPerfil(usuario);
       Alert.alert('Perfil actualizado', 'Los cambios fueron guardados', [
         { text: 'OK', onPress: () => navigation.goBack() }
       ]);
@@ -14,7 +14,6 @@ import DateTimePicker from '@react-native-community/datetimepicker';
 import { Picker } from '@react-native-picker/picker';
 import { fetchCategorias } from "../utils/api";
 import { crearPagoFijo } from "../utils/api";
-import AsyncStorage from '@react-native-async-storage/async-storage';
 
 export default function PagosFijosScreen() {
   const [modalAdd, setModalAdd] = useState(false);
@@ -31,10 +30,8 @@ export default function PagosFijosScreen() {
   const [selectedCategory, setSelectedCategory] = useState('');
 
   const handleGuardarPago = async () => {
-    const usuario_id = parseInt(await AsyncStorage.getItem('usuario_id'));
     const nuevoPago = {
       descripcion: nombrePago,
-      usuario_id: usuario_id,
       categoria_id: selectedCategory,
       monto: parseFloat(monto),
       fecha: fechaVencimiento.toISOString().split("T")[0]
@@ -9,8 +9,7 @@ import {
   Alert
 } from 'react-native';
 import { Ionicons } from '@expo/vector-icons';
-
-const API_URL = "http://192.168.1.140:8000";
+import { getPerfil } from '../utils/api';
 
 export default function Perfil({ navigation }) {
   const [usuario, setUsuario] = useState({
@@ -25,8 +24,7 @@ export default function Perfil({ navigation }) {
 
   const fetchPerfil = async () => {
     try {
-      const res = await fetch(`${API_URL}/usuarios/1`);
-      const data = await res.json();
+      const data = await getPerfil();
       setUsuario({
         nombre: data.nombre,
         email: data.email,
@@ -13,7 +13,7 @@ import {
   ScrollView,
 } from "react-native";
 import DateTimePicker from "@react-native-community/datetimepicker";
-import { getTransacciones, crearTransaccion as crearTransaccionAPI, editarTransaccion as editarTransaccionAPI, eliminarTransaccion as  eliminarTransaccionAPI} from "../utils/api";
+import { escucharEventos, getTransacciones, crearTransaccion as crearTransaccionAPI, editarTransaccion as editarTransaccionAPI, eliminarTransaccion as  eliminarTransaccionAPI} from "../utils/api";
 
 const ajustarFecha = (date) => {
   const year = date.getFullYear();
@@ -25,6 +25,8 @@ const ajustarFecha = (date) => {
 export default function Transacciones() {
   const [transacciones, setTransacciones] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [cursor, setCursor] = useState(null);
+  const [cargandoMas, setCargandoMas] = useState(false);
 
   const [modalVisible, setModalVisible] = useState(false);
   const [monto, setMonto] = useState("");
@@ -46,11 +48,40 @@ export default function Transacciones() {
     fetchTransacciones();
   }, []);
 
+  // Cambios hechos desde otro dispositivo o por el servidor (pagos fijos, importaciones)
+  useEffect(() => {
+    let conectadoAntes = false;
+    return escucharEventos((tipo, evento) => {
+      if (tipo === "conectado") {
+        // Al reconectar se pudieron perder cambios
+        if (conectadoAntes) fetchTransacciones();
+        conectadoAntes = true;
+        return;
+      }
+      if (tipo === "recargar") {
+        fetchTransacciones();
+        return;
+      }
+      if (evento.entidad !== "transaccion") return;
+      if (evento.accion === "masiva") {
+        fetchTransacciones();
+        return;
+      }
+      const { accion, datos } = evento;
+      setTransacciones((prev) => {
+        if (accion === "eliminada") return prev.filter((t) => t.id !== datos.id);
+        if (prev.some((t) => t.id === datos.id)) return prev.map((t) => (t.id === datos.id ? { ...t, ...datos } : t));
+        return accion === "creada" ? [datos, ...prev] : prev;
+      });
+    });
+  }, []);
+
   const fetchTransacciones = async () => {
     try {
       setLoading(true);
-      const data = await getTransacciones();
-      setTransacciones(data);
+      const { items, siguiente } = await getTransacciones();
+      setTransacciones(items);
+      setCursor(siguiente);
     } catch (error) {
       console.log("Error cargando transacciones", error);
       Alert.alert("Error", "No se pudieron cargar las transacciones");
@@ -59,6 +90,20 @@ export default function Transacciones() {
     }
   };
 
+  const cargarMas = async () => {
+    if (!cursor || cargandoMas) return;
+    try {
+      setCargandoMas(true);
+      const { items, siguiente } = await getTransacciones({ cursor });
+      setTransacciones((prev) => [...prev, ...items]);
+      setCursor(siguiente);
+    } catch (error) {
+      console.log("Error cargando más transacciones", error);
+    } finally {
+      setCargandoMas(false);
+    }
+  };
+
   const crearTransaccion = async () => {
     if (!monto || !categoria || !descripcion || !fecha) {
       Alert.alert("Error", "Todos los campos son obligatorios");
@@ -72,10 +117,9 @@ export default function Transacciones() {
         descripcion,
         fecha
       });
-      setTransacciones([...transacciones, res]);
+      setTransacciones((prev) => [res, ...prev]);
       setModalVisible(false);
       limpiarCampos();
-      fetchTransacciones();
     } catch (error) {
       console.log("Error creando transacción", error);
     }
@@ -98,16 +142,16 @@ const editarTransaccion = async () => {
   }
 
   try {
-    await editarTransaccionAPI(editId, {
+    const res = await editarTransaccionAPI(editId, {
       monto: parseFloat(monto),
       categoria,
       descripcion,
       fecha
     });
 
+    setTransacciones((prev) => prev.map((t) => (t.id === editId ? res : t)));
     setModalEditarVisible(false);
     limpiarCampos();
-    fetchTransacciones();
   } catch (error) {
     console.log("Error editando transacción", error);
     Alert.alert("Error", "No se pudo editar la transacción");
@@ -123,8 +167,8 @@ const editarTransaccion = async () => {
 const eliminarTransaccion = async () => {
   try {
     await eliminarTransaccionAPI(deleteId);
+    setTransacciones((prev) => prev.filter((t) => t.id !== deleteId));
     setModalEliminarVisible(false);
-    fetchTransacciones();
   } catch (error) {
     console.log("Error eliminando transacción", error);
     Alert.alert("Error", "No se pudo eliminar la transacción");
@@ -213,6 +257,9 @@ const eliminarTransaccion = async () => {
           keyExtractor={(item) => item.id.toString()}
           renderItem={renderCardItem}
           contentContainerStyle={{ paddingBottom: 80 }}
+          onEndReached={cargarMas}
+          onEndReachedThreshold={0.5}
+          ListFooterComponent={cargandoMas ? <ActivityIndicator color="#007bff" /> : null}
         />
       )}
 
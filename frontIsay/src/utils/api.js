@@ -1,4 +1,5 @@
 import axios from 'axios';
+import AsyncStorage from '@react-native-async-storage/async-storage';
 
 const API_URL = 'http://192.168.1.140:8000';
 
@@ -10,6 +11,47 @@ const api = axios.create({
   },
 });
 
+// Sesión: cada petición lleva el token de acceso; ante un 401 se pide un par
+// nuevo con el token de refresco una sola vez y se reintenta la petición
+const guardarTokens = async ({ access_token, refresh_token }) => {
+  await AsyncStorage.multiSet([['access_token', access_token], ['refresh_token', refresh_token]]);
+};
+
+api.interceptors.request.use(async (config) => {
+  const token = await AsyncStorage.getItem('access_token');
+  if (token) {
+    config.headers.Authorization = `Bearer ${token}`;
+  }
+  return config;
+});
+
+let refrescando = null;
+
+// Varias peticiones que fallan a la vez comparten el mismo refresco
+const refrescarTokens = (refresh_token) => {
+  refrescando = refrescando || api.post('/token/refresh', { refresh_token })
+    .then((r) => guardarTokens(r.data))
+    .finally(() => { refrescando = null; });
+  return refrescando;
+};
+
+api.interceptors.response.use(
+  (response) => response,
+  async (error) => {
+    const original = error.config;
+    if (error.response?.status !== 401 || original._reintento || original.url === '/token/refresh') {
+      throw error;
+    }
+    original._reintento = true;
+    const refresh_token = await AsyncStorage.getItem('refresh_token');
+    if (!refresh_token) {
+      throw error;
+    }
+    await refrescarTokens(refresh_token);
+    return api(original);
+  }
+);
+
 //Registro
 export const register = async (form) => {
   try {
@@ -24,18 +66,45 @@ export const register = async (form) => {
 export const login = async (correo, contraseña_hash) => {
   try {
     const response = await api.post('/login', { correo, contraseña_hash });
+    await guardarTokens(response.data);
     return response.data;
   } catch (error) {
     throw error.response?.data?.detail || 'Error al iniciar sesión';
   }
 };
 
+export const logout = async () => {
+  const refresh_token = await AsyncStorage.getItem('refresh_token');
+  try {
+    await api.post('/logout', { refresh_token });
+  } finally {
+    await AsyncStorage.multiRemove(['access_token', 'refresh_token', 'usuario_id', 'usuario_nombre', 'sync_cursor', 'sync_pendientes']);
+  }
+};
+
+// Perfil del usuario de la sesión
+export const getPerfil = async () => {
+  const response = await api.get('/usuarios/me');
+  return response.data;
+};
+
+export const actualizarPerfil = async (datos) => {
+  const response = await api.put('/usuarios/me', datos);
+  return response.data;
+};
+
 //Dashboard
 export const getResumen = async () => {
   const response = await api.get('/resumen');
   return response.data;
 };
 
+// Resumen, tendencias y categorías de todos los tipos en una sola petición
+export const getDashboard = async (params = {}) => {
+  const response = await api.get('/dashboard', { params });
+  return response.data;
+};
+
 export const getTendencias = async (tipo) => {
   const response = await api.get(`/graficas/tendencias?tipo=${tipo}`);
   return response.data;
@@ -47,9 +116,10 @@ export const getCategorias = async (tipo) => {
 };
 
 //Transacciones
-export const getTransacciones = async () => {
-  const response = await api.get('/transacciones');
-  return response.data;
+// Devuelve una página; `siguiente` es el cursor para pedir la próxima (null al final)
+export const getTransacciones = async (params = {}) => {
+  const response = await api.get('/transacciones', { params });
+  return { items: response.data, siguiente: response.headers['x-next-cursor'] || null };
 };
 
 export const crearTransaccion = async (data) => {
@@ -83,4 +153,106 @@ export const crearPagoFijo = async (data) => {
   }
 };
 
+// Sincronización sin conexión
+// Los cambios hechos sin red se encolan con una clave única; `sincronizar` los
+// envía a /sync (reenviar la misma clave no duplica nada) y trae lo que cambió
+// en el servidor desde el último cursor.
+const nuevaClave = () => `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+
+export const encolar = async (entidad, operacion, datos = null, id = null) => {
+  const pendientes = JSON.parse((await AsyncStorage.getItem('sync_pendientes')) || '[]');
+  pendientes.push({ clave: nuevaClave(), entidad, operacion, datos, id });
+  await AsyncStorage.setItem('sync_pendientes', JSON.stringify(pendientes));
+};
+
+// Devuelve { resultados, cambios: [páginas], completo }; con `completo` la app
+// reemplaza sus datos locales en vez de mezclarlos
+export const sincronizar = async () => {
+  const pendientes = JSON.parse((await AsyncStorage.getItem('sync_pendientes')) || '[]');
+  let cursor = await AsyncStorage.getItem('sync_cursor');
+  const cambios = [];
+  let resultados = [];
+  let completo = false;
+  let mutaciones = pendientes.slice(0, 500);  // máximo por petición; el resto va en la próxima
+  let hayMas = true;
+  while (hayMas) {
+    const { data } = await api.post('/sync', { cursor, mutaciones });
+    if (mutaciones.length) {
+      resultados = data.resultados;
+      // Las claves confirmadas salen de la cola (las que fallaron también: su error no cambia)
+      const confirmadas = new Set(data.resultados.map((r) => r.clave));
+      const restantes = JSON.parse((await AsyncStorage.getItem('sync_pendientes')) || '[]')
+        .filter((m) => !confirmadas.has(m.clave));
+      await AsyncStorage.setItem('sync_pendientes', JSON.stringify(restantes));
+      mutaciones = [];
+    }
+    completo = completo || data.completo;
+    cambios.push(data.cambios);
+    cursor = data.cursor;
+    hayMas = data.hay_mas;
+  }
+  await AsyncStorage.setItem('sync_cursor', cursor);
+  return { resultados, cambios, completo };
+};
+
+// Cambios en vivo (GET /eventos, Server-Sent Events)
+// `alEvento(tipo, datos)` recibe 'conectado' y 'recargar' (volver a pedir todo) o
+// 'cambio' con { entidad, accion, datos, resumen }. Reconecta solo; devuelve una
+// función para cerrar. Usa XMLHttpRequest porque fetch en React Native no entrega
+// el cuerpo por partes.
+export const escucharEventos = (alEvento) => {
+  let xhr = null;
+  let cerrado = false;
+  let espera = 1000;
+
+  const conectar = async () => {
+    const token = await AsyncStorage.getItem('access_token');
+    if (cerrado || !token) return;
+    let leido = 0;
+    xhr = new XMLHttpRequest();
+    xhr.open('GET', `${API_URL}/eventos`);
+    xhr.setRequestHeader('Authorization', `Bearer ${token}`);
+    xhr.setRequestHeader('Accept', 'text/event-stream');
+    xhr.onprogress = () => {
+      const bloques = xhr.responseText.slice(leido).split('\n\n');
+      bloques.pop(); // el último puede estar incompleto
+      for (const bloque of bloques) {
+        leido += bloque.length + 2;
+        let tipo = 'message';
+        let datos = '';
+        for (const linea of bloque.split('\n')) {
+          if (linea.startsWith('event: ')) tipo = linea.slice(7);
+          else if (linea.startsWith('data: ')) datos += linea.slice(6);
+        }
+        if (datos) {
+          espera = 1000;
+          alEvento(tipo, JSON.parse(datos));
+        }
+      }
+    };
+    xhr.onloadend = async () => {
+      if (cerrado) return;
+      // El servidor cierra al vencer el token de acceso
+      if (xhr.status === 401 || xhr.status === 200) {
+        const refresh_token = await AsyncStorage.getItem('refresh_token');
+        if (!refresh_token) return;
+        try {
+          await refrescarTokens(refresh_token);
+        } catch (error) {
+          return;
+        }
+      }
+      setTimeout(conectar, espera);
+      espera = Math.min(espera * 2, 30000);
+    };
+    xhr.send();
+  };
+
+  conectar();
+  return () => {
+    cerrado = true;
+    xhr?.abort();
+  };
+};
+
 export default api;